@@ -16,7 +16,9 @@
 # under the License.
 
 import socket
+import time
 
+from eventlet import queue
 import msgpack
 from oslo.config import cfg
 import oslo.messaging
@@ -37,6 +39,19 @@ OPTS = [
     cfg.IntOpt('udp_port',
                default=4952,
                help='Port to which the UDP socket is bound.'),
+    cfg.IntOpt('udp_queue_size',
+               default=10000,
+               help='Maximum number of received UDP samples waiting to be '
+               'dispatched. Samples received while the queue is full are '
+               'dropped.'),
+    cfg.IntOpt('udp_batch_size',
+               default=100,
+               help='Maximum number of queued UDP samples passed to the '
+               'dispatchers at once.'),
+    cfg.IntOpt('udp_stats_interval',
+               default=60,
+               help='Number of seconds between logs of the UDP sample '
+               'counters (<= 0 means never).'),
     cfg.BoolOpt('requeue_sample_on_dispatcher_error',
                 default=False,
                 help='Requeue the sample on the collector sample queue '
@@ -62,10 +77,19 @@ class CollectorService(os_service.Service):
         self.dispatcher_manager = dispatcher.load_dispatcher_manager()
         self.rpc_server = None
         self.notification_server = None
+        self.udp_queue = None
         super(CollectorService, self).start()
 
         if cfg.CONF.collector.udp_address:
+            self.udp_queue = queue.LightQueue(
+                cfg.CONF.collector.udp_queue_size)
+            self._reset_udp_stats()
+            self.udp_run = True
             self.tg.add_thread(self.start_udp)
+            self.tg.add_thread(self.dispatch_udp)
+            if cfg.CONF.collector.udp_stats_interval > 0:
+                self.tg.add_timer(cfg.CONF.collector.udp_stats_interval,
+                                  self.log_udp_stats)
 
         allow_requeue = cfg.CONF.collector.requeue_sample_on_dispatcher_error
         transport = messaging.get_transport(optional=True)
@@ -87,27 +111,80 @@ class CollectorService(os_service.Service):
                 self.tg.add_timer(604800, lambda: None)
 
     def start_udp(self):
+        """Receive the UDP samples and queue them for dispatch.
+
+        The socket is bound with SO_REUSEPORT where available, so that each
+        collector worker receives on its own socket.
+        """
         udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         udp.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if hasattr(socket, 'SO_REUSEPORT'):
+            udp.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
         udp.bind((cfg.CONF.collector.udp_address,
                   cfg.CONF.collector.udp_port))
 
-        self.udp_run = True
         while self.udp_run:
             # NOTE(jd) Arbitrary limit of 64K because that ought to be
             # enough for anybody.
             data, source = udp.recvfrom(64 * units.Ki)
+            self.udp_stats['received'] += 1
             try:
                 sample = msgpack.loads(data, encoding='utf-8')
             except Exception:
                 LOG.warn(_("UDP: Cannot decode data sent by %s"), str(source))
             else:
                 try:
-                    LOG.debug(_("UDP: Storing %s"), str(sample))
-                    self.dispatcher_manager.map_method('record_metering_data',
-                                                       sample)
-                except Exception:
-                    LOG.exception(_("UDP: Unable to store meter"))
+                    self.udp_queue.put_nowait(sample)
+                except queue.Full:
+                    self.udp_stats['dropped'] += 1
+
+    def dispatch_udp(self):
+        """Pass the queued UDP samples to the dispatchers in batches."""
+        while self.udp_run or not self.udp_queue.empty():
+            try:
+                sample = self.udp_queue.get(timeout=1)
+            except queue.Empty:
+                continue
+            self._dispatch_udp_batch([sample])
+
+    def _dispatch_udp_batch(self, samples):
+        while (len(samples) < cfg.CONF.collector.udp_batch_size
+               and not self.udp_queue.empty()):
+            samples.append(self.udp_queue.get_nowait())
+        began = time.time()
+        try:
+            LOG.debug(_("UDP: Storing %d samples"), len(samples))
+            self.dispatcher_manager.map_method('record_metering_data',
+                                               samples)
+        except Exception:
+            LOG.exception(_("UDP: Unable to store meter"))
+        elapsed = time.time() - began
+        stats = self.udp_stats
+        stats['dispatched'] += len(samples)
+        stats['batches'] += 1
+        stats['dispatch_time'] += elapsed
+        stats['max_dispatch_time'] = max(stats['max_dispatch_time'], elapsed)
+
+    def _reset_udp_stats(self):
+        self.udp_stats = dict(received=0, dropped=0, dispatched=0, batches=0,
+                              dispatch_time=0.0, max_dispatch_time=0.0)
+
+    def log_udp_stats(self):
+        """Log the UDP sample counters since the previous log."""
+        stats = self.udp_stats
+        self._reset_udp_stats()
+        LOG.info(_("UDP: %(received)d samples received, %(dropped)d dropped "
+                   "and %(dispatched)d dispatched in %(batches)d batches, "
+                   "%(queued)d queued, dispatch latency %(avg).3fs average "
+                   "and %(max).3fs max"),
+                 {'received': stats['received'],
+                  'dropped': stats['dropped'],
+                  'dispatched': stats['dispatched'],
+                  'batches': stats['batches'],
+                  'queued': self.udp_queue.qsize(),
+                  'avg': (stats['dispatch_time'] / stats['batches']
+                          if stats['batches'] else 0.0),
+                  'max': stats['max_dispatch_time']})
 
     def stop(self):
         self.udp_run = False
@@ -115,6 +192,10 @@ class CollectorService(os_service.Service):
             self.rpc_server.stop()
         if self.notification_server:
             self.notification_server.stop()
+        if self.udp_queue:
+            while not self.udp_queue.empty():
+                self._dispatch_udp_batch([self.udp_queue.get_nowait()])
+        self.dispatcher_manager.map_method('flush')
         super(CollectorService, self).stop()
 
     def sample(self, ctxt, publisher_id, event_type, payload, metadata):
@@ -15,31 +15,167 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import datetime
+
+from lxml import etree
 from oslo.config import cfg
+from oslo.utils import timeutils
 
+from ceilometer.compute.virt.libvirt import inspector as libvirt_inspector
 from ceilometer import nova_client
+from ceilometer.openstack.common.gettextutils import _
+from ceilometer.openstack.common import log
 from ceilometer import plugin
 
 OPTS = [
     cfg.BoolOpt('workload_partitioning',
                 default=False,
                 help='Enable work-load partitioning, allowing multiple '
-                     'compute agents to be run simultaneously.')
+                     'compute agents to be run simultaneously.'),
+    cfg.StrOpt('instance_discovery_method',
+               default='naive',
+               help='Method used to discover the instances running on the '
+                    'local host (valid options are: naive, '
+                    'libvirt_metadata). naive asks nova-api for them on '
+                    'each polling cycle, libvirt_metadata lists the local '
+                    'libvirt domains and only asks nova-api about the '
+                    'instances it has not seen yet.'),
+    cfg.IntOpt('resource_cache_expiry',
+               default=3600,
+               help='Number of seconds after which the instances cached by '
+                    'the libvirt_metadata discovery are all refreshed from '
+                    'nova-api.'),
 ]
 cfg.CONF.register_opts(OPTS, group='compute')
 
+LOG = log.getLogger(__name__)
+
+NOVA_NS = 'http://openstack.org/xmlns/libvirt/nova/1.0'
+
+# Number of seconds the changes asked from nova-api overlap with the
+# previous refresh, so that clock skew between the agent and nova-api does
+# not lose any.
+CHANGES_SINCE_OVERLAP = 60
+
+# Status nova reports for an instance in the libvirt domain state
+DOMAIN_STATUS = {
+    1: 'ACTIVE',  # VIR_DOMAIN_RUNNING
+    3: 'PAUSED',  # VIR_DOMAIN_PAUSED
+    5: 'SHUTOFF',  # VIR_DOMAIN_SHUTOFF
+    7: 'SUSPENDED',  # VIR_DOMAIN_PMSUSPENDED
+}
+
+
+def _domain_flavor(domain):
+    """Return the flavor nova recorded in the domain metadata.
+
+    None is returned for the domains not created by nova.
+    """
+    tree = etree.fromstring(domain.XMLDesc(0))
+    flavor = tree.find('./metadata/{%s}instance/{%s}flavor' % (NOVA_NS,
+                                                               NOVA_NS))
+    if flavor is None:
+        return None
+    sizes = dict((child.tag.split('}')[-1], int(child.text))
+                 for child in flavor if child.text)
+    return {'name': flavor.get('name'),
+            'vcpus': sizes.get('vcpus', 0),
+            'ram': sizes.get('memory', 0),
+            'disk': sizes.get('disk', 0),
+            'ephemeral': sizes.get('ephemeral', 0)}
+
 
 class InstanceDiscovery(plugin.DiscoveryBase):
     def __init__(self):
         super(InstanceDiscovery, self).__init__()
         self.nova_cli = nova_client.Client()
+        self.inspector = None
+        self.instances = {}
+        # UUIDs of the domains nova-api did not list for this host, such as
+        # orphaned or migrating ones, which are not asked about again until
+        # the cache expires
+        self.unknown = set()
+        self.last_run = None
+        self.last_cache_expire = None
 
     def discover(self, manager, param=None):
         """Discover resources to monitor."""
-        instances = self.nova_cli.instance_get_all_by_host(cfg.CONF.host)
+        instances = None
+        if cfg.CONF.compute.instance_discovery_method == 'libvirt_metadata':
+            try:
+                instances = self.discover_libvirt_metadata()
+            except Exception as e:
+                LOG.warning(_('Unable to discover the instances from the '
+                              'libvirt metadata, asking nova-api: %s'), e)
+        if instances is None:
+            instances = self.nova_cli.instance_get_all_by_host(cfg.CONF.host)
         return [i for i in instances
                 if getattr(i, 'OS-EXT-STS:vm_state', None) != 'error']
 
+    def discover_libvirt_metadata(self):
+        """Discover the instances from the local libvirt domains.
+
+        The instances are taken from the cache, which is only refreshed
+        from nova-api when a domain is not in it, when the flavor of a
+        domain changed or when the cache expired. Domains still unknown
+        to nova-api after a refresh only cause another one once the cache
+        expired.
+        """
+        if self.inspector is None:
+            self.inspector = libvirt_inspector.LibvirtInspector()
+        domains = {}
+        for domain in self.inspector.list_domains():
+            flavor = _domain_flavor(domain)
+            if flavor is not None:
+                domains[domain.UUIDString()] = (domain, flavor)
+
+        if self._cache_expired() or any(
+                uuid not in self.unknown and (
+                    uuid not in self.instances or
+                    self.instances[uuid].flavor.get('name') != flavor['name'])
+                for uuid, (domain, flavor) in domains.items()):
+            self._refresh_cache()
+
+        instances = []
+        for uuid, (domain, flavor) in domains.items():
+            instance = self.instances.get(uuid)
+            if instance is None:
+                LOG.debug('Domain %s is not a known instance of this host',
+                          uuid)
+                continue
+            instance.flavor.update(flavor)
+            status = DOMAIN_STATUS.get(domain.info()[0])
+            if status:
+                instance.status = status
+            instances.append(instance)
+        # Forget about the instances gone from the host
+        self.instances = dict((i.id, i) for i in instances)
+        self.unknown = set(domains) - set(self.instances)
+        return instances
+
+    def _cache_expired(self):
+        return (self.last_cache_expire is None or
+                timeutils.is_older_than(
+                    self.last_cache_expire,
+                    cfg.CONF.compute.resource_cache_expiry))
+
+    def _refresh_cache(self):
+        now = timeutils.utcnow()
+        if self._cache_expired():
+            self.instances = {}
+            self.last_cache_expire = now
+            since = None
+        else:
+            since = timeutils.isotime(self.last_run - datetime.timedelta(
+                seconds=CHANGES_SINCE_OVERLAP))
+        for instance in self.nova_cli.instance_get_all_by_host(
+                cfg.CONF.host, since):
+            if getattr(instance, 'OS-EXT-STS:vm_state', None) == 'deleted':
+                self.instances.pop(instance.id, None)
+            else:
+                self.instances[instance.id] = instance
+        self.last_run = now
+
     @property
     def group_id(self):
         if cfg.CONF.compute.workload_partitioning:
@@ -30,11 +30,12 @@ LOG = log.getLogger(__name__)
 class CPUPollster(plugin.ComputePollster):
 
     def get_samples(self, manager, cache, resources):
+        inspector = manager.inspector.get_cycle_inspector(cache)
         for instance in resources:
             LOG.debug(_('checking instance %s'), instance.id)
             instance_name = util.instance_name(instance)
             try:
-                cpu_info = manager.inspector.inspect_cpus(instance_name)
+                cpu_info = inspector.inspect_cpus(instance_name)
                 LOG.debug(_("CPUTIME USAGE: %(instance)s %(time)d"),
                           {'instance': instance.__dict__,
                            'time': cpu_info.time})
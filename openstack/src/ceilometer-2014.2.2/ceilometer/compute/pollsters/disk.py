@@ -106,11 +106,12 @@ class _Base(plugin.ComputePollster):
         """Return one or more Sample."""
 
     def get_samples(self, manager, cache, resources):
+        inspector = manager.inspector.get_cycle_inspector(cache)
         for instance in resources:
             instance_name = util.instance_name(instance)
             try:
                 c_data = self._populate_cache(
-                    manager.inspector,
+                    inspector,
                     cache,
                     instance,
                     instance_name,
@@ -27,10 +27,11 @@ class MemoryUsagePollster(plugin.ComputePollster):
 
     def get_samples(self, manager, cache, resources):
         self._inspection_duration = self._record_poll_time()
+        inspector = manager.inspector.get_cycle_inspector(cache)
         for instance in resources:
             LOG.debug(_('Checking memory usage for instance %s'), instance.id)
             try:
-                memory_info = manager.inspector.inspect_memory_usage(
+                memory_info = inspector.inspect_memory_usage(
                     instance, self._inspection_duration)
                 LOG.debug(_("MEMORY USAGE: %(instance)s %(usage)f"),
                           ({'instance': instance.__dict__,
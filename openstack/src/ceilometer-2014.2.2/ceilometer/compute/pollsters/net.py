@@ -92,13 +92,14 @@ class _Base(plugin.ComputePollster):
 
     def get_samples(self, manager, cache, resources):
         self._inspection_duration = self._record_poll_time()
+        inspector = manager.inspector.get_cycle_inspector(cache)
         for instance in resources:
             instance_name = util.instance_name(instance)
             LOG.debug(_('checking net info for instance %s'), instance.id)
             try:
                 vnics = self._get_vnics_for_instance(
                     cache,
-                    manager.inspector,
+                    inspector,
                     instance,
                 )
                 for vnic, info in vnics:
@@ -149,6 +149,18 @@ class InstanceShutOffException(InspectorException):
 #
 class Inspector(object):
 
+    def get_cycle_inspector(self, cache):
+        """Return the inspector to use for a polling cycle.
+
+        Inspectors able to gather the statistics of all the instances at
+        once return an inspector sharing them between the pollsters of the
+        cycle, kept in cache.
+
+        :param cache: the cache dict of the polling cycle
+        :return: an inspector of the same interface
+        """
+        return self
+
     def inspect_instances(self):
         """List the instances on the current host."""
         raise ceilometer.NotImplementedError
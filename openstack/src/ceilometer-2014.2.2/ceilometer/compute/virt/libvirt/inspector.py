@@ -61,6 +61,53 @@ def retry_on_disconnect(function):
     return decorator
 
 
+def _interfaces(tree):
+    """Yield the interfaces of the XML description of a domain."""
+    for iface in tree.findall('devices/interface'):
+        target = iface.find('target')
+        if target is not None:
+            name = target.get('dev')
+        else:
+            continue
+        mac = iface.find('mac')
+        if mac is not None:
+            mac_address = mac.get('address')
+        else:
+            continue
+        fref = iface.find('filterref')
+        if fref is not None:
+            fref = fref.get('filter')
+
+        params = dict((p.get('name').lower(), p.get('value'))
+                      for p in iface.findall('filterref/parameter'))
+        yield virt_inspector.Interface(name=name, mac=mac_address,
+                                       fref=fref, parameters=params)
+
+
+def _interface_stats(dom_stats):
+    return virt_inspector.InterfaceStats(rx_bytes=dom_stats[0],
+                                         rx_packets=dom_stats[1],
+                                         tx_bytes=dom_stats[4],
+                                         tx_packets=dom_stats[5])
+
+
+def _disks(tree):
+    """Yield the disks of the XML description of a domain."""
+    for device in filter(
+            bool,
+            [target.get("dev")
+             for target in tree.findall('devices/disk/target')]):
+        yield virt_inspector.Disk(device=device)
+
+
+def _disk_stats(block_stats):
+    return virt_inspector.DiskStats(read_requests=block_stats[0],
+                                    read_bytes=block_stats[1],
+                                    write_requests=block_stats[2],
+                                    write_bytes=block_stats[3],
+                                    errors=block_stats[4])
+
+
 class LibvirtInspector(virt_inspector.Inspector):
 
     per_type_uris = dict(uml='uml:///system', xen='xen:///', lxc='lxc:///')
@@ -73,6 +120,9 @@ class LibvirtInspector(virt_inspector.Inspector):
         return CONF.libvirt_uri or self.per_type_uris.get(CONF.libvirt_type,
                                                           'qemu:///system')
 
+    def get_cycle_inspector(self, cache):
+        return cache.setdefault('libvirt', LibvirtCycleInspector(self))
+
     def _get_connection(self):
         if not self.connection:
             global libvirt
@@ -119,6 +169,11 @@ class LibvirtInspector(virt_inspector.Inspector):
                         # Instance was deleted while listing... ignore it
                         pass
 
+    @retry_on_disconnect
+    def list_domains(self):
+        """Return the domains defined on the host, running or not."""
+        return self._get_connection().listAllDomains(0)
+
     def inspect_cpus(self, instance_name):
         domain = self._lookup_by_name(instance_name)
         dom_info = domain.info()
@@ -133,31 +188,9 @@ class LibvirtInspector(virt_inspector.Inspector):
                      {'instance_name': instance_name})
             return
         tree = etree.fromstring(domain.XMLDesc(0))
-        for iface in tree.findall('devices/interface'):
-            target = iface.find('target')
-            if target is not None:
-                name = target.get('dev')
-            else:
-                continue
-            mac = iface.find('mac')
-            if mac is not None:
-                mac_address = mac.get('address')
-            else:
-                continue
-            fref = iface.find('filterref')
-            if fref is not None:
-                fref = fref.get('filter')
-
-            params = dict((p.get('name').lower(), p.get('value'))
-                          for p in iface.findall('filterref/parameter'))
-            interface = virt_inspector.Interface(name=name, mac=mac_address,
-                                                 fref=fref, parameters=params)
-            dom_stats = domain.interfaceStats(name)
-            stats = virt_inspector.InterfaceStats(rx_bytes=dom_stats[0],
-                                                  rx_packets=dom_stats[1],
-                                                  tx_bytes=dom_stats[4],
-                                                  tx_packets=dom_stats[5])
-            yield (interface, stats)
+        for interface in _interfaces(tree):
+            yield (interface, _interface_stats(
+                domain.interfaceStats(interface.name)))
 
     def inspect_disks(self, instance_name):
         domain = self._lookup_by_name(instance_name)
@@ -168,18 +201,8 @@ class LibvirtInspector(virt_inspector.Inspector):
                      {'instance_name': instance_name})
             return
         tree = etree.fromstring(domain.XMLDesc(0))
-        for device in filter(
-                bool,
-                [target.get("dev")
-                 for target in tree.findall('devices/disk/target')]):
-            disk = virt_inspector.Disk(device=device)
-            block_stats = domain.blockStats(device)
-            stats = virt_inspector.DiskStats(read_requests=block_stats[0],
-                                             read_bytes=block_stats[1],
-                                             write_requests=block_stats[2],
-                                             write_bytes=block_stats[3],
-                                             errors=block_stats[4])
-            yield (disk, stats)
+        for disk in _disks(tree):
+            yield (disk, _disk_stats(domain.blockStats(disk.device)))
 
     @retry_on_disconnect
     def _lookup_by_uuid(self, instance):
@@ -247,3 +270,155 @@ class LibvirtInspector(virt_inspector.Inspector):
                 'instance_uuid': instance.id, 'error': e}
             raise virt_inspector.NoDataException(msg)
 
+
+class _Domain(object):
+    """A domain as inspected during a polling cycle.
+
+    :param domain: the libvirt domain
+    :param stats: the statistics of the domain returned by
+                  getAllDomainStats, if any
+    """
+
+    def __init__(self, domain, stats=None):
+        self.domain = domain
+        self.stats = stats or {}
+        self._info = None
+        self._tree = None
+
+    def info(self):
+        if self._info is None:
+            self._info = self.domain.info()
+        return self._info
+
+    def state(self):
+        if 'state.state' in self.stats:
+            return self.stats['state.state']
+        return self.info()[0]
+
+    def tree(self):
+        if self._tree is None:
+            self._tree = etree.fromstring(self.domain.XMLDesc(0))
+        return self._tree
+
+    def device_stats(self, kind, name):
+        """Return the prefix of the statistics of a net or block device.
+
+        None is returned when the statistics of the device are unknown.
+        """
+        for i in range(self.stats.get('%s.count' % kind, 0)):
+            if self.stats.get('%s.%d.name' % (kind, i)) == name:
+                return '%s.%d.' % (kind, i)
+
+
+class LibvirtCycleInspector(object):
+    """Libvirt inspections sharing their libvirt calls for a polling cycle.
+
+    The statistics of all the running domains are retrieved at once with
+    getAllDomainStats where libvirt supports it. The other domains are
+    looked up as by LibvirtInspector, but once per cycle, and their XML
+    description is parsed once for all the pollsters.
+    """
+
+    def __init__(self, inspector):
+        self.inspector = inspector
+        self._domains = None
+
+    def __getattr__(self, name):
+        # NOTE: The other inspections are not shared.
+        return getattr(self.inspector, name)
+
+    def _get_all_domain_stats(self):
+        domains = {}
+        connection = self.inspector._get_connection()
+        try:
+            stats = (libvirt.VIR_DOMAIN_STATS_STATE |
+                     libvirt.VIR_DOMAIN_STATS_CPU_TOTAL |
+                     libvirt.VIR_DOMAIN_STATS_BALLOON |
+                     libvirt.VIR_DOMAIN_STATS_VCPU |
+                     libvirt.VIR_DOMAIN_STATS_INTERFACE |
+                     libvirt.VIR_DOMAIN_STATS_BLOCK)
+            records = connection.getAllDomainStats(
+                stats, libvirt.VIR_CONNECT_GET_ALL_DOMAINS_STATS_ACTIVE)
+        except AttributeError:
+            # NOTE: getAllDomainStats is new in libvirt 1.2.8.
+            LOG.debug('getAllDomainStats is not supported by libvirt')
+            return domains
+        except libvirt.libvirtError as e:
+            LOG.debug('Failed to get the statistics of all domains: %s', e)
+            return domains
+        for domain, domain_stats in records:
+            domains[domain.name()] = _Domain(domain, domain_stats)
+        return domains
+
+    def _get_domains(self):
+        if self._domains is None:
+            self._domains = self._get_all_domain_stats()
+        return self._domains
+
+    def _lookup_by_name(self, instance_name):
+        domains = self._get_domains()
+        if instance_name not in domains:
+            domains[instance_name] = _Domain(
+                self.inspector._lookup_by_name(instance_name))
+        return domains[instance_name]
+
+    def inspect_cpus(self, instance_name):
+        domain = self._lookup_by_name(instance_name)
+        if 'cpu.time' in domain.stats and 'vcpu.current' in domain.stats:
+            return virt_inspector.CPUStats(number=domain.stats['vcpu.current'],
+                                           time=domain.stats['cpu.time'])
+        dom_info = domain.info()
+        return virt_inspector.CPUStats(number=dom_info[3], time=dom_info[4])
+
+    def inspect_vnics(self, instance_name):
+        domain = self._lookup_by_name(instance_name)
+        if domain.state() == libvirt.VIR_DOMAIN_SHUTOFF:
+            LOG.warn(_('Failed to inspect vnics of %(instance_name)s, '
+                       'domain is in state of SHUTOFF'),
+                     {'instance_name': instance_name})
+            return
+        for interface in _interfaces(domain.tree()):
+            prefix = domain.device_stats('net', interface.name)
+            if prefix is None:
+                stats = _interface_stats(
+                    domain.domain.interfaceStats(interface.name))
+            else:
+                stats = virt_inspector.InterfaceStats(
+                    rx_bytes=domain.stats[prefix + 'rx.bytes'],
+                    rx_packets=domain.stats[prefix + 'rx.pkts'],
+                    tx_bytes=domain.stats[prefix + 'tx.bytes'],
+                    tx_packets=domain.stats[prefix + 'tx.pkts'])
+            yield (interface, stats)
+
+    def inspect_disks(self, instance_name):
+        domain = self._lookup_by_name(instance_name)
+        if domain.state() == libvirt.VIR_DOMAIN_SHUTOFF:
+            LOG.warn(_('Failed to inspect disks of %(instance_name)s, '
+                       'domain is in state of SHUTOFF'),
+                     {'instance_name': instance_name})
+            return
+        for disk in _disks(domain.tree()):
+            prefix = domain.device_stats('block', disk.device)
+            if prefix is None:
+                stats = _disk_stats(domain.domain.blockStats(disk.device))
+            else:
+                # NOTE: The bulk statistics have no error count, which
+                # blockStats reports as -1 when unknown too.
+                stats = virt_inspector.DiskStats(
+                    read_requests=domain.stats[prefix + 'rd.reqs'],
+                    read_bytes=domain.stats[prefix + 'rd.bytes'],
+                    write_requests=domain.stats[prefix + 'wr.reqs'],
+                    write_bytes=domain.stats[prefix + 'wr.bytes'],
+                    errors=-1)
+            yield (disk, stats)
+
+    def inspect_memory_usage(self, instance, duration=None):
+        domain = self._get_domains().get(util.instance_name(instance))
+        stats = domain.stats if domain else {}
+        # NOTE: The balloon statistics of the guest are in the bulk
+        # statistics from libvirt 2.1.0 on.
+        if stats.get('balloon.available') and stats.get('balloon.unused'):
+            memory_used = stats['balloon.available'] - stats['balloon.unused']
+            return virt_inspector.MemoryUsageStats(
+                usage=memory_used / (stats['balloon.available'] * 1.0))
+        return self.inspector.inspect_memory_usage(instance, duration)
@@ -66,3 +66,6 @@ class Base(object):
     @abc.abstractmethod
     def record_events(self, events):
         """Recording events interface."""
+
+    def flush(self):
+        """Write out buffered data, if the dispatcher buffers any."""
@@ -14,14 +14,33 @@
 # WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
 # License for the specific language governing permissions and limitations
 # under the License.
+import threading
+
+from oslo.config import cfg
 from oslo.utils import timeutils
 
 from ceilometer import dispatcher
 from ceilometer.openstack.common.gettextutils import _
 from ceilometer.openstack.common import log
+from ceilometer.openstack.common import loopingcall
 from ceilometer.publisher import utils as publisher_utils
 from ceilometer import storage
 
+database_dispatcher_opts = [
+    cfg.IntOpt('batch_size',
+               default=1,
+               help='Number of samples buffered by the database dispatcher '
+                    'and written to the storage backend at once. 1 writes '
+                    'the samples of every message as it is received.'),
+    cfg.IntOpt('batch_timeout',
+               default=5,
+               help='Maximum number of seconds a sample is buffered before '
+                    'being written, when batch_size is greater than 1.'),
+]
+
+cfg.CONF.register_opts(database_dispatcher_opts,
+                       group="dispatcher_database")
+
 LOG = log.getLogger(__name__)
 
 
@@ -35,10 +54,27 @@ class DatabaseDispatcher(dispatcher.Base):
     ceilometer.conf file
 
     dispatchers = database
+
+    Samples can be buffered and written in batches of up to batch_size
+    samples, at least every batch_timeout seconds:
+
+    [dispatcher_database]
+    batch_size = 1000
+    batch_timeout = 5
     """
     def __init__(self, conf):
         super(DatabaseDispatcher, self).__init__(conf)
         self.storage_conn = storage.get_connection_from_config(conf)
+        self.batch_size = conf.dispatcher_database.batch_size
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._flush_timer = None
+        if self.batch_size > 1:
+            self._flush_timer = loopingcall.FixedIntervalLoopingCall(
+                self.flush)
+            self._flush_timer.start(
+                interval=conf.dispatcher_database.batch_timeout,
+                initial_delay=conf.dispatcher_database.batch_timeout)
 
     def record_metering_data(self, data):
         # We may have receive only one counter on the wire
@@ -63,7 +99,10 @@ class DatabaseDispatcher(dispatcher.Base):
                     if meter.get('timestamp'):
                         ts = timeutils.parse_isotime(meter['timestamp'])
                         meter['timestamp'] = timeutils.normalize_time(ts)
-                    self.storage_conn.record_metering_data(meter)
+                    if self.batch_size > 1:
+                        self._buffer_sample(meter)
+                    else:
+                        self.storage_conn.record_metering_data(meter)
                 except Exception as err:
                     LOG.exception(_('Failed to record metering data: %s'),
                                   err)
@@ -72,6 +111,28 @@ class DatabaseDispatcher(dispatcher.Base):
                     'message signature invalid, discarding message: %r'),
                     meter)
 
+    def _buffer_sample(self, meter):
+        with self._lock:
+            self._buffer.append(meter)
+            if len(self._buffer) < self.batch_size:
+                return
+            samples, self._buffer = self._buffer, []
+        self._record_batch(samples)
+
+    def _record_batch(self, samples):
+        try:
+            self.storage_conn.record_metering_data_batch(samples)
+        except Exception as err:
+            LOG.exception(_('Failed to record a batch of %(count)d samples: '
+                            '%(err)s'), {'count': len(samples), 'err': err})
+
+    def flush(self):
+        """Write the buffered samples to the storage backend."""
+        with self._lock:
+            samples, self._buffer = self._buffer, []
+        if samples:
+            self._record_batch(samples)
+
     def record_events(self, events):
         if not isinstance(events, list):
             events = [events]
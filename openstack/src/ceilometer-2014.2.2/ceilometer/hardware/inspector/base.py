@@ -37,3 +37,14 @@ class Inspector(object):
         :return metadata: dict to construct sample's metadata
         :return extra: dict of extra metadata to help constructing sample
         """
+
+    def prefetch(self, hosts):
+        """Fetch the data of all the metrics from several hosts at once.
+
+        Inspectors able to query the hosts concurrently override this to
+        fill the caches later passed to inspect_generic, the default
+        implementation does nothing.
+
+        :param hosts: list of (host, cache) tuples, the cache being the
+                      one passed to inspect_generic for that host
+        """
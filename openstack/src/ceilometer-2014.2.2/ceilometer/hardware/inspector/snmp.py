@@ -19,10 +19,24 @@
 # under the License.
 """Inspector for collecting data over SNMP"""
 
+from oslo.config import cfg
+from pyasn1.type import univ
 from pysnmp.entity.rfc3413.oneliner import cmdgen
 
 from ceilometer.hardware.inspector import base
 
+OPTS = [
+    cfg.IntOpt('snmp_timeout',
+               default=1,
+               help='Number of seconds to wait for the response to an SNMP '
+                    'request before sending it again.'),
+    cfg.IntOpt('snmp_retries',
+               default=5,
+               help='Number of times an SNMP request is sent again before '
+                    'giving up on the host.'),
+]
+cfg.CONF.register_opts(OPTS, group='hardware')
+
 
 class SNMPException(Exception):
     pass
@@ -106,6 +120,9 @@ class SNMPInspector(base.Inspector):
     }
 
     _CACHE_KEY_OID = "snmp_cached_oid"
+    _CACHE_KEY_ERROR = "snmp_prefetch_error"
+    # Number of table rows asked for by each GetBulkRequest of prefetch
+    _bulk_max_repetitions = 25
 
     '''
 
@@ -271,14 +288,21 @@ class SNMPInspector(base.Inspector):
 
     def __init__(self):
         super(SNMPInspector, self).__init__()
-        self._cmdGen = cmdgen.CommandGenerator()
+        self._asynCmdGen = cmdgen.AsynCommandGenerator()
+        self._cmdGen = cmdgen.CommandGenerator(asynCmdGen=self._asynCmdGen)
+
+    def _get_transport(self, host):
+        conf = cfg.CONF.hardware
+        return cmdgen.UdpTransportTarget((host.hostname,
+                                          host.port or self._port),
+                                         timeout=conf.snmp_timeout,
+                                         retries=conf.snmp_retries)
 
     def _query_oids(self, host, oids, cache, is_bulk):
         # send GetRequest or GetBulkRequest to get oid values and
         # populate the values into cache
         authData = self._get_auth_strategy(host)
-        transport = cmdgen.UdpTransportTarget((host.hostname,
-                                               host.port or self._port))
+        transport = self._get_transport(host)
         oid_cache = cache.setdefault(self._CACHE_KEY_OID, {})
 
         if is_bulk:
@@ -308,6 +332,85 @@ class SNMPInspector(base.Inspector):
             for name, val in data:
                 oid_cache[name.prettyPrint()] = val
 
+    def _prefetch_oids(self):
+        # the scalar and the table oids of all the meters
+        exact_oids = set()
+        prefix_oids = set([self._interface_ip_oid])
+        for meter_def in self.MAPPING.values():
+            if meter_def['matching_type'] == PREFIX:
+                oids = prefix_oids
+            else:
+                oids = exact_oids
+            oids.add(meter_def['metric_oid'][0])
+            oids.update(oid for oid, converter
+                        in meter_def['metadata'].values())
+        return sorted(exact_oids), sorted(prefix_oids)
+
+    def prefetch(self, hosts):
+        """Query the oids of all the meters from the hosts concurrently.
+
+        Each host is sent a GetRequest for all the scalar oids and a
+        GetBulkRequest walk of all the table oids, the requests to all the
+        hosts being handled by a single run of the dispatcher.
+        """
+        hosts = [(host, cache) for host, cache in hosts
+                 if self._CACHE_KEY_OID not in cache]
+        if not hosts:
+            return
+        exact_oids, prefix_oids = self._prefetch_oids()
+        heads = [univ.ObjectIdentifier(oid) for oid in prefix_oids]
+        for host, cache in hosts:
+            cache[self._CACHE_KEY_OID] = {}
+            try:
+                authData = self._get_auth_strategy(host)
+                transport = self._get_transport(host)
+            except Exception as err:
+                cache[self._CACHE_KEY_ERROR] = err
+                continue
+            if exact_oids:
+                self._asynCmdGen.asyncGetCmd(
+                    authData, transport, exact_oids,
+                    (self._prefetch_get_cb, cache),
+                    lookupValues=True)
+            if prefix_oids:
+                self._asynCmdGen.asyncBulkCmd(
+                    authData, transport,
+                    0, self._bulk_max_repetitions,
+                    prefix_oids,
+                    (self._prefetch_bulk_cb, (cache, heads)),
+                    lookupValues=True)
+        self._asynCmdGen.snmpEngine.transportDispatcher.runDispatcher()
+
+    def _prefetch_get_cb(self, sendRequestHandle, errIndication, errStatus,
+                         errIdx, varBinds, cache):
+        # on errStatus nothing is cached and inspect_generic queries the
+        # oids of each meter on its own
+        if errIndication:
+            cache[self._CACHE_KEY_ERROR] = errIndication
+        elif not errStatus:
+            oid_cache = cache[self._CACHE_KEY_OID]
+            for name, val in varBinds:
+                oid_cache[name.prettyPrint()] = val
+
+    def _prefetch_bulk_cb(self, sendRequestHandle, errIndication, errStatus,
+                          errIdx, varBindTable, cbCtx):
+        # return True to go on walking the tables
+        cache, heads = cbCtx
+        if errIndication:
+            cache[self._CACHE_KEY_ERROR] = errIndication
+            return False
+        if errStatus:
+            return False
+        oid_cache = cache[self._CACHE_KEY_OID]
+        in_tables = False
+        for var_bind_table_row in varBindTable:
+            in_tables = False
+            for head, (name, val) in zip(heads, var_bind_table_row):
+                if head.isPrefixOf(name) and not isinstance(val, univ.Null):
+                    oid_cache[name.prettyPrint()] = val
+                    in_tables = True
+        return in_tables
+
     @staticmethod
     def find_matching_oids(oid_cache, oid, match_type, find_one=True):
         matched = []
@@ -357,6 +460,12 @@ class SNMPInspector(base.Inspector):
     def inspect_generic(self, host, identifier, cache, extra_metadata=None):
         # the snmp definition for the corresponding meter
         meter_def = self.MAPPING[identifier]
+        # do not query again a host prefetch failed to reach
+        if self._CACHE_KEY_ERROR in cache:
+            raise SNMPException("An error occurred, host %(host)s, "
+                                "%(err)s" %
+                                dict(host=host.hostname,
+                                     err=cache[self._CACHE_KEY_ERROR]))
         # collect oids that needs to be queried
         oids_to_query = self._find_missing_oids(meter_def, cache)
         # query oids and populate into caches
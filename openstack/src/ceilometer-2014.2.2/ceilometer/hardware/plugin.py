@@ -38,6 +38,8 @@ class HardwarePollster(plugin.CentralPollster):
 
     CACHE_KEY = None
     IDENTIFIER = None
+    # the inspector caches of the hosts, shared by all hardware pollsters
+    INSPECTOR_CACHE_KEY = 'hardware.inspector'
 
     def __init__(self):
         super(HardwarePollster, self).__init__()
@@ -83,11 +85,12 @@ class HardwarePollster(plugin.CentralPollster):
         :param cache: A dictionary for passing data between plugins
         :param resources: end point to poll data from
         """
-        resources = resources or []
+        resources = [self._parse_resource(res) for res in resources or []]
         h_cache = cache.setdefault(self.CACHE_KEY, {})
+        ins_cache = cache.setdefault(self.INSPECTOR_CACHE_KEY, {})
+        self._prefetch(resources, ins_cache)
         sample_iters = []
-        for resource in resources:
-            parsed_url, res, extra_metadata = self._parse_resource(resource)
+        for parsed_url, res, extra_metadata in resources:
             ins = self._get_inspector(parsed_url)
             try:
                 # Call hardware inspector to poll for the data
@@ -97,7 +100,7 @@ class HardwarePollster(plugin.CentralPollster):
                     i_cache[self.IDENTIFIER] = list(ins.inspect_generic(
                         parsed_url,
                         self.IDENTIFIER,
-                        i_cache,
+                        ins_cache.setdefault(res, {}),
                         extra_metadata))
                 # Generate samples
                 if i_cache[self.IDENTIFIER]:
@@ -112,6 +115,25 @@ class HardwarePollster(plugin.CentralPollster):
                                    err=err))
         return itertools.chain(*sample_iters)
 
+    def _prefetch(self, resources, ins_cache):
+        """Let the inspectors query all their hosts at once.
+
+        :param resources: list of parsed resources
+        :param ins_cache: the inspector caches of the hosts
+        """
+        hosts = {}
+        for parsed_url, res, extra_metadata in resources:
+            hosts.setdefault(parsed_url.scheme, []).append(
+                (parsed_url, ins_cache.setdefault(res, {})))
+        for scheme, scheme_hosts in six.iteritems(hosts):
+            try:
+                ins = self._get_inspector(scheme_hosts[0][0])
+                ins.prefetch(scheme_hosts)
+            except Exception as err:
+                LOG.exception(_('inspector prefetch failed for %(scheme)s '
+                                'hosts: %(err)s'),
+                              dict(scheme=scheme, err=err))
+
     def generate_samples(self, host_url, data):
         """Generate an iterable Sample from the data returned by inspector
 
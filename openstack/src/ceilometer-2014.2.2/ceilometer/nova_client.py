@@ -139,9 +139,15 @@ class Client(object):
             setattr(instance, attr, ameta)
 
     @logged
-    def instance_get_all_by_host(self, hostname):
-        """Returns list of instances on particular host."""
+    def instance_get_all_by_host(self, hostname, since=None):
+        """Returns list of instances on particular host.
+
+        If since is specified, only the instances changed since then,
+        deleted ones included, are returned.
+        """
         search_opts = {'host': hostname, 'all_tenants': True}
+        if since:
+            search_opts['changes-since'] = since
         return self._with_flavor_and_image(self.nova_client.servers.list(
             detailed=True,
             search_opts=search_opts))
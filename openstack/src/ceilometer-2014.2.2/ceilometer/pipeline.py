@@ -21,6 +21,7 @@ import fnmatch
 import itertools
 import operator
 import os
+import re
 
 from oslo.config import cfg
 import yaml
@@ -109,6 +110,7 @@ class Source(object):
         if not isinstance(self.discovery, list):
             raise PipelineException("Discovery should be a list", cfg)
         self._check_meters()
+        self._compile_meters()
 
     def __str__(self):
         return self.name
@@ -148,26 +150,43 @@ class Source(object):
         else:
             return name
 
-    def support_meter(self, meter_name):
-        meter_name = self._variable_meter_name(meter_name)
+    @staticmethod
+    def _compile_patterns(patterns):
+        if not patterns:
+            return None
+        return re.compile('|'.join('(?:%s)' % fnmatch.translate(pattern)
+                                   for pattern in patterns))
+
+    def _compile_meters(self):
+        # Support wildcard like storage.* and !disk.*
+        self._excluded = self._compile_patterns(
+            [meter[1:] for meter in self.meters if meter[0] == '!'])
+        self._included = self._compile_patterns(
+            [meter for meter in self.meters if meter[0] != '!'])
 
         # Special case: if we only have negation, we suppose the default is
         # allow
-        default = all(meter.startswith('!') for meter in self.meters)
+        self._default = all(meter.startswith('!') for meter in self.meters)
 
-        # Support wildcard like storage.* and !disk.*
-        # Start with negation, we consider that the order is deny, allow
-        if any(fnmatch.fnmatch(meter_name, meter[1:])
-               for meter in self.meters
-               if meter[0] == '!'):
-            return False
+        # Whether each meter name seen so far is supported
+        self._supported = {}
 
-        if any(fnmatch.fnmatch(meter_name, meter)
-               for meter in self.meters
-               if meter[0] != '!'):
-            return True
+    def support_meter(self, meter_name):
+        try:
+            return self._supported[meter_name]
+        except KeyError:
+            pass
 
-        return default
+        name = self._variable_meter_name(meter_name)
+        # Start with negation, we consider that the order is deny, allow
+        if self._excluded and self._excluded.match(name):
+            supported = False
+        elif self._included and self._included.match(name):
+            supported = True
+        else:
+            supported = self._default
+        self._supported[meter_name] = supported
+        return supported
 
     def check_sinks(self, sinks):
         if not self.sinks:
@@ -262,10 +281,9 @@ class Sink(object):
             for transformer in self.transformers[start:]:
                 sample = transformer.handle_sample(ctxt, sample)
                 if not sample:
-                    LOG.debug(_(
-                        "Pipeline %(pipeline)s: Sample dropped by "
-                        "transformer %(trans)s") % ({'pipeline': self,
-                                                     'trans': transformer}))
+                    LOG.debug(_("Pipeline %(pipeline)s: Sample dropped by "
+                                "transformer %(trans)s"),
+                              {'pipeline': self, 'trans': transformer})
                     return
             return sample
         except Exception as err:
@@ -289,26 +307,32 @@ class Sink(object):
 
         transformed_samples = []
         for sample in samples:
-            LOG.debug(_(
-                "Pipeline %(pipeline)s: Transform sample "
-                "%(smp)s from %(trans)s transformer") % ({'pipeline': self,
-                                                          'smp': sample,
-                                                          'trans': start}))
+            LOG.debug(_("Pipeline %(pipeline)s: Transform sample "
+                        "%(smp)s from %(trans)s transformer"),
+                      {'pipeline': self, 'smp': sample, 'trans': start})
             sample = self._transform_sample(start, ctxt, sample)
             if sample:
                 transformed_samples.append(sample)
 
         if transformed_samples:
-            for p in self.publishers:
-                try:
-                    p.publish_samples(ctxt, transformed_samples)
-                except Exception:
-                    LOG.exception(_(
-                        "Pipeline %(pipeline)s: Continue after error "
-                        "from publisher %(pub)s") % ({'pipeline': self,
-                                                      'pub': p}))
+            self._publish(ctxt, transformed_samples)
+
+    def _publish(self, ctxt, samples):
+        for p in self.publishers:
+            try:
+                p.publish_samples(ctxt, samples)
+            except Exception:
+                LOG.exception(_(
+                    "Pipeline %(pipeline)s: Continue after error "
+                    "from publisher %(pub)s") % ({'pipeline': self,
+                                                  'pub': p}))
 
     def publish_samples(self, ctxt, samples):
+        if not self.transformers:
+            # Nothing to transform, all the samples are published at once
+            if samples:
+                self._publish(ctxt, samples)
+            return
         for meter_name, samples in itertools.groupby(
                 sorted(samples, key=operator.attrgetter('name')),
                 operator.attrgetter('name')):
@@ -364,7 +388,8 @@ class Pipeline(object):
 
     def publish_samples(self, ctxt, samples):
         supported = [s for s in samples if self.source.support_meter(s.name)]
-        self.sink.publish_samples(ctxt, supported)
+        if supported:
+            self.sink.publish_samples(ctxt, supported)
 
     def flush(self, ctxt):
         self.sink.flush(ctxt)
@@ -45,6 +45,20 @@ STORAGE_OPTS = [
                default=-1,
                help="Number of seconds that samples are kept "
                "in the database for (<= 0 means forever)."),
+    cfg.BoolOpt('partition_samples',
+                default=False,
+                help="Store samples in daily partitions, collections with "
+                "MongoDB and table partitions with MySQL, so that expired "
+                "samples are dropped a day at a time. Samples are then kept "
+                "until the end of the day their time to live ends in. "
+                "Partitioning an existing MySQL sample table rewrites it."),
+    cfg.ListOpt('indexed_metadata_keys',
+                default=[],
+                help="Resource metadata keys that are indexed for metadata "
+                "queries, such as instance_type, host, image_ref or "
+                "display_name. The collector and the API must use the same "
+                "keys, and the database must be upgraded with "
+                "ceilometer-dbsync after changing them."),
     cfg.StrOpt('metering_connection',
                default=None,
                help='The connection string used to connect to the meteting '
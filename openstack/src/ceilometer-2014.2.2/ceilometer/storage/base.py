@@ -193,6 +193,17 @@ class Connection(object):
         raise ceilometer.NotImplementedError(
             'Recording metering data is not implemented')
 
+    def record_metering_data_batch(self, samples):
+        """Write a batch of samples to the backend storage system.
+
+        Drivers without a bulk write path record the samples one by one.
+
+        :param samples: a list of dictionaries such as returned by
+                        ceilometer.meter.meter_message_from_counter
+        """
+        for sample in samples:
+            self.record_metering_data(sample)
+
     @staticmethod
     def clear_expired_metering_data(ttl):
         """Clear expired data from the backend storage system.
@@ -23,8 +23,13 @@
 import calendar
 import copy
 import datetime
+import functools
+import heapq
+import itertools
 import json
+import math
 import operator
+import re
 import uuid
 
 import bson.code
@@ -35,6 +40,7 @@ import pymongo
 import six
 
 import ceilometer
+from ceilometer.openstack.common.gettextutils import _
 from ceilometer.openstack.common import log
 from ceilometer import storage
 from ceilometer.storage import base
@@ -45,9 +51,83 @@ from ceilometer import utils
 
 cfg.CONF.import_opt('time_to_live', 'ceilometer.storage',
                     group="database")
+cfg.CONF.import_opt('partition_samples', 'ceilometer.storage',
+                    group="database")
+
+OPTS = [
+    cfg.BoolOpt('mongodb_rollups',
+                default=False,
+                help='Maintain per minute, hour and day aggregates of the '
+                     'samples of every resource and meter, and compute '
+                     'statistics from them where possible instead of from '
+                     'the raw samples. Requires MongoDB 2.6. Every '
+                     'collector writing to the database and the API must '
+                     'set it, as the rollups of the samples recorded by a '
+                     'collector without it are incomplete.'),
+]
+
+cfg.CONF.register_opts(OPTS, group='database')
 
 LOG = log.getLogger(__name__)
 
+# Periods of the sample rollups in seconds, coarsest first
+ROLLUP_PERIODS = (86400, 3600, 60)
+
+# Fields identifying a rollup, together with its period_start
+ROLLUP_KEY = ('counter_name', 'resource_id', 'user_id', 'project_id',
+              'source', 'period')
+
+# Above this number of time ranges to read from the raw samples, statistics
+# are computed from the raw samples only.
+MAX_ROLLUP_EDGES = 1000
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+
+# Daily sample collections, used instead of meter with partition_samples
+PARTITION_RE = re.compile(r'^meter_(\d{8})$')
+
+
+def _partition_name(day):
+    return 'meter_%s' % day.strftime('%Y%m%d')
+
+
+@functools.total_ordering
+class _Reversed(object):
+    """Sort key of a value in descending order."""
+
+    def __init__(self, value):
+        self.value = value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+    def __lt__(self, other):
+        return other.value < self.value
+
+
+def _epoch_us(timestamp):
+    return (calendar.timegm(timestamp.utctimetuple()) * 1000000 +
+            timestamp.microsecond)
+
+
+def _from_epoch_us(value):
+    return _EPOCH + datetime.timedelta(microseconds=value)
+
+
+def _choose_rollup_period(period, start, end):
+    """Return the period of the rollups to compute statistics from.
+
+    The rollups used are the coarsest ones whose period divides the period
+    of the statistics, preferring those aligned with the start and end of
+    the query. Returns None for periods no rollup period divides.
+    """
+    candidates = [p for p in ROLLUP_PERIODS if not period or period % p == 0]
+    for candidate in candidates:
+        if all(t is None or _epoch_us(t) % (candidate * 1000000) == 0
+               for t in (start, end)):
+            return candidate
+    return candidates[-1] if candidates else None
+
 
 AVAILABLE_CAPABILITIES = {
     'resources': {'query': {'simple': True,
@@ -73,6 +153,9 @@ class Connection(pymongo_base.Connection):
 
         - meter
           - the raw incoming data
+        - meter_YYYYMMDD
+          - the raw incoming data of a day, when the partition_samples
+            option is set; samples recorded before it was set stay in meter
         - resource
           - the metadata for resources
           - { _id: uuid of resource,
@@ -82,6 +165,18 @@ class Connection(pymongo_base.Connection):
               meter: [ array of {counter_name: string, counter_type: string,
                                  counter_unit: string} ]
             }
+        - rollup
+          - the aggregates of the samples of a meter and resource per minute,
+            hour and day, when the mongodb_rollups option is set
+          - { counter_name: string, resource_id: uuid, user_id: uuid,
+              project_id: uuid, source: string,
+              period: seconds, period_start: datetime,
+              count: int, sum: float, min: float, max: float,
+              duration_start: datetime, duration_end: datetime,
+              counter_unit: string
+            }
+        - rollup_info
+          - { _id: 'since', timestamp: time the rollups were started at }
     """
 
     CAPABILITIES = utils.update_nested(pymongo_base.Connection.CAPABILITIES,
@@ -395,8 +490,23 @@ class Connection(pymongo_base.Connection):
         self.conn = self.CONNECTION_POOL.connect(url)
 
         # Require MongoDB 2.4 to use $setOnInsert
-        if self.conn.server_info()['versionArray'] < [2, 4]:
+        server_version = self.conn.server_info()['versionArray']
+        if server_version < [2, 4]:
             raise storage.StorageBadVersion("Need at least MongoDB 2.4")
+        # Require MongoDB 2.6 to use $min and $max on updates
+        if cfg.CONF.database.mongodb_rollups and server_version < [2, 6]:
+            raise storage.StorageBadVersion(
+                "Need at least MongoDB 2.6 for rollups")
+        self._rollups_started = False
+        # Require MongoDB 2.6 to merge statistics of several collections
+        if cfg.CONF.database.partition_samples and server_version < [2, 6]:
+            raise storage.StorageBadVersion(
+                "Need at least MongoDB 2.6 for partitioned samples")
+        # Daily collections whose indexes were ensured
+        self._partitions = set()
+        # Statistics are computed with the aggregation pipeline on MongoDB
+        # 2.6 and later, and with map_reduce on older servers.
+        self._use_aggregation = server_version >= [2, 6]
 
         connection_options = pymongo.uri_parser.parse_uri(url)
         self.db = getattr(self.conn, connection_options['database'])
@@ -426,49 +536,199 @@ class Connection(pymongo_base.Connection):
                 ('source', pymongo.ASCENDING),
             ], name=name, background=background[primary])
 
+        self.db.resource.ensure_index([('last_sample_timestamp',
+                                        pymongo.DESCENDING)],
+                                      name='last_sample_timestamp_idx',
+                                      sparse=True)
+        self._ensure_metadata_indexes(self.db.resource, 'metadata', [])
+        self._ensure_sample_indexes(self.db.meter)
+        for collection in self._partition_collections():
+            self._ensure_sample_indexes(collection)
+            self._partitions.add(collection.name)
+        self.db.rollup.ensure_index([
+            ('counter_name', pymongo.ASCENDING),
+            ('period', pymongo.ASCENDING),
+            ('period_start', pymongo.ASCENDING),
+            ('resource_id', pymongo.ASCENDING),
+            ('user_id', pymongo.ASCENDING),
+            ('project_id', pymongo.ASCENDING),
+            ('source', pymongo.ASCENDING),
+        ], name='rollup_idx', unique=True)
+        # remove API v1 related table
+        self.db.user.drop()
+        self.db.project.drop()
+
+        self._ensure_ttl_index(self.db.meter, 'timestamp', 'meter_ttl')
+        # NOTE: A rollup expires with the last of its samples, statistics
+        # read the time range of the earlier ones from the raw samples.
+        self._ensure_ttl_index(self.db.rollup, 'duration_end', 'rollup_ttl')
+
+    @staticmethod
+    def _ensure_sample_indexes(collection):
+        # We need variations for user_id vs. project_id, see upgrade()
+        name_qualifier = dict(user_id='', project_id='project_')
+        background = dict(user_id=False, project_id=True)
+        for primary in ['user_id', 'project_id']:
             name = 'meter_%sidx' % name_qualifier[primary]
-            self.db.meter.ensure_index([
+            collection.ensure_index([
                 ('resource_id', pymongo.ASCENDING),
                 (primary, pymongo.ASCENDING),
                 ('counter_name', pymongo.ASCENDING),
                 ('timestamp', pymongo.ASCENDING),
                 ('source', pymongo.ASCENDING),
             ], name=name, background=background[primary])
+        collection.ensure_index([('timestamp', pymongo.DESCENDING)],
+                                name='timestamp_idx')
+        Connection._ensure_metadata_indexes(
+            collection, 'resource_metadata',
+            [('counter_name', pymongo.ASCENDING),
+             ('timestamp', pymongo.DESCENDING)])
 
-        self.db.resource.ensure_index([('last_sample_timestamp',
-                                        pymongo.DESCENDING)],
-                                      name='last_sample_timestamp_idx',
-                                      sparse=True)
-        self.db.meter.ensure_index([('timestamp', pymongo.DESCENDING)],
-                                   name='timestamp_idx')
-        # remove API v1 related table
-        self.db.user.drop()
-        self.db.project.drop()
+    @staticmethod
+    def _ensure_metadata_indexes(collection, field, suffix):
+        """Index the indexed metadata keys and drop the stale indexes.
+
+        :param collection: The collection to index.
+        :param field: The metadata field of the collection.
+        :param suffix: The (key, direction) indexed after each metadata key.
+        """
+        names = {}
+        for key in cfg.CONF.database.indexed_metadata_keys:
+            names['meta_%s_idx' % key] = key
+        for name in collection.index_information():
+            if (name.startswith('meta_') and name.endswith('_idx')
+                    and name not in names):
+                collection.drop_index(name)
+        for name, key in six.iteritems(names):
+            collection.ensure_index(
+                [('%s.%s' % (field, key), pymongo.ASCENDING)] + suffix,
+                name=name, background=True)
 
-        indexes = self.db.meter.index_information()
+    @staticmethod
+    def _ensure_ttl_index(collection, field, name):
+        indexes = collection.index_information()
 
         ttl = cfg.CONF.database.time_to_live
 
         if ttl <= 0:
-            if 'meter_ttl' in indexes:
-                self.db.meter.drop_index('meter_ttl')
+            if name in indexes:
+                collection.drop_index(name)
             return
 
-        if 'meter_ttl' in indexes:
+        if name in indexes:
             # NOTE(sileht): manually check expireAfterSeconds because
             # ensure_index doesn't update index options if the index already
             # exists
-            if ttl == indexes['meter_ttl'].get('expireAfterSeconds', -1):
+            if ttl == indexes[name].get('expireAfterSeconds', -1):
                 return
 
-            self.db.meter.drop_index('meter_ttl')
+            collection.drop_index(name)
 
-        self.db.meter.create_index(
-            [('timestamp', pymongo.ASCENDING)],
+        collection.create_index(
+            [(field, pymongo.ASCENDING)],
             expireAfterSeconds=ttl,
-            name='meter_ttl'
+            name=name
         )
 
+    def _partition_collections(self, query=None):
+        """Return the daily sample collections, newest first.
+
+        Only the collections of the days a query on the timestamp of the
+        samples covers are returned.
+        """
+        if not cfg.CONF.database.partition_samples:
+            return []
+        start = end = None
+        timestamp = (query or {}).get('timestamp')
+        if isinstance(timestamp, dict):
+            start = timestamp.get('$gte', timestamp.get('$gt'))
+            end = timestamp.get('$lt', timestamp.get('$lte'))
+        elif timestamp is not None:
+            start = end = timestamp
+        if not isinstance(start, datetime.datetime):
+            start = None
+        if not isinstance(end, datetime.datetime):
+            end = None
+        names = sorted((name for name in self.db.collection_names()
+                        if PARTITION_RE.match(name)), reverse=True)
+        return [self.db[name] for name in names
+                if ((start is None or name >= _partition_name(start)) and
+                    (end is None or name <= _partition_name(end)))]
+
+    def _sample_collections(self, query=None):
+        """Return the collections holding the samples, newest first."""
+        # NOTE: Samples recorded before partition_samples was set are left
+        # in the meter collection, until its TTL index expires them.
+        return self._partition_collections(query) + [self.db.meter]
+
+    def _collection_for(self, timestamp):
+        """Return the collection a sample is recorded in."""
+        if not cfg.CONF.database.partition_samples:
+            return self.db.meter
+        name = _partition_name(timestamp)
+        if name not in self._partitions:
+            self._ensure_sample_indexes(self.db[name])
+            self._partitions.add(name)
+        return self.db[name]
+
+    def _find_samples(self, query, sort, limit):
+        collections = self._sample_collections(query)
+        if len(collections) == 1:
+            return super(Connection, self)._find_samples(query, sort, limit)
+        if sort == [('timestamp', pymongo.DESCENDING)]:
+            # NOTE: The daily collections hold disjoint time ranges and are
+            # read one after the other, newest first. Only the meter
+            # collection may overlap them.
+            cursors = [self._find_samples_in_order(collections[:-1], query,
+                                                   sort, limit),
+                       collections[-1].find(query, limit=limit or 0,
+                                            sort=sort)]
+        else:
+            cursors = [collection.find(query, limit=limit or 0, sort=sort)
+                       for collection in collections]
+
+        def _keyed(i, cursor):
+            # NOTE: The position of a sample breaks ties between equal keys.
+            for n, sample in enumerate(cursor):
+                yield self._sort_key(sort, sample), i, n, sample
+
+        samples = heapq.merge(*[_keyed(i, cursor)
+                                for i, cursor in enumerate(cursors)])
+        return itertools.islice((s[-1] for s in samples), limit)
+
+    @staticmethod
+    def _find_samples_in_order(collections, query, sort, limit):
+        for collection in collections:
+            if limit is not None and limit <= 0:
+                return
+            for sample in collection.find(query, limit=limit or 0,
+                                          sort=sort):
+                if limit is not None:
+                    limit -= 1
+                yield sample
+
+    @staticmethod
+    def _sort_key(sort, sample):
+        key = []
+        for field, direction in sort:
+            value = sample.get(field)
+            key.append(value if direction == pymongo.ASCENDING
+                       else _Reversed(value))
+        return key
+
+    def _find_first_sample(self, query=None):
+        """Return the earliest sample matching a query, or None."""
+        first = self.db.meter.find_one(query,
+                                       sort=[('timestamp', pymongo.ASCENDING)])
+        for collection in reversed(self._partition_collections(query)):
+            sample = collection.find_one(
+                query, sort=[('timestamp', pymongo.ASCENDING)])
+            if sample is not None:
+                if first is None or sample['timestamp'] < first['timestamp']:
+                    first = sample
+                break
+        return first
+
     def clear(self):
         self.conn.drop_database(self.db)
         # Connection will be reopened automatically if needed
@@ -533,7 +793,144 @@ class Connection(pymongo_base.Connection):
         # a new key '_id').
         record = copy.copy(data)
         record['recorded_at'] = timeutils.utcnow()
-        self.db.meter.insert(record)
+        self._collection_for(record['timestamp']).insert(record)
+
+        if cfg.CONF.database.mongodb_rollups:
+            self._record_rollups([data])
+
+    def record_metering_data_batch(self, samples):
+        """Write a batch of samples to the backend storage system.
+
+        The resource updates of the batch are coalesced per resource, with
+        the metadata of its latest sample winning, and sent as one ordered
+        bulk operation. The samples are then inserted at once.
+
+        :param samples: a list of dictionaries such as returned by
+                        ceilometer.meter.meter_message_from_counter
+        """
+        if not samples:
+            return
+
+        resources = {}
+        for data in samples:
+            meter = {'counter_name': data['counter_name'],
+                     'counter_type': data['counter_type'],
+                     'counter_unit': data['counter_unit'],
+                     }
+            resource = resources.get(data['resource_id'])
+            if resource is None:
+                resources[data['resource_id']] = {
+                    'owner': data, 'first': data, 'last': data,
+                    'meters': [meter]}
+                continue
+            # The owner of a resource is taken from its last received
+            # sample, as when samples are recorded one by one.
+            resource['owner'] = data
+            if data['timestamp'] < resource['first']['timestamp']:
+                resource['first'] = data
+            if data['timestamp'] >= resource['last']['timestamp']:
+                resource['last'] = data
+            if meter not in resource['meters']:
+                resource['meters'].append(meter)
+
+        bulk = self.db.resource.initialize_ordered_bulk_op()
+        for resource_id, resource in six.iteritems(resources):
+            owner = resource['owner']
+            first_timestamp = resource['first']['timestamp']
+            last = resource['last']
+            bulk.find({'_id': resource_id}).upsert().update_one(
+                {'$set': {'project_id': owner['project_id'],
+                          'user_id': owner['user_id'],
+                          'source': owner['source'],
+                          },
+                 '$setOnInsert': {'metadata': last['resource_metadata'],
+                                  'first_sample_timestamp': first_timestamp,
+                                  'last_sample_timestamp': last['timestamp'],
+                                  },
+                 '$addToSet': {'meter': {'$each': resource['meters']}},
+                 })
+            # only update last sample timestamp if actually later, see
+            # record_metering_data()
+            bulk.find({'_id': resource_id,
+                       '$or': [{'last_sample_timestamp': None},
+                               {'last_sample_timestamp':
+                                {'$lte': last['timestamp']}}]}
+                      ).update_one(
+                {'$set': {'metadata': last['resource_metadata'],
+                          'last_sample_timestamp': last['timestamp']}})
+            # only update first sample timestamp if actually earlier
+            bulk.find({'_id': resource_id,
+                       'first_sample_timestamp': {'$gt': first_timestamp}}
+                      ).update_one(
+                {'$set': {'first_sample_timestamp': first_timestamp}})
+        bulk.execute()
+
+        recorded_at = timeutils.utcnow()
+        records = {}
+        for data in samples:
+            record = copy.copy(data)
+            record['recorded_at'] = recorded_at
+            collection = self._collection_for(record['timestamp'])
+            records.setdefault(collection.name, (collection, []))[1].append(
+                record)
+        for collection, collection_records in six.itervalues(records):
+            collection.insert(collection_records)
+
+        if cfg.CONF.database.mongodb_rollups:
+            self._record_rollups(samples)
+
+    def _record_rollups(self, samples):
+        """Add samples to the per minute, hour and day rollups."""
+        if not self._rollups_started:
+            # Statistics are only computed from rollups for the time after
+            # they were started.
+            self.db.rollup_info.update(
+                {'_id': 'since'},
+                {'$setOnInsert': {'timestamp': timeutils.utcnow()}},
+                upsert=True)
+            self._rollups_started = True
+
+        rollups = {}
+        for data in samples:
+            timestamp = data['timestamp']
+            volume = data['counter_volume']
+            timestamp_us = _epoch_us(timestamp)
+            for period in ROLLUP_PERIODS:
+                period_us = period * 1000000
+                key = (data['counter_name'], data['resource_id'],
+                       data['user_id'], data['project_id'], data['source'],
+                       period, timestamp_us - timestamp_us % period_us)
+                rollup = rollups.get(key)
+                if rollup is None:
+                    rollups[key] = {'count': 1, 'sum': volume,
+                                    'min': volume, 'max': volume,
+                                    'duration_start': timestamp,
+                                    'duration_end': timestamp,
+                                    'counter_unit': data['counter_unit']}
+                    continue
+                rollup['count'] += 1
+                rollup['sum'] += volume
+                rollup['min'] = min(rollup['min'], volume)
+                rollup['max'] = max(rollup['max'], volume)
+                rollup['duration_start'] = min(rollup['duration_start'],
+                                               timestamp)
+                rollup['duration_end'] = max(rollup['duration_end'],
+                                             timestamp)
+                rollup['counter_unit'] = data['counter_unit']
+
+        bulk = self.db.rollup.initialize_unordered_bulk_op()
+        for key, rollup in six.iteritems(rollups):
+            spec = dict(zip(ROLLUP_KEY, key))
+            spec['period_start'] = _from_epoch_us(key[-1])
+            bulk.find(spec).upsert().update_one(
+                {'$inc': {'count': rollup['count'], 'sum': rollup['sum']},
+                 '$min': {'min': rollup['min'],
+                          'duration_start': rollup['duration_start']},
+                 '$max': {'max': rollup['max'],
+                          'duration_end': rollup['duration_end']},
+                 '$set': {'counter_unit': rollup['counter_unit']},
+                 })
+        bulk.execute()
 
     def clear_expired_metering_data(self, ttl):
         """Clear expired data from the backend storage system.
@@ -541,6 +938,9 @@ class Connection(pymongo_base.Connection):
         Clearing occurs according to the time-to-live.
         :param ttl: Number of seconds to keep records for.
         """
+        if cfg.CONF.database.partition_samples:
+            self._drop_expired_partitions(ttl)
+            return
         results = self.db.meter.group(
             key={},
             condition={},
@@ -552,6 +952,23 @@ class Connection(pymongo_base.Connection):
 
         self.db.resource.remove({'_id': {'$nin': results['resources']}})
 
+    def _drop_expired_partitions(self, ttl):
+        """Drop the daily sample collections whose samples all expired."""
+        end = timeutils.utcnow() - datetime.timedelta(seconds=ttl)
+        dropped = 0
+        for collection in self._partition_collections():
+            if collection.name < _partition_name(end):
+                collection.drop()
+                self._partitions.discard(collection.name)
+                dropped += 1
+        LOG.info(_("%d daily sample collections removed from database"),
+                 dropped)
+
+        resources = set()
+        for collection in self._sample_collections():
+            resources.update(collection.distinct('resource_id'))
+        self.db.resource.remove({'_id': {'$nin': list(resources)}})
+
     @staticmethod
     def _get_marker(db_collection, marker_pairs):
         """Return the mark document according to the attribute-value pairs.
@@ -723,13 +1140,15 @@ class Connection(pymongo_base.Connection):
         # as result post-sorting (as oppposed to reduce pre-sorting)
         # is not possible on an inline M-R
         out = 'resource_list_%s' % uuid.uuid4()
-        self.db.meter.map_reduce(self.MAP_RESOURCES,
-                                 self.REDUCE_RESOURCES,
-                                 out=out,
-                                 sort={'resource_id': 1},
-                                 query=query)
-
         try:
+            for i, collection in enumerate(self._sample_collections(query)):
+                # The resources of the other collections are merged into
+                # the results of the first one by the reduce function.
+                collection.map_reduce(self.MAP_RESOURCES,
+                                      self.REDUCE_RESOURCES,
+                                      out=out if i == 0 else {'reduce': out},
+                                      sort={'resource_id': 1},
+                                      query=query)
             for r in self.db[out].find(sort=sort_instructions):
                 resource = r['value']
                 yield models.Resource(
@@ -859,14 +1278,149 @@ class Connection(pymongo_base.Connection):
 
         q = pymongo_utils.make_query_from_filter(sample_filter)
 
+        period_start = None
         if period:
             if sample_filter.start:
                 period_start = sample_filter.start
             else:
-                period_start = self.db.meter.find(
-                    limit=1, sort=[('timestamp',
-                                    pymongo.ASCENDING)])[0]['timestamp']
+                first = self._find_first_sample()
+                if first is None:
+                    return []
+                period_start = first['timestamp']
             period_start = int(calendar.timegm(period_start.utctimetuple()))
+
+        results = None
+        if cfg.CONF.database.mongodb_rollups and not aggregate:
+            results = self._get_statistics_from_rollups(
+                sample_filter, q, period, period_start, groupby)
+        if results is None:
+            results = self._raw_statistics(q, period, period_start, groupby,
+                                           aggregate)
+
+        # FIXME(terriyu) Fix get_meter_statistics() so we don't use sorted()
+        # to return the results
+        return sorted(
+            (self._stats_result_to_model(r, groupby, aggregate)
+             for r in results),
+            key=operator.attrgetter('period_start'))
+
+    def _raw_statistics(self, q, period, period_start, groupby, aggregate):
+        """Compute statistics from the raw samples."""
+        if self._use_aggregation:
+            return self._aggregate_statistics(q, period, period_start,
+                                              groupby, aggregate)
+        return self._map_reduce_statistics(q, period, period_start, groupby,
+                                           aggregate)
+
+    def _aggregate_statistics(self, q, period, period_start, groupby,
+                              aggregate):
+        """Compute statistics from the raw samples with an aggregation."""
+        funcs = ([(a.func, a.param) for a in aggregate] if aggregate
+                 else [(func, None) for func in self.STANDARD_AGGREGATES[
+                     'emit_body']])
+
+        key = dict((g, '$%s' % g) for g in groupby or [])
+        if period:
+            period_first = _from_epoch_us(period_start * 1000000)
+            offset = {'$subtract': ['$timestamp', period_first]}
+            key['period_start'] = {'$subtract': [
+                offset, {'$mod': [offset, period * 1000]}]}
+        group = {'_id': key,
+                 'unit': {'$first': '$counter_unit'},
+                 'duration_start': {'$min': '$timestamp'},
+                 'duration_end': {'$max': '$timestamp'}}
+        for func, param in funcs:
+            if func == 'count':
+                group['count'] = {'$sum': 1}
+            elif func in ('sum', 'min', 'max'):
+                group[func] = {'$%s' % func: '$counter_volume'}
+            elif func == 'avg':
+                group['acount'] = {'$sum': 1}
+                group['asum'] = {'$sum': '$counter_volume'}
+            elif func == 'stddev':
+                group['sdcount'] = {'$sum': 1}
+                group['sdsum'] = {'$sum': '$counter_volume'}
+                group['sdsquares'] = {'$sum': {'$multiply': [
+                    '$counter_volume', '$counter_volume']}}
+            elif func == 'cardinality':
+                v = self.PARAMETERIZED_AGGREGATES['validate'].get(func)
+                if not (v and v(param)):
+                    raise storage.StorageBadAggregate('Bad aggregate: %s.%s'
+                                                      % (func, param))
+                group['distinct_%s' % param] = {'$addToSet': '$%s' % param}
+            else:
+                raise ceilometer.NotImplementedError(
+                    'Selectable aggregate function %s'
+                    ' is not supported' % func)
+
+        rows = {}
+        for collection in self._sample_collections(q):
+            collection_rows = collection.aggregate(
+                [{'$match': q}, {'$group': group}], allowDiskUse=True)
+            if isinstance(collection_rows, dict):
+                collection_rows = collection_rows['result']
+            for row in collection_rows:
+                key = tuple(sorted(six.iteritems(row['_id'])))
+                if key in rows:
+                    self._merge_group_rows(group, rows[key], row)
+                else:
+                    rows[key] = row
+
+        results = []
+        for row in six.itervalues(rows):
+            result = {'unit': row['unit'],
+                      'duration_start': row['duration_start'],
+                      'duration_end': row['duration_end'],
+                      'duration': timeutils.delta_seconds(
+                          row['duration_start'], row['duration_end']),
+                      'groupby': (dict((g, row['_id'][g]) for g in groupby)
+                                  if groupby else None)}
+            if period:
+                result['period'] = period
+                result['period_start'] = period_first + datetime.timedelta(
+                    milliseconds=row['_id']['period_start'])
+                result['period_end'] = (result['period_start'] +
+                                        datetime.timedelta(seconds=period))
+            else:
+                result['period'] = 0
+                result['period_start'] = row['duration_start']
+                result['period_end'] = row['duration_end']
+            for func, param in funcs:
+                if func in ('count', 'sum', 'min', 'max'):
+                    result[func] = row[func]
+                elif func == 'avg':
+                    result['avg'] = float(row['asum']) / row['acount']
+                elif func == 'stddev':
+                    mean = float(row['sdsum']) / row['sdcount']
+                    variance = float(row['sdsquares']) / row['sdcount'] - (
+                        mean * mean)
+                    result['stddev'] = math.sqrt(max(variance, 0))
+                elif func == 'cardinality':
+                    result['cardinality/%s' % param] = len(
+                        row['distinct_%s' % param])
+            results.append(result)
+        return results
+
+    @staticmethod
+    def _merge_group_rows(group, row, other):
+        """Merge the $group results of another collection into a row."""
+        for field, accumulator in six.iteritems(group):
+            if field == '_id':
+                continue
+            op = next(iter(accumulator))
+            if op == '$sum':
+                row[field] += other[field]
+            elif op == '$min':
+                row[field] = min(row[field], other[field])
+            elif op == '$max':
+                row[field] = max(row[field], other[field])
+            elif op == '$addToSet':
+                row[field] = list(set(row[field]) | set(other[field]))
+
+    def _map_reduce_statistics(self, q, period, period_start, groupby,
+                               aggregate):
+        """Compute statistics from the raw samples with map_reduce."""
+        if period:
             map_params = {'period': period,
                           'period_first': period_start,
                           'groupby_fields': json.dumps(groupby)}
@@ -906,13 +1460,141 @@ class Connection(pymongo_base.Connection):
             finalize=finalize_stats,
             query=q,
         )
+        return [r['value'] for r in results['results']]
 
-        # FIXME(terriyu) Fix get_meter_statistics() so we don't use sorted()
-        # to return the results
-        return sorted(
-            (self._stats_result_to_model(r['value'], groupby, aggregate)
-             for r in results['results']),
-            key=operator.attrgetter('period_start'))
+    def _get_statistics_from_rollups(self, sample_filter, q, period,
+                                     period_first, groupby):
+        """Compute standard statistics from the sample rollups.
+
+        Rollups lying across the boundary of a statistics period, or the
+        start or end of the query, are replaced by the raw samples of their
+        time range. So are the rollups starting before time_to_live, which
+        outlive some of their samples. Returns None when the statistics
+        have to be computed from the raw samples only.
+        """
+        if (sample_filter.metaquery or sample_filter.message_id or
+                sample_filter.start_timestamp_op == 'gt' or
+                sample_filter.end_timestamp_op == 'le'):
+            return None
+        rollup_period = _choose_rollup_period(period, sample_filter.start,
+                                              sample_filter.end)
+        if rollup_period is None:
+            return None
+        since = self.db.rollup_info.find_one({'_id': 'since'})
+        if since is None:
+            return None
+        start = sample_filter.start
+        if start is None:
+            first = self._find_first_sample(q)
+            if first is None:
+                return []
+            start = first['timestamp']
+        if start < since['timestamp']:
+            return None
+
+        rollup_us = rollup_period * 1000000
+        start_us = _epoch_us(start)
+        end_us = _epoch_us(sample_filter.end) if sample_filter.end else None
+        # NOTE: A rollup expires with its last sample, so its first samples
+        # may already be gone.
+        ttl = cfg.CONF.database.time_to_live
+        expired_us = (_epoch_us(timeutils.utcnow() -
+                                datetime.timedelta(seconds=ttl))
+                      if ttl > 0 else None)
+        if period:
+            first_us = period_first * 1000000
+            period_us = period * 1000000
+
+        def _bucket(timestamp_us):
+            return (timestamp_us - first_us) // period_us if period else None
+
+        rollup_q = dict((k, v) for k, v in six.iteritems(q)
+                        if k != 'timestamp')
+        rollup_q['period'] = rollup_period
+        rollup_q['period_start'] = {
+            '$gte': _from_epoch_us(start_us - start_us % rollup_us)}
+        if sample_filter.end:
+            rollup_q['period_start']['$lt'] = sample_filter.end
+
+        stats = {}
+        edges = set()
+        for rollup in self.db.rollup.find(rollup_q):
+            rollup_start_us = _epoch_us(rollup['period_start'])
+            rollup_end_us = rollup_start_us + rollup_us
+            if (rollup_start_us < start_us or
+                    (end_us is not None and rollup_end_us > end_us) or
+                    (expired_us is not None and
+                     rollup_start_us < expired_us) or
+                    _bucket(rollup_start_us) != _bucket(rollup_end_us - 1)):
+                edges.add(rollup_start_us)
+                continue
+            self._add_to_statistics(
+                stats, _bucket(rollup_start_us), groupby,
+                dict((g, rollup[g]) for g in groupby or []),
+                rollup, rollup['counter_unit'])
+
+        if edges:
+            ranges = []
+            for edge in sorted(edges):
+                if ranges and ranges[-1][1] == edge:
+                    ranges[-1][1] = edge + rollup_us
+                else:
+                    ranges.append([edge, edge + rollup_us])
+            if len(ranges) > MAX_ROLLUP_EDGES:
+                return None
+            raw_q = dict(q)
+            raw_q['$or'] = [{'timestamp': {'$gte': _from_epoch_us(a),
+                                           '$lt': _from_epoch_us(b)}}
+                            for a, b in ranges]
+            for value in self._raw_statistics(raw_q, period, period_first,
+                                              groupby, None):
+                bucket = (_bucket(_epoch_us(value['period_start']))
+                          if period else None)
+                self._add_to_statistics(stats, bucket, groupby,
+                                        value['groupby'] or {}, value,
+                                        value['unit'])
+
+        results = []
+        for (bucket, _groupby_key), result in six.iteritems(stats):
+            if period:
+                result['period'] = period
+                result['period_start'] = _from_epoch_us(
+                    first_us + bucket * period_us)
+                result['period_end'] = (result['period_start'] +
+                                        datetime.timedelta(seconds=period))
+            else:
+                result['period'] = 0
+                result['period_start'] = result['duration_start']
+                result['period_end'] = result['duration_end']
+            result['avg'] = float(result['sum']) / result['count']
+            result['duration'] = timeutils.delta_seconds(
+                result['duration_start'], result['duration_end'])
+            results.append(result)
+        return results
+
+    @staticmethod
+    def _add_to_statistics(stats, bucket, groupby, groupby_values, value,
+                           unit):
+        key = (bucket, tuple(groupby_values.get(g) for g in groupby or []))
+        result = stats.get(key)
+        if result is None:
+            stats[key] = {'unit': unit,
+                          'groupby': groupby_values,
+                          'count': value['count'],
+                          'sum': value['sum'],
+                          'min': value['min'],
+                          'max': value['max'],
+                          'duration_start': value['duration_start'],
+                          'duration_end': value['duration_end']}
+            return
+        result['count'] += value['count']
+        result['sum'] += value['sum']
+        result['min'] = min(result['min'], value['min'])
+        result['max'] = max(result['max'], value['max'])
+        result['duration_start'] = min(result['duration_start'],
+                                       value['duration_start'])
+        result['duration_end'] = max(result['duration_end'],
+                                     value['duration_end'])
 
     @staticmethod
     def _stats_result_aggregates(result, aggregate):
@@ -41,6 +41,7 @@ from ceilometer import storage
 from ceilometer.storage import base
 from ceilometer.storage import models as api_models
 from ceilometer.storage.sqlalchemy import models
+from ceilometer.storage.sqlalchemy import partitions
 from ceilometer.storage.sqlalchemy import utils as sql_utils
 from ceilometer import utils
 
@@ -112,7 +113,7 @@ def apply_metaquery_filter(session, query, metaquery):
     for k, value in six.iteritems(metaquery):
         key = k[9:]  # strip out 'metadata.' prefix
         try:
-            _model = sql_utils.META_TYPE_MAP[type(value)]
+            _model = sql_utils.get_meta_table(key, value)
         except KeyError:
             raise ceilometer.NotImplementedError(
                 'Query on %(key)s is of %(value)s '
@@ -238,6 +239,64 @@ class Connection(base.Connection):
         path = os.path.join(os.path.abspath(os.path.dirname(__file__)),
                             'sqlalchemy', 'migrate_repo')
         migration.db_sync(self._engine_facade.get_engine(), path)
+        self._index_metadata()
+        if cfg.CONF.database.partition_samples:
+            self._partition_samples()
+
+    def _index_metadata(self):
+        """Fill metadata_indexed for the configured indexed metadata keys.
+
+        The values of the keys that are no longer indexed are removed, those
+        of the newly indexed keys are copied from metadata_text.
+        """
+        keys = cfg.CONF.database.indexed_metadata_keys
+        engine = self._engine_facade.get_engine()
+        session = self._engine_facade.get_session()
+        with session.begin():
+            stale = session.query(models.MetaIndexed)
+            if keys:
+                stale = stale.filter(~models.MetaIndexed.meta_key.in_(keys))
+            stale.delete(synchronize_session=False)
+            indexed = set(key for key, in
+                          session.query(distinct(models.MetaIndexed.meta_key)))
+            new_keys = [key for key in keys if key not in indexed]
+            if not new_keys:
+                return
+            LOG.info(_('Indexing the metadata keys %s'), ', '.join(new_keys))
+            length = (func.char_length if engine.name == 'mysql'
+                      else func.length)
+            meta_text = models.MetaText
+            session.execute(models.MetaIndexed.__table__.insert().from_select(
+                ['id', 'meta_key', 'value'],
+                sa.select([meta_text.id, meta_text.meta_key, meta_text.value])
+                .where(sa.and_(meta_text.meta_key.in_(new_keys),
+                               length(meta_text.value) <=
+                               sql_utils.INDEXED_VALUE_LENGTH))))
+
+    def _partition_samples(self):
+        """Partition the sample table by day and add the coming days."""
+        engine = self._engine_facade.get_engine()
+        if engine.name != 'mysql':
+            LOG.warning(_('Partitioned samples are only supported with '
+                          'MySQL, samples are stored in a single table'))
+            return
+        today = timeutils.utcnow().date()
+        last_day = today + datetime.timedelta(days=partitions.DAYS_AHEAD)
+        if partitions.get_partitions(engine):
+            partitions.add_partitions(engine, today, last_day)
+            return
+
+        # NOTE: Samples that are due to expire go to the first partition.
+        first_day = today
+        ttl = cfg.CONF.database.time_to_live
+        if ttl > 0:
+            session = self._engine_facade.get_session()
+            first = session.query(func.min(models.Sample.timestamp)).scalar()
+            if first is not None:
+                expired = timeutils.utcnow() - datetime.timedelta(seconds=ttl)
+                first_day = min(max(first, expired).date(), today)
+        LOG.info(_('Partitioning the sample table by day'))
+        partitions.partition_table(engine, first_day, last_day)
 
     def clear(self):
         engine = self._engine_facade.get_engine()
@@ -312,6 +371,11 @@ class Connection(base.Connection):
                             except KeyError:
                                 LOG.warn(_("Unknown metadata type. Key (%s) "
                                          "will not be queryable."), key)
+                            if sql_utils.is_indexed(key, v):
+                                meta_map.setdefault(models.MetaIndexed, [])
+                                meta_map[models.MetaIndexed].append(
+                                    {'id': internal_id, 'meta_key': key,
+                                     'value': v})
                         for _model in meta_map.keys():
                             conn.execute(_model.__table__.insert(),
                                          meta_map[_model])
@@ -350,12 +414,67 @@ class Connection(base.Connection):
                          message_signature=data['message_signature'],
                          message_id=data['message_id'])
 
+    def record_metering_data_batch(self, samples):
+        """Write a batch of samples to the backend storage system.
+
+        The batch is written in one transaction. Meters and resources are
+        looked up or created once per batch and the samples are inserted
+        with a single multi-row insert.
+
+        :param samples: a list of dictionaries such as returned by
+                        ceilometer.meter.meter_message_from_counter
+        """
+        if not samples:
+            return
+        engine = self._engine_facade.get_engine()
+        with engine.begin() as conn:
+            meter_ids = {}
+            resource_ids = {}
+            rows = []
+            for data in samples:
+                meter_key = (data['counter_name'],
+                             data['counter_type'],
+                             data['counter_unit'])
+                m_id = meter_ids.get(meter_key)
+                if m_id is None:
+                    m_id = meter_ids[meter_key] = self._create_meter(
+                        conn, *meter_key)
+                # NOTE: Resources are versioned by metadata in this
+                # driver, so each sample keeps the metadata it came with.
+                res_key = (data['resource_id'],
+                           data['user_id'],
+                           data['project_id'],
+                           data['source'],
+                           jsonutils.dumps(data['resource_metadata'],
+                                           sort_keys=True))
+                res_id = resource_ids.get(res_key)
+                if res_id is None:
+                    res_id = resource_ids[res_key] = self._create_resource(
+                        conn,
+                        data['resource_id'],
+                        data['user_id'],
+                        data['project_id'],
+                        data['source'],
+                        data['resource_metadata'])
+                rows.append({'meter_id': m_id,
+                             'resource_id': res_id,
+                             'timestamp': data['timestamp'],
+                             'volume': data['counter_volume'],
+                             'message_signature': data['message_signature'],
+                             'message_id': data['message_id']})
+            conn.execute(models.Sample.__table__.insert(), rows)
+
     def clear_expired_metering_data(self, ttl):
         """Clear expired data from the backend storage system.
 
         Clearing occurs according to the time-to-live.
         :param ttl: Number of seconds to keep records for.
         """
+        engine = self._engine_facade.get_engine()
+        if (cfg.CONF.database.partition_samples and engine.name == 'mysql'
+                and partitions.get_partitions(engine)):
+            self._drop_expired_partitions(engine, ttl)
+            return
 
         session = self._engine_facade.get_session()
         with session.begin():
@@ -365,7 +484,8 @@ class Connection(base.Connection):
 
             sample_subq = sample_q.subquery()
             for table in [models.MetaText, models.MetaBigInt,
-                          models.MetaFloat, models.MetaBool]:
+                          models.MetaFloat, models.MetaBool,
+                          models.MetaIndexed]:
                 (session.query(table)
                  .join(sample_subq, sample_subq.c.id == table.id)
                  .delete())
@@ -380,6 +500,36 @@ class Connection(base.Connection):
              .delete(synchronize_session='fetch'))
             LOG.info(_("%d samples removed from database"), rows)
 
+    def _drop_expired_partitions(self, engine, ttl):
+        """Drop the daily sample partitions whose samples all expired."""
+        end = timeutils.utcnow() - datetime.timedelta(seconds=ttl)
+        dropped = partitions.drop_partitions(engine, end)
+        today = timeutils.utcnow().date()
+        partitions.add_partitions(
+            engine, today,
+            today + datetime.timedelta(days=partitions.DAYS_AHEAD))
+
+        session = self._engine_facade.get_session()
+        with session.begin():
+            # remove Meter definitions with no matching samples
+            (session.query(models.Meter)
+             .filter(~models.Meter.samples.any())
+             .delete(synchronize_session='fetch'))
+            # remove resources with no matching samples, and their metadata
+            orphans = (session.query(models.Resource.internal_id)
+                       .filter(~models.Resource.samples.any()))
+            for table in [models.MetaText, models.MetaBigInt,
+                          models.MetaFloat, models.MetaBool,
+                          models.MetaIndexed]:
+                (session.query(table)
+                 .filter(table.id.in_(orphans.subquery()))
+                 .delete(synchronize_session='fetch'))
+            (session.query(models.Resource)
+             .filter(~models.Resource.samples.any())
+             .delete(synchronize_session='fetch'))
+        LOG.info(_("%d daily sample partitions removed from database"),
+                 len(dropped))
+
     def get_resources(self, user=None, project=None, source=None,
                       start_timestamp=None, start_timestamp_op=None,
                       end_timestamp=None, end_timestamp_op=None,
@@ -234,14 +234,16 @@ class Connection(base.Connection):
 
         return self._retrieve_samples(query_filter, orderby_filter, limit)
 
-    def _retrieve_samples(self, query, orderby, limit):
+    def _find_samples(self, query, sort, limit):
         if limit is not None:
-            samples = self.db.meter.find(query,
-                                         limit=limit,
-                                         sort=orderby)
-        else:
-            samples = self.db.meter.find(query,
-                                         sort=orderby)
+            return self.db.meter.find(query,
+                                      limit=limit,
+                                      sort=sort)
+        return self.db.meter.find(query,
+                                  sort=sort)
+
+    def _retrieve_samples(self, query, orderby, limit):
+        samples = self._find_samples(query, orderby, limit)
 
         for s in samples:
             # Remove the ObjectId generated by the database when
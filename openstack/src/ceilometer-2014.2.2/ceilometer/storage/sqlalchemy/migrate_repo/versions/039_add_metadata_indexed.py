@@ -0,0 +1,36 @@
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import sqlalchemy as sa
+
+
+def upgrade(migrate_engine):
+    meta = sa.MetaData(bind=migrate_engine)
+    sa.Table('resource', meta, autoload=True)
+    meta_indexed = sa.Table(
+        'metadata_indexed', meta,
+        sa.Column('id', sa.Integer, sa.ForeignKey('resource.internal_id'),
+                  primary_key=True),
+        sa.Column('meta_key', sa.String(255), primary_key=True),
+        sa.Column('value', sa.String(255)),
+        sa.Index('ix_meta_indexed_value', 'value'),
+        mysql_engine='InnoDB',
+        mysql_charset='utf8',
+    )
+    meta_indexed.create()
+
+
+def downgrade(migrate_engine):
+    meta = sa.MetaData(bind=migrate_engine)
+    meta_indexed = sa.Table('metadata_indexed', meta, autoload=True)
+    meta_indexed.drop()
@@ -148,6 +148,18 @@ class MetaFloat(Base):
     value = Column(Float(53), default=False)
 
 
+class MetaIndexed(Base):
+    """Metering string metadata of the indexed metadata keys."""
+
+    __tablename__ = 'metadata_indexed'
+    __table_args__ = (
+        Index('ix_meta_indexed_value', 'value'),
+    )
+    id = Column(Integer, ForeignKey('resource.internal_id'), primary_key=True)
+    meta_key = Column(String(255), primary_key=True)
+    value = Column(String(255))
+
+
 class Meter(Base):
     """Meter definition data."""
 
@@ -193,6 +205,8 @@ class Resource(Base):
                             cascade="all, delete-orphan")
     meta_bool = relationship("MetaBool", backref="resource",
                              cascade="all, delete-orphan")
+    meta_indexed = relationship("MetaIndexed", backref="resource",
+                                cascade="all, delete-orphan")
 
 
 @event.listens_for(Resource, "before_insert")
@@ -0,0 +1,101 @@
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+"""Daily partitions of the sample table on MySQL.
+
+The sample table is partitioned by range on its timestamp, stored by
+PreciseTimestamp as seconds since the epoch. Partition pYYYYMMDD holds the
+samples of that day, the first partition also holds those of the days
+before it, and pmax those of the days after the last partition.
+"""
+
+import calendar
+import datetime
+
+import sqlalchemy as sa
+
+# Number of days partitions are created in advance for
+DAYS_AHEAD = 7
+
+
+def _day_end(day):
+    return calendar.timegm((day + datetime.timedelta(days=1)).timetuple())
+
+
+def _partitions(first_day, last_day):
+    partitions = []
+    day = first_day
+    while day <= last_day:
+        partitions.append('PARTITION p%s VALUES LESS THAN (%d)' %
+                          (day.strftime('%Y%m%d'), _day_end(day)))
+        day += datetime.timedelta(days=1)
+    partitions.append('PARTITION pmax VALUES LESS THAN MAXVALUE')
+    return ', '.join(partitions)
+
+
+def get_partitions(engine):
+    """Return the (name, upper bound) of the partitions of the sample table.
+
+    The upper bound of pmax is None. The list is empty when the table is
+    not partitioned.
+    """
+    rows = engine.execute(sa.text(
+        "SELECT partition_name, partition_description "
+        "FROM information_schema.partitions "
+        "WHERE table_schema = DATABASE() AND table_name = 'sample' "
+        "AND partition_name IS NOT NULL "
+        "ORDER BY partition_ordinal_position")).fetchall()
+    return [(name, None if bound == 'MAXVALUE' else int(bound))
+            for name, bound in rows]
+
+
+def partition_table(engine, first_day, last_day):
+    """Partition the sample table by day, from first_day to last_day."""
+    # NOTE: Partitioned InnoDB tables can't have foreign keys, and their
+    # partitioning column must be part of their primary key.
+    for fk in sa.inspect(engine).get_foreign_keys('sample'):
+        engine.execute('ALTER TABLE sample DROP FOREIGN KEY %s' % fk['name'])
+    engine.execute('ALTER TABLE sample '
+                   'MODIFY timestamp DECIMAL(20, 6) NOT NULL, '
+                   'DROP PRIMARY KEY, ADD PRIMARY KEY (id, timestamp)')
+    engine.execute('ALTER TABLE sample '
+                   'PARTITION BY RANGE (FLOOR(timestamp)) (%s)' %
+                   _partitions(first_day, last_day))
+
+
+def add_partitions(engine, first_day, last_day):
+    """Split pmax into the days up to last_day.
+
+    The first day added is the day after the last partition, or first_day
+    when only pmax is left.
+    """
+    bounds = [bound for _name, bound in get_partitions(engine)
+              if bound is not None]
+    if bounds:
+        first_day = datetime.datetime.utcfromtimestamp(max(bounds)).date()
+    if first_day <= last_day:
+        engine.execute('ALTER TABLE sample REORGANIZE PARTITION pmax '
+                       'INTO (%s)' % _partitions(first_day, last_day))
+
+
+def drop_partitions(engine, end):
+    """Drop the partitions of the days ended by end.
+
+    Returns the names of the dropped partitions.
+    """
+    end = calendar.timegm(end.utctimetuple())
+    names = [name for name, bound in get_partitions(engine)
+             if bound is not None and bound <= end]
+    if names:
+        engine.execute('ALTER TABLE sample DROP PARTITION %s' %
+                       ', '.join(names))
+    return names
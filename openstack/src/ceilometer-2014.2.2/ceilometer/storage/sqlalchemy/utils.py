@@ -17,6 +17,8 @@
 import operator
 import types
 
+from oslo.config import cfg
+import six
 from sqlalchemy import and_
 from sqlalchemy import asc
 from sqlalchemy import desc
@@ -36,6 +38,27 @@ META_TYPE_MAP = {bool: models.MetaBool,
                  long: models.MetaBigInt,
                  float: models.MetaFloat}
 
+# Longest value of an indexed metadata key kept in metadata_indexed
+INDEXED_VALUE_LENGTH = 255
+
+
+def is_indexed(key, value):
+    """Check whether the metadata key value pair is in metadata_indexed."""
+    return (key in cfg.CONF.database.indexed_metadata_keys
+            and isinstance(value, six.string_types)
+            and len(value) <= INDEXED_VALUE_LENGTH)
+
+
+def get_meta_table(key, value):
+    """Return the metadata table to look up value of key in.
+
+    Equality lookups of the indexed metadata keys use metadata_indexed,
+    the others the metadata table of the type of value.
+    """
+    if is_indexed(key, value):
+        return models.MetaIndexed
+    return META_TYPE_MAP[type(value)]
+
 
 class QueryTransformer(object):
     operators = {"=": operator.eq,
@@ -84,7 +107,10 @@ class QueryTransformer(object):
                                                  'operator is not implemented')
 
         field_name = field_name[len('resource_metadata.'):]
-        meta_table = META_TYPE_MAP[type(value)]
+        if op == self.operators["="]:
+            meta_table = get_meta_table(field_name, value)
+        else:
+            meta_table = META_TYPE_MAP[type(value)]
         meta_alias = aliased(meta_table)
         on_clause = and_(self.table.internal_id == meta_alias.id,
                          meta_alias.meta_key == field_name)
@@ -0,0 +1,211 @@
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+"""Tests for ceilometer/compute/discovery.py
+"""
+
+import datetime
+
+import mock
+from oslo.config import fixture as fixture_config
+from oslo.utils import timeutils
+from oslotest import base
+
+from ceilometer.compute import discovery
+
+DOMAIN_XML = """
+<domain type="kvm">
+  <uuid>%(uuid)s</uuid>
+  <name>instance-00000001</name>
+  <metadata>
+    <nova:instance xmlns:nova="http://openstack.org/xmlns/libvirt/nova/1.0">
+      <nova:name>test</nova:name>
+      <nova:flavor name="%(flavor)s">
+        <nova:memory>512</nova:memory>
+        <nova:disk>1</nova:disk>
+        <nova:swap>0</nova:swap>
+        <nova:ephemeral>0</nova:ephemeral>
+        <nova:vcpus>1</nova:vcpus>
+      </nova:flavor>
+    </nova:instance>
+  </metadata>
+</domain>
+"""
+
+
+class TestDiscovery(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestDiscovery, self).setUp()
+        self.CONF = self.useFixture(fixture_config.Config()).conf
+        self.CONF.set_override('host', 'test')
+        self.CONF.set_override('instance_discovery_method',
+                               'libvirt_metadata', group='compute')
+        self.discovery = discovery.InstanceDiscovery()
+        self.discovery.inspector = mock.Mock()
+        self.discovery.nova_cli = mock.Mock()
+        self.domains = []
+        self.discovery.inspector.list_domains.return_value = self.domains
+        self.servers = []
+        self.discovery.nova_cli.instance_get_all_by_host.return_value = (
+            self.servers)
+        self.utcnow = datetime.datetime(2014, 10, 1, 10, 0, 0)
+        timeutils.set_time_override(self.utcnow)
+        self.addCleanup(timeutils.clear_time_override)
+
+    @staticmethod
+    def _domain(uuid, flavor='m1.tiny', state=1, xml=DOMAIN_XML):
+        domain = mock.Mock()
+        domain.UUIDString.return_value = uuid
+        domain.XMLDesc.return_value = xml % {'uuid': uuid, 'flavor': flavor}
+        domain.info.return_value = (state, 524288, 524288, 1, 999999)
+        return domain
+
+    @staticmethod
+    def _server(uuid, flavor='m1.tiny', vm_state='active'):
+        server = mock.Mock()
+        server.id = uuid
+        server.status = 'ACTIVE'
+        server.flavor = {'id': 1, 'name': flavor, 'vcpus': 1, 'ram': 512,
+                         'disk': 1, 'ephemeral': 0}
+        setattr(server, 'OS-EXT-STS:vm_state', vm_state)
+        return server
+
+    def _discover(self):
+        return self.discovery.discover(mock.Mock())
+
+    def _nova_calls(self):
+        return self.discovery.nova_cli.instance_get_all_by_host.call_args_list
+
+    def test_naive(self):
+        self.CONF.set_override('instance_discovery_method', 'naive',
+                               group='compute')
+        self.servers.extend([self._server('a'),
+                             self._server('b', vm_state='error')])
+        self.assertEqual(['a'], [i.id for i in self._discover()])
+        self.assertEqual([mock.call('test')], self._nova_calls())
+        self.assertFalse(self.discovery.inspector.list_domains.called)
+
+    def test_cached(self):
+        self.domains.extend([self._domain('a'), self._domain('b')])
+        self.servers.extend([self._server('a'), self._server('b')])
+        self.assertEqual(['a', 'b'], sorted(i.id for i in self._discover()))
+        self.assertEqual(['a', 'b'], sorted(i.id for i in self._discover()))
+        self.assertEqual([mock.call('test', None)], self._nova_calls())
+
+    def test_new_domain(self):
+        self.domains.append(self._domain('a'))
+        self.servers.append(self._server('a'))
+        self._discover()
+        self.domains.append(self._domain('b'))
+        self.servers[:] = [self._server('b')]
+        timeutils.advance_time_seconds(600)
+        self.assertEqual(['a', 'b'], sorted(i.id for i in self._discover()))
+        self.assertEqual([mock.call('test', None),
+                          mock.call('test', '2014-10-01T09:59:00Z')],
+                         self._nova_calls())
+
+    def test_unknown_domain(self):
+        self.domains.extend([self._domain('a'), self._domain('b')])
+        self.servers.append(self._server('a'))
+        self.assertEqual(['a'], [i.id for i in self._discover()])
+        self.assertEqual(['a'], [i.id for i in self._discover()])
+        self.assertEqual(1, len(self._nova_calls()))
+
+    def test_unknown_domain_cache_expiry(self):
+        self.CONF.set_override('resource_cache_expiry', 60, group='compute')
+        self.domains.extend([self._domain('a'), self._domain('b')])
+        self.servers.append(self._server('a'))
+        self._discover()
+        self.servers.append(self._server('b'))
+        timeutils.advance_time_seconds(61)
+        self.assertEqual(['a', 'b'], sorted(i.id for i in self._discover()))
+        self.assertEqual([mock.call('test', None),
+                          mock.call('test', None)], self._nova_calls())
+
+    def test_unknown_domain_found_later(self):
+        self.domains.extend([self._domain('a'), self._domain('b')])
+        self.servers.append(self._server('a'))
+        self._discover()
+        self.domains.append(self._domain('c'))
+        self.servers[:] = [self._server('b'), self._server('c')]
+        self.assertEqual(['a', 'b', 'c'],
+                         sorted(i.id for i in self._discover()))
+        self.assertEqual(set(), self.discovery.unknown)
+
+    def test_not_nova_domain(self):
+        self.domains.extend([self._domain('a'),
+                             self._domain('b', xml='<domain/>')])
+        self.servers.append(self._server('a'))
+        self.assertEqual(['a'], [i.id for i in self._discover()])
+        self._discover()
+        self.assertEqual(1, len(self._nova_calls()))
+
+    def test_deleted_instance(self):
+        self.domains.extend([self._domain('a'), self._domain('b')])
+        self.servers.extend([self._server('a'), self._server('b')])
+        self._discover()
+        del self.domains[1]
+        self.assertEqual(['a'], [i.id for i in self._discover()])
+        self.assertEqual(['a'], list(self.discovery.instances))
+
+    def test_error_instance(self):
+        self.domains.extend([self._domain('a'), self._domain('b')])
+        self.servers.extend([self._server('a'),
+                             self._server('b', vm_state='error')])
+        self.assertEqual(['a'], [i.id for i in self._discover()])
+        self._discover()
+        self.assertEqual(1, len(self._nova_calls()))
+
+    def test_domain_state_and_flavor(self):
+        self.domains.append(self._domain('a', state=5))
+        self.servers.append(self._server('a'))
+        instance = self._discover()[0]
+        self.assertEqual('SHUTOFF', instance.status)
+        self.assertEqual({'id': 1, 'name': 'm1.tiny', 'vcpus': 1, 'ram': 512,
+                          'disk': 1, 'ephemeral': 0}, instance.flavor)
+
+    def test_resized_domain(self):
+        self.domains.append(self._domain('a'))
+        self.servers.append(self._server('a'))
+        self._discover()
+        self.domains[:] = [self._domain('a', flavor='m1.small')]
+        self.servers[:] = [self._server('a', flavor='m1.small')]
+        self.assertEqual('m1.small', self._discover()[0].flavor['name'])
+        self.assertEqual(2, len(self._nova_calls()))
+        self._discover()
+        self.assertEqual(2, len(self._nova_calls()))
+
+    def test_cache_expiry(self):
+        self.CONF.set_override('resource_cache_expiry', 60, group='compute')
+        self.domains.append(self._domain('a'))
+        self.servers.append(self._server('a'))
+        self._discover()
+        timeutils.advance_time_seconds(61)
+        self._discover()
+        self.assertEqual([mock.call('test', None),
+                          mock.call('test', None)], self._nova_calls())
+
+    def test_deleted_since(self):
+        self.domains.append(self._domain('a'))
+        self.servers.append(self._server('a'))
+        self._discover()
+        self.domains[:] = [self._domain('a'), self._domain('b')]
+        self.servers[:] = [self._server('a', vm_state='deleted'),
+                           self._server('b')]
+        self.assertEqual(['b'], [i.id for i in self._discover()])
+
+    def test_libvirt_failure(self):
+        self.discovery.inspector.list_domains.side_effect = Exception
+        self.servers.append(self._server('a'))
+        self.assertEqual(['a'], [i.id for i in self._discover()])
+        self.assertEqual([mock.call('test')], self._nova_calls())
@@ -62,6 +62,13 @@ class TestLibvirtInspection(base.BaseTestCase):
             self.assertEqual('fake_name', inspected_instance.name)
             self.assertEqual('uuid', inspected_instance.UUID)
 
+    def test_list_domains(self):
+        connection = self.inspector.connection
+        with mock.patch.object(connection, 'listAllDomains',
+                               return_value=[self.domain]) as list_all:
+            self.assertEqual([self.domain], self.inspector.list_domains())
+        list_all.assert_called_once_with(0)
+
     def test_inspect_cpus(self):
         with contextlib.nested(mock.patch.object(self.inspector.connection,
                                                  'lookupByName',
@@ -246,6 +253,169 @@ class TestLibvirtInspection(base.BaseTestCase):
             self.assertEqual(disks, [])
 
 
+class TestLibvirtCycleInspection(base.BaseTestCase):
+
+    dom_xml = """
+         <domain type='kvm'>
+             <devices>
+                 <disk type='file' device='disk'>
+                     <source file='/path/instance-00000001/disk'/>
+                     <target dev='vda' bus='virtio'/>
+                 </disk>
+                 <interface type='bridge'>
+                     <mac address='fa:16:3e:71:ec:6d'/>
+                     <target dev='vnet0'/>
+                     <filterref filter='nova-instance-00000001-fa163e71ec6d'>
+                         <parameter name='IP' value='10.0.0.2'/>
+                     </filterref>
+                 </interface>
+             </devices>
+         </domain>
+    """
+
+    stats = {
+        'state.state': 1,
+        'cpu.time': 999999L,
+        'vcpu.current': 2,
+        'balloon.available': 2048L,
+        'balloon.unused': 512L,
+        'net.count': 1,
+        'net.0.name': 'vnet0',
+        'net.0.rx.bytes': 1L,
+        'net.0.rx.pkts': 2L,
+        'net.0.tx.bytes': 3L,
+        'net.0.tx.pkts': 4L,
+        'block.count': 1,
+        'block.0.name': 'vda',
+        'block.0.rd.reqs': 5L,
+        'block.0.rd.bytes': 6L,
+        'block.0.wr.reqs': 7L,
+        'block.0.wr.bytes': 8L,
+    }
+
+    def setUp(self):
+        super(TestLibvirtCycleInspection, self).setUp()
+        self.instance_name = 'instance-00000001'
+        self.inspector = libvirt_inspector.LibvirtInspector()
+        self.inspector.connection = mock.Mock()
+        libvirt_inspector.libvirt = mock.Mock(
+            VIR_DOMAIN_SHUTOFF=5,
+            VIR_DOMAIN_STATS_STATE=1,
+            VIR_DOMAIN_STATS_CPU_TOTAL=2,
+            VIR_DOMAIN_STATS_BALLOON=4,
+            VIR_DOMAIN_STATS_VCPU=8,
+            VIR_DOMAIN_STATS_INTERFACE=16,
+            VIR_DOMAIN_STATS_BLOCK=32,
+            VIR_CONNECT_GET_ALL_DOMAINS_STATS_ACTIVE=16,
+            libvirtError=Exception)
+        self.domain = mock.Mock()
+        self.domain.name.return_value = self.instance_name
+        self.domain.XMLDesc.return_value = self.dom_xml
+        self.domain.info.return_value = (1L, 0L, 0L, 4L, 888888L)
+        self.domain.interfaceStats.return_value = (9L, 10L, 0L, 0L,
+                                                   11L, 12L, 0L, 0L)
+        self.domain.blockStats.return_value = (13L, 14L, 15L, 16L, 0L)
+        self.domain.memoryStats.return_value = {'available': 1024L,
+                                                'unused': 768L}
+        self.inspector.connection.lookupByName.return_value = self.domain
+        self.inspector.connection.lookupByUUIDString.return_value = (
+            self.domain)
+        self.cycle_inspector = self.inspector.get_cycle_inspector({})
+
+    def _inspect_all(self):
+        cpu = self.cycle_inspector.inspect_cpus(self.instance_name)
+        vnics = list(self.cycle_inspector.inspect_vnics(self.instance_name))
+        disks = list(self.cycle_inspector.inspect_disks(self.instance_name))
+        return cpu, vnics, disks
+
+    def test_get_cycle_inspector(self):
+        cache = {}
+        cycle_inspector = self.inspector.get_cycle_inspector(cache)
+        self.assertIsInstance(cycle_inspector,
+                              libvirt_inspector.LibvirtCycleInspector)
+        self.assertIs(cycle_inspector,
+                      self.inspector.get_cycle_inspector(cache))
+        self.assertIsNot(cycle_inspector,
+                         self.inspector.get_cycle_inspector({}))
+
+    def test_inspect_all_domain_stats(self):
+        self.inspector.connection.getAllDomainStats.return_value = [
+            (self.domain, self.stats)]
+        cpu, vnics, disks = self._inspect_all()
+
+        self.assertEqual(virt_inspector.CPUStats(number=2, time=999999L),
+                         cpu)
+        self.assertEqual(1, len(vnics))
+        vnic0, info0 = vnics[0]
+        self.assertEqual('vnet0', vnic0.name)
+        self.assertEqual('fa:16:3e:71:ec:6d', vnic0.mac)
+        self.assertEqual('10.0.0.2', vnic0.parameters.get('ip'))
+        self.assertEqual(virt_inspector.InterfaceStats(
+            rx_bytes=1L, rx_packets=2L, tx_bytes=3L, tx_packets=4L), info0)
+        self.assertEqual([(virt_inspector.Disk(device='vda'),
+                           virt_inspector.DiskStats(
+                               read_requests=5L, read_bytes=6L,
+                               write_requests=7L, write_bytes=8L,
+                               errors=-1))], disks)
+
+        self.inspector.connection.getAllDomainStats.assert_called_once_with(
+            63, 16)
+        self.assertEqual(1, self.domain.XMLDesc.call_count)
+        self.assertFalse(self.inspector.connection.lookupByName.called)
+        self.assertFalse(self.domain.info.called)
+        self.assertFalse(self.domain.interfaceStats.called)
+        self.assertFalse(self.domain.blockStats.called)
+
+    def test_inspect_without_all_domain_stats(self):
+        self.inspector.connection.getAllDomainStats.side_effect = (
+            AttributeError)
+        cpu, vnics, disks = self._inspect_all()
+
+        self.assertEqual(virt_inspector.CPUStats(number=4L, time=888888L),
+                         cpu)
+        self.assertEqual(virt_inspector.InterfaceStats(
+            rx_bytes=9L, rx_packets=10L, tx_bytes=11L, tx_packets=12L),
+            vnics[0][1])
+        self.assertEqual(virt_inspector.DiskStats(
+            read_requests=13L, read_bytes=14L, write_requests=15L,
+            write_bytes=16L, errors=0L), disks[0][1])
+
+        self.inspector.connection.lookupByName.assert_called_once_with(
+            self.instance_name)
+        self.assertEqual(1, self.domain.info.call_count)
+        self.assertEqual(1, self.domain.XMLDesc.call_count)
+
+    def test_inspect_domain_not_in_all_domain_stats(self):
+        self.inspector.connection.getAllDomainStats.return_value = []
+        self.domain.info.return_value = (5L, 0L, 0L, 4L, 888888L)
+        cpu, vnics, disks = self._inspect_all()
+
+        self.assertEqual(virt_inspector.CPUStats(number=4L, time=888888L),
+                         cpu)
+        self.assertEqual([], vnics)
+        self.assertEqual([], disks)
+
+    def test_inspect_memory_usage(self):
+        instance = mock.Mock(id='uuid')
+        setattr(instance, 'OS-EXT-SRV-ATTR:instance_name',
+                self.instance_name)
+        self.inspector.connection.getAllDomainStats.return_value = [
+            (self.domain, self.stats)]
+        self.assertEqual(
+            virt_inspector.MemoryUsageStats(usage=0.75),
+            self.cycle_inspector.inspect_memory_usage(instance))
+        self.assertFalse(self.domain.memoryStats.called)
+
+        stats = dict(self.stats)
+        del stats['balloon.unused']
+        self.inspector.connection.getAllDomainStats.return_value = [
+            (self.domain, stats)]
+        cycle_inspector = self.inspector.get_cycle_inspector({})
+        self.assertEqual(
+            virt_inspector.MemoryUsageStats(usage=0.25),
+            cycle_inspector.inspect_memory_usage(instance))
+
+
 class TestLibvirtInspectionWithError(base.BaseTestCase):
 
     class fakeLibvirtError(Exception):
@@ -109,3 +109,64 @@ class TestDispatcherDB(base.BaseTestCase):
             self.dispatcher.record_metering_data(msg)
 
         record_metering_data.assert_called_once_with(expected)
+
+    def _make_msg(self, i):
+        msg = {'counter_name': 'test',
+               'resource_id': self.id(),
+               'counter_volume': i,
+               }
+        msg['message_signature'] = utils.compute_signature(
+            msg,
+            self.CONF.publisher.metering_secret,
+        )
+        return msg
+
+    @mock.patch('ceilometer.openstack.common.loopingcall.'
+                'FixedIntervalLoopingCall')
+    def test_batch_by_count(self, looping_call):
+        self.CONF.set_override('batch_size', 3, group='dispatcher_database')
+        self.CONF.set_override('batch_timeout', 7,
+                               group='dispatcher_database')
+        self.dispatcher = database.DatabaseDispatcher(self.CONF)
+        looping_call.return_value.start.assert_called_once_with(
+            interval=7, initial_delay=7)
+        msgs = [self._make_msg(i) for i in range(4)]
+
+        with mock.patch.object(self.dispatcher.storage_conn,
+                               'record_metering_data_batch') as record_batch:
+            self.dispatcher.record_metering_data(msgs[:2])
+            self.assertFalse(record_batch.called)
+            self.dispatcher.record_metering_data(msgs[2:])
+
+        record_batch.assert_called_once_with(msgs[:3])
+
+    @mock.patch('ceilometer.openstack.common.loopingcall.'
+                'FixedIntervalLoopingCall')
+    def test_batch_flush(self, looping_call):
+        self.CONF.set_override('batch_size', 10, group='dispatcher_database')
+        self.dispatcher = database.DatabaseDispatcher(self.CONF)
+        msgs = [self._make_msg(i) for i in range(2)]
+
+        with mock.patch.object(self.dispatcher.storage_conn,
+                               'record_metering_data_batch') as record_batch:
+            self.dispatcher.record_metering_data(msgs)
+            self.dispatcher.flush()
+            self.dispatcher.flush()
+
+        record_batch.assert_called_once_with(msgs)
+
+    @mock.patch('ceilometer.openstack.common.loopingcall.'
+                'FixedIntervalLoopingCall')
+    def test_batch_error(self, looping_call):
+        self.CONF.set_override('batch_size', 2, group='dispatcher_database')
+        self.dispatcher = database.DatabaseDispatcher(self.CONF)
+        msgs = [self._make_msg(i) for i in range(4)]
+
+        with mock.patch.object(self.dispatcher.storage_conn,
+                               'record_metering_data_batch',
+                               side_effect=[Exception('boom'), None]
+                               ) as record_batch:
+            self.dispatcher.record_metering_data(msgs)
+
+        self.assertEqual([mock.call(msgs[:2]), mock.call(msgs[2:])],
+                         record_batch.call_args_list)
@@ -16,8 +16,10 @@
 # under the License.
 """Tests for ceilometer/hardware/inspector/snmp/inspector.py
 """
+import mock
 from oslo.utils import netutils
 from oslotest import mockpatch
+from pyasn1.type import univ
 
 from ceilometer.hardware.inspector import snmp
 from ceilometer.tests import base as test_base
@@ -48,6 +50,30 @@ def faux_bulkCmd_new(authData, transportTarget, nonRepeaters, maxRepetitions,
     return (None, None, 0, varBindTable)
 
 
+def faux_asyncGetCmd(authData, transportTarget, varNames, cbInfo, **kwargs):
+    cbFun, cbCtx = cbInfo
+    varBinds = [(FakeObjectName(oid),
+                 int(oid.split('.')[-1])) for oid in varNames]
+    cbFun(None, None, 0, 0, varBinds, cbCtx)
+
+
+def faux_asyncBulkCmd(authData, transportTarget, nonRepeaters,
+                      maxRepetitions, varNames, cbInfo, **kwargs):
+    # two rows per GetBulkRequest, the tables having three rows each
+    cbFun, cbCtx = cbInfo
+    first = 1
+    while True:
+        varBindTable = [
+            [(univ.ObjectIdentifier(oid + ".%d" % i), i) if i <= 3 else
+             (univ.ObjectIdentifier(oid + "0"), univ.Null(''))
+             for oid in varNames]
+            for i in range(first, first + 2)
+        ]
+        if not cbFun(None, None, 0, 0, varBindTable, cbCtx):
+            break
+        first += 2
+
+
 class TestSNMPInspector(test_base.BaseTestCase):
     mapping = {
         'test_exact': {
@@ -143,3 +169,86 @@ class TestSNMPInspector(test_base.BaseTestCase):
         self.assertEqual(8, ret)
         self.assertIn('ip', metadata)
         self.assertIn("2", metadata['ip'])
+
+    def _patch_async(self, get_cmd, bulk_cmd):
+        cmd_gen = self.inspector._asynCmdGen
+        self.useFixture(mockpatch.PatchObject(
+            cmd_gen, 'asyncGetCmd', side_effect=get_cmd))
+        self.useFixture(mockpatch.PatchObject(
+            cmd_gen, 'asyncBulkCmd', side_effect=bulk_cmd))
+        self.useFixture(mockpatch.PatchObject(
+            cmd_gen.snmpEngine, 'transportDispatcher'))
+        return cmd_gen
+
+    def test_prefetch(self):
+        cmd_gen = self._patch_async(faux_asyncGetCmd, faux_asyncBulkCmd)
+        hosts = [(self.host, {}),
+                 (netutils.urlsplit("snmp://127.0.0.2"), {})]
+        self.inspector.prefetch(hosts)
+        self.assertEqual(2, cmd_gen.asyncGetCmd.call_count)
+        self.assertEqual(['1.3.6.1.4.1.2021.10.1.3.1',
+                          '1.3.6.1.4.1.2021.10.1.3.8'],
+                         cmd_gen.asyncGetCmd.call_args[0][2])
+        self.assertEqual(2, cmd_gen.asyncBulkCmd.call_count)
+        self.assertEqual([ins._interface_ip_oid,
+                          '1.3.6.1.4.1.2021.9.1.3',
+                          '1.3.6.1.4.1.2021.9.1.8'],
+                         cmd_gen.asyncBulkCmd.call_args[0][4])
+        dispatcher = cmd_gen.snmpEngine.transportDispatcher
+        dispatcher.runDispatcher.assert_called_once_with()
+        for host, cache in hosts:
+            keys = cache[ins._CACHE_KEY_OID].keys()
+            self.assertEqual(11, len(keys))
+            self.assertIn('1.3.6.1.4.1.2021.9.1.8.3', keys)
+            self.assertNotIn('1.3.6.1.4.1.2021.9.1.80', keys)
+
+    def test_prefetch_cache_used(self):
+        self._patch_async(faux_asyncGetCmd, faux_asyncBulkCmd)
+        cache = {}
+        self.inspector.prefetch([(self.host, cache)])
+        self.useFixture(mockpatch.PatchObject(
+            self.inspector, '_query_oids',
+            side_effect=AssertionError('no query expected')))
+        ret = list(self.inspector.inspect_generic(self.host,
+                                                  'test_prefix',
+                                                  cache))
+        self.assertEqual(3, len(ret))
+        ret = list(self.inspector.inspect_generic(self.host,
+                                                  'test_exact',
+                                                  cache))
+        self.assertEqual(1, len(ret))
+
+    def test_prefetch_skip_cached(self):
+        cmd_gen = self._patch_async(faux_asyncGetCmd, faux_asyncBulkCmd)
+        self.inspector.prefetch([(self.host, {ins._CACHE_KEY_OID: {}})])
+        self.assertFalse(cmd_gen.asyncGetCmd.called)
+        dispatcher = cmd_gen.snmpEngine.transportDispatcher
+        self.assertFalse(dispatcher.runDispatcher.called)
+
+    def test_prefetch_timeout(self):
+        def faux_timeout(authData, transportTarget, *args, **kwargs):
+            cbFun, cbCtx = args[-1]
+            cbFun(None, 'timeout', 0, 0, [], cbCtx)
+
+        self._patch_async(faux_timeout, faux_timeout)
+        query = self.useFixture(mockpatch.PatchObject(
+            self.inspector, '_query_oids')).mock
+        cache = {}
+        self.inspector.prefetch([(self.host, cache)])
+        self.assertRaises(snmp.SNMPException, list,
+                          self.inspector.inspect_generic(self.host,
+                                                         'test_exact',
+                                                         cache))
+        self.assertFalse(query.called)
+
+    def test_prefetch_bad_host(self):
+        cmd_gen = self._patch_async(faux_asyncGetCmd, faux_asyncBulkCmd)
+        self.useFixture(mockpatch.PatchObject(
+            self.inspector, '_get_transport',
+            side_effect=[Exception('bad host'), mock.DEFAULT]))
+        hosts = [(self.host, {}),
+                 (netutils.urlsplit("snmp://127.0.0.2"), {})]
+        self.inspector.prefetch(hosts)
+        self.assertIn(ins._CACHE_KEY_ERROR, hosts[0][1])
+        self.assertEqual(1, cmd_gen.asyncGetCmd.call_count)
+        self.assertEqual(11, len(hosts[1][1][ins._CACHE_KEY_OID]))
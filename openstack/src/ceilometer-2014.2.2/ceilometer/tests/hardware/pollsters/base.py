@@ -17,6 +17,7 @@
 
 import fixtures
 import mock
+from oslo.utils import netutils
 
 from ceilometer.central import manager
 from ceilometer.hardware.inspector import base as inspector_base
@@ -63,7 +64,10 @@ class TestPollsterBase(test_base.BaseTestCase):
         mgr = manager.AgentManager()
         pollster = factory()
         cache = {}
-        samples = list(pollster.get_samples(mgr, cache, self.hosts))
+        with mock.patch.object(FakeInspector, 'prefetch') as prefetch:
+            samples = list(pollster.get_samples(mgr, cache, self.hosts))
+        prefetch.assert_called_once_with(
+            [(netutils.urlsplit(host), {}) for host in self.hosts])
         self.assertTrue(samples)
         self.assertIn(pollster.CACHE_KEY, cache)
         for host in self.hosts:
@@ -18,6 +18,7 @@
 # under the License.
 
 import abc
+import copy
 import datetime
 import traceback
 
@@ -395,6 +396,20 @@ class BasePipelineTestCase(base.BaseTestCase):
         self.assertTrue(pipeline_manager.pipelines[0].
                         support_meter('instance'))
 
+    def test_wildcard_counters_match_whole_name(self):
+        counter_cfg = ['disk.*', 'cpu', 'instance:*']
+        self._set_pipeline_cfg('counters', counter_cfg)
+        pipeline_manager = pipeline.PipelineManager(self.pipeline_cfg,
+                                                    self.transformer_manager)
+        pipe = pipeline_manager.pipelines[0]
+        self.assertTrue(pipe.support_meter('disk.read.bytes'))
+        self.assertFalse(pipe.support_meter('diskXread'))
+        self.assertFalse(pipe.support_meter('cpu_util'))
+        self.assertFalse(pipe.support_meter('xcpu'))
+        self.assertTrue(pipe.support_meter('instance:m1.tiny'))
+        self.assertTrue(pipe.support_meter('instance:m1.tiny'))
+        self.assertFalse(pipe.support_meter('instance'))
+
     def test_multiple_pipeline(self):
         self._augment_pipeline_cfg()
 
@@ -477,6 +492,20 @@ class BasePipelineTestCase(base.BaseTestCase):
         self.assertEqual(1, publisher.calls)
         self.assertEqual('a', getattr(publisher.samples[0], 'name'))
 
+    def test_none_transformer_pipeline_multiple_meters(self):
+        self._set_pipeline_cfg('transformers', None)
+        self._set_pipeline_cfg('counters', ['a', 'b'])
+        pipeline_manager = pipeline.PipelineManager(self.pipeline_cfg,
+                                                    self.transformer_manager)
+        counter_b = copy.copy(self.test_counter)
+        counter_b.name = 'b'
+        with pipeline_manager.publisher(None) as p:
+            p([self.test_counter, counter_b, self.test_counter])
+        publisher = pipeline_manager.pipelines[0].publishers[0]
+        self.assertEqual(1, publisher.calls)
+        self.assertEqual(['a', 'b', 'a'],
+                         [s.name for s in publisher.samples])
+
     def test_empty_transformer_pipeline(self):
         self._set_pipeline_cfg('transformers', [])
         pipeline_manager = pipeline.PipelineManager(self.pipeline_cfg,
@@ -23,7 +23,12 @@
 
 """
 
+import datetime
+
+import mock
+
 from ceilometer.alarm.storage import impl_mongodb as impl_mongodb_alarm
+from ceilometer import storage
 from ceilometer.storage import base
 from ceilometer.storage import impl_mongodb
 from ceilometer.tests import base as test_base
@@ -110,6 +115,248 @@ class IndexTest(tests_db.TestBase):
         self.assertTrue(self.conn.db.meter.ensure_index('foo',
                                                         name='meter_ttl'))
 
+    def test_metadata_indexes(self):
+        self.CONF.set_override('indexed_metadata_keys',
+                               ['display_name', 'instance_type'],
+                               group='database')
+        self.conn.upgrade()
+        meter_indexes = self.conn.db.meter.index_information()
+        self.assertEqual([('resource_metadata.display_name', 1),
+                          ('counter_name', 1), ('timestamp', -1)],
+                         meter_indexes['meta_display_name_idx']['key'])
+        self.assertIn('meta_instance_type_idx', meter_indexes)
+        self.assertEqual([('metadata.display_name', 1)],
+                         self.conn.db.resource.index_information()
+                         ['meta_display_name_idx']['key'])
+
+        self.CONF.set_override('indexed_metadata_keys', ['instance_type'],
+                               group='database')
+        self.conn.upgrade()
+        self.assertNotIn('meta_display_name_idx',
+                         self.conn.db.meter.index_information())
+        self.assertNotIn('meta_display_name_idx',
+                         self.conn.db.resource.index_information())
+        self.assertIn('meta_instance_type_idx',
+                      self.conn.db.resource.index_information())
+
+
+class RollupPeriodTest(test_base.BaseTestCase):
+
+    def test_coarsest_dividing_period(self):
+        self.assertEqual(86400, impl_mongodb._choose_rollup_period(
+            86400 * 7, None, None))
+        self.assertEqual(3600, impl_mongodb._choose_rollup_period(
+            7200, None, None))
+        self.assertEqual(60, impl_mongodb._choose_rollup_period(
+            600, None, None))
+
+    def test_sub_minute_period(self):
+        self.assertIsNone(impl_mongodb._choose_rollup_period(30, None, None))
+        self.assertIsNone(impl_mongodb._choose_rollup_period(90, None, None))
+
+    def test_aligned_with_query(self):
+        start = datetime.datetime(2013, 8, 1, 10)
+        end = datetime.datetime(2013, 8, 2, 10, 30)
+        self.assertEqual(3600, impl_mongodb._choose_rollup_period(
+            None, start, None))
+        self.assertEqual(60, impl_mongodb._choose_rollup_period(
+            86400, start, end))
+        self.assertEqual(60, impl_mongodb._choose_rollup_period(
+            86400, start + datetime.timedelta(seconds=1), None))
+
+
+@tests_db.run_with('mongodb')
+class StatisticsRollupTest(test_storage_scenarios.DBTestBase):
+
+    def prepare_data(self):
+        self.CONF.set_override('mongodb_rollups', True, group='database')
+        self.mock_utcnow.return_value = datetime.datetime(2013, 8, 1)
+        start = datetime.datetime(2013, 8, 1, 10)
+        for i in range(100):
+            self.create_and_store_sample(
+                timestamp=start + datetime.timedelta(minutes=37 * i,
+                                                     seconds=i),
+                name='cpu_util', volume=i % 13,
+                resource_id='resource-%d' % (i % 3),
+                user_id='user-%d' % (i % 2))
+
+    def _compare(self, sample_filter, period=None, groupby=None):
+        def _stats():
+            # NOTE: The period of statistics computed without one is not
+            # defined by the raw samples path.
+            return sorted(
+                ((s.period_start, s.period_end) if period else None,
+                 s.count, s.sum, s.min, s.max,
+                 s.duration_start, s.duration_end, s.groupby)
+                for s in self.conn.get_meter_statistics(sample_filter,
+                                                        period=period,
+                                                        groupby=groupby))
+        with_rollups = _stats()
+        self.CONF.set_override('mongodb_rollups', False, group='database')
+        self.assertEqual(_stats(), with_rollups)
+        self.assertTrue(with_rollups)
+
+    def test_rollups_recorded(self):
+        self.assertEqual(3, len(self.conn.db.rollup.distinct('period')))
+
+    def test_aligned_periods(self):
+        self._compare(storage.SampleFilter(
+            meter='cpu_util', start=datetime.datetime(2013, 8, 1, 12),
+            end=datetime.datetime(2013, 8, 3)), period=3600)
+
+    def test_unaligned_periods(self):
+        self._compare(storage.SampleFilter(
+            meter='cpu_util', start=datetime.datetime(2013, 8, 1, 12, 3, 7),
+            end=datetime.datetime(2013, 8, 3, 1, 2)), period=7200,
+            groupby=['resource_id'])
+
+    def test_without_period(self):
+        self._compare(storage.SampleFilter(
+            meter='cpu_util', start=datetime.datetime(2013, 8, 1, 12, 3, 7),
+            resource='resource-1'), groupby=['user_id'])
+
+    def test_expired_samples(self):
+        # NOTE: Expire the raw samples the way the TTL index would, the
+        # rollups still covering them live until their last sample expires.
+        self.CONF.set_override('time_to_live', 86400, group='database')
+        self.mock_utcnow.return_value = datetime.datetime(2013, 8, 3, 9, 30)
+        self.conn.db.meter.remove(
+            {'timestamp': {'$lt': datetime.datetime(2013, 8, 2, 9, 30)}})
+        self._compare(storage.SampleFilter(
+            meter='cpu_util', start=datetime.datetime(2013, 8, 1)),
+            period=86400)
+
+
+@tests_db.run_with('mongodb')
+class StatisticsAggregationTest(test_storage_scenarios.DBTestBase):
+
+    def prepare_data(self):
+        self.mock_utcnow.return_value = datetime.datetime(2013, 8, 1)
+        start = datetime.datetime(2013, 8, 1, 10)
+        for i in range(50):
+            self.create_and_store_sample(
+                timestamp=start + datetime.timedelta(minutes=23 * i,
+                                                     seconds=i),
+                name='cpu_util', volume=i % 7,
+                resource_id='resource-%d' % (i % 3),
+                user_id='user-%d' % (i % 2))
+
+    def _compare(self, sample_filter, period=None, groupby=None):
+        def _stats(use_aggregation):
+            self.conn._use_aggregation = use_aggregation
+            return sorted(
+                ((s.period_start, s.period_end) if period else None,
+                 s.count, s.sum, s.min, s.max, s.avg,
+                 s.duration_start, s.duration_end, s.groupby)
+                for s in self.conn.get_meter_statistics(sample_filter,
+                                                        period=period,
+                                                        groupby=groupby))
+        pipeline = _stats(True)
+        self.assertEqual(_stats(False), pipeline)
+        self.assertTrue(pipeline)
+
+    def test_period(self):
+        self._compare(storage.SampleFilter(
+            meter='cpu_util', start=datetime.datetime(2013, 8, 1, 11, 3, 7)),
+            period=7200)
+
+    def test_period_groupby(self):
+        self._compare(storage.SampleFilter(meter='cpu_util'), period=3600,
+                      groupby=['resource_id', 'user_id'])
+
+    def test_without_period(self):
+        self._compare(storage.SampleFilter(meter='cpu_util',
+                                           resource='resource-1'),
+                      groupby=['user_id'])
+
+    def test_selectable_aggregates(self):
+        self.conn._use_aggregation = True
+        aggregates = [mock.Mock(func='stddev', param=None),
+                      mock.Mock(func='cardinality', param='user_id')]
+        results = list(self.conn.get_meter_statistics(
+            storage.SampleFilter(meter='cpu_util', resource='resource-1'),
+            aggregate=aggregates))
+        self.assertEqual(1, len(results))
+        volumes = [i % 7 for i in range(1, 50, 3)]
+        mean = float(sum(volumes)) / len(volumes)
+        stddev = (sum((v - mean) ** 2 for v in volumes) / len(volumes)) ** 0.5
+        self.assertAlmostEqual(stddev, results[0].aggregate['stddev'])
+        self.assertEqual(2, results[0].aggregate['cardinality/user_id'])
+        self.assertNotIn('count', results[0].as_dict())
+
+
+@tests_db.run_with('mongodb')
+class PartitionedSamplesTest(test_storage_scenarios.DBTestBase):
+
+    def prepare_data(self):
+        self.CONF.set_override('partition_samples', True, group='database')
+        self.mock_utcnow.return_value = datetime.datetime(2013, 8, 5, 12)
+        start = datetime.datetime(2013, 8, 1, 10)
+        for i in range(40):
+            self.create_and_store_sample(
+                timestamp=start + datetime.timedelta(hours=2 * i),
+                name='cpu_util', volume=i,
+                resource_id='resource-%d' % (i % 4))
+
+    def test_daily_collections(self):
+        self.assertEqual(['meter_20130801', 'meter_20130802',
+                          'meter_20130803', 'meter_20130804'],
+                         sorted(c.name for c in
+                                self.conn._partition_collections()))
+        self.assertEqual(0, self.conn.db.meter.count())
+
+    def test_get_samples(self):
+        results = list(self.conn.get_samples(
+            storage.SampleFilter(meter='cpu_util'), limit=15))
+        self.assertEqual(list(range(39, 24, -1)),
+                         [s.counter_volume for s in results])
+
+    def test_get_samples_pruned(self):
+        f = storage.SampleFilter(meter='cpu_util',
+                                 start=datetime.datetime(2013, 8, 2, 12),
+                                 end=datetime.datetime(2013, 8, 3))
+        self.assertEqual(['meter_20130803', 'meter_20130802'],
+                         [c.name for c in self.conn._partition_collections(
+                             impl_mongodb.pymongo_utils.make_query_from_filter(
+                                 f))])
+        self.assertEqual([18, 17, 16, 15, 14, 13],
+                         [s.counter_volume
+                          for s in self.conn.get_samples(f)])
+
+    def test_query_samples_orderby(self):
+        results = list(self.conn.query_samples(
+            orderby=[{'counter_volume': 'asc'}], limit=3))
+        self.assertEqual([0, 1, 2], [s.counter_volume for s in results])
+
+    def test_statistics(self):
+        results = list(self.conn.get_meter_statistics(
+            storage.SampleFilter(meter='cpu_util'), period=86400,
+            groupby=['resource_id']))
+        self.assertEqual(16, len(results))
+        self.assertEqual(40, sum(r.count for r in results))
+        self.assertEqual(sum(range(40)), sum(r.sum for r in results))
+        total = list(self.conn.get_meter_statistics(
+            storage.SampleFilter(meter='cpu_util')))[0]
+        self.assertEqual((40, 0, 39, 19.5),
+                         (total.count, total.min, total.max, total.avg))
+
+    def test_time_constrained_resources(self):
+        results = list(self.conn.get_resources(
+            start_timestamp=datetime.datetime(2013, 8, 2, 23),
+            end_timestamp=datetime.datetime(2013, 8, 3, 3)))
+        self.assertEqual(['resource-0', 'resource-3'],
+                         sorted(r.resource_id for r in results))
+
+    def test_clear_expired_metering_data(self):
+        self.conn.clear_expired_metering_data(3 * 86400)
+        self.assertEqual(['meter_20130802', 'meter_20130803',
+                          'meter_20130804'],
+                         sorted(c.name for c in
+                                self.conn._partition_collections()))
+        self.assertEqual(7, min(s.counter_volume for s in
+                                self.conn.get_samples(
+                                    storage.SampleFilter())))
+
 
 @tests_db.run_with('mongodb')
 class AlarmTestPagination(test_storage_scenarios.AlarmTestBase):
@@ -29,9 +29,11 @@ import mock
 from oslo.utils import timeutils
 
 from ceilometer.alarm.storage import impl_sqlalchemy as impl_sqla_alarm
+from ceilometer import storage
 from ceilometer.storage import impl_sqlalchemy
 from ceilometer.storage import models
 from ceilometer.storage.sqlalchemy import models as sql_models
+from ceilometer.storage.sqlalchemy import partitions
 from ceilometer.tests import base as test_base
 from ceilometer.tests import db as tests_db
 from ceilometer.tests.storage import test_storage_scenarios as scenarios
@@ -193,6 +195,121 @@ class RelationshipTest(scenarios.DBTestBase):
                                  ))
 
 
+@tests_db.run_with('sqlite')
+class IndexedMetadataTest(scenarios.DBTestBase):
+
+    def prepare_data(self):
+        self.CONF.set_override('indexed_metadata_keys', ['display_name'],
+                               group='database')
+        for i in range(6):
+            self.create_and_store_sample(
+                timestamp=datetime.datetime(2013, 8, 1, 10 + i),
+                resource_id='resource-%d' % i,
+                metadata={'display_name': 'server-%d' % (i % 2),
+                          'tag': 'tag-%d' % (i % 3),
+                          'size': i})
+        self.create_and_store_sample(
+            timestamp=datetime.datetime(2013, 8, 1, 16),
+            resource_id='resource-long',
+            metadata={'display_name': 'x' * 300, 'tag': 'tag-0'})
+
+    def _indexed(self):
+        session = self.conn._engine_facade.get_session()
+        return sorted((row.meta_key, row.value) for row in
+                      session.query(sql_models.MetaIndexed))
+
+    def test_metadata_indexed(self):
+        self.assertEqual([('display_name', 'server-0')] * 3 +
+                         [('display_name', 'server-1')] * 3,
+                         self._indexed())
+
+    def test_metaquery_filter_tables(self):
+        session = self.conn._engine_facade.get_session()
+        query = impl_sqlalchemy.apply_metaquery_filter(
+            session, session.query(sql_models.Resource),
+            {'metadata.display_name': 'server-0'})
+        self.assertIn('metadata_indexed', str(query))
+        self.assertNotIn('metadata_text', str(query))
+        query = impl_sqlalchemy.apply_metaquery_filter(
+            session, session.query(sql_models.Resource),
+            {'metadata.tag': 'tag-0'})
+        self.assertIn('metadata_text', str(query))
+        self.assertNotIn('metadata_indexed', str(query))
+
+    def test_get_samples(self):
+        results = list(self.conn.get_samples(storage.SampleFilter(
+            metaquery={'metadata.display_name': 'server-1'})))
+        self.assertEqual(['resource-1', 'resource-3', 'resource-5'],
+                         sorted(s.resource_id for s in results))
+        results = list(self.conn.get_samples(storage.SampleFilter(
+            metaquery={'metadata.display_name': 'x' * 300})))
+        self.assertEqual(['resource-long'], [s.resource_id for s in results])
+
+    def test_query_samples(self):
+        results = list(self.conn.query_samples(
+            {'and': [{'=': {'resource_metadata.display_name': 'server-0'}},
+                     {'=': {'resource_metadata.tag': 'tag-0'}}]}))
+        self.assertEqual(['resource-0'], [s.resource_id for s in results])
+        results = list(self.conn.query_samples(
+            {'or': [{'=': {'resource_metadata.display_name': 'server-0'}},
+                    {'>': {'resource_metadata.size': 3}}]}))
+        self.assertEqual(['resource-0', 'resource-2', 'resource-4',
+                          'resource-5'],
+                         sorted(s.resource_id for s in results))
+
+    def test_upgrade_indexes_configured_keys(self):
+        self.CONF.set_override('indexed_metadata_keys', ['tag'],
+                               group='database')
+        self.conn.upgrade()
+        self.assertEqual([('tag', 'tag-0')] * 3 + [('tag', 'tag-1')] * 2 +
+                         [('tag', 'tag-2')] * 2, self._indexed())
+        results = list(self.conn.get_resources(
+            metaquery={'metadata.tag': 'tag-2'}))
+        self.assertEqual(['resource-2', 'resource-5'],
+                         sorted(r.resource_id for r in results))
+
+        self.CONF.set_override('indexed_metadata_keys', [], group='database')
+        self.conn.upgrade()
+        self.assertEqual([], self._indexed())
+
+
+@tests_db.run_with('mysql')
+class PartitionedSamplesTest(scenarios.DBTestBase):
+
+    def prepare_data(self):
+        self.CONF.set_override('partition_samples', True, group='database')
+        self.CONF.set_override('time_to_live', 3 * 86400, group='database')
+        self.mock_utcnow.return_value = datetime.datetime(2013, 8, 5, 12)
+        start = datetime.datetime(2013, 8, 1, 10)
+        for i in range(40):
+            self.create_and_store_sample(
+                timestamp=start + datetime.timedelta(hours=2 * i),
+                name='cpu_util', volume=i,
+                resource_id='resource-%d' % (i % 4))
+        self.conn.upgrade()
+
+    def _partition_names(self):
+        return [name for name, _bound in partitions.get_partitions(
+            self.conn._engine_facade.get_engine())]
+
+    def test_partitions(self):
+        self.assertEqual(['p201308%02d' % day for day in range(2, 13)] +
+                         ['pmax'], self._partition_names())
+        self.assertEqual(40, len(list(self.conn.get_samples(
+            storage.SampleFilter(meter='cpu_util')))))
+
+    def test_clear_expired_metering_data(self):
+        self.mock_utcnow.return_value = datetime.datetime(2013, 8, 6, 12)
+        self.conn.clear_expired_metering_data(3 * 86400)
+        self.assertEqual(['p201308%02d' % day for day in range(3, 14)] +
+                         ['pmax'], self._partition_names())
+        results = list(self.conn.get_samples(
+            storage.SampleFilter(meter='cpu_util')))
+        self.assertEqual(21, len(results))
+        self.assertEqual(19, min(s.counter_volume for s in results))
+        self.assertEqual(4, len(list(self.conn.get_resources())))
+
+
 class CapabilitiesTest(test_base.BaseTestCase):
     # Check the returned capabilities list, which is specific to each DB
     # driver
@@ -690,6 +690,51 @@ class RawSampleTest(DBTestBase,
         self.assertEqual(len(results), 2)
 
 
+class RecordMeteringDataBatchTest(DBTestBase,
+                                  tests_db.MixinTestsWithBackendScenarios):
+
+    def prepare_data(self):
+        self.msgs = []
+        for i, (resource_id, minute, tag) in enumerate([
+                ('resource-id', 40, 'first'),
+                ('resource-id', 42, 'last'),
+                ('resource-id', 41, 'middle'),
+                ('resource-id-2', 40, 'other')]):
+            s = sample.Sample(
+                'instance' if i % 2 else 'cpu', sample.TYPE_CUMULATIVE,
+                unit='', volume=i, user_id='user-id',
+                project_id='project-id', resource_id=resource_id,
+                timestamp=datetime.datetime(2012, 7, 2, 10, minute),
+                resource_metadata={'tag': tag}, source='test')
+            self.msgs.append(utils.meter_message_from_counter(
+                s, self.CONF.publisher.metering_secret))
+        self.conn.record_metering_data_batch(self.msgs)
+
+    def test_samples(self):
+        results = list(self.conn.get_samples(storage.SampleFilter()))
+        self.assertEqual(sorted(msg['message_id'] for msg in self.msgs),
+                         sorted(r.message_id for r in results))
+
+    def test_resources(self):
+        resources = dict((r.resource_id, r)
+                         for r in self.conn.get_resources())
+        self.assertEqual(set(['resource-id', 'resource-id-2']),
+                         set(resources))
+        resource = resources['resource-id']
+        self.assertEqual('last', resource.metadata['tag'])
+        self.assertEqual(datetime.datetime(2012, 7, 2, 10, 40),
+                         resource.first_sample_timestamp)
+        self.assertEqual(datetime.datetime(2012, 7, 2, 10, 42),
+                         resource.last_sample_timestamp)
+
+    def test_meters(self):
+        meters = set((m.name, m.resource_id)
+                     for m in self.conn.get_meters())
+        self.assertEqual(set([('cpu', 'resource-id'),
+                              ('instance', 'resource-id'),
+                              ('instance', 'resource-id-2')]), meters)
+
+
 class ComplexSampleQueryTest(DBTestBase,
                              tests_db.MixinTestsWithBackendScenarios):
     def setUp(self):
@@ -108,11 +108,14 @@ class TestCollector(tests_base.BaseTestCase):
             return_value=fake_dispatcher))
         return plugin
 
-    def _make_fake_socket(self, sample):
+    def _make_fake_socket(self, *samples):
+        datagrams = [msgpack.dumps(s) for s in samples]
+
         def recvfrom(size):
-            # Make the loop stop
-            self.srv.stop()
-            return msgpack.dumps(sample), ('127.0.0.1', 12345)
+            if len(datagrams) == 1:
+                # Make the loop stop
+                self.srv.stop()
+            return datagrams.pop(0), ('127.0.0.1', 12345)
 
         sock = mock.Mock()
         sock.recvfrom = recvfrom
@@ -120,8 +123,11 @@ class TestCollector(tests_base.BaseTestCase):
 
     def _verify_udp_socket(self, udp_socket):
         conf = self.CONF.collector
-        udp_socket.setsockopt.assert_called_once_with(socket.SOL_SOCKET,
-                                                      socket.SO_REUSEADDR, 1)
+        udp_socket.setsockopt.assert_any_call(socket.SOL_SOCKET,
+                                              socket.SO_REUSEADDR, 1)
+        if hasattr(socket, 'SO_REUSEPORT'):
+            udp_socket.setsockopt.assert_any_call(socket.SOL_SOCKET,
+                                                  socket.SO_REUSEPORT, 1)
         udp_socket.bind.assert_called_once_with((conf.udp_address,
                                                  conf.udp_port))
 
@@ -149,7 +155,7 @@ class TestCollector(tests_base.BaseTestCase):
         self._verify_udp_socket(udp_socket)
 
         mock_dispatcher.record_metering_data.assert_called_once_with(
-            self.counter)
+            [self.counter])
 
     def test_udp_receive_storage_error(self):
         self._setup_messaging(False)
@@ -169,7 +175,7 @@ class TestCollector(tests_base.BaseTestCase):
         self._verify_udp_socket(udp_socket)
 
         mock_dispatcher.record_metering_data.assert_called_once_with(
-            self.counter)
+            [self.counter])
 
     @staticmethod
     def _raise_error():
@@ -186,8 +192,9 @@ class TestCollector(tests_base.BaseTestCase):
         self._verify_udp_socket(udp_socket)
 
     @mock.patch.object(oslo.messaging.MessageHandlingServer, 'start')
+    @mock.patch.object(collector.CollectorService, 'dispatch_udp')
     @mock.patch.object(collector.CollectorService, 'start_udp')
-    def test_only_udp(self, udp_start, rpc_start):
+    def test_only_udp(self, udp_start, udp_dispatch, rpc_start):
         """Check that only UDP is started if messaging transport is unset."""
         self._setup_messaging(False)
         udp_socket = self._make_fake_socket(self.counter)
@@ -195,16 +202,19 @@ class TestCollector(tests_base.BaseTestCase):
             self.srv.start()
             self.assertEqual(0, rpc_start.call_count)
             self.assertEqual(1, udp_start.call_count)
+            self.assertEqual(1, udp_dispatch.call_count)
 
     @mock.patch.object(oslo.messaging.MessageHandlingServer, 'start')
+    @mock.patch.object(collector.CollectorService, 'dispatch_udp')
     @mock.patch.object(collector.CollectorService, 'start_udp')
-    def test_only_rpc(self, udp_start, rpc_start):
+    def test_only_rpc(self, udp_start, udp_dispatch, rpc_start):
         """Check that only RPC is started if udp_address is empty."""
         self.CONF.set_override('udp_address', '', group='collector')
         self.srv.start()
         # two calls because two servers (notification and rpc)
         self.assertEqual(2, rpc_start.call_count)
         self.assertEqual(0, udp_start.call_count)
+        self.assertEqual(0, udp_dispatch.call_count)
 
     def test_udp_receive_valid_encoding(self):
         self._setup_messaging(False)
@@ -214,9 +224,67 @@ class TestCollector(tests_base.BaseTestCase):
                         return_value=self._make_fake_socket(self.utf8_msg)):
             self.srv.start()
             self.assertTrue(utils.verify_signature(
-                mock_dispatcher.method_calls[0][1][0],
+                mock_dispatcher.record_metering_data.call_args[0][0][0],
                 "not-so-secret"))
 
+    def _make_udp_samples(self, count):
+        samples = []
+        for i in range(count):
+            s = dict(self.counter, resource_id='cat-%d' % i)
+            samples.append(s)
+        return samples
+
+    def test_udp_receive_batches(self):
+        self._setup_messaging(False)
+        self.CONF.set_override('udp_batch_size', 2, group='collector')
+        mock_dispatcher = self._setup_fake_dispatcher()
+        samples = self._make_udp_samples(5)
+        with mock.patch('socket.socket',
+                        return_value=self._make_fake_socket(*samples)):
+            self.srv.start()
+
+        self.assertEqual([mock.call(samples[0:2]), mock.call(samples[2:4]),
+                          mock.call(samples[4:])],
+                         mock_dispatcher.record_metering_data.call_args_list)
+        self.assertEqual(5, self.srv.udp_stats['received'])
+        self.assertEqual(0, self.srv.udp_stats['dropped'])
+        self.assertEqual(5, self.srv.udp_stats['dispatched'])
+        self.assertEqual(3, self.srv.udp_stats['batches'])
+
+    def test_udp_receive_queue_full(self):
+        self._setup_messaging(False)
+        self.CONF.set_override('udp_queue_size', 2, group='collector')
+        mock_dispatcher = self._setup_fake_dispatcher()
+        samples = self._make_udp_samples(5)
+        with mock.patch('socket.socket',
+                        return_value=self._make_fake_socket(*samples)):
+            self.srv.start()
+
+        # The queued samples are dispatched when the collector stops, before
+        # the last one is received.
+        self.assertEqual([mock.call(samples[0:2]), mock.call(samples[4:])],
+                         mock_dispatcher.record_metering_data.call_args_list)
+        self.assertEqual(5, self.srv.udp_stats['received'])
+        self.assertEqual(2, self.srv.udp_stats['dropped'])
+
+    @mock.patch.object(collector, 'LOG')
+    def test_log_udp_stats(self, mylog):
+        self._setup_messaging(False)
+        self._setup_fake_dispatcher()
+        samples = self._make_udp_samples(3)
+        with mock.patch('socket.socket',
+                        return_value=self._make_fake_socket(*samples)):
+            self.srv.start()
+
+        self.srv.log_udp_stats()
+        stats = mylog.info.call_args[0][1]
+        self.assertEqual(3, stats['received'])
+        self.assertEqual(0, stats['dropped'])
+        self.assertEqual(3, stats['dispatched'])
+        self.assertEqual(2, stats['batches'])
+        self.assertEqual(0, stats['queued'])
+        self.assertEqual(0, self.srv.udp_stats['received'])
+
     @mock.patch('ceilometer.storage.impl_log.LOG')
     def test_collector_no_mock(self, mylog):
         self.CONF.set_override('udp_address', '', group='collector')
@@ -233,8 +301,9 @@ class TestCollector(tests_base.BaseTestCase):
             'metering data test for test_run_tasks: 1')
 
     @mock.patch.object(oslo.messaging.MessageHandlingServer, 'start')
+    @mock.patch.object(collector.CollectorService, 'dispatch_udp')
     @mock.patch.object(collector.CollectorService, 'start_udp')
-    def test_collector_requeue(self, udp_start, rpc_start):
+    def test_collector_requeue(self, udp_start, udp_dispatch, rpc_start):
         self.CONF.set_override('requeue_sample_on_dispatcher_error', True,
                                group='collector')
         self.srv.start()
@@ -245,8 +314,9 @@ class TestCollector(tests_base.BaseTestCase):
                              ret)
 
     @mock.patch.object(oslo.messaging.MessageHandlingServer, 'start')
+    @mock.patch.object(collector.CollectorService, 'dispatch_udp')
     @mock.patch.object(collector.CollectorService, 'start_udp')
-    def test_collector_no_requeue(self, udp_start, rpc_start):
+    def test_collector_no_requeue(self, udp_start, udp_dispatch, rpc_start):
         self.CONF.set_override('requeue_sample_on_dispatcher_error', False,
                                group='collector')
         self.srv.start()
@@ -96,6 +96,17 @@ class TestNovaClient(base.BaseTestCase):
         self.assertEqual(11, instances[0].kernel_id)
         self.assertEqual(21, instances[0].ramdisk_id)
 
+    def test_instance_get_all_by_host_since(self):
+        with mock.patch.object(self.nv.nova_client.servers, 'list',
+                               side_effect=self.fake_servers_list) as lst:
+            self.nv.instance_get_all_by_host('foobar',
+                                             '2014-10-01T10:00:00Z')
+
+        lst.assert_called_once_with(
+            detailed=True,
+            search_opts={'host': 'foobar', 'all_tenants': True,
+                         'changes-since': '2014-10-01T10:00:00Z'})
+
     def test_instance_get_all(self):
         with mock.patch.object(self.nv.nova_client.servers, 'list',
                                side_effect=self.fake_servers_list):
@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Compare the MongoDB statistics implementations on a synthetic dataset.
+
+Loads a synthetic set of samples of a single meter into the configured
+MongoDB metering database, then times get_meter_statistics() for a few
+typical queries with the aggregation pipeline and with map_reduce.
+
+Usage:
+
+source .tox/py27/bin/activate
+./tools/benchmark_mongodb_statistics.py --samples 50000000
+./tools/benchmark_mongodb_statistics.py --skip-load --repeat 5
+"""
+from __future__ import print_function
+
+import argparse
+import datetime
+import random
+import time
+import uuid
+
+from oslo.config import cfg
+
+from ceilometer import storage
+
+
+METER = 'benchmark.statistics'
+
+
+def load_samples(conn, samples, resources, days, batch_size):
+    end = datetime.datetime.utcnow().replace(microsecond=0)
+    start = end - datetime.timedelta(days=days)
+    step = days * 86400.0 / samples
+    users = ['user-%d' % i for i in range(max(resources // 10, 1))]
+
+    print('Adding %d samples of %s over %d resources.' %
+          (samples, METER, resources))
+    began = time.time()
+    batch = []
+    for n in range(samples):
+        resource = n % resources
+        batch.append({
+            'counter_name': METER,
+            'counter_type': 'gauge',
+            'counter_unit': '%',
+            'counter_volume': random.uniform(0, 100),
+            'user_id': users[resource % len(users)],
+            'project_id': 'project-%d' % (resource % 10),
+            'resource_id': 'resource-%d' % resource,
+            'source': 'benchmark',
+            'timestamp': start + datetime.timedelta(seconds=n * step),
+            'resource_metadata': {},
+            'message_id': str(uuid.uuid4()),
+            'message_signature': '',
+        })
+        if len(batch) >= batch_size:
+            conn.db.meter.insert(batch)
+            batch = []
+    if batch:
+        conn.db.meter.insert(batch)
+    print('Added %d samples in %.1fs.' % (samples, time.time() - began))
+
+
+def run_query(conn, use_aggregation, repeat, sample_filter, **kwargs):
+    conn._use_aggregation = use_aggregation
+    timings = []
+    for i in range(repeat):
+        began = time.time()
+        results = list(conn.get_meter_statistics(sample_filter, **kwargs))
+        timings.append(time.time() - began)
+    return min(timings), len(results)
+
+
+def main():
+    cfg.CONF([], project='ceilometer')
+
+    parser = argparse.ArgumentParser(
+        description='benchmark MongoDB meter statistics',
+    )
+    parser.add_argument(
+        '--samples',
+        default=50000000,
+        type=int,
+        help='The number of samples to generate.',
+    )
+    parser.add_argument(
+        '--resources',
+        default=1000,
+        type=int,
+        help='The number of resources the samples are spread over.',
+    )
+    parser.add_argument(
+        '--days',
+        default=30,
+        type=int,
+        help='The number of days in the past the samples start at.',
+    )
+    parser.add_argument(
+        '--batch-size',
+        default=10000,
+        type=int,
+        help='The number of samples inserted at once.',
+    )
+    parser.add_argument(
+        '--repeat',
+        default=3,
+        type=int,
+        help='The number of runs of each query, the best one is reported.',
+    )
+    parser.add_argument(
+        '--skip-load',
+        action='store_true',
+        help='Reuse the samples loaded by a previous run.',
+    )
+    args = parser.parse_args()
+
+    conn = storage.get_connection_from_config(cfg.CONF)
+    if not hasattr(conn, '_use_aggregation'):
+        parser.error('the metering database is not MongoDB')
+    if not conn._use_aggregation:
+        parser.error('the aggregation pipeline needs MongoDB 2.6')
+    # NOTE: Both implementations are compared on the raw samples.
+    cfg.CONF.set_override('mongodb_rollups', False, group='database')
+
+    if not args.skip_load:
+        conn.upgrade()
+        load_samples(conn, args.samples, args.resources, args.days,
+                     args.batch_size)
+
+    end = datetime.datetime.utcnow()
+    start = end - datetime.timedelta(days=args.days)
+    queries = [
+        ('whole meter', storage.SampleFilter(meter=METER), {}),
+        ('hourly', storage.SampleFilter(meter=METER, start=start, end=end),
+         {'period': 3600}),
+        ('daily by resource',
+         storage.SampleFilter(meter=METER, start=start, end=end),
+         {'period': 86400, 'groupby': ['resource_id']}),
+        ('one resource hourly',
+         storage.SampleFilter(meter=METER, resource='resource-0',
+                              start=start, end=end),
+         {'period': 3600}),
+    ]
+
+    print('%-22s %12s %12s %8s %8s' %
+          ('query', 'map_reduce', 'pipeline', 'speedup', 'rows'))
+    for name, sample_filter, kwargs in queries:
+        mr_time, rows = run_query(conn, False, args.repeat, sample_filter,
+                                  **kwargs)
+        agg_time, agg_rows = run_query(conn, True, args.repeat,
+                                       sample_filter, **kwargs)
+        if rows != agg_rows:
+            print('%s: map_reduce returned %d rows, pipeline %d' %
+                  (name, rows, agg_rows))
+        print('%-22s %11.2fs %11.2fs %7.1fx %8d' %
+              (name, mr_time, agg_time, mr_time / agg_time, agg_rows))
+
+    return 0
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Measure the number of samples per second going through the pipelines.
+
+Loads the pipelines of a pipeline definition file with setup_pipeline(),
+its publishers being replaced by in-memory test publishers, then pushes
+synthetic samples of typical compute meters through them the way the
+agents do, a batch of samples per publisher context.
+
+Usage:
+
+source .tox/py27/bin/activate
+./tools/benchmark_pipeline.py --samples 200000
+./tools/benchmark_pipeline.py --pipeline-cfg-file pipeline.yaml \\
+    --batch-size 1
+"""
+from __future__ import print_function
+
+import argparse
+import datetime
+import os
+import tempfile
+import time
+
+from oslo.config import cfg
+import yaml
+
+from ceilometer import pipeline
+from ceilometer import sample
+
+
+METERS = [
+    ('cpu', sample.TYPE_CUMULATIVE, 'ns'),
+    ('memory', sample.TYPE_GAUGE, 'MB'),
+    ('vcpus', sample.TYPE_GAUGE, 'vcpu'),
+    ('instance', sample.TYPE_GAUGE, 'instance'),
+    ('instance:m1.small', sample.TYPE_GAUGE, 'instance'),
+    ('disk.read.bytes', sample.TYPE_CUMULATIVE, 'B'),
+    ('disk.read.requests', sample.TYPE_CUMULATIVE, 'request'),
+    ('disk.write.bytes', sample.TYPE_CUMULATIVE, 'B'),
+    ('disk.write.requests', sample.TYPE_CUMULATIVE, 'request'),
+    ('network.incoming.bytes', sample.TYPE_CUMULATIVE, 'B'),
+    ('network.incoming.packets', sample.TYPE_CUMULATIVE, 'packet'),
+    ('network.outgoing.bytes', sample.TYPE_CUMULATIVE, 'B'),
+    ('network.outgoing.packets', sample.TYPE_CUMULATIVE, 'packet'),
+    ('image.size', sample.TYPE_GAUGE, 'B'),
+    ('storage.objects', sample.TYPE_GAUGE, 'object'),
+]
+
+
+def make_samples(count, resources):
+    start = datetime.datetime.utcnow()
+    samples = []
+    for n in range(count):
+        name, meter_type, unit = METERS[n % len(METERS)]
+        timestamp = start + datetime.timedelta(seconds=n)
+        samples.append(sample.Sample(
+            name=name,
+            type=meter_type,
+            unit=unit,
+            volume=n,
+            user_id='user',
+            project_id='project',
+            resource_id='resource-%d' % (n // len(METERS) % resources),
+            timestamp=timestamp.isoformat(),
+            resource_metadata={'cpu_number': 1},
+        ))
+    return samples
+
+
+def load_pipeline(cfg_file):
+    # publish in memory only
+    with open(cfg_file) as f:
+        pipeline_cfg = yaml.safe_load(f)
+    if 'sinks' in pipeline_cfg:
+        sinks = pipeline_cfg['sinks']
+    else:
+        sinks = pipeline_cfg
+    for sink in sinks:
+        sink['publishers'] = ['test://']
+
+    fd, path = tempfile.mkstemp(suffix='.yaml')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            yaml.safe_dump(pipeline_cfg, f)
+        cfg.CONF.set_override('pipeline_cfg_file', path)
+        return pipeline.setup_pipeline()
+    finally:
+        os.unlink(path)
+
+
+def run(pipeline_manager, samples, batch_size):
+    began = time.time()
+    for i in range(0, len(samples), batch_size):
+        with pipeline_manager.publisher(None) as p:
+            p(samples[i:i + batch_size])
+    return time.time() - began
+
+
+def main():
+    cfg.CONF([], project='ceilometer')
+
+    parser = argparse.ArgumentParser(
+        description='benchmark the samples throughput of the pipelines',
+    )
+    parser.add_argument(
+        '--pipeline-cfg-file',
+        default=os.path.join(os.path.dirname(__file__), os.pardir,
+                             'etc', 'ceilometer', 'pipeline.yaml'),
+        help='The pipeline definition file to load.',
+    )
+    parser.add_argument(
+        '--samples',
+        default=100000,
+        type=int,
+        help='The number of samples to push through the pipelines.',
+    )
+    parser.add_argument(
+        '--resources',
+        default=1000,
+        type=int,
+        help='The number of resources the samples are spread over.',
+    )
+    parser.add_argument(
+        '--batch-size',
+        default=100,
+        type=int,
+        help='The number of samples published within a publisher context.',
+    )
+    parser.add_argument(
+        '--repeat',
+        default=3,
+        type=int,
+        help='The number of runs, the best one is reported.',
+    )
+    args = parser.parse_args()
+
+    samples = make_samples(args.samples, args.resources)
+    timings = []
+    for i in range(args.repeat):
+        # new pipelines for each run, the transformers keeping state
+        pipeline_manager = load_pipeline(args.pipeline_cfg_file)
+        timings.append(run(pipeline_manager, samples, args.batch_size))
+    published = sum(len(publisher.samples)
+                    for p in pipeline_manager.pipelines
+                    for publisher in p.publishers)
+
+    best = min(timings)
+    print('%d pipelines, %d samples in batches of %d, %d published' %
+          (len(pipeline_manager.pipelines), len(samples), args.batch_size,
+           published))
+    print('%.2fs, %.0f samples/s, %.1fus/sample' %
+          (best, len(samples) / best, best * 1000000 / len(samples)))
+
+    return 0
+
+if __name__ == '__main__':
+    main()
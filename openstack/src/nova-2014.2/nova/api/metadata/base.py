@@ -23,6 +23,7 @@ import posixpath
 from oslo.config import cfg
 
 from nova.api.ec2 import ec2utils
+from nova.api.metadata import cache as metadata_cache
 from nova.api.metadata import password
 from nova import block_device
 from nova.compute import flavors
@@ -324,7 +325,7 @@ class InstanceMetadata():
         metadata['availability_zone'] = self.availability_zone
 
         if self._check_os_version(GRIZZLY, version):
-            metadata['random_seed'] = base64.b64encode(os.urandom(512))
+            metadata['random_seed'] = random_seed()
 
         self.set_mimetype(MIME_TYPE_APPLICATION_JSON)
         return jsonutils.dumps(metadata)
@@ -376,24 +377,12 @@ class InstanceMetadata():
                            CONF.dhcp_domain)
 
     def lookup(self, path):
-        if path == "" or path[0] != "/":
-            path = posixpath.normpath("/" + path)
-        else:
-            path = posixpath.normpath(path)
+        path = normalize_path(path)
+        path_tokens = path.split('/')[1:]
 
         # Set default mimeType. It will be modified only if there is a change
         self.set_mimetype(MIME_TYPE_TEXT_PLAIN)
 
-        # fix up requests, prepending /ec2 to anything that does not match
-        path_tokens = path.split('/')[1:]
-        if path_tokens[0] not in ("ec2", "openstack"):
-            if path_tokens[0] == "":
-                # request for /
-                path_tokens = ["ec2"]
-            else:
-                path_tokens = ["ec2"] + path_tokens
-            path = "/" + "/".join(path_tokens)
-
         # all values of 'path' input starts with '/' and have no trailing /
 
         # specifically handle the top level request
@@ -504,6 +493,41 @@ class VendorDataDriver(object):
         return self._data
 
 
+def normalize_path(path):
+    """Return the canonical form of a metadata request path."""
+    if path == "" or path[0] != "/":
+        path = posixpath.normpath("/" + path)
+    else:
+        path = posixpath.normpath(path)
+
+    # fix up requests, prepending /ec2 to anything that does not match
+    path_tokens = path.split('/')[1:]
+    if path_tokens[0] not in ("ec2", "openstack"):
+        if path_tokens[0] == "":
+            # request for /
+            path_tokens = ["ec2"]
+        else:
+            path_tokens = ["ec2"] + path_tokens
+        path = "/" + "/".join(path_tokens)
+    return path
+
+
+def render_metadata(meta_data, built_at=None):
+    """Render every response of an InstanceMetadata for the cache."""
+    return metadata_cache.RenderedMetadata.render(
+        meta_data, ec2_md_print, normalize_path, built_at=built_at)
+
+
+def random_seed():
+    return base64.b64encode(os.urandom(512))
+
+
+def get_instance_uuid_by_address(address):
+    ctxt = context.get_admin_context()
+    fixed_ip = network.API().get_fixed_ip_by_address(ctxt, address)
+    return fixed_ip['instance_uuid']
+
+
 def get_metadata_by_address(conductor_api, address):
     ctxt = context.get_admin_context()
     fixed_ip = network.API().get_fixed_ip_by_address(ctxt, address)
@@ -0,0 +1,227 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Shared cache of rendered instance metadata.
+
+In precompute mode the metadata service renders every path of an instance's
+metadata tree (EC2, OpenStack and vendor data) in one go and stores the
+rendered responses in memcached, where all metadata API workers find them.
+Instance updates mark the rendered tree stale. A stale tree keeps being
+served for a short while as it is rebuilt in the background.
+"""
+
+import time
+
+from oslo.config import cfg
+import six
+
+from nova.openstack.common import jsonutils
+from nova.openstack.common import memorycache
+
+metadata_cache_opts = [
+    cfg.BoolOpt('metadata_precompute',
+                default=False,
+                help='Render the whole metadata tree of an instance at once '
+                     'and serve it from the memcached_servers shared by the '
+                     'metadata API workers. Must also be set on the '
+                     'services updating instances, such as nova-conductor '
+                     'and nova-api, for their updates to refresh the tree'),
+    cfg.IntOpt('metadata_precompute_expiration',
+               default=600,
+               help='Number of seconds a rendered metadata tree is kept. '
+                    'Without memcached_servers, updates made by other '
+                    'services cannot reach the cache of the metadata API, '
+                    'so trees are only kept for 15 seconds'),
+    cfg.IntOpt('metadata_stale_seconds',
+               default=30,
+               help='Number of seconds after an instance update during '
+                    'which its previous metadata tree is still served '
+                    'while the new one is rendered'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(metadata_cache_opts)
+CONF.import_opt('memcached_servers', 'nova.openstack.common.memorycache')
+
+MC = None
+
+# Number of seconds a rendered tree is kept in a process local cache, which
+# instance updates made by other services do not invalidate
+LOCAL_EXPIRATION = 15
+
+# Paths whose responses depend on the request rather than on the instance
+DYNAMIC_PATHS = ('password',)
+
+
+def _get_cache():
+    global MC
+
+    if MC is None:
+        MC = memorycache.get_client()
+
+    return MC
+
+
+def _tree_expiration():
+    if CONF.memcached_servers:
+        return CONF.metadata_precompute_expiration
+    return min(CONF.metadata_precompute_expiration, LOCAL_EXPIRATION)
+
+
+def _tree_key(instance_uuid, address):
+    return 'metadata-tree-%s-%s' % (instance_uuid, address)
+
+
+def _invalid_key(instance_uuid):
+    return 'metadata-invalid-%s' % instance_uuid
+
+
+def _address_key(address):
+    return 'metadata-uuid-%s' % address
+
+
+def invalidate(instance_uuid):
+    """Mark the rendered metadata of an instance stale."""
+    if not CONF.metadata_precompute or not instance_uuid:
+        return
+    _get_cache().set(_invalid_key(instance_uuid), time.time(),
+                     CONF.metadata_precompute_expiration)
+
+
+def get_instance_uuid(address):
+    return _get_cache().get(_address_key(address))
+
+
+def set_instance_uuid(address, instance_uuid, expiration):
+    _get_cache().set(_address_key(address), instance_uuid, expiration)
+
+
+def is_dynamic(path):
+    """Whether a path must be served from a live InstanceMetadata."""
+    return path.rsplit('/', 1)[-1] in DYNAMIC_PATHS
+
+
+class RenderedMetadata(object):
+    """Every response of an instance's metadata tree, rendered.
+
+    Responses are kept by normalized path as (mimetype, body index), with
+    identical bodies, such as the user data of every version, stored once.
+    """
+
+    def __init__(self, paths, bodies, seeded, project_id, built_at=None):
+        self.paths = paths
+        self.bodies = bodies
+        self.seeded = seeded
+        self.project_id = project_id
+        self.built_at = built_at or time.time()
+
+    @classmethod
+    def render(cls, meta_data, print_fn, normalize_fn, built_at=None):
+        """Render all the paths of an InstanceMetadata.
+
+        :param print_fn: renders a looked up value as a response body
+        :param normalize_fn: returns the normalized form of a path
+        :param built_at: time the instance was read at, defaults to now
+        """
+        paths = {}
+        bodies = []
+        body_index = {}
+        seeded = set()
+
+        def _add(path, mimetype, body):
+            if body not in body_index:
+                body_index[body] = len(bodies)
+                bodies.append(body)
+            paths[normalize_fn(path)] = (mimetype, body_index[body])
+
+        def _walk(path):
+            try:
+                data = meta_data.lookup(path)
+            except Exception:
+                return
+            if callable(data):
+                return
+            mimetype = meta_data.get_mimetype()
+
+            if path.endswith('/meta_data.json'):
+                # NOTE: The random seed must differ on every request, so it
+                # is added back when serving.
+                md = jsonutils.loads(data)
+                if md.pop('random_seed', None) is not None:
+                    seeded.add(normalize_fn(path))
+                    data = jsonutils.dumps(md)
+
+            _add(path, mimetype, print_fn(data))
+
+            if isinstance(data, dict):
+                children = [k for k in data if k != '_name']
+            elif isinstance(data, list):
+                children = [c for c in data
+                            if isinstance(c, six.string_types) and
+                            '/' not in c]
+            else:
+                children = []
+            for child in children:
+                _walk('%s/%s' % (path, child))
+
+        _walk('/ec2')
+        _walk('/openstack')
+        for key in meta_data.content:
+            _walk('/openstack/content/%s' % key)
+        return cls(paths, bodies, seeded, meta_data.instance['project_id'],
+                   built_at=built_at)
+
+    def get(self, path, random_seed_fn):
+        """Return (mimetype, body) for a normalized path, or None."""
+        try:
+            mimetype, index = self.paths[path]
+        except KeyError:
+            return None
+        body = self.bodies[index]
+        if path in self.seeded:
+            body = '%s, "random_seed": "%s"}' % (body[:-1], random_seed_fn())
+        return mimetype, body
+
+    def store(self, instance_uuid, address):
+        _get_cache().set(_tree_key(instance_uuid, address),
+                         {'paths': self.paths, 'bodies': self.bodies,
+                          'seeded': self.seeded,
+                          'project_id': self.project_id,
+                          'built_at': self.built_at},
+                         _tree_expiration())
+
+    @classmethod
+    def load(cls, instance_uuid, address):
+        """Return (rendered, stale), rendered being None on a miss.
+
+        stale is True for a tree rendered before the last update of the
+        instance, but still within metadata_stale_seconds of that update.
+        """
+        cache = _get_cache()
+        value = cache.get(_tree_key(instance_uuid, address))
+        if not value:
+            return None, False
+        rendered = cls(value['paths'], value['bodies'], value['seeded'],
+                       value['project_id'], built_at=value['built_at'])
+        invalid_at = cache.get(_invalid_key(instance_uuid))
+        if not invalid_at or invalid_at < rendered.built_at:
+            return rendered, False
+        if time.time() - invalid_at < CONF.metadata_stale_seconds:
+            return rendered, True
+        return None, False
+
+    @staticmethod
+    def claim_refresh(instance_uuid, address):
+        """Whether this worker should re-render a stale tree."""
+        return _get_cache().add(
+            'metadata-refresh-%s-%s' % (instance_uuid, address), 1,
+            CONF.metadata_stale_seconds)
@@ -18,6 +18,7 @@
 import hashlib
 import hmac
 import os
+import time
 
 from oslo.config import cfg
 import six
@@ -25,6 +26,7 @@ import webob.dec
 import webob.exc
 
 from nova.api.metadata import base
+from nova.api.metadata import cache as metadata_cache
 from nova import conductor
 from nova import exception
 from nova.i18n import _
@@ -103,6 +105,58 @@ class MetadataRequestHandler(wsgi.Application):
 
         return data
 
+    def get_instance_uuid_by_remote_address(self, address):
+        if not address:
+            raise exception.FixedIpNotFoundForAddress(address=address)
+
+        instance_uuid = metadata_cache.get_instance_uuid(address)
+        if instance_uuid:
+            return instance_uuid
+
+        try:
+            instance_uuid = base.get_instance_uuid_by_address(address)
+        except exception.NotFound:
+            return None
+
+        metadata_cache.set_instance_uuid(address, instance_uuid,
+                                         CACHE_EXPIRATION)
+        return instance_uuid
+
+    def get_rendered_metadata(self, instance_id, address):
+        """Return the rendered metadata tree of an instance.
+
+        A stale tree is returned as is while this worker, if no other one
+        does, renders a fresh one in the background.
+        """
+        rendered, stale = metadata_cache.RenderedMetadata.load(instance_id,
+                                                                address)
+        if rendered is None:
+            return self._render_metadata(instance_id, address)
+
+        if stale and metadata_cache.RenderedMetadata.claim_refresh(
+                instance_id, address):
+            utils.spawn_n(self._refresh_metadata, instance_id, address)
+        return rendered
+
+    def _render_metadata(self, instance_id, address):
+        built_at = time.time()
+        try:
+            meta_data = base.get_metadata_by_instance_id(self.conductor_api,
+                                                         instance_id, address)
+        except exception.NotFound:
+            return None
+
+        rendered = base.render_metadata(meta_data, built_at=built_at)
+        rendered.store(instance_id, address)
+        return rendered
+
+    def _refresh_metadata(self, instance_id, address):
+        try:
+            self._render_metadata(instance_id, address)
+        except Exception:
+            LOG.exception(_LE('Failed to refresh metadata for instance id: '
+                              '%s'), instance_id)
+
     @webob.dec.wsgify(RequestClass=wsgi.Request)
     def __call__(self, req):
         if os.path.normpath(req.path_info) == "/":
@@ -111,6 +165,10 @@ class MetadataRequestHandler(wsgi.Application):
             req.response.content_type = base.MIME_TYPE_TEXT_PLAIN
             return req.response
 
+        if (CONF.metadata_precompute and
+                not metadata_cache.is_dynamic(req.path_info.rstrip('/'))):
+            return self._handle_precomputed_request(req)
+
         if CONF.neutron.service_metadata_proxy:
             meta_data = self._handle_instance_id_request(req)
         else:
@@ -141,10 +199,69 @@ class MetadataRequestHandler(wsgi.Application):
         req.response.content_type = meta_data.get_mimetype()
         return req.response
 
-    def _handle_remote_ip_request(self, req):
+    def _handle_precomputed_request(self, req):
+        tenant_id = None
+        if CONF.neutron.service_metadata_proxy:
+            instance_id, tenant_id, remote_address = (
+                self._verify_instance_id_request(req))
+        else:
+            remote_address = self._get_remote_address(req)
+            try:
+                instance_id = self.get_instance_uuid_by_remote_address(
+                    remote_address)
+            except Exception:
+                LOG.exception(_('Failed to get metadata for ip: %s'),
+                              remote_address)
+                msg = _('An unknown error has occurred. '
+                        'Please try your request again.')
+                raise webob.exc.HTTPInternalServerError(
+                    explanation=unicode(msg))
+            if instance_id is None:
+                LOG.error(_LE('Failed to get metadata for ip: %s'),
+                          remote_address)
+                raise webob.exc.HTTPNotFound()
+
+        try:
+            rendered = self.get_rendered_metadata(instance_id, remote_address)
+        except Exception:
+            LOG.exception(_('Failed to get metadata for instance id: %s'),
+                          instance_id)
+            msg = _('An unknown error has occurred. '
+                    'Please try your request again.')
+            raise webob.exc.HTTPInternalServerError(explanation=unicode(msg))
+
+        if rendered is None:
+            LOG.error(_LE('Failed to get metadata for instance id: %s'),
+                      instance_id)
+            raise webob.exc.HTTPNotFound()
+        if tenant_id is not None and rendered.project_id != tenant_id:
+            LOG.warn(_LW("Tenant_id %(tenant_id)s does not match tenant_id "
+                         "of instance %(instance_id)s."),
+                     {'tenant_id': tenant_id, 'instance_id': instance_id})
+            raise webob.exc.HTTPNotFound()
+
+        response = rendered.get(base.normalize_path(req.path_info),
+                                base.random_seed)
+        if response is None:
+            raise webob.exc.HTTPNotFound()
+
+        mimetype, resp = response
+        if isinstance(resp, six.text_type):
+            req.response.text = resp
+        else:
+            req.response.body = resp
+
+        req.response.content_type = mimetype
+        return req.response
+
+    def _get_remote_address(self, req):
         remote_address = req.remote_addr
         if CONF.use_forwarded_for:
             remote_address = req.headers.get('X-Forwarded-For', remote_address)
+        return remote_address
+
+    def _handle_remote_ip_request(self, req):
+        remote_address = self._get_remote_address(req)
 
         try:
             meta_data = self.get_metadata_by_remote_address(remote_address)
@@ -162,6 +279,36 @@ class MetadataRequestHandler(wsgi.Application):
         return meta_data
 
     def _handle_instance_id_request(self, req):
+        instance_id, tenant_id, remote_address = (
+            self._verify_instance_id_request(req))
+
+        try:
+            meta_data = self.get_metadata_by_instance_id(instance_id,
+                                                         remote_address)
+        except Exception:
+            LOG.exception(_('Failed to get metadata for instance id: %s'),
+                          instance_id)
+            msg = _('An unknown error has occurred. '
+                    'Please try your request again.')
+            raise webob.exc.HTTPInternalServerError(explanation=unicode(msg))
+
+        if meta_data is None:
+            LOG.error(_LE('Failed to get metadata for instance id: %s'),
+                      instance_id)
+        elif meta_data.instance['project_id'] != tenant_id:
+            LOG.warn(_LW("Tenant_id %(tenant_id)s does not match tenant_id "
+                         "of instance %(instance_id)s."),
+                     {'tenant_id': tenant_id, 'instance_id': instance_id})
+            # causes a 404 to be raised
+            meta_data = None
+
+        return meta_data
+
+    def _verify_instance_id_request(self, req):
+        """Check the headers of a request proxied by Neutron.
+
+        Returns the instance id, tenant id and remote address of the request.
+        """
         instance_id = req.headers.get('X-Instance-ID')
         tenant_id = req.headers.get('X-Tenant-ID')
         signature = req.headers.get('X-Instance-ID-Signature')
@@ -202,24 +349,4 @@ class MetadataRequestHandler(wsgi.Application):
             msg = _('Invalid proxy request signature.')
             raise webob.exc.HTTPForbidden(explanation=msg)
 
-        try:
-            meta_data = self.get_metadata_by_instance_id(instance_id,
-                                                         remote_address)
-        except Exception:
-            LOG.exception(_('Failed to get metadata for instance id: %s'),
-                          instance_id)
-            msg = _('An unknown error has occurred. '
-                    'Please try your request again.')
-            raise webob.exc.HTTPInternalServerError(explanation=unicode(msg))
-
-        if meta_data is None:
-            LOG.error(_LE('Failed to get metadata for instance id: %s'),
-                      instance_id)
-        elif meta_data.instance['project_id'] != tenant_id:
-            LOG.warn(_LW("Tenant_id %(tenant_id)s does not match tenant_id "
-                         "of instance %(instance_id)s."),
-                     {'tenant_id': tenant_id, 'instance_id': instance_id})
-            # causes a 404 to be raised
-            meta_data = None
-
-        return meta_data
+        return instance_id, tenant_id, remote_address
@@ -0,0 +1,77 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import six
+import webob
+
+from nova.api.openstack import extensions
+from nova.api.openstack import wsgi
+from nova import compute
+from nova import exception
+from nova.i18n import _
+
+
+authorize = extensions.extension_authorizer('compute', 'image_prefetch')
+
+
+class ImagePrefetchController(wsgi.Controller):
+    """Has compute hosts download images ahead of the first boot."""
+
+    def __init__(self, *args, **kwargs):
+        self.host_api = compute.HostAPI()
+        super(ImagePrefetchController, self).__init__(*args, **kwargs)
+
+    @wsgi.response(202)
+    def create(self, req, body):
+        """Starts downloading images into the image cache of the hosts.
+
+        The hosts download the images with the token of this request, which
+        the periodic tasks refreshing their image cache do not have.
+        """
+        context = req.environ['nova.context']
+        authorize(context)
+
+        if not self.is_valid_body(body, 'prefetch'):
+            msg = _("Missing prefetch in request body")
+            raise webob.exc.HTTPBadRequest(explanation=msg)
+        prefetch = body['prefetch']
+
+        image_ids = prefetch.get('image_ids')
+        if image_ids is not None:
+            if (not isinstance(image_ids, list) or not image_ids or
+                    not all(isinstance(image_id, six.string_types)
+                            for image_id in image_ids)):
+                msg = _("image_ids must be a non-empty list of image IDs")
+                raise webob.exc.HTTPBadRequest(explanation=msg)
+
+        try:
+            self.host_api.prefetch_images(context, image_ids=image_ids,
+                                          host_name=prefetch.get('host'))
+        except exception.NotFound as e:
+            raise webob.exc.HTTPNotFound(explanation=e.format_message())
+        except exception.ComputeServiceUnavailable as e:
+            raise webob.exc.HTTPBadRequest(explanation=e.format_message())
+
+
+class Image_prefetch(extensions.ExtensionDescriptor):
+    """Image cache prefetch support."""
+
+    name = "ImagePrefetch"
+    alias = "os-image-prefetch"
+    namespace = ("http://docs.openstack.org/compute/ext/"
+                 "image-prefetch/api/v2")
+    updated = "2014-10-01T00:00:00Z"
+
+    def get_resources(self):
+        controller = ImagePrefetchController()
+        ext = extensions.ResourceExtension('os-image-prefetch', controller)
+        return [ext]
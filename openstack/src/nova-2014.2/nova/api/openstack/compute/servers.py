@@ -532,6 +532,21 @@ class Controller(wsgi.Controller):
         remove_invalid_options(context, search_opts,
                 self._get_server_search_options())
 
+        # 'fields' limits the attributes shown by detail and lets us load
+        # only the instance fields those attributes are built from.
+        search_opts.pop('fields', None)
+        attributes = None
+        if not is_detail:
+            instance_fields = self._view_builder.basic_instance_fields
+        elif req.GET.get('fields'):
+            attributes = set(field.strip()
+                             for field in req.GET['fields'].split(',')
+                             if field.strip())
+            instance_fields = self._view_builder.get_instance_fields(
+                attributes)
+        else:
+            instance_fields = None
+
         # Verify search by 'status' contains a valid status.
         # Convert it to filter by vm_state or task_state for compute_api.
         search_opts.pop('status', None)
@@ -601,7 +616,8 @@ class Controller(wsgi.Controller):
                                                      search_opts=search_opts,
                                                      limit=limit,
                                                      marker=marker,
-                                                     want_objects=True)
+                                                     want_objects=True,
+                                                     fields=instance_fields)
         except exception.MarkerNotFound:
             msg = _('marker [%s] not found') % marker
             raise exc.HTTPBadRequest(explanation=msg)
@@ -611,8 +627,10 @@ class Controller(wsgi.Controller):
             instance_list = objects.InstanceList(objects=[])
 
         if is_detail:
-            instance_list.fill_faults()
-            response = self._view_builder.detail(req, instance_list)
+            if attributes is None:
+                instance_list.fill_faults()
+            response = self._view_builder.detail(req, instance_list,
+                                                 attributes=attributes)
         else:
             response = self._view_builder.index(req, instance_list)
         req.cache_db_instances(instance_list)
@@ -14,6 +14,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import functools
 import hashlib
 
 from nova.api.openstack import common
@@ -21,6 +22,8 @@ from nova.api.openstack.compute.views import addresses as views_addresses
 from nova.api.openstack.compute.views import flavors as views_flavors
 from nova.api.openstack.compute.views import images as views_images
 from nova.compute import flavors
+from nova import exception
+from nova.i18n import _
 from nova.i18n import _LW
 from nova.objects import base as obj_base
 from nova.openstack.common import log as logging
@@ -48,6 +51,29 @@ class ViewBuilder(common.ViewBuilder):
         "ERROR", "DELETED"
     )
 
+    # Instance fields needed to render each optional server attribute, so
+    # listings limited with ?fields= only load what they show.
+    _attribute_instance_fields = {
+        "name": ["display_name"],
+        "status": ["deleted", "vm_state", "task_state"],
+        "tenant_id": ["project_id"],
+        "user_id": ["user_id"],
+        "metadata": ["metadata"],
+        "hostId": ["host", "project_id"],
+        "image": ["image_ref"],
+        "flavor": ["system_metadata"],
+        "created": ["created_at"],
+        "updated": ["updated_at"],
+        "addresses": ["info_cache"],
+        "accessIPv4": ["access_ip_v4"],
+        "accessIPv6": ["access_ip_v6"],
+        "fault": ["deleted", "vm_state", "task_state", "fault"],
+        "progress": ["deleted", "vm_state", "task_state", "progress"],
+    }
+
+    # Instance fields needed by index()
+    basic_instance_fields = ["display_name"]
+
     def __init__(self):
         """Initialize view builder."""
         super(ViewBuilder, self).__init__()
@@ -113,14 +139,88 @@ class ViewBuilder(common.ViewBuilder):
 
         return server
 
+    def show_attributes(self, request, instance, attributes):
+        """Detailed view of a single instance limited to some attributes.
+
+        'id' and 'links' are always included. 'fault' and 'progress' are
+        only shown for the same statuses as in show().
+        """
+        server = {
+            "id": instance["uuid"],
+            "links": self._get_links(request,
+                                     instance["uuid"],
+                                     self._collection_name),
+        }
+        status = None
+        if set(["status", "fault", "progress"]) & attributes:
+            status = self._get_vm_status(instance)
+        for attribute in attributes:
+            if attribute == "name":
+                server["name"] = instance["display_name"]
+            elif attribute == "status":
+                server["status"] = status
+            elif attribute == "tenant_id":
+                server["tenant_id"] = instance.get("project_id") or ""
+            elif attribute == "user_id":
+                server["user_id"] = instance.get("user_id") or ""
+            elif attribute == "metadata":
+                server["metadata"] = self._get_metadata(instance)
+            elif attribute == "hostId":
+                server["hostId"] = self._get_host_id(instance) or ""
+            elif attribute == "image":
+                server["image"] = self._get_image(request, instance)
+            elif attribute == "flavor":
+                server["flavor"] = self._get_flavor(request, instance)
+            elif attribute == "created":
+                server["created"] = timeutils.isotime(instance["created_at"])
+            elif attribute == "updated":
+                server["updated"] = timeutils.isotime(instance["updated_at"])
+            elif attribute == "addresses":
+                server["addresses"] = self._get_addresses(request, instance)
+            elif attribute in ("accessIPv4", "accessIPv6"):
+                ip = instance.get("access_ip_v%s" % attribute[-1])
+                server[attribute] = str(ip) if ip is not None else ''
+            elif attribute == "fault":
+                if status in self._fault_statuses:
+                    _inst_fault = self._get_fault(request, instance)
+                    if _inst_fault:
+                        server["fault"] = _inst_fault
+            elif attribute == "progress":
+                if status in self._progress_statuses:
+                    server["progress"] = instance.get("progress", 0)
+        return {"server": server}
+
+    def get_instance_fields(self, attributes):
+        """Return the instance fields needed to show the given attributes.
+
+        :param attributes: set of server attribute names
+        :raises: InvalidInput if an attribute is unknown
+        """
+        instance_fields = set()
+        for attribute in attributes:
+            try:
+                instance_fields.update(
+                    self._attribute_instance_fields[attribute])
+            except KeyError:
+                raise exception.InvalidInput(
+                    reason=_("Unknown server attribute: %s") % attribute)
+        return list(instance_fields)
+
     def index(self, request, instances):
         """Show a list of servers without many details."""
         coll_name = self._collection_name
         return self._list_view(self.basic, request, instances, coll_name)
 
-    def detail(self, request, instances):
-        """Detailed view of a list of instance."""
+    def detail(self, request, instances, attributes=None):
+        """Detailed view of a list of instance.
+
+        If attributes is given, each server only shows those attributes.
+        """
         coll_name = self._collection_name + '/detail'
+        if attributes is not None:
+            func = functools.partial(self.show_attributes,
+                                     attributes=attributes)
+            return self._list_view(func, request, instances, coll_name)
         return self._list_view(self.show, request, instances, coll_name)
 
     def _list_view(self, func, request, servers, coll_name):
@@ -965,6 +965,9 @@ class Resource(wsgi.Application):
                      'context_project_id': context.project_id}
             return Fault(webob.exc.HTTPBadRequest(explanation=msg))
 
+        if context:
+            context.enable_object_cache()
+
         # Run pre-processing extensions
         response, post = self.pre_process_extensions(extensions,
                                                      request, action_args)
@@ -1010,6 +1013,11 @@ class Resource(wsgi.Application):
                 # Headers must be utf-8 strings
                 response.headers[hdr] = utils.utf8(str(val))
 
+        object_cache = getattr(context, '_object_cache', None)
+        if object_cache is not None:
+            LOG.debug("Object cache for %(url)s: %(stats)s",
+                      {'url': request.url, 'stats': object_cache.stats()})
+
         return response
 
     def get_method(self, request, action, content_type, body):
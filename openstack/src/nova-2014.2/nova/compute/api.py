@@ -29,6 +29,7 @@ from oslo.config import cfg
 from oslo.utils import units
 import six
 
+from nova.api.metadata import cache as metadata_cache
 from nova import availability_zones
 from nova import block_device
 from nova.cells import opts as cells_opts
@@ -55,6 +56,7 @@ from nova.network.security_group import security_group_base
 from nova import notifications
 from nova import objects
 from nova.objects import base as obj_base
+from nova.objects import cache as object_cache
 from nova.objects import quotas as quotas_obj
 from nova.objects import security_group as security_group_obj
 from nova.openstack.common import excutils
@@ -1907,7 +1909,7 @@ class API(base.Base):
 
     def get_all(self, context, search_opts=None, sort_key='created_at',
                 sort_dir='desc', limit=None, marker=None, want_objects=False,
-                expected_attrs=None):
+                expected_attrs=None, fields=None):
         """Get all instances filtered by one of the given parameters.
 
         If there is no filter and the context is an admin, it will retrieve
@@ -1919,6 +1921,10 @@ class API(base.Base):
         The results will be returned sorted in the order specified by the
         'sort_dir' parameter using the key specified in the 'sort_key'
         parameter.
+
+        If 'fields' is given, only those instance fields are loaded from
+        the database and expected_attrs is ignored. Any other field is
+        loaded on first access.
         """
 
         # TODO(bcwaldon): determine the best argument for target here
@@ -1986,9 +1992,17 @@ class API(base.Base):
                     except ValueError:
                         return []
 
-        inst_models = self._get_instances_by_filters(context, filters,
-                sort_key, sort_dir, limit=limit, marker=marker,
-                expected_attrs=expected_attrs)
+        if fields is not None:
+            fields = set(fields)
+            if 'ip6' in filters or 'ip' in filters:
+                fields.add('info_cache')
+            inst_models = objects.InstanceList.get_projected_by_filters(
+                context, filters, list(fields), sort_key=sort_key,
+                sort_dir=sort_dir, limit=limit, marker=marker)
+        else:
+            inst_models = self._get_instances_by_filters(context, filters,
+                    sort_key, sort_dir, limit=limit, marker=marker,
+                    expected_attrs=expected_attrs)
 
         if 'ip6' in filters or 'ip' in filters:
             inst_models = self._ip_filter(inst_models, filters)
@@ -3316,6 +3330,27 @@ class HostAPI(base.Base):
                          must_be_up=True)
         return self.rpcapi.get_host_uptime(context, host=host_name)
 
+    def prefetch_images(self, context, image_ids=None, host_name=None):
+        """Has compute hosts download images into their image cache.
+
+        Goes to every enabled compute host which is up unless host_name is
+        given. Without image_ids the hosts fetch the images they are
+        configured to keep cached. Returns the hosts asked to prefetch.
+        """
+        if host_name:
+            self._assert_host_exists(context, host_name, must_be_up=True)
+            host_names = [host_name]
+        else:
+            services = self.service_get_all(
+                context, filters={'topic': CONF.compute_topic,
+                                  'disabled': False})
+            host_names = [service['host'] for service in services
+                          if self.servicegroup_api.service_is_up(service)]
+        for host in host_names:
+            self.rpcapi.prefetch_images(context, host=host,
+                                        image_ids=image_ids)
+        return host_names
+
     @wrap_exception()
     def host_power_action(self, context, host_name, action):
         """Reboots, shuts down or powers up the host."""
@@ -3939,6 +3974,9 @@ class SecurityGroupAPI(base.Base, security_group_base.SecurityGroupBase):
         self.db.instance_add_security_group(context.elevated(),
                                             instance_uuid,
                                             security_group['id'])
+        object_cache.invalidate(context, 'Instance', instance_uuid,
+                                ['security_groups'])
+        metadata_cache.invalidate(instance_uuid)
         # NOTE(comstud): No instance_uuid argument to this compute manager
         # call
         self.security_group_rpcapi.refresh_security_group_rules(context,
@@ -3962,6 +4000,9 @@ class SecurityGroupAPI(base.Base, security_group_base.SecurityGroupBase):
         self.db.instance_remove_security_group(context.elevated(),
                                                instance_uuid,
                                                security_group['id'])
+        object_cache.invalidate(context, 'Instance', instance_uuid,
+                                ['security_groups'])
+        metadata_cache.invalidate(instance_uuid)
         # NOTE(comstud): No instance_uuid argument to this compute manager
         # call
         self.security_group_rpcapi.refresh_security_group_rules(context,
@@ -27,6 +27,7 @@ terminating it.
 
 import base64
 import contextlib
+import datetime
 import functools
 import socket
 import sys
@@ -142,10 +143,19 @@ interval_opts = [
                     'Setting this to 0 will disable, but this will change in '
                     'Juno to mean "run at the default rate".'),
     # TODO(gilliard): Clean the above message after the K release
+    cfg.IntOpt('sync_power_state_batch_size',
+               default=100,
+               help='Number of power state changes found while syncing power '
+                    'states that are saved together with one conductor '
+                    'call. Set to 0 to save each change on its own'),
     cfg.IntOpt("heal_instance_info_cache_interval",
                default=60,
                help="Number of seconds between instance info_cache self "
                     "healing updates"),
+    cfg.IntOpt("heal_instance_info_cache_batch_size",
+               default=20,
+               help="Number of instances whose info_cache is refreshed by "
+                    "each info_cache self healing update"),
     cfg.IntOpt('reclaim_instance_interval',
                default=0,
                help='Interval in seconds for reclaiming deleted instances'),
@@ -237,6 +247,10 @@ CONF.import_opt('enabled', 'nova.spice', group='spice')
 CONF.import_opt('enable', 'nova.cells.opts', group='cells')
 CONF.import_opt('image_cache_subdirectory_name', 'nova.virt.imagecache')
 CONF.import_opt('image_cache_manager_interval', 'nova.virt.imagecache')
+CONF.import_opt('image_prefetch_interval', 'nova.virt.imagecache')
+CONF.import_opt('prefetch_images', 'nova.virt.imagecache')
+CONF.import_opt('image_prefetch_popular_count', 'nova.virt.imagecache')
+CONF.import_opt('image_prefetch_popular_window', 'nova.virt.imagecache')
 CONF.import_opt('enabled', 'nova.rdp', group='rdp')
 CONF.import_opt('html5_proxy_base_url', 'nova.rdp', group='rdp')
 CONF.import_opt('enabled', 'nova.console.serial', group='serial_console')
@@ -432,6 +446,30 @@ def aggregate_object_compat(function):
     return decorated_function
 
 
+def _power_state_is_steady(instance, vm_power_state):
+    """Whether syncing the power state of an instance would do nothing.
+
+    That is the case when the hypervisor reports the power state recorded
+    for the instance, and that power state is the expected one for its
+    vm_state or its vm_state is not reconciled at all.
+    """
+    if instance.power_state != vm_power_state:
+        return False
+    if instance.vm_state in (vm_states.BUILDING,
+                             vm_states.RESCUED,
+                             vm_states.RESIZED,
+                             vm_states.SUSPENDED,
+                             vm_states.ERROR):
+        return True
+    if instance.vm_state == vm_states.ACTIVE:
+        return vm_power_state == power_state.RUNNING
+    if instance.vm_state == vm_states.STOPPED:
+        return vm_power_state in (power_state.NOSTATE,
+                                  power_state.SHUTDOWN,
+                                  power_state.CRASHED)
+    return False
+
+
 class InstanceEvents(object):
     def __init__(self):
         self._events = {}
@@ -591,7 +629,7 @@ class ComputeVirtAPI(virtapi.VirtAPI):
 class ComputeManager(manager.Manager):
     """Manages the running instances from creation to destruction."""
 
-    target = messaging.Target(version='3.35')
+    target = messaging.Target(version='3.36')
 
     # How long to wait in seconds before re-issuing a shutdown
     # signal to a instance during power off.  The overall
@@ -621,6 +659,7 @@ class ComputeManager(manager.Manager):
         self.instance_events = InstanceEvents()
         self._sync_power_pool = eventlet.GreenPool()
         self._syncs_in_progress = {}
+        self._prefetch_pool = eventlet.GreenPool(1)
 
         super(ComputeManager, self).__init__(service_name="compute",
                                              *args, **kwargs)
@@ -4021,6 +4060,32 @@ class ComputeManager(manager.Manager):
         """Returns the result of calling "uptime" on the target host."""
         return self.driver.get_host_uptime(self.host)
 
+    @wrap_exception()
+    def prefetch_images(self, context, image_ids=None):
+        """Download images into the image cache in the background.
+
+        The downloads are made with the context of the operator who asked
+        for them, as periodic tasks have no token to give to glance.
+        Without image_ids the images this node keeps cached are fetched.
+        """
+        if not self.driver.capabilities["has_imagecache"]:
+            return
+        if self._prefetch_pool.running():
+            LOG.info(_LI('Previous image prefetch still running, skipping'))
+            return
+        if image_ids is None:
+            image_ids = self._get_images_to_prefetch(context)
+        if not image_ids:
+            return
+
+        def _prefetch():
+            try:
+                self.driver.prefetch_images(context, image_ids)
+            except Exception:
+                LOG.exception(_LE('Error while prefetching images'))
+
+        self._prefetch_pool.spawn_n(_prefetch)
+
     @object_compat
     @wrap_exception()
     @wrap_instance_fault
@@ -5270,21 +5335,22 @@ class ComputeManager(manager.Manager):
         spacing=CONF.heal_instance_info_cache_interval)
     def _heal_instance_info_cache(self, context):
         """Called periodically.  On every call, try to update the
-        info_cache's network information for another instance by
-        calling to the network manager.
-
-        This is implemented by keeping a cache of uuids of instances
-        that live on this host.  On each call, we pop one off of a
-        list, pull the DB record, and try the call to the network API.
-        If anything errors don't fail, as it's possible the instance
-        has been deleted, etc.
+        info_cache's network information for another batch of instances
+        by calling to the network API.
+
+        This is implemented by keeping a list of uuids of instances that
+        live on this host, ordered so that the instances whose cache was
+        refreshed the longest time ago come first.  On each call, we pop
+        a batch off of the list, pull their DB records in one query, and
+        have the network API refresh all of their caches at once.  If
+        anything errors don't fail, as it's possible an instance has been
+        deleted, etc.
         """
         heal_interval = CONF.heal_instance_info_cache_interval
         if not heal_interval:
             return
 
         instance_uuids = getattr(self, '_instance_uuids_to_heal', [])
-        instance = None
 
         LOG.debug('Starting heal instance info cache')
 
@@ -5292,7 +5358,9 @@ class ComputeManager(manager.Manager):
             # The list of instances to heal is empty so rebuild it
             LOG.debug('Rebuilding the list of instances to heal')
             db_instances = objects.InstanceList.get_by_host(
-                context, self.host, expected_attrs=[], use_slave=True)
+                context, self.host, expected_attrs=['info_cache'],
+                use_slave=True)
+            to_heal = []
             for inst in db_instances:
                 # We don't want to refresh the cache for instances
                 # which are building or deleting so don't put them
@@ -5306,27 +5374,22 @@ class ComputeManager(manager.Manager):
                     LOG.debug('Skipping network cache update for instance '
                               'because it is being deleted.', instance=inst)
                     continue
+                to_heal.append(inst)
 
-                if not instance:
-                    # Save the first one we find so we don't
-                    # have to get it again
-                    instance = inst
-                else:
-                    instance_uuids.append(inst['uuid'])
-
+            to_heal.sort(key=self._info_cache_age)
+            instance_uuids = [inst.uuid for inst in to_heal]
             self._instance_uuids_to_heal = instance_uuids
-        else:
-            # Find the next valid instance on the list
-            while instance_uuids:
-                try:
-                    inst = objects.Instance.get_by_uuid(
-                            context, instance_uuids.pop(0),
-                            expected_attrs=['system_metadata', 'info_cache'],
-                            use_slave=True)
-                except exception.InstanceNotFound:
-                    # Instance is gone.  Try to grab another.
-                    continue
 
+        batch = instance_uuids[:CONF.heal_instance_info_cache_batch_size]
+        del instance_uuids[:len(batch)]
+
+        instances = []
+        if batch:
+            db_instances = objects.InstanceList.get_by_filters(
+                context, {'uuid': batch, 'deleted': False},
+                expected_attrs=['system_metadata', 'info_cache'],
+                use_slave=True)
+            for inst in db_instances:
                 # Check the instance hasn't been migrated
                 if inst.host != self.host:
                     LOG.debug('Skipping network cache update for instance '
@@ -5337,23 +5400,34 @@ class ComputeManager(manager.Manager):
                     LOG.debug('Skipping network cache update for instance '
                               'because it is being deleted.', instance=inst)
                 else:
-                    instance = inst
-                    break
+                    instances.append(inst)
 
-        if instance:
-            # We have an instance now to refresh
+        if instances:
+            # We have instances now to refresh
             try:
-                # Call to network API to get instance info.. this will
-                # force an update to the instance's info_cache
-                self._get_instance_nw_info(context, instance, use_slave=True)
-                LOG.debug('Updated the network info_cache for instance',
-                          instance=instance)
+                healed = self.network_api.heal_instance_info_caches(
+                    context, instances)
+                LOG.debug('Updated the network info_cache of %(healed)d of '
+                          '%(total)d instances',
+                          {'healed': len(healed), 'total': len(instances)})
             except Exception:
                 LOG.error(_('An error occurred while refreshing the network '
-                            'cache.'), instance=instance, exc_info=True)
+                            'cache.'), exc_info=True)
         else:
             LOG.debug("Didn't find any instances for network info cache "
                       "update.")
+        return len(instances)
+
+    @staticmethod
+    def _info_cache_age(instance):
+        """Sort key putting the least recently refreshed caches first."""
+        info_cache = instance.info_cache
+        if info_cache is None:
+            return (0, None)
+        refreshed_at = info_cache.updated_at or info_cache.created_at
+        if refreshed_at is None:
+            return (0, None)
+        return (1, refreshed_at)
 
     @periodic_task.periodic_task
     def _poll_rebooting_instances(self, context):
@@ -5370,6 +5444,7 @@ class ComputeManager(manager.Manager):
                     to_poll.append(instance)
 
             self.driver.poll_rebooting_instances(CONF.reboot_timeout, to_poll)
+            return len(rebooting)
 
     @periodic_task.periodic_task
     def _poll_rescued_instances(self, context):
@@ -5388,6 +5463,7 @@ class ComputeManager(manager.Manager):
 
             for instance in to_unrescue:
                 self.compute_api.unrescue(context, instance)
+            return len(rescued_instances)
 
     @periodic_task.periodic_task
     def _poll_unconfirmed_resizes(self, context):
@@ -5414,18 +5490,23 @@ class ComputeManager(manager.Manager):
             migration.status = 'error'
             migration.save(context.elevated())
 
+        # NOTE: Fetch the instances of all the migrations with one call.
+        instances = {}
+        if migrations:
+            for instance in objects.InstanceList.get_by_uuids(
+                    context, [m.instance_uuid for m in migrations],
+                    expected_attrs=['metadata', 'system_metadata'],
+                    use_slave=True):
+                instances[instance.uuid] = instance
+
         for migration in migrations:
             instance_uuid = migration.instance_uuid
             LOG.info(_("Automatically confirming migration "
                        "%(migration_id)s for instance %(instance_uuid)s"),
                      {'migration_id': migration.id,
                       'instance_uuid': instance_uuid})
-            expected_attrs = ['metadata', 'system_metadata']
-            try:
-                instance = objects.Instance.get_by_uuid(context,
-                            instance_uuid, expected_attrs=expected_attrs,
-                            use_slave=True)
-            except exception.InstanceNotFound:
+            instance = instances.get(instance_uuid)
+            if instance is None:
                 reason = (_("Instance %s not found") %
                           instance_uuid)
                 _set_migration_to_error(migration, reason)
@@ -5473,6 +5554,7 @@ class ComputeManager(manager.Manager):
                 LOG.info(_("Error auto-confirming resize: %s. "
                            "Will retry later."),
                          e, instance=instance)
+        return len(migrations)
 
     @compute_utils.periodic_task_spacing_warn("shelved_poll_interval")
     @periodic_task.periodic_task(spacing=CONF.shelved_poll_interval)
@@ -5501,6 +5583,7 @@ class ComputeManager(manager.Manager):
             except Exception:
                 LOG.exception(_LE('Periodic task failed to offload instance.'),
                         instance=instance)
+        return len(shelved_instances)
 
     @periodic_task.periodic_task
     def _instance_usage_audit(self, context):
@@ -5721,13 +5804,31 @@ class ComputeManager(manager.Manager):
                      {'num_db_instances': num_db_instances,
                       'num_vm_instances': num_vm_instances})
 
+        # NOTE: Power state changes are only saved if no task was started
+        # on the instance, and it was not updated, in the meantime.
+        if CONF.sync_power_state_batch_size > 0:
+            save_batch = instance_obj.InstanceSaveBatch(
+                context, expected_task_state=[None],
+                max_size=CONF.sync_power_state_batch_size)
+        else:
+            save_batch = None
+        to_sync = []
+
+        def _flush():
+            try:
+                save_batch.flush()
+            except Exception:
+                LOG.exception(_LE("Periodic sync_power_state task failed to "
+                                  "save power state changes."))
+
         def _sync(db_instance):
             # NOTE(melwitt): This must be synchronized as we query state from
             #                two separate sources, the driver and the database.
             #                They are set (in stop_instance) and read, in sync.
             @utils.synchronized(db_instance.uuid)
             def query_driver_power_state_and_sync():
-                self._query_driver_power_state_and_sync(context, db_instance)
+                self._query_driver_power_state_and_sync(
+                    context, db_instance, save_batch=save_batch)
 
             try:
                 query_driver_power_state_and_sync()
@@ -5737,6 +5838,11 @@ class ComputeManager(manager.Manager):
                               instance=db_instance)
 
             self._syncs_in_progress.pop(db_instance.uuid)
+            # NOTE: The last sync of this pass saves the changes of all the
+            # others.
+            to_sync.remove(db_instance)
+            if save_batch is not None and not to_sync:
+                _flush()
 
         for db_instance in db_instances:
             # process syncs asynchronously - don't want instance locking to
@@ -5747,9 +5853,13 @@ class ComputeManager(manager.Manager):
             else:
                 LOG.debug('Triggering sync for uuid %s' % uuid)
                 self._syncs_in_progress[uuid] = True
-                self._sync_power_pool.spawn_n(_sync, db_instance)
+                to_sync.append(db_instance)
+
+        for db_instance in list(to_sync):
+            self._sync_power_pool.spawn_n(_sync, db_instance)
 
-    def _query_driver_power_state_and_sync(self, context, db_instance):
+    def _query_driver_power_state_and_sync(self, context, db_instance,
+                                           save_batch=None):
         if db_instance.task_state is not None:
             LOG.info(_LI("During sync_power_state the instance has a "
                          "pending task (%(task)s). Skip."),
@@ -5761,24 +5871,33 @@ class ComputeManager(manager.Manager):
             vm_power_state = vm_instance['state']
         except exception.InstanceNotFound:
             vm_power_state = power_state.NOSTATE
+        if _power_state_is_steady(db_instance, vm_power_state):
+            # NOTE: The hypervisor agrees with the instance as listed at the
+            # start of this pass, so there is nothing to save or reconcile
+            # and no need to read the instance again.
+            return
         # Note(maoy): the above get_info call might take a long time,
         # for example, because of a broken libvirt driver.
         try:
             self._sync_instance_power_state(context,
                                             db_instance,
                                             vm_power_state,
-                                            use_slave=True)
+                                            use_slave=True,
+                                            save_batch=save_batch)
         except exception.InstanceNotFound:
             # NOTE(hanlind): If the instance gets deleted during sync,
             # silently ignore.
             pass
 
     def _sync_instance_power_state(self, context, db_instance, vm_power_state,
-                                   use_slave=False):
+                                   use_slave=False, save_batch=None):
         """Align instance power state between the database and hypervisor.
 
         If the instance is not found on the hypervisor, but is in the database,
         then a stop() API will be called on the instance.
+
+        A power state change is added to save_batch, when given, instead of
+        being saved right away.
         """
         if CONF.compute_driver == "ovirt.OvirtDriver" or CONF.compute_driver == "vmwareapi.VMwareVCDriver":
             return
@@ -5819,7 +5938,16 @@ class ComputeManager(manager.Manager):
         if vm_power_state != db_power_state:
             # power_state is always updated from hypervisor to db
             db_instance.power_state = vm_power_state
-            db_instance.save()
+            if save_batch is not None:
+                # NOTE: The batch is saved once the instance lock is
+                # released, so only if no operation changed the instance
+                # since it was read.
+                save_batch.add(db_instance,
+                               expected_values={
+                                   'power_state': db_power_state,
+                                   'updated_at': db_instance.updated_at})
+            else:
+                db_instance.save()
             db_power_state = vm_power_state
 
         # Note(maoy): Now resolve the discrepancy between vm_state and
@@ -5963,6 +6091,7 @@ class ComputeManager(manager.Manager):
                     LOG.warning(_("Periodic reclaim failed to delete "
                                   "instance: %s"),
                                 unicode(e), instance=instance)
+        return len(instances)
 
     @periodic_task.periodic_task
     def update_available_resource(self, context):
@@ -6219,6 +6348,32 @@ class ComputeManager(manager.Manager):
 
         self.driver.manage_image_cache(context, filtered_instances)
 
+    def _get_images_to_prefetch(self, context):
+        image_ids = list(CONF.prefetch_images)
+        if CONF.image_prefetch_popular_count > 0:
+            since = timeutils.utcnow() - datetime.timedelta(
+                seconds=CONF.image_prefetch_popular_window)
+            counts = objects.InstanceList.get_image_boot_counts(
+                context, since, limit=CONF.image_prefetch_popular_count)
+            for image_ref, _count in counts:
+                if image_ref not in image_ids:
+                    image_ids.append(image_ref)
+        return image_ids
+
+    @periodic_task.periodic_task(spacing=CONF.image_prefetch_interval,
+                                 external_process_ok=True)
+    def _refresh_prefetched_images(self, context):
+        """Keep the wanted images which are cached from aging out."""
+        if CONF.image_prefetch_interval <= 0:
+            return
+        if not self.driver.capabilities["has_imagecache"]:
+            return
+
+        image_ids = self._get_images_to_prefetch(context)
+        if image_ids:
+            self.driver.refresh_cached_images(image_ids)
+        return len(image_ids)
+
     @periodic_task.periodic_task(spacing=CONF.instance_delete_interval)
     def _run_pending_deletes(self, context):
         """Retry any pending instance file deletes."""
@@ -274,6 +274,8 @@ class ComputeAPI(object):
         ... Juno supports message version 3.35.  So, any changes to
         existing methods in 3.x after that point should be done such that they
         can handle the version_cap being set to 3.35.
+
+        * 3.36 - Add prefetch_images
     '''
 
     VERSION_ALIASES = {
@@ -737,6 +739,11 @@ class ComputeAPI(object):
         cctxt = self.client.prepare(server=host, version=version)
         return cctxt.call(ctxt, 'get_host_uptime')
 
+    def prefetch_images(self, ctxt, host, image_ids=None):
+        version = '3.36'
+        cctxt = self.client.prepare(server=host, version=version)
+        cctxt.cast(ctxt, 'prefetch_images', image_ids=image_ids)
+
     def reserve_block_device_name(self, ctxt, instance, device, volume_id,
                                   disk_bus=None, device_type=None):
         kw = {'instance': instance, 'device': device,
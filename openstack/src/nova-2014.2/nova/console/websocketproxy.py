@@ -19,26 +19,187 @@ Leverages websockify.py by Joel Martin
 '''
 
 import Cookie
+import errno
+import signal
 import socket
+import time
 import urlparse
 
+import eventlet
+from eventlet import event
+from oslo.config import cfg
 import websockify
 
 from nova.consoleauth import rpcapi as consoleauth_rpcapi
 from nova import context
 from nova.i18n import _
+from nova.openstack.common import jsonutils
 from nova.openstack.common import log as logging
 
 LOG = logging.getLogger(__name__)
 
+websocketproxy_opts = [
+    cfg.BoolOpt('console_proxy_green',
+                default=False,
+                help='Handle console connections in green threads of a '
+                     'single process, rather than in a process per '
+                     'connection'),
+    cfg.IntOpt('console_proxy_max_connections',
+               default=1000,
+               help='Maximum number of concurrent console connections '
+                    'handled in green thread mode. Each connection uses two '
+                    'file descriptors, the client and the target sockets, '
+                    'so the open files limit of the proxy, often 1024 by '
+                    'default, must be raised above twice this value'),
+    cfg.IntOpt('console_token_cache_ttl',
+               default=10,
+               help='Number of seconds a validated console token is reused '
+                    'for new connections without asking consoleauth again, '
+                    'never beyond the token\'s own expiry. 0 disables the '
+                    'cache'),
+    cfg.StrOpt('console_proxy_status_path',
+               help='URL path under which the proxy reports its connections '
+                    'and their throughput as JSON, in green thread mode'),
+    cfg.ListOpt('console_proxy_status_hosts',
+                default=['127.0.0.1', '::1'],
+                help='Client addresses allowed to query the status path'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(websocketproxy_opts)
+CONF.import_opt('console_token_ttl', 'nova.consoleauth.manager')
+
+# Number of seconds the green server waits before accepting again once out
+# of file descriptors
+ACCEPT_RETRY_DELAY = 0.1
+
+
+class TokenCache(object):
+    """Connect info of recently validated console tokens.
+
+    Concurrent connections presenting the same token share a single
+    consoleauth check.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._pending = {}
+
+    def _get(self, token):
+        entry = self._entries.get(token)
+        if entry is None:
+            return None
+        connect_info, expires = entry
+        if time.time() >= expires:
+            del self._entries[token]
+            return None
+        return connect_info
+
+    def _put(self, token, connect_info):
+        now = time.time()
+        expires = now + CONF.console_token_cache_ttl
+        last_activity_at = connect_info.get('last_activity_at')
+        if last_activity_at:
+            expires = min(expires,
+                          last_activity_at + CONF.console_token_ttl)
+        if expires <= now:
+            return
+        if len(self._entries) >= 1024:
+            for stale in [t for t, (_i, e) in self._entries.iteritems()
+                          if e <= now]:
+                del self._entries[stale]
+        self._entries[token] = (connect_info, expires)
+
+    def check_token(self, token, check_fn):
+        """Return the connect info of token, calling check_fn on a miss."""
+        if CONF.console_token_cache_ttl <= 0:
+            return check_fn(token)
+
+        connect_info = self._get(token)
+        if connect_info:
+            return connect_info
+
+        waiter = self._pending.get(token)
+        if waiter is not None:
+            return waiter.wait()
+
+        waiter = self._pending[token] = event.Event()
+        connect_info = None
+        try:
+            connect_info = check_fn(token)
+            if connect_info:
+                self._put(token, connect_info)
+        finally:
+            del self._pending[token]
+            waiter.send(connect_info)
+        return connect_info
+
+
+class ConnectionStats(object):
+    """Throughput and latency counters of one console connection."""
+
+    def __init__(self, client, connect_info, token_check_time):
+        self.client = client
+        self.instance_uuid = connect_info.get('instance_uuid')
+        self.console_type = connect_info.get('console_type')
+        self.target = '%s:%s' % (connect_info['host'], connect_info['port'])
+        self.started_at = time.time()
+        self.token_check_time = token_check_time
+        self.connect_time = None
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.frames_in = 0
+        self.frames_out = 0
+        self.send_wait_time = 0.0
+        self.last_activity_at = self.started_at
+
+    def received(self, nbytes, frames=1):
+        self.bytes_in += nbytes
+        self.frames_in += frames
+        self.last_activity_at = time.time()
+
+    def sent(self, nbytes, wait_time):
+        self.bytes_out += nbytes
+        self.frames_out += 1
+        self.send_wait_time += wait_time
+        self.last_activity_at = time.time()
+
+    def to_dict(self):
+        duration = max(time.time() - self.started_at, 0.001)
+        return {'client': self.client,
+                'target': self.target,
+                'instance_uuid': self.instance_uuid,
+                'console_type': self.console_type,
+                'duration': duration,
+                'token_check_ms': self.token_check_time * 1000,
+                'connect_ms': (self.connect_time or 0) * 1000,
+                'bytes_in': self.bytes_in,
+                'bytes_out': self.bytes_out,
+                'frames_in': self.frames_in,
+                'frames_out': self.frames_out,
+                'bytes_in_per_second': self.bytes_in / duration,
+                'bytes_out_per_second': self.bytes_out / duration,
+                'send_wait_ms': self.send_wait_time * 1000,
+                'idle': time.time() - self.last_activity_at}
+
 
 class NovaProxyRequestHandlerBase(object):
+    def _proxy_server(self):
+        # NOTE: With websockify < 0.6 the handler is the server itself
+        return getattr(self, 'server', self)
+
+    def _check_token(self, token):
+        ctxt = context.get_admin_context()
+        rpcapi = consoleauth_rpcapi.ConsoleAuthAPI()
+        return rpcapi.check_token(ctxt, token=token)
+
     def new_websocket_client(self):
         """Called after a new WebSocket connection has been established."""
-        # Reopen the eventlet hub to make sure we don't share an epoll
-        # fd with parent and/or siblings, which would be bad
-        from eventlet import hubs
-        hubs.use_hub()
+        if not CONF.console_proxy_green:
+            # Reopen the eventlet hub to make sure we don't share an epoll
+            # fd with parent and/or siblings, which would be bad
+            from eventlet import hubs
+            hubs.use_hub()
 
         # The nova expected behavior is to have token
         # passed to the method GET of the request
@@ -55,9 +216,13 @@ class NovaProxyRequestHandlerBase(object):
                 if 'token' in cookie:
                     token = cookie['token'].value
 
-        ctxt = context.get_admin_context()
-        rpcapi = consoleauth_rpcapi.ConsoleAuthAPI()
-        connect_info = rpcapi.check_token(ctxt, token=token)
+        server = self._proxy_server()
+        started_at = time.time()
+        token_cache = getattr(server, 'token_cache', None)
+        if token_cache is not None:
+            connect_info = token_cache.check_token(token, self._check_token)
+        else:
+            connect_info = self._check_token(token)
 
         if not connect_info:
             raise Exception(_("Invalid Token"))
@@ -66,6 +231,11 @@ class NovaProxyRequestHandlerBase(object):
         host = connect_info['host']
         port = int(connect_info['port'])
 
+        client_address = getattr(self, 'client_address', None) or ['']
+        stats = ConnectionStats(client_address[0], connect_info,
+                                time.time() - started_at)
+        started_at = time.time()
+
         # Connect to the target
         self.msg(_("connecting to: %(host)s:%(port)s") % {'host': host,
                                                           'port': port})
@@ -82,8 +252,13 @@ class NovaProxyRequestHandlerBase(object):
                         raise Exception(_("Invalid Connection Info"))
                     tsock.recv(len(data))
                     break
+        stats.connect_time = time.time() - started_at
 
         # Start proxying
+        connections = getattr(server, 'connections', None)
+        if connections is not None:
+            connections[id(self)] = stats
+        self.conn_stats = stats
         try:
             self.do_proxy(tsock)
         except Exception:
@@ -93,6 +268,9 @@ class NovaProxyRequestHandlerBase(object):
                 self.vmsg(_("%(host)s:%(port)s: Target closed") %
                           {'host': host, 'port': port})
             raise
+        finally:
+            if connections is not None:
+                server.connection_closed(connections.pop(id(self)))
 
 
 # TODO(sross): when the websockify version is bumped to be >=0.6,
@@ -107,11 +285,150 @@ if getattr(websockify, 'ProxyRequestHandler', None) is not None:
         def socket(self, *args, **kwargs):
             return websockify.WebSocketServer.socket(*args, **kwargs)
 
+        def do_GET(self):
+            path = urlparse.urlparse(self.path).path
+            if (CONF.console_proxy_green and CONF.console_proxy_status_path
+                    and path == CONF.console_proxy_status_path):
+                self._send_status()
+                return
+            websockify.ProxyRequestHandler.do_GET(self)
+
+        def _send_status(self):
+            if self.client_address[0] not in CONF.console_proxy_status_hosts:
+                self.send_error(403, "Forbidden")
+                return
+            body = jsonutils.dumps(self.server.get_status())
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_proxy(self, target):
+            if not CONF.console_proxy_green:
+                return websockify.ProxyRequestHandler.do_proxy(self, target)
+
+            # NOTE: Each direction is pumped by its own green thread, which
+            # blocks on its socket rather than polling both with select().
+            stats = self.conn_stats
+
+            def client_to_target():
+                while True:
+                    bufs, closed = self.recv_frames()
+                    if bufs:
+                        stats.received(sum(len(buf) for buf in bufs),
+                                       len(bufs))
+                    for buf in bufs:
+                        target.sendall(buf)
+                    if closed:
+                        raise self.CClose(closed['code'], closed['reason'])
+
+            def target_to_client():
+                while True:
+                    buf = target.recv(self.buffer_size)
+                    if not buf:
+                        raise self.CClose(1000, "Target closed")
+                    started_at = time.time()
+                    pending = self.send_frames([buf])
+                    while pending:
+                        pending = self.send_frames()
+                    stats.sent(len(buf), time.time() - started_at)
+
+            pumps = [eventlet.spawn(client_to_target),
+                     eventlet.spawn(target_to_client)]
+            pumps[0].link(lambda _gt: pumps[1].kill())
+            pumps[1].link(lambda _gt: pumps[0].kill())
+            error = None
+            for pump in pumps:
+                try:
+                    pump.wait()
+                except eventlet.greenlet.GreenletExit:
+                    pass
+                except Exception as e:
+                    error = error or e
+            if error:
+                raise error
+
     class NovaWebSocketProxy(websockify.WebSocketProxy):
+        def __init__(self, *args, **kwargs):
+            websockify.WebSocketProxy.__init__(self, *args, **kwargs)
+            self.token_cache = TokenCache()
+            self.connections = {}
+            self.closed_connections = 0
+            self.closed_bytes = 0
+
         @staticmethod
         def get_logger():
             return LOG
 
+        def connection_closed(self, stats):
+            self.closed_connections += 1
+            self.closed_bytes += stats.bytes_in + stats.bytes_out
+
+        def get_status(self):
+            connections = [c.to_dict() for c in self.connections.values()]
+            return {'connections': connections,
+                    'active_connections': len(connections),
+                    'closed_connections': self.closed_connections,
+                    'bytes_in_per_second': sum(
+                        c['bytes_in_per_second'] for c in connections),
+                    'bytes_out_per_second': sum(
+                        c['bytes_out_per_second'] for c in connections),
+                    'closed_bytes': self.closed_bytes}
+
+        def start_server(self):
+            if not CONF.console_proxy_green:
+                return websockify.WebSocketProxy.start_server(self)
+
+            lsock = self.socket(self.listen_host, self.listen_port, False,
+                                self.prefer_ipv6,
+                                tcp_keepalive=self.tcp_keepalive,
+                                tcp_keepcnt=self.tcp_keepcnt,
+                                tcp_keepidle=self.tcp_keepidle,
+                                tcp_keepintvl=self.tcp_keepintvl)
+            if self.daemon:
+                self.daemonize(keepfd=lsock.fileno(), chdir=self.web)
+            self.started()
+
+            original_signals = {
+                signal.SIGINT: signal.getsignal(signal.SIGINT),
+                signal.SIGTERM: signal.getsignal(signal.SIGTERM),
+            }
+            signal.signal(signal.SIGINT, self.do_SIGINT)
+            signal.signal(signal.SIGTERM, self.do_SIGTERM)
+
+            pool = eventlet.GreenPool(CONF.console_proxy_max_connections)
+            try:
+                while True:
+                    try:
+                        sock, address = lsock.accept()
+                    except socket.error as e:
+                        if e.errno == errno.EINTR:
+                            continue
+                        self.warn(_("Failed to accept a console connection: "
+                                    "%s"), e)
+                        if e.errno in (errno.EMFILE, errno.ENFILE):
+                            # NOTE: Out of file descriptors, give the open
+                            # connections a chance to close some.
+                            eventlet.sleep(ACCEPT_RETRY_DELAY)
+                        continue
+                    pool.spawn_n(self._handle_client, sock, address)
+                    self.handler_id += 1
+            except (self.Terminate, SystemExit, KeyboardInterrupt):
+                self.msg("In exit")
+            finally:
+                self.vmsg("Closing socket listening at %s:%s",
+                          self.listen_host, self.listen_port)
+                lsock.close()
+                for sig, func in original_signals.items():
+                    signal.signal(sig, func)
+
+        def _handle_client(self, sock, address):
+            try:
+                self.top_new_client(sock, address)
+            finally:
+                sock.close()
+
 else:
     import sys
 
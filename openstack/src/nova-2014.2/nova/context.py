@@ -24,6 +24,7 @@ import six
 
 from nova import exception
 from nova.i18n import _
+from nova.objects import cache as object_cache
 from nova.openstack.common import local
 from nova.openstack.common import log as logging
 from nova.openstack.common import timeutils
@@ -98,6 +99,9 @@ class RequestContext(object):
         self.is_admin = is_admin
         if self.is_admin is None:
             self.is_admin = policy.check_is_admin(self)
+        # NOTE: Not part of to_dict(), only the API enables an object
+        # cache for its requests, see enable_object_cache().
+        self._object_cache = None
         if overwrite or not hasattr(local.store, 'context'):
             self.update_store()
 
@@ -116,6 +120,22 @@ class RequestContext(object):
     read_deleted = property(_get_read_deleted, _set_read_deleted,
                             _del_read_deleted)
 
+    @property
+    def object_cache(self):
+        """Identity map of objects loaded on behalf of this request."""
+        return self._object_cache
+
+    def enable_object_cache(self):
+        """Remember lazy-loaded objects for the rest of this request.
+
+        Only meant for API requests: their object saves run in the same
+        process, where they update or invalidate the cached copies.
+        Services calling objects through the conductor would not see
+        the saves made on their behalf.
+        """
+        if self._object_cache is None:
+            self._object_cache = object_cache.RequestObjectCache()
+
     def update_store(self):
         local.store.context = self
 
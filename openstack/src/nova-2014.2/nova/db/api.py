@@ -150,6 +150,15 @@ def service_update(context, service_id, values):
     return IMPL.service_update(context, service_id, values)
 
 
+def service_heartbeat_update_many(context, heartbeats):
+    """Record the last heartbeat of several services at once.
+
+    :param heartbeats: dict of service id to heartbeat time. Each service
+                       gets that updated_at and one more report_count.
+    """
+    return IMPL.service_heartbeat_update_many(context, heartbeats)
+
+
 ###################
 
 
@@ -493,6 +502,17 @@ def fixed_ip_associate_pool(context, network_id, instance_uuid=None,
                                         instance_uuid, host)
 
 
+def fixed_ip_associate_pool_many(context, network_id, requests):
+    """Find free ips in network for several instances or hosts at once.
+
+    :param requests: list of (instance_uuid, host) pairs
+    :returns: list of the associated fixed ips, in the order of the
+              requests. It is shorter than requests when the network runs
+              out of free ips.
+    """
+    return IMPL.fixed_ip_associate_pool_many(context, network_id, requests)
+
+
 def fixed_ip_create(context, values):
     """Create a fixed ip from the values dictionary."""
     return IMPL.fixed_ip_create(context, values)
@@ -662,6 +682,26 @@ def instance_get_all_by_filters(context, filters, sort_key='created_at',
                                             use_slave=use_slave)
 
 
+def instance_get_all_by_filters_projected(context, filters, columns,
+                                          sort_key='created_at',
+                                          sort_dir='desc', limit=None,
+                                          marker=None, columns_to_join=None,
+                                          use_slave=False):
+    """Get only the given columns of all instances that match all filters."""
+    return IMPL.instance_get_all_by_filters_projected(
+        context, filters, columns, sort_key=sort_key, sort_dir=sort_dir,
+        limit=limit, marker=marker, columns_to_join=columns_to_join,
+        use_slave=use_slave)
+
+
+def instance_image_boot_counts(context, since, limit=None):
+    """Get the number of instances booted from each image since a time.
+
+    Returns (image_ref, count) tuples, most booted image first.
+    """
+    return IMPL.instance_image_boot_counts(context, since, limit=limit)
+
+
 def instance_get_active_by_window_joined(context, begin, end=None,
                                          project_id=None, host=None,
                                          use_slave=False):
@@ -872,6 +912,15 @@ def instance_info_cache_update(context, instance_uuid, values):
     return IMPL.instance_info_cache_update(context, instance_uuid, values)
 
 
+def instance_info_cache_update_many(context, values_by_uuid):
+    """Update the info cache records of several instances at once.
+
+    :param values_by_uuid: = dict of column values to update, keyed by
+                             the uuid of the info cache's instance
+    """
+    return IMPL.instance_info_cache_update_many(context, values_by_uuid)
+
+
 def instance_info_cache_delete(context, instance_uuid):
     """Deletes an existing instance_info_cache record
 
@@ -1142,6 +1191,48 @@ def reservation_rollback(context, reservations, project_id=None, user_id=None):
                                      user_id=user_id)
 
 
+def quota_reserve_optimistic(context, resources, quotas, user_quotas, deltas,
+                             expire, until_refresh, max_age, project_id=None,
+                             user_id=None):
+    """Check quotas and create reservations without locking usages."""
+    return IMPL.quota_reserve_optimistic(context, resources, quotas,
+                                         user_quotas, deltas, expire,
+                                         until_refresh, max_age,
+                                         project_id=project_id,
+                                         user_id=user_id)
+
+
+def reservation_commit_optimistic(context, reservations, project_id=None,
+                                  user_id=None):
+    """Commit quota reservations without locking usages."""
+    return IMPL.reservation_commit_optimistic(context, reservations,
+                                              project_id=project_id,
+                                              user_id=user_id)
+
+
+def reservation_rollback_optimistic(context, reservations, project_id=None,
+                                    user_id=None):
+    """Roll back quota reservations without locking usages."""
+    return IMPL.reservation_rollback_optimistic(context, reservations,
+                                                project_id=project_id,
+                                                user_id=user_id)
+
+
+def reservation_expire_optimistic(context):
+    """Roll back any expired reservations without locking usages."""
+    return IMPL.reservation_expire_optimistic(context)
+
+
+def quota_usage_get_stale(context, limit):
+    """Get the project and user pairs whose usages most need a resync."""
+    return IMPL.quota_usage_get_stale(context, limit)
+
+
+def quota_usage_refresh(context, resources, project_id, user_id):
+    """Resync the tracked usages of a project and user."""
+    return IMPL.quota_usage_refresh(context, resources, project_id, user_id)
+
+
 def quota_destroy_all_by_project_and_user(context, project_id, user_id):
     """Destroy all quotas associated with a given project and user."""
     return IMPL.quota_destroy_all_by_project_and_user(context,
@@ -1934,6 +2025,19 @@ def task_log_get(context, task_name, period_beginning,
                  period_ending, host, state)
 
 
+def periodic_task_stats_update(context, host, binary, task_name, values):
+    """Create or update the run statistics of a periodic task on a host."""
+    return IMPL.periodic_task_stats_update(context, host, binary, task_name,
+                                           values)
+
+
+def periodic_task_stats_get_all(context, host=None, binary=None):
+    """Get the periodic task run statistics, optionally for one host or
+    service binary.
+    """
+    return IMPL.periodic_task_stats_get_all(context, host=host, binary=binary)
+
+
 ####################
 
 
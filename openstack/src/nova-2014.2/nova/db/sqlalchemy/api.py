@@ -33,6 +33,7 @@ from oslo.db.sqlalchemy import utils as sqlalchemyutils
 import six
 from sqlalchemy import and_
 from sqlalchemy import Boolean
+from sqlalchemy import event
 from sqlalchemy.exc import NoSuchTableError
 from sqlalchemy import Integer
 from sqlalchemy import MetaData
@@ -56,6 +57,7 @@ from nova.compute import task_states
 from nova.compute import vm_states
 import nova.context
 from nova.db.sqlalchemy import models
+from nova.db.sqlalchemy import replicas
 from nova import exception
 from nova.i18n import _
 from nova.openstack.common import excutils
@@ -92,16 +94,107 @@ def _create_facade_lazily():
     return _ENGINE_FACADE
 
 
+_REPLICA_POOL = None
+_WRITE_TRACKER = replicas.WriteTracker()
+# Tracks the request context of the running DB API call, and the replica
+# chosen for it if it is a read-only call.
+_ROUTING = threading.local()
+
+
+def _get_replica_pool():
+    global _REPLICA_POOL
+    if _REPLICA_POOL is None:
+        with _LOCK:
+            if _REPLICA_POOL is None:
+                connections = [CONF.database.slave_connection]
+                connections.extend(CONF.database.replica_connections)
+                _REPLICA_POOL = replicas.ReplicaPool(
+                    [connection for connection in connections if connection],
+                    engine_kwargs=dict(
+                        mysql_sql_mode=CONF.database.mysql_sql_mode,
+                        idle_timeout=CONF.database.idle_timeout,
+                        connection_debug=CONF.database.connection_debug,
+                        max_pool_size=CONF.database.max_pool_size,
+                        max_overflow=CONF.database.max_overflow,
+                        pool_timeout=CONF.database.pool_timeout,
+                        connection_trace=CONF.database.connection_trace))
+    return _REPLICA_POOL
+
+
+def _read_replica():
+    """Return the replica serving the running read-only call, if any."""
+    return getattr(_ROUTING, 'replica', None)
+
+
 def get_engine(use_slave=False):
+    replica = _read_replica()
+    if replica is not None:
+        return replica.engine
     facade = _create_facade_lazily()
     return facade.get_engine(use_slave=use_slave)
 
 
 def get_session(use_slave=False, **kwargs):
+    replica = _read_replica()
+    if replica is not None:
+        return replica.session_maker(**kwargs)
     facade = _create_facade_lazily()
     return facade.get_session(use_slave=use_slave, **kwargs)
 
 
+def _note_write(session):
+    context = getattr(_ROUTING, 'context', None)
+    if context is not None and session.bind is get_engine():
+        _WRITE_TRACKER.note_write(context)
+
+
+@event.listens_for(db_session.Session, 'after_flush')
+def _after_flush(session, flush_context):
+    _note_write(session)
+
+
+@event.listens_for(db_session.Session, 'after_bulk_update')
+def _after_bulk_update(update_context):
+    _note_write(update_context.session)
+
+
+@event.listens_for(db_session.Session, 'after_bulk_delete')
+def _after_bulk_delete(delete_context):
+    _note_write(delete_context.session)
+
+
+def _read_only(f):
+    """Decorator for DB API calls that may be served by a read replica.
+
+    The first argument to the wrapped function must be the context. When
+    read routing is enabled the call runs against a healthy replica within
+    the lag limit, unless the context or its project wrote recently. If no
+    replica qualifies, or the chosen one fails, the primary is used.
+    """
+
+    @functools.wraps(f)
+    def wrapper(context, *args, **kwargs):
+        if (not CONF.database.route_reads_to_replicas or
+                _read_replica() is not None or
+                _WRITE_TRACKER.is_sticky(context)):
+            return f(context, *args, **kwargs)
+        pool = _get_replica_pool()
+        replica = pool.choose()
+        if replica is None:
+            return f(context, *args, **kwargs)
+        _ROUTING.replica = replica
+        try:
+            return f(context, *args, **kwargs)
+        except db_exc.DBConnectionError:
+            pool.mark_failed(replica)
+            LOG.warn(_("Read replica %s failed, retrying on the primary"),
+                     replica.engine.url)
+        finally:
+            _ROUTING.replica = None
+        return f(context, *args, **kwargs)
+    return wrapper
+
+
 _SHADOW_TABLE_PREFIX = 'shadow_'
 _DEFAULT_QUOTA_NAME = 'default'
 PER_PROJECT_QUOTAS = ['fixed_ips', 'floating_ips', 'networks']
@@ -122,6 +215,7 @@ def require_admin_context(f):
     @functools.wraps(f)
     def wrapper(*args, **kwargs):
         nova.context.require_admin_context(args[0])
+        _ROUTING.context = args[0]
         return f(*args, **kwargs)
     return wrapper
 
@@ -140,6 +234,7 @@ def require_context(f):
     @functools.wraps(f)
     def wrapper(*args, **kwargs):
         nova.context.require_context(args[0])
+        _ROUTING.context = args[0]
         return f(*args, **kwargs)
     return wrapper
 
@@ -211,6 +306,7 @@ def model_query(context, model, *args, **kwargs):
         use_slave = False
 
     session = kwargs.get('session') or get_session(use_slave=use_slave)
+    _ROUTING.context = context
     read_deleted = kwargs.get('read_deleted') or context.read_deleted
     project_only = kwargs.get('project_only', False)
 
@@ -437,6 +533,7 @@ def service_get(context, service_id, with_compute_node=False,
 
 
 @require_admin_context
+@_read_only
 def service_get_all(context, disabled=None):
     query = model_query(context, models.Service)
 
@@ -527,6 +624,19 @@ def service_update(context, service_id, values):
     return service_ref
 
 
+@require_admin_context
+def service_heartbeat_update_many(context, heartbeats):
+    session = get_session()
+    with session.begin():
+        for service_id, updated_at in heartbeats.iteritems():
+            model_query(context, models.Service, session=session,
+                        read_deleted="no").\
+                filter_by(id=service_id).\
+                update({'updated_at': updated_at,
+                        'report_count': models.Service.report_count + 1},
+                       synchronize_session=False)
+
+
 ###################
 
 def compute_node_get(context, compute_id):
@@ -558,6 +668,7 @@ def compute_node_get_by_service_id(context, service_id):
 
 
 @require_admin_context
+@_read_only
 def compute_node_get_all(context, no_date_fields):
 
     # NOTE(msdubov): Using lower-level 'select' queries and joining the tables
@@ -1173,6 +1284,37 @@ def fixed_ip_associate_pool(context, network_id, instance_uuid=None,
     return fixed_ip_ref
 
 
+@require_admin_context
+def fixed_ip_associate_pool_many(context, network_id, requests):
+    for instance_uuid, _host in requests:
+        if instance_uuid and not uuidutils.is_uuid_like(instance_uuid):
+            raise exception.InvalidUUID(uuid=instance_uuid)
+
+    session = get_session()
+    with session.begin():
+        network_or_none = or_(models.FixedIp.network_id == network_id,
+                              models.FixedIp.network_id == null())
+        fixed_ip_refs = model_query(context, models.FixedIp, session=session,
+                                    read_deleted="no").\
+                               filter(network_or_none).\
+                               filter_by(reserved=False).\
+                               filter_by(instance_uuid=None).\
+                               filter_by(host=None).\
+                               with_lockmode('update').\
+                               limit(len(requests)).\
+                               all()
+        for (instance_uuid, host), fixed_ip_ref in zip(requests,
+                                                       fixed_ip_refs):
+            if fixed_ip_ref['network_id'] is None:
+                fixed_ip_ref['network'] = network_id
+            if instance_uuid:
+                fixed_ip_ref['instance_uuid'] = instance_uuid
+            if host:
+                fixed_ip_ref['host'] = host
+            session.add(fixed_ip_ref)
+    return fixed_ip_refs
+
+
 @require_context
 def fixed_ip_create(context, values):
     fixed_ip_ref = models.FixedIp()
@@ -1835,6 +1977,7 @@ def instance_get_all(context, columns_to_join=None):
 
 
 @require_context
+@_read_only
 def instance_get_all_by_filters(context, filters, sort_key, sort_dir,
                                 limit=None, marker=None, columns_to_join=None,
                                 use_slave=False):
@@ -1877,8 +2020,6 @@ def instance_get_all_by_filters(context, filters, sort_key, sort_dir,
     if limit == 0:
         return []
 
-    sort_fn = {'desc': desc, 'asc': asc}
-
     if CONF.database.slave_connection == '':
         use_slave = False
 
@@ -1894,6 +2035,120 @@ def instance_get_all_by_filters(context, filters, sort_key, sort_dir,
     for column in columns_to_join:
         query_prefix = query_prefix.options(joinedload(column))
 
+    query_prefix = _instances_filtered_query(context, session, query_prefix,
+                                             filters, sort_key, sort_dir,
+                                             limit=limit, marker=marker)
+
+    return _instances_fill_metadata(context, query_prefix.all(), manual_joins)
+
+
+@require_context
+@_read_only
+def instance_get_all_by_filters_projected(context, filters, columns,
+                                          sort_key='created_at',
+                                          sort_dir='desc', limit=None,
+                                          marker=None, columns_to_join=None,
+                                          use_slave=False):
+    """Return a projection of the instances that match all filters.
+
+    Filtering, sorting and pagination behave exactly like
+    instance_get_all_by_filters(), but only the requested instance
+    columns are selected and info_cache and security_groups are never
+    joined. 'uuid' is always part of the projection.
+
+    :param columns: list of instance column names to select
+    :param columns_to_join: list of related rows to fetch, any combination
+                            of 'metadata', 'system_metadata' and
+                            'info_cache'. Each is loaded with one batched
+                            query rather than a join.
+    :returns: list of dicts keyed by the selected column names, plus one
+              key per entry in columns_to_join
+    """
+    if limit == 0:
+        return []
+
+    table_columns = models.Instance.__table__.columns
+    for column in columns:
+        if column not in table_columns:
+            msg = _("Invalid instance column: %s") % column
+            raise exception.InvalidInput(reason=msg)
+    columns_to_join = columns_to_join or []
+    for column in columns_to_join:
+        if column not in ('metadata', 'system_metadata', 'info_cache'):
+            msg = _("Column %s cannot be joined in a projection") % column
+            raise exception.InvalidInput(reason=msg)
+
+    if CONF.database.slave_connection == '':
+        use_slave = False
+
+    session = get_session(use_slave=use_slave)
+
+    selected = ['uuid'] + [column for column in columns if column != 'uuid']
+    query_prefix = session.query(*[getattr(models.Instance, column)
+                                   for column in selected])
+    query_prefix = _instances_filtered_query(context, session, query_prefix,
+                                             filters, sort_key, sort_dir,
+                                             limit=limit, marker=marker)
+
+    instances = [dict(zip(selected, row)) for row in query_prefix.all()]
+    uuids = [inst['uuid'] for inst in instances]
+
+    meta = collections.defaultdict(list)
+    if 'metadata' in columns_to_join:
+        for row in _instance_metadata_get_multi(context, uuids,
+                                                session=session):
+            meta[row['instance_uuid']].append(row)
+
+    sys_meta = collections.defaultdict(list)
+    if 'system_metadata' in columns_to_join:
+        for row in _instance_system_metadata_get_multi(context, uuids,
+                                                       session=session):
+            sys_meta[row['instance_uuid']].append(row)
+
+    info_caches = {}
+    if 'info_cache' in columns_to_join and uuids:
+        for row in model_query(context, models.InstanceInfoCache,
+                               session=session).\
+                filter(models.InstanceInfoCache.instance_uuid.in_(uuids)):
+            info_caches[row['instance_uuid']] = row
+
+    for inst in instances:
+        if 'metadata' in columns_to_join:
+            inst['metadata'] = meta[inst['uuid']]
+        if 'system_metadata' in columns_to_join:
+            inst['system_metadata'] = sys_meta[inst['uuid']]
+        if 'info_cache' in columns_to_join:
+            inst['info_cache'] = info_caches.get(inst['uuid'])
+
+    return instances
+
+
+def _instance_get_marker_keys(context, marker, sort_keys, session):
+    """Look up the sort key values of the marker instance.
+
+    Only the columns used for keyset pagination are selected, so resuming
+    a listing does not pay for the joins of a full instance fetch.
+    """
+    query = model_query(context,
+                        *[getattr(models.Instance, key) for key in sort_keys],
+                        base_model=models.Instance, session=session,
+                        project_only=True).\
+                filter_by(uuid=marker)
+    result = query.first()
+    if not result:
+        raise exception.MarkerNotFound(marker)
+    return result
+
+
+def _instances_filtered_query(context, session, query_prefix, filters,
+                              sort_key, sort_dir, limit=None, marker=None):
+    """Apply the instance_get_all_by_filters() filters to a query.
+
+    The query may select full Instance models or a projection of
+    Instance columns. Ordering and keyset pagination are applied as well.
+    """
+    sort_fn = {'desc': desc, 'asc': asc}
+
     query_prefix = query_prefix.order_by(sort_fn[sort_dir](
             getattr(models.Instance, sort_key)))
 
@@ -1963,19 +2218,16 @@ def instance_get_all_by_filters(context, filters, sort_key, sort_dir,
                               filters)
 
     # paginate query
+    sort_keys = [sort_key, 'created_at', 'id']
     if marker is not None:
-        try:
-            marker = _instance_get_by_uuid(context, marker, session=session)
-        except exception.InstanceNotFound:
-            raise exception.MarkerNotFound(marker)
-    query_prefix = sqlalchemyutils.paginate_query(query_prefix,
+        marker = _instance_get_marker_keys(context, marker, sort_keys,
+                                           session)
+    return sqlalchemyutils.paginate_query(query_prefix,
                            models.Instance, limit,
-                           [sort_key, 'created_at', 'id'],
+                           sort_keys,
                            marker=marker,
                            sort_dir=sort_dir)
 
-    return _instances_fill_metadata(context, query_prefix.all(), manual_joins)
-
 
 def tag_filter(context, query, model, model_metadata,
                model_uuid, filters):
@@ -2131,6 +2383,7 @@ def process_sort_params(sort_keys, sort_dirs,
 
 
 @require_context
+@_read_only
 def instance_get_active_by_window_joined(context, begin, end=None,
                                          project_id=None, host=None,
                                          use_slave=False):
@@ -2152,6 +2405,23 @@ def instance_get_active_by_window_joined(context, begin, end=None,
     return _instances_fill_metadata(context, query.all())
 
 
+@require_admin_context
+@_read_only
+def instance_image_boot_counts(context, since, limit=None):
+    """Return (image_ref, count) of instances created since a time."""
+    count = func.count(models.Instance.id)
+    query = model_query(context, models.Instance.image_ref, count,
+                        read_deleted='yes', base_model=models.Instance).\
+                filter(models.Instance.created_at >= since).\
+                filter(models.Instance.image_ref != null()).\
+                filter(models.Instance.image_ref != '').\
+                group_by(models.Instance.image_ref).\
+                order_by(desc(count))
+    if limit:
+        query = query.limit(limit)
+    return query.all()
+
+
 def _instance_get_all_query(context, project_only=False,
                             joins=None, use_slave=False):
     if joins is None:
@@ -2167,6 +2437,7 @@ def _instance_get_all_query(context, project_only=False,
 
 
 @require_admin_context
+@_read_only
 def instance_get_all_by_host(context, host,
                              columns_to_join=None,
                              use_slave=False):
@@ -2193,6 +2464,7 @@ def _instance_get_all_uuids_by_host(context, host, session=None):
 
 
 @require_admin_context
+@_read_only
 def instance_get_all_by_host_and_node(context, host, node):
     return _instances_fill_metadata(context,
         _instance_get_all_query(context, joins=[]).filter_by(host=host).
@@ -2347,6 +2619,25 @@ def _instance_update(context, instance_uuid, values, copy_old_instance=False,
             if actual_state not in expected:
                 raise exception.UnexpectedVMStateError(actual=actual_state,
                                                        expected=expected)
+        if "expected_values" in values:
+            # NOTE: Datetimes are compared to the second, as instance
+            # objects carry them without fractions of a second.
+            expected = {}
+            actual = {}
+            for key, value in values.pop("expected_values").items():
+                actual_value = instance_ref[key]
+                if isinstance(value, datetime.datetime):
+                    value = timeutils.normalize_time(value).replace(
+                        microsecond=0)
+                    if actual_value is not None:
+                        actual_value = actual_value.replace(microsecond=0)
+                if actual_value != value:
+                    expected[key] = value
+                    actual[key] = actual_value
+            if expected:
+                raise exception.InstanceUpdateConflict(
+                        instance_uuid=instance_uuid, expected=expected,
+                        actual=actual)
 
         instance_hostname = instance_ref['hostname'] or ''
         if ("hostname" in values and
@@ -2449,6 +2740,40 @@ def instance_info_cache_update(context, instance_uuid, values):
     return info_cache
 
 
+@require_context
+def instance_info_cache_update_many(context, values_by_uuid):
+    """Update the info cache records of several instances in one
+    transaction.
+
+    :param values_by_uuid: = dict of the column values to update, keyed
+                             by the uuid of the info cache's instance
+    """
+    if not values_by_uuid:
+        return []
+    session = get_session()
+    with session.begin():
+        info_caches = dict(
+            (info_cache.instance_uuid, info_cache) for info_cache in
+            model_query(context, models.InstanceInfoCache, session=session,
+                        read_deleted="yes").
+            filter(models.InstanceInfoCache.instance_uuid.in_(
+                values_by_uuid.keys())).
+            all())
+        updated = []
+        for instance_uuid, values in values_by_uuid.iteritems():
+            info_cache = info_caches.get(instance_uuid)
+            if info_cache and info_cache['deleted']:
+                # NOTE: The instance was deleted under us, skip it.
+                continue
+            elif not info_cache:
+                info_cache = models.InstanceInfoCache()
+                info_cache.instance_uuid = instance_uuid
+            info_cache.update(values)
+            session.add(info_cache)
+            updated.append(info_cache)
+    return updated
+
+
 @require_context
 def instance_info_cache_delete(context, instance_uuid):
     """Deletes an existing instance_info_cache record
@@ -2887,6 +3212,7 @@ def quota_get(context, project_id, resource, user_id=None):
 
 
 @require_context
+@_read_only
 def quota_get_all_by_project_and_user(context, project_id, user_id):
     nova.context.authorize_project_context(context, project_id)
 
@@ -2905,6 +3231,7 @@ def quota_get_all_by_project_and_user(context, project_id, user_id):
 
 
 @require_context
+@_read_only
 def quota_get_all_by_project(context, project_id):
     nova.context.authorize_project_context(context, project_id)
 
@@ -3074,11 +3401,13 @@ def _quota_usage_get_all(context, project_id, user_id=None):
 
 
 @require_context
+@_read_only
 def quota_usage_get_all_by_project_and_user(context, project_id, user_id):
     return _quota_usage_get_all(context, project_id, user_id=user_id)
 
 
 @require_context
+@_read_only
 def quota_usage_get_all_by_project(context, project_id):
     return _quota_usage_get_all(context, project_id)
 
@@ -3145,13 +3474,14 @@ def _reservation_create(context, uuid, usage, project_id, user_id, resource,
 # on reservations.
 
 def _get_project_user_quota_usages(context, session, project_id,
-                                   user_id):
-    rows = model_query(context, models.QuotaUsage,
-                       read_deleted="no",
-                       session=session).\
-                   filter_by(project_id=project_id).\
-                   with_lockmode('update').\
-                   all()
+                                   user_id, lock=True):
+    query = model_query(context, models.QuotaUsage,
+                        read_deleted="no",
+                        session=session).\
+                   filter_by(project_id=project_id)
+    if lock:
+        query = query.with_lockmode('update')
+    rows = query.all()
     proj_result = dict()
     user_result = dict()
     # Get the total count of in_use,reserved
@@ -3166,6 +3496,40 @@ def _get_project_user_quota_usages(context, session, project_id,
     return proj_result, user_result
 
 
+def _quota_over_exception(project_quotas, user_quotas, deltas, overs,
+                          project_usages, user_usages):
+    """Build the OverQuota exception for a failed reservation."""
+    if project_quotas == user_quotas:
+        usages = project_usages
+    else:
+        usages = user_usages
+    usages = dict((k, dict(in_use=v['in_use'], reserved=v['reserved']))
+                  for k, v in usages.items())
+    headroom = dict((res, user_quotas[res] -
+                         (usages[res]['in_use'] + usages[res]['reserved']))
+                    for res in user_quotas.keys())
+
+    # If quota_cores is unlimited [-1]:
+    # - set cores headroom based on instances headroom:
+    if user_quotas.get('cores') == -1:
+        if deltas['cores']:
+            hc = headroom['instances'] * deltas['cores']
+            headroom['cores'] = hc / deltas['instances']
+        else:
+            headroom['cores'] = headroom['instances']
+
+    # If quota_ram is unlimited [-1]:
+    # - set ram headroom based on instances headroom:
+    if user_quotas.get('ram') == -1:
+        if deltas['ram']:
+            hr = headroom['instances'] * deltas['ram']
+            headroom['ram'] = hr / deltas['instances']
+        else:
+            headroom['ram'] = headroom['instances']
+    return exception.OverQuota(overs=sorted(overs), quotas=user_quotas,
+                               usages=usages, headroom=headroom)
+
+
 @require_context
 @_retry_on_deadlock
 def quota_reserve(context, resources, project_quotas, user_quotas, deltas,
@@ -3342,35 +3706,8 @@ def quota_reserve(context, resources, project_quotas, user_quotas, deltas,
         LOG.warning(_("Change will make usage less than 0 for the following "
                       "resources: %s"), unders)
     if overs:
-        if project_quotas == user_quotas:
-            usages = project_usages
-        else:
-            usages = user_usages
-        usages = dict((k, dict(in_use=v['in_use'], reserved=v['reserved']))
-                      for k, v in usages.items())
-        headroom = dict((res, user_quotas[res] -
-                             (usages[res]['in_use'] + usages[res]['reserved']))
-                        for res in user_quotas.keys())
-
-        # If quota_cores is unlimited [-1]:
-        # - set cores headroom based on instances headroom:
-        if user_quotas.get('cores') == -1:
-            if deltas['cores']:
-                hc = headroom['instances'] * deltas['cores']
-                headroom['cores'] = hc / deltas['instances']
-            else:
-                headroom['cores'] = headroom['instances']
-
-        # If quota_ram is unlimited [-1]:
-        # - set ram headroom based on instances headroom:
-        if user_quotas.get('ram') == -1:
-            if deltas['ram']:
-                hr = headroom['instances'] * deltas['ram']
-                headroom['ram'] = hr / deltas['instances']
-            else:
-                headroom['ram'] = headroom['instances']
-        raise exception.OverQuota(overs=sorted(overs), quotas=user_quotas,
-                                  usages=usages, headroom=headroom)
+        raise _quota_over_exception(project_quotas, user_quotas, deltas,
+                                    overs, project_usages, user_usages)
 
     return reservations
 
@@ -3419,6 +3756,233 @@ def reservation_rollback(context, reservations, project_id=None, user_id=None):
         reservation_query.soft_delete(synchronize_session=False)
 
 
+# NOTE: The optimistic quota functions below never lock quota_usages with
+# SELECT ... FOR UPDATE. Reservations are applied with compare-and-swap
+# updates that only succeed if the usage row still holds the values the
+# quota check was made against, and commits and rollbacks apply relative
+# updates. Usage resyncs are left to quota_usage_refresh, which is meant to
+# run in the background.
+
+# Number of times a reservation is retried after losing a compare-and-swap
+# race before falling back to the locking quota_reserve.
+_QUOTA_CAS_RETRIES = 5
+
+
+class _QuotaUsageConflict(Exception):
+    """A usage row changed between the quota check and the update."""
+
+
+def _quota_reserve_cas(context, session, project_quotas, user_quotas,
+                       deltas, expire, project_id, user_id):
+    elevated = context.elevated()
+    project_usages, user_usages = _get_project_user_quota_usages(
+            context, session, project_id, user_id, lock=False)
+    if any(res not in user_usages or user_usages[res].in_use < 0
+           for res in deltas):
+        # NOTE: Missing or desynced usages need a locked resync first.
+        return None, None
+
+    for key, value in user_usages.items():
+        if key not in project_usages:
+            project_usages[key] = value
+    overs = [res for res, delta in deltas.items()
+             if user_quotas[res] >= 0 and delta >= 0 and
+             (project_quotas[res] < delta +
+              project_usages[res]['total'] or
+              user_quotas[res] < delta +
+              user_usages[res].total)]
+    if overs:
+        raise _quota_over_exception(project_quotas, user_quotas, deltas,
+                                    overs, project_usages, user_usages)
+
+    reservations = []
+    for res, delta in deltas.items():
+        usage = user_usages[res]
+        if delta > 0:
+            # All the instances of a multi-instance request are reserved
+            # with a single update of the usage row.
+            updated = model_query(elevated, models.QuotaUsage,
+                                  read_deleted="no", session=session).\
+                filter_by(id=usage.id,
+                          in_use=usage.in_use,
+                          reserved=usage.reserved).\
+                update({'reserved': usage.reserved + delta},
+                       synchronize_session=False)
+            if not updated:
+                raise _QuotaUsageConflict()
+        reservation = models.Reservation(uuid=str(uuid.uuid4()),
+                                         usage_id=usage.id,
+                                         project_id=project_id,
+                                         user_id=user_id,
+                                         resource=res,
+                                         delta=delta,
+                                         expire=expire)
+        session.add(reservation)
+        reservations.append(reservation.uuid)
+    return reservations, project_usages
+
+
+@require_context
+def quota_reserve_optimistic(context, resources, project_quotas, user_quotas,
+                             deltas, expire, until_refresh, max_age,
+                             project_id=None, user_id=None):
+    if project_id is None:
+        project_id = context.project_id
+    if user_id is None:
+        user_id = context.user_id
+
+    for _attempt in range(_QUOTA_CAS_RETRIES):
+        session = get_session()
+        try:
+            with session.begin():
+                reservations, usages = _quota_reserve_cas(
+                        context, session, project_quotas, user_quotas,
+                        deltas, expire, project_id, user_id)
+        except _QuotaUsageConflict:
+            continue
+        if reservations is None:
+            break
+
+        # NOTE: The compare-and-swap only protects this user's usage rows,
+        # so check the project totals again now that the reservation is
+        # visible to others. Concurrent requests that went over the project
+        # quota together are all rolled back, which never over-commits.
+        project_usages, _user_usages = _get_project_user_quota_usages(
+                context, get_session(), project_id, user_id, lock=False)
+        overs = [res for res, delta in deltas.items()
+                 if project_quotas[res] >= 0 and delta > 0 and
+                 res in project_usages and
+                 project_quotas[res] < project_usages[res]['total']]
+        if overs:
+            reservation_rollback_optimistic(context, reservations,
+                                            project_id=project_id,
+                                            user_id=user_id)
+            raise _quota_over_exception(project_quotas, user_quotas, deltas,
+                                        overs, usages, usages)
+        return reservations
+
+    return quota_reserve(context, resources, project_quotas, user_quotas,
+                         deltas, expire, until_refresh, max_age,
+                         project_id=project_id, user_id=user_id)
+
+
+def _reservation_rows_apply(context, session, rows, commit):
+    for reservation in rows:
+        # NOTE: Claim the reservation first so a concurrent commit,
+        # rollback or expiry of the same reservation is applied once.
+        claimed = model_query(context, models.Reservation,
+                              read_deleted="no", session=session).\
+                      filter_by(id=reservation.id).\
+                      soft_delete(synchronize_session=False)
+        if not claimed:
+            continue
+        updates = {}
+        if reservation.delta >= 0:
+            updates['reserved'] = (models.QuotaUsage.reserved -
+                                   reservation.delta)
+        if commit:
+            updates['in_use'] = (models.QuotaUsage.in_use +
+                                 reservation.delta)
+        if updates:
+            model_query(context, models.QuotaUsage,
+                        read_deleted="no", session=session).\
+                filter_by(id=reservation.usage_id).\
+                update(updates, synchronize_session=False)
+
+
+def _reservations_apply(context, reservations, commit):
+    session = get_session()
+    with session.begin():
+        rows = model_query(context, models.Reservation,
+                           read_deleted="no", session=session).\
+                   filter(models.Reservation.uuid.in_(reservations)).\
+                   order_by(models.Reservation.usage_id).\
+                   all()
+        _reservation_rows_apply(context, session, rows, commit)
+
+
+@require_context
+@_retry_on_deadlock
+def reservation_commit_optimistic(context, reservations, project_id=None,
+                                  user_id=None):
+    _reservations_apply(context, reservations, commit=True)
+
+
+@require_context
+@_retry_on_deadlock
+def reservation_rollback_optimistic(context, reservations, project_id=None,
+                                    user_id=None):
+    _reservations_apply(context, reservations, commit=False)
+
+
+@require_admin_context
+@_retry_on_deadlock
+def reservation_expire_optimistic(context):
+    session = get_session()
+    with session.begin():
+        current_time = timeutils.utcnow()
+        rows = model_query(context, models.Reservation,
+                           read_deleted="no", session=session).\
+                   filter(models.Reservation.expire < current_time).\
+                   order_by(models.Reservation.usage_id).\
+                   all()
+        _reservation_rows_apply(context, session, rows, commit=False)
+
+
+@require_admin_context
+def quota_usage_get_stale(context, limit):
+    """Return the (project_id, user_id) pairs whose usages most need a
+    resync: desynced ones first, then the least recently updated.
+    """
+    return model_query(context, models.QuotaUsage.project_id,
+                       models.QuotaUsage.user_id,
+                       base_model=models.QuotaUsage, read_deleted="no").\
+               group_by(models.QuotaUsage.project_id,
+                        models.QuotaUsage.user_id).\
+               order_by(func.min(sql.case([(models.QuotaUsage.in_use < 0, 0)],
+                                          else_=1)),
+                        func.min(models.QuotaUsage.updated_at)).\
+               limit(limit).\
+               all()
+
+
+@require_admin_context
+@_retry_on_deadlock
+def quota_usage_refresh(context, resources, project_id, user_id):
+    session = get_session()
+    with session.begin():
+        _project_usages, user_usages = _get_project_user_quota_usages(
+                context, session, project_id, user_id)
+        synced = set()
+        now = timeutils.utcnow()
+        for resource, usage in user_usages.items():
+            usage.updated_at = now
+            sync_name = getattr(resources.get(resource), 'sync', None)
+            if sync_name is None or sync_name in synced:
+                continue
+            synced.add(sync_name)
+            sync = QUOTA_SYNC_FUNCTIONS[sync_name]
+            for res, in_use in sync(context, project_id, user_id,
+                                    session).items():
+                if res not in user_usages:
+                    continue
+                if user_usages[res].in_use != in_use:
+                    LOG.debug('quota_usages out of sync, updating. '
+                              'project_id: %(project_id)s, '
+                              'user_id: %(user_id)s, '
+                              'resource: %(res)s, '
+                              'tracked usage: %(tracked_use)s, '
+                              'actual usage: %(in_use)s',
+                              {'project_id': project_id,
+                               'user_id': user_id,
+                               'res': res,
+                               'tracked_use': user_usages[res].in_use,
+                               'in_use': in_use})
+                    user_usages[res].in_use = in_use
+        for usage in user_usages.values():
+            session.add(usage)
+
+
 @require_admin_context
 def quota_destroy_all_by_project_and_user(context, project_id, user_id):
     session = get_session()
@@ -5693,6 +6257,40 @@ def task_log_end_task(context, task_name, period_beginning, period_ending,
             raise exception.TaskNotRunning(task_name=task_name, host=host)
 
 
+@require_admin_context
+@_retry_on_deadlock
+def periodic_task_stats_update(context, host, binary, task_name, values):
+    convert_objects_related_datetimes(values, 'last_run_at', 'created_at',
+                                      'updated_at', 'deleted_at')
+    session = get_session()
+    with session.begin():
+        stats_ref = model_query(context, models.PeriodicTaskStats,
+                                session=session, read_deleted="no").\
+                        filter_by(host=host).\
+                        filter_by(binary=binary).\
+                        filter_by(task_name=task_name).\
+                        first()
+        if not stats_ref:
+            stats_ref = models.PeriodicTaskStats()
+            stats_ref.host = host
+            stats_ref.binary = binary
+            stats_ref.task_name = task_name
+        stats_ref.update(values)
+        stats_ref.save(session=session)
+    return stats_ref
+
+
+@require_admin_context
+def periodic_task_stats_get_all(context, host=None, binary=None):
+    query = model_query(context, models.PeriodicTaskStats, read_deleted="no")
+    if host is not None:
+        query = query.filter_by(host=host)
+    if binary is not None:
+        query = query.filter_by(binary=binary)
+    return query.order_by(models.PeriodicTaskStats.host,
+                          models.PeriodicTaskStats.task_name).all()
+
+
 def _get_default_deleted_value(table):
     # TODO(dripton): It would be better to introspect the actual default value
     # from the column, but I don't see a way to do that in the low-level APIs
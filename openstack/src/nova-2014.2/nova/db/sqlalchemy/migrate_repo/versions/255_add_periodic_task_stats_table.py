@@ -0,0 +1,74 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+
+from migrate.changeset import UniqueConstraint
+from sqlalchemy import BigInteger
+from sqlalchemy import Column
+from sqlalchemy import DateTime
+from sqlalchemy import Float
+from sqlalchemy import Integer
+from sqlalchemy import MetaData
+from sqlalchemy import String
+from sqlalchemy import Table
+
+
+def upgrade(migrate_engine):
+    meta = MetaData()
+    meta.bind = migrate_engine
+
+    columns = [
+        (('created_at', DateTime), {}),
+        (('updated_at', DateTime), {}),
+        (('deleted_at', DateTime), {}),
+        (('deleted', Integer), {}),
+        (('id', Integer), dict(primary_key=True, nullable=False)),
+        (('host', String(length=255)), dict(nullable=False)),
+        (('binary', String(length=255)), dict(nullable=False)),
+        (('task_name', String(length=255)), dict(nullable=False)),
+        (('spacing', Float), {}),
+        (('runs', Integer), {}),
+        (('failures', Integer), {}),
+        (('overruns', Integer), {}),
+        (('last_run_at', DateTime), {}),
+        (('last_duration', Float), {}),
+        (('max_duration', Float), {}),
+        (('total_duration', Float), {}),
+        (('db_calls', BigInteger), {}),
+        (('rpc_calls', BigInteger), {}),
+     ]
+    for prefix in ('', 'shadow_'):
+        basename = prefix + 'periodic_task_stats'
+        if migrate_engine.has_table(basename):
+            continue
+        _columns = tuple([Column(*args, **kwargs)
+                          for args, kwargs in columns])
+        table = Table(basename, meta, *_columns, mysql_engine='InnoDB',
+                      mysql_charset='utf8')
+        table.create()
+
+        if not prefix:
+            UniqueConstraint(
+                'host', 'binary', 'task_name', 'deleted', table=table,
+                name='uniq_periodic_task_stats0host0binary0task_name0deleted'
+            ).create()
+
+
+def downgrade(migrate_engine):
+    meta = MetaData()
+    meta.bind = migrate_engine
+
+    for prefix in ('', 'shadow_'):
+        table_name = prefix + 'periodic_task_stats'
+        if migrate_engine.has_table(table_name):
+            table = Table(table_name, meta, autoload=True)
+            table.drop()
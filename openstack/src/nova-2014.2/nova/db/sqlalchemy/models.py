@@ -1311,6 +1311,30 @@ class TaskLog(BASE, NovaBase):
     errors = Column(Integer(), default=0)
 
 
+class PeriodicTaskStats(BASE, NovaBase):
+    """Run statistics of a periodic task on a host."""
+    __tablename__ = 'periodic_task_stats'
+    __table_args__ = (
+        schema.UniqueConstraint(
+            'host', 'binary', 'task_name', 'deleted',
+            name="uniq_periodic_task_stats0host0binary0task_name0deleted"),
+    )
+    id = Column(Integer, primary_key=True, nullable=False, autoincrement=True)
+    host = Column(String(255), nullable=False)
+    binary = Column(String(255), nullable=False)
+    task_name = Column(String(255), nullable=False)
+    spacing = Column(Float)
+    runs = Column(Integer, default=0)
+    failures = Column(Integer, default=0)
+    overruns = Column(Integer, default=0)
+    last_run_at = Column(DateTime)
+    last_duration = Column(Float)
+    max_duration = Column(Float)
+    total_duration = Column(Float, default=0)
+    db_calls = Column(BigInteger, default=0)
+    rpc_calls = Column(BigInteger, default=0)
+
+
 class InstanceGroupMember(BASE, NovaBase):
     """Represents the members for an instance group."""
     __tablename__ = 'instance_group_member'
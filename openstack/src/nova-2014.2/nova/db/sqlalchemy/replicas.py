@@ -0,0 +1,187 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Pool of asynchronously replicated read-only databases.
+
+The SQLAlchemy backend sends read-only DB API calls to a replica from this
+pool when ``[database] route_reads_to_replicas`` is enabled. Replicas are
+health checked periodically and skipped while they are unreachable or lag
+behind the primary by more than ``replica_max_lag`` seconds, in which case
+reads fall back to the primary.
+"""
+
+import itertools
+import threading
+import time
+
+from oslo.config import cfg
+from oslo.db import exception as db_exc
+from oslo.db.sqlalchemy import session as db_session
+import sqlalchemy
+
+from nova.i18n import _LW
+from nova.openstack.common import log as logging
+
+replica_opts = [
+    cfg.BoolOpt('route_reads_to_replicas',
+                default=False,
+                help='Send read-only DB API calls, such as instance '
+                     'listings, compute node and quota usage reads, to the '
+                     'read replicas given by slave_connection and '
+                     'replica_connections'),
+    cfg.ListOpt('replica_connections',
+                default=[],
+                help='Connection strings of additional read replicas, used '
+                     'together with slave_connection'),
+    cfg.IntOpt('replica_max_lag',
+               default=30,
+               help='Replicas lagging behind the primary by more than this '
+                    'many seconds are not used for reads'),
+    cfg.IntOpt('replica_check_interval',
+               default=10,
+               help='Interval in seconds between replica health and lag '
+                    'checks'),
+    cfg.IntOpt('replica_sticky_seconds',
+               default=10,
+               help='Number of seconds after a write during which reads on '
+                    'behalf of the same project go to the primary, so that '
+                    'callers always read their own writes'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(replica_opts, 'database')
+
+LOG = logging.getLogger(__name__)
+
+# Per dialect query returning the replication lag in seconds, or no rows
+# (or NULL) when the lag cannot be determined.
+_LAG_QUERIES = {
+    'postgresql': 'SELECT EXTRACT(EPOCH FROM '
+                  'now() - pg_last_xact_replay_timestamp())',
+}
+
+
+class Replica(object):
+    """A single read replica and its last known health."""
+
+    def __init__(self, connection, engine):
+        self.connection = connection
+        self.engine = engine
+        self.session_maker = db_session.get_maker(engine=engine)
+        self.healthy = True
+        self.lag = 0
+        self.checked_at = None
+
+    def check(self):
+        """Refresh the health and lag of this replica."""
+        try:
+            with self.engine.connect() as conn:
+                self.lag = self._get_lag(conn)
+            self.healthy = True
+        except (sqlalchemy.exc.SQLAlchemyError, db_exc.DBError) as e:
+            if self.healthy:
+                LOG.warn(_LW("Read replica %(replica)s is unavailable: "
+                             "%(error)s"),
+                         {'replica': self.engine.url, 'error': e})
+            self.healthy = False
+        self.checked_at = time.time()
+
+    def _get_lag(self, conn):
+        dialect = self.engine.dialect.name
+        if dialect == 'mysql':
+            row = conn.execute('SHOW SLAVE STATUS').first()
+            if row is None:
+                # NOTE: Not a replica at all, so it cannot lag.
+                return 0
+            return row['Seconds_Behind_Master']
+        if dialect in _LAG_QUERIES:
+            return conn.execute(_LAG_QUERIES[dialect]).scalar() or 0
+        conn.execute('SELECT 1')
+        return 0
+
+    def usable(self, max_lag):
+        return self.healthy and self.lag is not None and self.lag <= max_lag
+
+
+class ReplicaPool(object):
+    """Round-robin pool of read replicas with lag-aware health checks."""
+
+    def __init__(self, connections, engine_kwargs=None):
+        engine_kwargs = dict(engine_kwargs or {})
+        # NOTE: Do not block startup on an unreachable replica, the health
+        # check takes it out of rotation instead.
+        engine_kwargs['max_retries'] = 0
+        self.replicas = [Replica(connection,
+                                 db_session.create_engine(connection,
+                                                          **engine_kwargs))
+                         for connection in connections]
+        self._cycle = itertools.cycle(self.replicas)
+        self._lock = threading.Lock()
+
+    def _maybe_check(self, replica):
+        if (replica.checked_at is None or
+                time.time() - replica.checked_at >=
+                CONF.database.replica_check_interval):
+            with self._lock:
+                if (replica.checked_at is None or
+                        time.time() - replica.checked_at >=
+                        CONF.database.replica_check_interval):
+                    replica.check()
+
+    def choose(self):
+        """Return the next usable replica, or None to use the primary."""
+        for _i in range(len(self.replicas)):
+            replica = next(self._cycle)
+            self._maybe_check(replica)
+            if replica.usable(CONF.database.replica_max_lag):
+                return replica
+        return None
+
+    def mark_failed(self, replica):
+        """Take a replica out of rotation until its next health check."""
+        replica.healthy = False
+        replica.checked_at = time.time()
+
+
+class WriteTracker(object):
+    """Remember which projects wrote recently, for read-your-writes."""
+
+    def __init__(self):
+        self._writes = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(context):
+        return getattr(context, 'project_id', None) or getattr(
+            context, 'user_id', None)
+
+    def note_write(self, context):
+        context.db_primary_only = True
+        key = self._key(context)
+        if key is None:
+            return
+        now = time.time()
+        with self._lock:
+            self._writes[key] = now
+            if len(self._writes) > 1024:
+                expiry = now - CONF.database.replica_sticky_seconds
+                for stale in [k for k, t in self._writes.iteritems()
+                              if t < expiry]:
+                    del self._writes[stale]
+
+    def is_sticky(self, context):
+        """Whether reads for this context must go to the primary."""
+        if getattr(context, 'db_primary_only', False):
+            return True
+        wrote_at = self._writes.get(self._key(context))
+        return (wrote_at is not None and time.time() - wrote_at <
+                CONF.database.replica_sticky_seconds)
@@ -1393,6 +1393,11 @@ class UnexpectedVMStateError(NovaException):
                 "the actual state is %(actual)s")
 
 
+class InstanceUpdateConflict(NovaException):
+    msg_fmt = _("Conflict updating instance %(instance_uuid)s: expecting "
+                "%(expected)s but the actual values are %(actual)s")
+
+
 class CryptoCAFileNotFound(FileNotFound):
     msg_fmt = _("The CA file for %(project)s could not be found")
 
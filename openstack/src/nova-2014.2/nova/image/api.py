@@ -136,7 +136,8 @@ class API(object):
         session, image_id = self._get_session_and_image_id(context, id_or_uri)
         return session.delete(context, image_id)
 
-    def download(self, context, id_or_uri, data=None, dest_path=None):
+    def download(self, context, id_or_uri, data=None, dest_path=None,
+                 max_rate=0):
         """Transfer image bits from Glance or a known source location to the
         supplied destination filepath.
 
@@ -146,6 +147,8 @@ class API(object):
                           information for.
         :param data: A file object to use in downloading image data.
         :param dest_path: Filepath to transfer image bits to.
+        :param max_rate: Limit the transfer from Glance to this many bytes
+                         per second, 0 for no limit.
 
         Note that because of the poor design of the
         `glance.ImageService.download` method, the function returns different
@@ -175,4 +178,4 @@ class API(object):
         #                 handle streaming/copying/zero-copy as they see fit.
         session, image_id = self._get_session_and_image_id(context, id_or_uri)
         return session.download(context, image_id, data=data,
-                                dst_path=dest_path)
+                                dst_path=dest_path, max_rate=max_rate)
@@ -18,14 +18,19 @@
 from __future__ import absolute_import
 
 import copy
+import errno
+import hashlib
 import itertools
+import os
 import random
 import sys
 import time
 
+import eventlet
 import glanceclient
 import glanceclient.exc
 from oslo.config import cfg
+from oslo.utils import units
 import six
 import six.moves.urllib.parse as urlparse
 
@@ -78,6 +83,19 @@ glance_opts = [
                      'via the direct_url.  Currently supported schemes: '
                      '[file].',
                deprecated_group='DEFAULT'),
+    cfg.IntOpt('download_workers',
+               default=1,
+               help='Number of byte ranges of an image fetched from glance '
+                    'in parallel when downloading it to a file. 1 streams '
+                    'the image in a single request'),
+    cfg.IntOpt('download_range_size',
+               default=64,
+               help='Size in MiB of the byte ranges fetched in parallel '
+                    'when download_workers is greater than 1'),
+    cfg.BoolOpt('download_sparse',
+                default=True,
+                help='Leave holes instead of writing blocks of zeroes when '
+                     'downloading an image to a file'),
     ]
 
 LOG = logging.getLogger(__name__)
@@ -184,6 +202,44 @@ def get_api_servers():
     return itertools.cycle(api_servers)
 
 
+class RangeNotSupported(Exception):
+    """The glance server ignored a Range request."""
+
+
+def _write_chunks(data, chunks, sparse=False):
+    """Write chunks at the current offset of a file and return the number
+    of bytes written. With sparse, chunks of zeroes are skipped over and
+    left as holes, so the file must not have data there already.
+    """
+    written = 0
+    for chunk in chunks:
+        if sparse and not chunk.lstrip(b'\0'):
+            data.seek(len(chunk), os.SEEK_CUR)
+        else:
+            data.write(chunk)
+        written += len(chunk)
+    return written
+
+
+class _RateLimiter(object):
+    """Keep the chunks read by one or more greenthreads under a shared
+    number of bytes per second.
+    """
+
+    def __init__(self, max_rate):
+        self.max_rate = max_rate
+        self.start = time.time()
+        self.read = 0
+
+    def throttle(self, chunks):
+        for chunk in chunks:
+            yield chunk
+            self.read += len(chunk)
+            delay = self.start + float(self.read) / self.max_rate - time.time()
+            if delay > 0:
+                time.sleep(delay)
+
+
 class GlanceClientWrapper(object):
     """Glance client wrapper class that implements retries."""
 
@@ -220,6 +276,27 @@ class GlanceClientWrapper(object):
         """Call a glance client method.  If we get a connection error,
         retry the request according to CONF.glance.num_retries.
         """
+        def _call(client):
+            return getattr(client.images, method)(*args, **kwargs)
+        return self._call_with_retries(context, version, method, _call)
+
+    def data_range(self, context, image_id, start, end):
+        """Return an iterator over bytes start to end, inclusive, of the
+        data of an image.
+
+        :raises: RangeNotSupported if glance returns the whole image.
+        """
+        def _call(client):
+            resp, body = client.images.client.get(
+                '/v1/images/%s' % urlparse.quote(str(image_id)),
+                headers={'Range': 'bytes=%d-%d' % (start, end)})
+            if resp.status_code != 206:
+                resp.close()
+                raise RangeNotSupported()
+            return body
+        return self._call_with_retries(context, 1, 'data', _call)
+
+    def _call_with_retries(self, context, version, method, func):
         retry_excs = (glanceclient.exc.ServiceUnavailable,
                 glanceclient.exc.InvalidEndpoint,
                 glanceclient.exc.CommunicationError)
@@ -229,7 +306,7 @@ class GlanceClientWrapper(object):
             client = self.client or self._create_onetime_client(context,
                                                                 version)
             try:
-                return getattr(client.images, method)(*args, **kwargs)
+                return func(client)
             except retry_excs as e:
                 host = self.host
                 port = self.port
@@ -334,8 +411,13 @@ class GlanceImageService(object):
                 "for %(scheme)s") % {'scheme': scheme})
         return
 
-    def download(self, context, image_id, data=None, dst_path=None):
-        """Calls out to Glance for data and writes data."""
+    def download(self, context, image_id, data=None, dst_path=None,
+                 max_rate=0):
+        """Calls out to Glance for data and writes data.
+
+        :param max_rate: limit the download to this many bytes per second,
+                         0 for no limit
+        """
         if CONF.glance.allowed_direct_url_schemes and dst_path is not None:
             image = self.show(context, image_id, include_locations=True)
             for entry in image.get('locations', []):
@@ -353,25 +435,102 @@ class GlanceImageService(object):
                     except Exception as ex:
                         LOG.exception(ex)
 
+        limiter = _RateLimiter(max_rate) if max_rate else None
+        if (data is None and dst_path and CONF.glance.download_workers > 1
+                and self._download_ranges(context, image_id, dst_path,
+                                          limiter)):
+            return
+
         try:
             image_chunks = self._client.call(context, 1, 'data', image_id)
         except Exception:
             _reraise_translated_image_exception(image_id)
+        if limiter:
+            image_chunks = limiter.throttle(image_chunks)
 
-        close_file = False
         if data is None and dst_path:
-            data = open(dst_path, 'wb')
-            close_file = True
-
-        if data is None:
+            with open(dst_path, 'wb') as data:
+                size = _write_chunks(data, image_chunks,
+                                     sparse=CONF.glance.download_sparse)
+                data.truncate(size)
+        elif data is None:
             return image_chunks
         else:
+            for chunk in image_chunks:
+                data.write(chunk)
+
+    def _download_ranges(self, context, image_id, dst_path, limiter=None):
+        """Fetch an image into dst_path as parallel byte ranges.
+
+        The checksum is computed while the ranges are still being fetched,
+        by reading back each range once all the ones before it are done.
+        Returns False, leaving dst_path alone, if the image is too small to
+        be split or glance does not support ranged requests.
+        """
+        image = self.show(context, image_id)
+        size = image.get('size') or 0
+        range_size = CONF.glance.download_range_size * units.Mi
+        if range_size <= 0 or size < 2 * range_size:
+            return False
+
+        def _fetch(byte_range):
+            start, end = byte_range
             try:
-                for chunk in image_chunks:
-                    data.write(chunk)
-            finally:
-                if close_file:
-                    data.close()
+                chunks = self._client.data_range(context, image_id,
+                                                 start, end)
+            except RangeNotSupported:
+                raise
+            except Exception:
+                _reraise_translated_image_exception(image_id)
+            if limiter:
+                chunks = limiter.throttle(chunks)
+            with open(dst_path, 'r+b') as data:
+                data.seek(start)
+                written = _write_chunks(data, chunks,
+                                        sparse=CONF.glance.download_sparse)
+            if written != end - start + 1:
+                raise IOError(errno.EPIPE,
+                              _('Short read of image %(image_id)s range '
+                                '%(start)d-%(end)d') %
+                              {'image_id': image_id, 'start': start,
+                               'end': end})
+            return byte_range
+
+        with open(dst_path, 'wb') as data:
+            data.truncate(size)
+        ranges = [(start, min(start + range_size, size) - 1)
+                  for start in xrange(0, size, range_size)]
+        pool = eventlet.GreenPool(CONF.glance.download_workers)
+        md5sum = hashlib.md5()
+        try:
+            with open(dst_path, 'rb') as data:
+                # NOTE: The first range is fetched on its own to find out
+                # whether glance honours ranged requests at all.
+                fetched = itertools.chain([_fetch(ranges[0])],
+                                          pool.imap(_fetch, ranges[1:]))
+                for start, end in fetched:
+                    data.seek(start)
+                    remaining = end - start + 1
+                    while remaining:
+                        chunk = data.read(min(remaining, units.Mi))
+                        md5sum.update(chunk)
+                        remaining -= len(chunk)
+        except RangeNotSupported:
+            pool.waitall()
+            LOG.debug('Glance does not support ranged downloads, streaming '
+                      'image %s', image_id)
+            return False
+        except Exception:
+            pool.waitall()
+            raise
+
+        checksum = image.get('checksum')
+        if checksum and md5sum.hexdigest() != checksum:
+            raise IOError(errno.EPIPE,
+                          _('Corrupt image download. Checksum was %(got)s '
+                            'expected %(expected)s') %
+                          {'got': md5sum.hexdigest(), 'expected': checksum})
+        return True
 
     def create(self, context, image_meta, data=None):
         """Store the image data and return the new image object."""
@@ -51,19 +51,53 @@ This module provides Manager, a base class for managers.
 
 """
 
+import time
+import zlib
+
 from oslo.config import cfg
 
 from nova.db import base
+from nova.i18n import _LE
+from nova.i18n import _LW
+from nova import objects
 from nova.openstack.common import log as logging
 from nova.openstack.common import periodic_task
+from nova.openstack.common import timeutils
 from nova import rpc
+from nova import utils
+
 
+periodic_opts = [
+    cfg.FloatOpt('periodic_host_jitter',
+                 default=1.0,
+                 help='Spread the first run of each periodic task over this '
+                      'fraction of its interval, by an offset derived from '
+                      'the host name, so that the periodic tasks of '
+                      'different hosts do not run in lockstep. 0 disables'),
+    cfg.FloatOpt('periodic_interval_max_factor',
+                 default=4.0,
+                 help='Periodic tasks which overrun their interval, or which '
+                      'keep finding nothing to do, are run less often, down '
+                      'to once every this many times their interval. 1 '
+                      'disables'),
+    cfg.IntOpt('periodic_task_stats_interval',
+               default=600,
+               help='Interval in seconds between saves of periodic task run '
+                    'statistics to the database. 0 disables'),
+]
 
 CONF = cfg.CONF
+CONF.register_opts(periodic_opts)
 CONF.import_opt('host', 'nova.netconf')
 LOG = logging.getLogger(__name__)
 
 
+def _host_offset(host, task_name):
+    """Return a fraction in [0, 1) which is stable for a host and task."""
+    return ((zlib.crc32('%s:%s' % (host, task_name)) & 0xffffffff) /
+            float(0x100000000))
+
+
 class Manager(base.Base, periodic_task.PeriodicTasks):
 
     def __init__(self, host=None, db_driver=None, service_name='undefined'):
@@ -76,10 +110,128 @@ class Manager(base.Base, periodic_task.PeriodicTasks):
         self.additional_endpoints = []
         super(Manager, self).__init__(db_driver)
 
+        self._periodic_interval = {}
+        self._periodic_stats = {}
+        self._periodic_stats_saved_at = time.time()
+        for name, _task in self._periodic_tasks:
+            spacing = self._periodic_spacing[name]
+            self._periodic_interval[name] = spacing
+            if self._periodic_last_run[name] is not None:
+                self._periodic_last_run[name] -= (
+                    spacing * CONF.periodic_host_jitter *
+                    _host_offset(self.host, name))
+
     def periodic_tasks(self, context, raise_on_error=False):
         """Tasks to be run at a periodic interval."""
         return self.run_periodic_tasks(context, raise_on_error=raise_on_error)
 
+    def run_periodic_tasks(self, context, raise_on_error=False):
+        """Tasks to be run at a periodic interval.
+
+        The interval of a task is stretched while the task overruns it, or
+        while the task returns a false value other than None, which tasks
+        use to report that they found nothing to do. The wall time, DB
+        calls and RPC calls of every run are recorded and periodically
+        saved as PeriodicTaskStats.
+        """
+        idle_for = periodic_task.DEFAULT_INTERVAL
+        for task_name, task in self._periodic_tasks:
+            full_task_name = '.'.join([self.__class__.__name__, task_name])
+
+            interval = self._periodic_interval[task_name]
+            last_run = self._periodic_last_run[task_name]
+
+            # Check if due, if not skip
+            idle_for = min(idle_for, interval)
+            if last_run is not None:
+                delta = last_run + interval - time.time()
+                if delta > 0:
+                    idle_for = min(idle_for, delta)
+                    continue
+
+            LOG.debug("Running periodic task %(full_task_name)s",
+                      {"full_task_name": full_task_name})
+            started = time.time()
+            self._periodic_last_run[task_name] = started
+
+            result = None
+            failed = False
+            with utils.count_calls() as calls:
+                try:
+                    result = task(self, context)
+                except Exception as e:
+                    if raise_on_error:
+                        raise
+                    failed = True
+                    LOG.exception(_LE("Error during %(full_task_name)s: "
+                                      "%(e)s"),
+                                  {"full_task_name": full_task_name, "e": e})
+            duration = time.time() - started
+
+            self._periodic_interval[task_name] = self._next_periodic_interval(
+                full_task_name, task_name, duration, result)
+            self._record_periodic_stats(task_name, duration, failed, calls)
+            time.sleep(0)
+
+        self._save_periodic_stats(context)
+        return idle_for
+
+    def _next_periodic_interval(self, full_task_name, task_name, duration,
+                                result):
+        spacing = self._periodic_spacing[task_name]
+        interval = self._periodic_interval[task_name]
+        max_interval = spacing * max(CONF.periodic_interval_max_factor, 1)
+        if duration > spacing:
+            LOG.warn(_LW("Periodic task %(full_task_name)s took %(duration)d "
+                         "seconds, longer than its %(spacing)d second "
+                         "interval"),
+                     {'full_task_name': full_task_name,
+                      'duration': duration, 'spacing': spacing})
+            return min(interval * 2, max_interval)
+        if result is None:
+            # NOTE: Come back from an overrun backoff gradually.
+            return max(interval / 2, spacing)
+        if result:
+            return spacing
+        return min(interval * 1.5, max_interval)
+
+    def _record_periodic_stats(self, task_name, duration, failed, calls):
+        stats = self._periodic_stats.get(task_name)
+        if stats is None:
+            stats = objects.PeriodicTaskStats(
+                host=self.host, binary='nova-%s' % self.service_name,
+                task_name=task_name, runs=0, failures=0, overruns=0,
+                max_duration=0.0, total_duration=0.0, db_calls=0,
+                rpc_calls=0)
+            self._periodic_stats[task_name] = stats
+        stats.spacing = self._periodic_interval[task_name]
+        stats.runs += 1
+        if failed:
+            stats.failures += 1
+        if duration > self._periodic_spacing[task_name]:
+            stats.overruns += 1
+        stats.last_run_at = timeutils.utcnow()
+        stats.last_duration = duration
+        stats.max_duration = max(stats.max_duration, duration)
+        stats.total_duration += duration
+        stats.db_calls += calls['db']
+        stats.rpc_calls += calls['rpc']
+
+    def _save_periodic_stats(self, context):
+        save_interval = CONF.periodic_task_stats_interval
+        if (save_interval <= 0 or
+                time.time() - self._periodic_stats_saved_at < save_interval):
+            return
+        self._periodic_stats_saved_at = time.time()
+        for stats in self._periodic_stats.values():
+            if not stats.obj_what_changed():
+                continue
+            try:
+                stats.save(context)
+            except Exception:
+                LOG.warn(_LW("Failed to save the run statistics of periodic "
+                             "task %s"), stats.task_name, exc_info=True)
+
     def init_host(self):
         """Hook to do additional manager initialization when one requests
         the service be started.  This is called before any service record
@@ -380,17 +380,31 @@ class API(base_api.NetworkAPI):
                                                     result, update_cells=False)
         return result
 
-    def _get_instance_nw_info(self, context, instance):
-        """Returns all network info related to an instance."""
+    @staticmethod
+    def _get_instance_nw_info_args(instance):
         flavor = flavors.extract_flavor(instance)
-        args = {'instance_id': instance['uuid'],
+        return {'instance_id': instance['uuid'],
                 'rxtx_factor': flavor['rxtx_factor'],
                 'host': instance['host'],
                 'project_id': instance['project_id']}
+
+    def _get_instance_nw_info(self, context, instance):
+        """Returns all network info related to an instance."""
+        args = self._get_instance_nw_info_args(instance)
         nw_info = self.network_rpcapi.get_instance_nw_info(context, **args)
 
         return network_model.NetworkInfo.hydrate(nw_info)
 
+    def _get_instance_nw_info_many(self, context, instances):
+        """Returns the network info of several instances, keyed by uuid,
+        with a single call to the network service.
+        """
+        nw_infos = self.network_rpcapi.get_instance_nw_info_many(
+            context, [self._get_instance_nw_info_args(instance)
+                      for instance in instances])
+        return dict((instance_uuid, network_model.NetworkInfo.hydrate(info))
+                    for instance_uuid, info in nw_infos.iteritems())
+
     @wrap_check_policy
     def validate_networks(self, context, requested_networks, num_instances):
         """validate the networks passed at the time of creating
@@ -13,12 +13,14 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import contextlib
 import functools
 import inspect
 
 from nova.db import base
 from nova import hooks
 from nova.i18n import _
+from nova.i18n import _LW
 from nova.network import model as network_model
 from nova import objects
 from nova.openstack.common import excutils
@@ -76,6 +78,17 @@ def refresh_cache(f):
     return wrapper
 
 
+@contextlib.contextmanager
+def _refresh_cache_locks(instance_uuids):
+    """Hold the refresh_cache locks of several instances."""
+    if not instance_uuids:
+        yield
+        return
+    with lockutils.lock('refresh_cache-%s' % instance_uuids[0]):
+        with _refresh_cache_locks(instance_uuids[1:]):
+            yield
+
+
 SENTINEL = object()
 
 
@@ -239,6 +252,49 @@ class NetworkAPI(base.Base):
         """Returns all network info related to an instance."""
         raise NotImplementedError()
 
+    def heal_instance_info_caches(self, context, instances):
+        """Refresh the network info caches of several instances.
+
+        The network info of all the instances is fetched first, and their
+        caches are then saved in a single DB transaction. Returns the uuids
+        of the instances whose caches were refreshed.
+        """
+        # NOTE: The locks are taken in a stable order so that concurrent
+        # batches cannot deadlock.
+        instance_uuids = sorted(instance['uuid'] for instance in instances)
+        with _refresh_cache_locks(instance_uuids):
+            nw_infos = self._get_instance_nw_info_many(context, instances)
+            info_caches = []
+            for instance in instances:
+                if instance['uuid'] not in nw_infos:
+                    continue
+                ic = objects.InstanceInfoCache.new(context, instance['uuid'])
+                ic.network_info = nw_infos[instance['uuid']]
+                info_caches.append(ic)
+            if info_caches:
+                # NOTE(comstud): Don't update API cell with new info_cache
+                # every time we pull network info for an instance, see
+                # get_instance_nw_info().
+                objects.InstanceInfoCache.save_many(context, info_caches,
+                                                    update_cells=False)
+        return [info_cache.instance_uuid for info_cache in info_caches]
+
+    def _get_instance_nw_info_many(self, context, instances):
+        """Return the network info of several instances keyed by uuid.
+
+        Instances whose network info cannot be retrieved are left out.
+        """
+        nw_infos = {}
+        for instance in instances:
+            try:
+                nw_infos[instance['uuid']] = self._get_instance_nw_info(
+                    context, instance)
+            except Exception:
+                LOG.warning(_LW('Failed to get the network info of the '
+                                'instance'), instance=instance,
+                            exc_info=True)
+        return nw_infos
+
     def create_pci_requests_for_sriov_ports(self, context,
                                             pci_requests,
                                             requested_networks):
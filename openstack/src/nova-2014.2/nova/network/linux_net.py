@@ -22,12 +22,13 @@ import inspect
 import os
 import re
 
+import eventlet
 import netaddr
 from oslo.config import cfg
 import six
 
 from nova import exception
-from nova.i18n import _
+from nova.i18n import _, _LE
 from nova import objects
 from nova.openstack.common import excutils
 from nova.openstack.common import fileutils
@@ -61,6 +62,12 @@ linux_net_opts = [
     cfg.IntOpt('dhcp_lease_time',
                default=86400,
                help='Lifetime of a DHCP lease in seconds'),
+    cfg.FloatOpt('dhcp_update_window',
+                 default=0,
+                 help='Number of seconds during which DHCP host updates of '
+                      'a network are collected and applied with a single '
+                      'host file update and dnsmasq reload. Set to 0 to '
+                      'apply every update right away'),
     cfg.MultiStrOpt('dns_server',
                     default=[],
                     help='If set, uses specific DNS server for dnsmasq. Can'
@@ -1000,7 +1007,40 @@ def release_dhcp(dev, address, mac_address):
                                                  mac_address=mac_address)
 
 
+# Devices with a DHCP update waiting for the end of dhcp_update_window,
+# with the context and network of the latest update request and the timer
+# which applies it.
+_pending_dhcp_updates = {}
+
+
 def update_dhcp(context, dev, network_ref):
+    if CONF.dhcp_update_window <= 0:
+        _update_dhcp(context, dev, network_ref)
+        return
+    if dev in _pending_dhcp_updates:
+        timer = _pending_dhcp_updates[dev][2]
+    else:
+        timer = eventlet.spawn_after(CONF.dhcp_update_window,
+                                     _apply_pending_dhcp_update, dev)
+    _pending_dhcp_updates[dev] = (context, network_ref, timer)
+
+
+# NOTE: The network manager holds this lock while it sets networks up or
+# tears them down, and requests DHCP updates.
+@utils.synchronized('setup_network', external=True)
+def _apply_pending_dhcp_update(dev):
+    pending = _pending_dhcp_updates.pop(dev, None)
+    if pending is None:
+        # dnsmasq was killed in the meantime
+        return
+    context, network_ref, _timer = pending
+    try:
+        _update_dhcp(context, dev, network_ref)
+    except Exception:
+        LOG.exception(_LE('Failed to update DHCP hosts of %s'), dev)
+
+
+def _update_dhcp(context, dev, network_ref):
     conffile = _dhcp_file(dev, 'conf')
     host = None
     if network_ref['multi_host']:
@@ -1008,10 +1048,45 @@ def update_dhcp(context, dev, network_ref):
     fixedips = objects.FixedIPList.get_by_network(context,
                                                   network_ref,
                                                   host=host)
-    write_to_file(conffile, get_dhcp_hosts(context, network_ref, fixedips))
+    changed = _update_hosts_file(conffile,
+                                 get_dhcp_hosts(context, network_ref,
+                                                fixedips))
+    optsfile = _dhcp_file(dev, 'opts')
+    if (not changed and _dnsmasq_is_running(dev) and
+            _read_file(optsfile) == get_dhcp_opts(context, network_ref,
+                                                  fixedips)):
+        LOG.debug('DHCP hosts of %s are unchanged, not reloading dnsmasq',
+                  dev)
+        return
     restart_dhcp(context, dev, network_ref, fixedips)
 
 
+def _read_file(path):
+    try:
+        with open(path) as f:
+            return f.read()
+    except IOError:
+        return None
+
+
+def _update_hosts_file(path, hosts_text):
+    """Bring a dnsmasq hosts file up to date.
+
+    Hosts added after all the current ones are appended instead of the
+    whole file being rewritten.
+
+    :returns: whether the file changed
+    """
+    current = _read_file(path)
+    if current == hosts_text:
+        return False
+    if current and hosts_text.startswith(current + '\n'):
+        write_to_file(path, hosts_text[len(current):], mode='a')
+    else:
+        write_to_file(path, hosts_text)
+    return True
+
+
 def update_dns(context, dev, network_ref):
     hostsfile = _dhcp_file(dev, 'hosts')
     host = None
@@ -1030,6 +1105,9 @@ def update_dhcp_hostfile_with_text(dev, hosts_text):
 
 
 def kill_dhcp(dev):
+    pending = _pending_dhcp_updates.pop(dev, None)
+    if pending is not None:
+        pending[2].cancel()
     pid = _dnsmasq_pid_for(dev)
     if pid:
         # Check that the process exists and looks like a dnsmasq process
@@ -1249,6 +1327,15 @@ def _ra_file(dev, kind):
                                               kind))
 
 
+def _dnsmasq_is_running(dev):
+    pid = _dnsmasq_pid_for(dev)
+    if not pid:
+        return False
+    out, _err = _execute('cat', '/proc/%d/cmdline' % pid,
+                         check_exit_code=False)
+    return _dhcp_file(dev, 'conf').split('/')[-1] in out
+
+
 def _dnsmasq_pid_for(dev):
     """Returns the pid for prior dnsmasq instance for a bridge/device.
 
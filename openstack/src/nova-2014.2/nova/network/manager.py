@@ -32,6 +32,7 @@ import re
 import uuid
 
 import eventlet
+from eventlet import event
 import netaddr
 from oslo.config import cfg
 from oslo import messaging
@@ -133,6 +134,12 @@ network_opts = [
     cfg.StrOpt('l3_lib',
                default='nova.network.l3.LinuxNetL3',
                help="Indicates underlying L3 management library"),
+    cfg.FloatOpt('fixed_ip_allocation_window',
+                 default=0,
+                 help='Number of seconds during which fixed IP allocations '
+                      'from the pool of a network are collected and made '
+                      'in a single DB transaction. Set to 0 to allocate '
+                      'each fixed IP on its own'),
     ]
 
 CONF = cfg.CONF
@@ -145,6 +152,50 @@ CONF.import_opt('share_dhcp_address', 'nova.objects.network')
 CONF.import_opt('network_device_mtu', 'nova.objects.network')
 
 
+class FixedIPPoolAllocator(object):
+    """Associate fixed IPs from the pool of a network in batches.
+
+    Requests arriving within fixed_ip_allocation_window of the first one
+    for a network are served together, by a single DB transaction.
+    """
+
+    def __init__(self):
+        self._pending = {}
+
+    def associate(self, context, network_id, instance_uuid=None, host=None):
+        if CONF.fixed_ip_allocation_window <= 0:
+            return objects.FixedIP.associate_pool(context, network_id,
+                                                  instance_uuid=instance_uuid,
+                                                  host=host)
+        if network_id not in self._pending:
+            self._pending[network_id] = []
+            eventlet.spawn_after(CONF.fixed_ip_allocation_window,
+                                 self._associate_pending, context, network_id)
+        done = event.Event()
+        self._pending[network_id].append((instance_uuid, host, done))
+        return done.wait()
+
+    def _associate_pending(self, context, network_id):
+        requests = self._pending.pop(network_id)
+        try:
+            fips = objects.FixedIPList.associate_pool_many(
+                context, network_id,
+                [[instance_uuid, host] for instance_uuid, host, _done
+                 in requests])
+        except Exception as e:
+            for _instance_uuid, _host, done in requests:
+                done.send_exception(e)
+            return
+        LOG.debug('Associated %(count)d fixed IPs of network %(network)s '
+                  'at once', {'count': len(fips), 'network': network_id})
+        fips = list(fips)
+        for i, (_instance_uuid, _host, done) in enumerate(requests):
+            if i < len(fips):
+                done.send(fips[i])
+            else:
+                done.send_exception(exception.NoMoreFixedIps())
+
+
 class RPCAllocateFixedIP(object):
     """Mixin class originally for FlatDCHP and VLAN network managers.
 
@@ -247,7 +298,7 @@ class NetworkManager(manager.Manager):
         The one at a time part is to flatten the layout to help scale
     """
 
-    target = messaging.Target(version='1.13')
+    target = messaging.Target(version='1.14')
 
     # If True, this manager requires VIF to create a bridge.
     SHOULD_CREATE_BRIDGE = False
@@ -283,6 +334,7 @@ class NetworkManager(manager.Manager):
         self.l3driver = importutils.import_object(l3_lib)
 
         self.quotas_cls = objects.Quotas
+        self.fixed_ip_allocator = FixedIPPoolAllocator()
 
         super(NetworkManager, self).__init__(service_name='network',
                                              *args, **kwargs)
@@ -603,6 +655,22 @@ class NetworkManager(manager.Manager):
                                                          rxtx_factor, host)
         return nw_info
 
+    def get_instance_nw_info_many(self, context, instances):
+        """Creates the network info lists of several instances, keyed by
+        instance uuid.
+
+        Instances whose network info cannot be built are left out.
+        """
+        nw_infos = {}
+        for args in instances:
+            try:
+                nw_infos[args['instance_id']] = self.get_instance_nw_info(
+                    context, **args)
+            except Exception:
+                LOG.exception(_LE('Failed to get the network info of '
+                                  'instance %s'), args['instance_id'])
+        return nw_infos
+
     def build_network_info_model(self, context, vifs, networks,
                                  rxtx_factor, instance_host):
         """Builds a NetworkInfo object containing all network information
@@ -895,7 +963,7 @@ class NetworkManager(manager.Manager):
                               {'network': network['id'],
                                'cidr': network['cidr']},
                               instance=instance)
-                    fip = objects.FixedIP.associate_pool(
+                    fip = self.fixed_ip_allocator.associate(
                         context.elevated(), network['id'], instance_id)
                     address = str(fip.address)
 
@@ -1914,9 +1982,9 @@ class VlanManager(RPCAllocateFixedIP, floating_ips.FloatingIP, NetworkManager):
                                                 instance_id,
                                                 network['id'])
             else:
-                fip = objects.FixedIP.associate_pool(context,
-                                                     network['id'],
-                                                     instance_id)
+                fip = self.fixed_ip_allocator.associate(context,
+                                                        network['id'],
+                                                        instance_id)
         address = fip.address
 
         vif = objects.VirtualInterface.get_by_instance_and_network(
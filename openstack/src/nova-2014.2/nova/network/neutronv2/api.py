@@ -612,6 +612,36 @@ class API(base_api.NetworkAPI):
                                                  port_ids)
         return network_model.NetworkInfo.hydrate(nw_info)
 
+    def _get_instance_nw_info_many(self, context, instances):
+        """Return the network info of several instances keyed by uuid,
+        listing the ports of all of them with a single request.
+        """
+        client = neutronv2.get_client(context, admin=True)
+        instances_by_uuid = dict((instance['uuid'], instance)
+                                 for instance in instances)
+        ports = client.list_ports(
+            device_id=instances_by_uuid.keys()).get('ports', [])
+        ports_by_device = dict((uuid, []) for uuid in instances_by_uuid)
+        for port in ports:
+            instance = instances_by_uuid.get(port['device_id'])
+            if (instance is not None and
+                    port['tenant_id'] == instance['project_id']):
+                ports_by_device[port['device_id']].append(port)
+
+        nw_infos = {}
+        for instance in instances:
+            try:
+                nw_info = self._build_network_info_model(
+                    context, instance,
+                    neutron_ports=ports_by_device[instance['uuid']])
+                nw_infos[instance['uuid']] = (
+                    network_model.NetworkInfo.hydrate(nw_info))
+            except Exception:
+                LOG.warning(_LW('Failed to get the network info of the '
+                                'instance'), instance=instance,
+                            exc_info=True)
+        return nw_infos
+
     def _gather_port_ids_and_networks(self, context, instance, networks=None,
                                       port_ids=None):
         """Return an instance's complete list of port_ids and networks."""
@@ -1336,7 +1366,7 @@ class API(base_api.NetworkAPI):
         return network, ovs_interfaceid
 
     def _build_network_info_model(self, context, instance, networks=None,
-                                  port_ids=None):
+                                  port_ids=None, neutron_ports=None):
         """Return list of ordered VIFs attached to instance.
 
         :param context - request context.
@@ -1348,14 +1378,18 @@ class API(base_api.NetworkAPI):
                           instance in order of attachment. If value is None
                           this value will be populated from the existing
                           cached value.
+        :param neutron_ports - The ports of the instance, if they were
+                               already listed.
         """
 
-        search_opts = {'tenant_id': instance['project_id'],
-                       'device_id': instance['uuid'], }
         client = neutronv2.get_client(context, admin=True)
-        data = client.list_ports(**search_opts)
+        if neutron_ports is None:
+            search_opts = {'tenant_id': instance['project_id'],
+                           'device_id': instance['uuid'], }
+            data = client.list_ports(**search_opts)
+            neutron_ports = data.get('ports', [])
 
-        current_neutron_ports = data.get('ports', [])
+        current_neutron_ports = neutron_ports
         networks, port_ids = self._gather_port_ids_and_networks(
                 context, instance, networks, port_ids)
         nw_info = network_model.NetworkInfo()
@@ -87,6 +87,8 @@ class NetworkAPI(object):
         ... Juno supports message version 1.13.  So, any changes to
         existing methods in 1.x after that point should be done such that they
         can handle the version_cap being set to 1.13.
+
+        * 1.14 - Adds get_instance_nw_info_many()
     '''
 
     VERSION_ALIASES = {
@@ -241,6 +243,20 @@ class NetworkAPI(object):
                           instance_id=instance_id, rxtx_factor=rxtx_factor,
                           host=host, project_id=project_id)
 
+    def get_instance_nw_info_many(self, ctxt, instances):
+        """Get the network info of several instances, keyed by uuid.
+
+        :param instances: list of dicts with the get_instance_nw_info()
+                          arguments of each instance
+        """
+        if not self.client.can_send_version('1.14'):
+            return dict((args['instance_id'],
+                         self.get_instance_nw_info(ctxt, **args))
+                        for args in instances)
+        cctxt = self.client.prepare(version='1.14')
+        return cctxt.call(ctxt, 'get_instance_nw_info_many',
+                          instances=instances)
+
     def validate_networks(self, ctxt, networks):
         return self.client.call(ctxt, 'validate_networks', networks=networks)
 
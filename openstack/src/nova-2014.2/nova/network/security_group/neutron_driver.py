@@ -21,6 +21,7 @@ from oslo.config import cfg
 import six
 from webob import exc
 
+from nova.api.metadata import cache as metadata_cache
 from nova.compute import api as compute_api
 from nova import exception
 from nova.i18n import _
@@ -448,6 +449,7 @@ class SecurityGroupAPI(security_group_base.SecurityGroupBase):
             except Exception:
                 with excutils.save_and_reraise_exception():
                     LOG.exception(_("Neutron Error:"))
+        metadata_cache.invalidate(instance['uuid'])
 
     @compute_api.wrap_check_security_groups_policy
     def remove_from_instance(self, context, instance, security_group_name):
@@ -510,6 +512,7 @@ class SecurityGroupAPI(security_group_base.SecurityGroupBase):
                    {'security_group_name': security_group_name,
                     'instance': instance['uuid']})
             self.raise_not_found(msg)
+        metadata_cache.invalidate(instance['uuid'])
 
     def populate_security_groups(self, instance, security_groups):
         # Setting to empty list since we do not want to populate this field
@@ -47,6 +47,7 @@ def register_all():
     __import__('nova.objects.network')
     __import__('nova.objects.network_request')
     __import__('nova.objects.pci_device')
+    __import__('nova.objects.periodic_task_stats')
     __import__('nova.objects.quotas')
     __import__('nova.objects.security_group')
     __import__('nova.objects.security_group_rule')
@@ -32,6 +32,7 @@ from nova.objects import fields
 from nova.openstack.common import log as logging
 from nova.openstack.common import timeutils
 from nova.openstack.common import versionutils
+from nova import utils
 
 
 LOG = logging.getLogger('object')
@@ -147,6 +148,7 @@ def remotable_classmethod(fn):
     """Decorator for remotable classmethods."""
     @functools.wraps(fn)
     def wrapper(cls, context, *args, **kwargs):
+        utils.note_call('db')
         if NovaObject.indirection_api:
             result = NovaObject.indirection_api.object_class_action(
                 context, cls.obj_name(), fn.__name__, cls.VERSION,
@@ -184,6 +186,7 @@ def remotable(fn):
                                                 objtype=self.obj_name())
         # Force this to be set if it wasn't before.
         self._context = ctxt
+        utils.note_call('db')
         if NovaObject.indirection_api:
             updates, result = NovaObject.indirection_api.object_action(
                 ctxt, self, fn.__name__, args, kwargs)
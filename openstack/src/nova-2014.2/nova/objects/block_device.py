@@ -12,6 +12,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+from nova.api.metadata import cache as metadata_cache
 from nova import block_device
 from nova.cells import opts as cells_opts
 from nova.cells import rpcapi as cells_rpcapi
@@ -113,6 +114,7 @@ class BlockDeviceMapping(base.NovaPersistentObject, base.NovaObject):
 
         db_bdm = db.block_device_mapping_create(context, updates, legacy=False)
         self._from_db_object(context, self, db_bdm)
+        metadata_cache.invalidate(self.instance_uuid)
         if cell_type == 'compute':
             cells_api = cells_rpcapi.CellsAPI()
             cells_api.bdm_update_or_create_at_top(context, self, create=True)
@@ -124,6 +126,7 @@ class BlockDeviceMapping(base.NovaPersistentObject, base.NovaObject):
                                               reason='already destroyed')
         db.block_device_mapping_destroy(context, self.id)
         delattr(self, base.get_attrname('id'))
+        metadata_cache.invalidate(self.instance_uuid)
 
         cell_type = cells_opts.get_cell_type()
         if cell_type == 'compute':
@@ -142,6 +145,7 @@ class BlockDeviceMapping(base.NovaPersistentObject, base.NovaObject):
         updated = db.block_device_mapping_update(self._context, self.id,
                                                  updates, legacy=False)
         self._from_db_object(context, self, updated)
+        metadata_cache.invalidate(self.instance_uuid)
         cell_type = cells_opts.get_cell_type()
         if cell_type == 'compute':
             cells_api = cells_rpcapi.CellsAPI()
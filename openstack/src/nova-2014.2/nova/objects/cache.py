@@ -0,0 +1,96 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Request scoped identity map for lazy-loaded object attributes."""
+
+import copy
+
+from oslo.config import cfg
+
+object_cache_opts = [
+    cfg.BoolOpt('request_object_cache',
+                default=True,
+                help='Remember lazy-loaded object attributes, such as an '
+                     'instance\'s info_cache or metadata, for the rest of '
+                     'an API request so they are only fetched once'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(object_cache_opts)
+
+
+class RequestObjectCache(object):
+    """Identity map of lazy-loaded attributes, scoped to one request.
+
+    Entries are keyed by object type, object identifier and attribute
+    name. Values are copied on the way in and out so that objects never
+    share mutable state through the cache.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _copy(value):
+        if hasattr(value, 'obj_clone'):
+            return value.obj_clone()
+        return copy.deepcopy(value)
+
+    def get(self, objtype, objid, attrname):
+        """Return (True, value) on a hit, (False, None) on a miss."""
+        try:
+            value = self._entries[(objtype, objid, attrname)]
+        except KeyError:
+            self.misses += 1
+            return False, None
+        self.hits += 1
+        return True, self._copy(value)
+
+    def put(self, objtype, objid, attrname, value):
+        self._entries[(objtype, objid, attrname)] = self._copy(value)
+
+    def refresh(self, objtype, objid, obj, attrnames):
+        """Update the cached attributes of obj from its current values."""
+        for attrname in attrnames:
+            key = (objtype, objid, attrname)
+            if key in self._entries and obj.obj_attr_is_set(attrname):
+                self._entries[key] = self._copy(obj[attrname])
+
+    def invalidate(self, objtype, objid, attrnames):
+        """Forget the cached attributes of an object written elsewhere."""
+        for attrname in attrnames:
+            self._entries.pop((objtype, objid, attrname), None)
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses,
+                'entries': len(self._entries)}
+
+
+def get_cache(context):
+    """Return the object cache of a request context, if caching is on."""
+    if context is None or not CONF.request_object_cache:
+        return None
+    return getattr(context, 'object_cache', None)
+
+
+def invalidate(context, objtype, objid, attrnames):
+    """Forget cached attributes of an object saved outside of it.
+
+    Called by the code paths writing an object's attributes without
+    going through the object, such as InstanceInfoCache.save() for an
+    instance's info_cache.
+    """
+    cache = get_cache(context)
+    if cache is not None:
+        cache.invalidate(objtype, objid, attrnames)
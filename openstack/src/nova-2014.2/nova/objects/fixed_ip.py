@@ -185,7 +185,8 @@ class FixedIPList(obj_base.ObjectListBase, obj_base.NovaObject):
     # Version 1.2: FixedIP <= version 1.2
     # Version 1.3: FixedIP <= version 1.3
     # Version 1.4: FixedIP <= version 1.4
-    VERSION = '1.4'
+    # Version 1.5: Added associate_pool_many()
+    VERSION = '1.5'
 
     fields = {
         'objects': fields.ListOfObjectsField('FixedIP'),
@@ -196,6 +197,7 @@ class FixedIPList(obj_base.ObjectListBase, obj_base.NovaObject):
         '1.2': '1.2',
         '1.3': '1.3',
         '1.4': '1.4',
+        '1.5': '1.4',
         }
 
     @obj_base.remotable_classmethod
@@ -204,6 +206,19 @@ class FixedIPList(obj_base.ObjectListBase, obj_base.NovaObject):
         return obj_base.obj_make_list(context, cls(context),
                                       objects.FixedIP, db_fixedips)
 
+    @obj_base.remotable_classmethod
+    def associate_pool_many(cls, context, network_id, requests):
+        """Associate free fixed ips with several instances or hosts.
+
+        :param requests: list of [instance_uuid, host] pairs
+        :returns: the associated fixed ips, in the order of the requests,
+                  fewer than requested if the network ran out of them
+        """
+        db_fixedips = db.fixed_ip_associate_pool_many(context, network_id,
+                                                      requests)
+        return obj_base.obj_make_list(context, cls(context),
+                                      objects.FixedIP, db_fixedips)
+
     @obj_base.remotable_classmethod
     def get_by_instance_uuid(cls, context, instance_uuid):
         db_fixedips = db.fixed_ip_get_by_instance(context, instance_uuid)
@@ -12,6 +12,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+from nova.api.metadata import cache as metadata_cache
 from nova.cells import opts as cells_opts
 from nova.cells import rpcapi as cells_rpcapi
 from nova.compute import flavors
@@ -21,6 +22,7 @@ from nova.i18n import _LE
 from nova import notifications
 from nova import objects
 from nova.objects import base
+from nova.objects import cache as object_cache
 from nova.objects import fields
 from nova.openstack.common import log as logging
 from nova.openstack.common import timeutils
@@ -43,6 +45,10 @@ _INSTANCE_OPTIONAL_NON_COLUMN_FIELDS = ['fault', 'numa_topology']
 # These are fields that can be specified as expected_attrs
 INSTANCE_OPTIONAL_ATTRS = (_INSTANCE_OPTIONAL_JOINED_FIELDS +
                            _INSTANCE_OPTIONAL_NON_COLUMN_FIELDS)
+# These are fields that are lazy-loaded for a whole InstanceList at once
+_INSTANCE_BATCHED_LOAD_FIELDS = ['metadata', 'system_metadata', 'info_cache',
+                                 'security_groups', 'pci_devices', 'fault']
+
 # These are fields that most query calls load by default
 INSTANCE_DEFAULT_FIELDS = ['metadata', 'system_metadata',
                            'info_cache', 'security_groups']
@@ -74,7 +80,8 @@ class Instance(base.NovaPersistentObject, base.NovaObject):
     # Version 1.13: Added delete_metadata_key()
     # Version 1.14: Added numa_topology
     # Version 1.15: PciDeviceList 1.1
-    VERSION = '1.15'
+    # Version 1.16: Added expected_values to save()
+    VERSION = '1.16'
 
     fields = {
         'id': fields.IntegerField(),
@@ -181,6 +188,12 @@ class Instance(base.NovaPersistentObject, base.NovaObject):
     def obj_reset_changes(self, fields=None):
         super(Instance, self).obj_reset_changes(fields)
         self._reset_metadata_tracking(fields=fields)
+        # NOTE: Our optional attributes now match the database, so make
+        # sure the request cache does not hand out older copies of them.
+        cache = object_cache.get_cache(self._context)
+        if cache is not None and self.obj_attr_is_set('uuid'):
+            cache.refresh(self.obj_name(), self.uuid, self,
+                          fields or INSTANCE_OPTIONAL_ATTRS)
 
     def obj_what_changed(self):
         changes = super(Instance, self).obj_what_changed()
@@ -316,6 +329,46 @@ class Instance(base.NovaPersistentObject, base.NovaObject):
         instance.obj_reset_changes()
         return instance
 
+    @staticmethod
+    def _from_db_projection(context, instance, db_inst, expected_attrs=None):
+        """Converts a projected database row to a partial object.
+
+        Only the column fields present in db_inst are set. Any other
+        column field is loaded from the database in one go the first time
+        it is accessed.
+        """
+        instance._context = context
+        instance._projected = True
+        if expected_attrs is None:
+            expected_attrs = []
+        for field in instance.fields:
+            if field in INSTANCE_OPTIONAL_ATTRS:
+                continue
+            elif field == 'deleted':
+                if 'deleted' in db_inst and 'id' in db_inst:
+                    instance.deleted = db_inst['deleted'] == db_inst['id']
+            elif field == 'cleaned':
+                if 'cleaned' in db_inst:
+                    instance.cleaned = db_inst['cleaned'] == 1
+            elif field in db_inst:
+                instance[field] = db_inst[field]
+
+        if 'metadata' in expected_attrs:
+            instance['metadata'] = utils.instance_meta(db_inst)
+        if 'system_metadata' in expected_attrs:
+            instance['system_metadata'] = utils.instance_sys_meta(db_inst)
+        if 'info_cache' in expected_attrs:
+            if db_inst['info_cache'] is None:
+                instance.info_cache = None
+            else:
+                instance.info_cache = objects.InstanceInfoCache(context)
+                instance.info_cache._from_db_object(context,
+                                                    instance.info_cache,
+                                                    db_inst['info_cache'])
+
+        instance.obj_reset_changes()
+        return instance
+
     @base.remotable_classmethod
     def get_by_uuid(cls, context, uuid, expected_attrs=None, use_slave=False):
         if expected_attrs is None:
@@ -413,7 +466,8 @@ class Instance(base.NovaPersistentObject, base.NovaObject):
 
     @base.remotable
     def save(self, context, expected_vm_state=None,
-             expected_task_state=None, admin_state_reset=False):
+             expected_task_state=None, admin_state_reset=False,
+             expected_values=None):
         """Save updates to this instance
 
         Column-wise updates will be made based on the result of
@@ -428,6 +482,9 @@ class Instance(base.NovaPersistentObject, base.NovaObject):
         for the instance to be in
         :param admin_state_reset: True if admin API is forcing setting
         of task_state/vm_state
+        :param expected_values: Optional dict of field values, such as
+        the power_state and updated_at the instance was read with, that
+        the in-database copy must still have
 
         """
 
@@ -490,6 +547,10 @@ class Instance(base.NovaPersistentObject, base.NovaObject):
             updates['expected_task_state'] = expected_task_state
         if expected_vm_state is not None:
             updates['expected_vm_state'] = expected_vm_state
+        if expected_values:
+            updates['expected_values'] = dict(
+                (field, self.fields[field].coerce(self, field, value))
+                for field, value in expected_values.items())
 
         expected_attrs = [attr for attr in _INSTANCE_OPTIONAL_JOINED_FIELDS
                                if self.obj_attr_is_set(attr)]
@@ -515,6 +576,7 @@ class Instance(base.NovaPersistentObject, base.NovaObject):
         self._from_db_object(context, self, inst_ref,
                              expected_attrs=expected_attrs)
         notifications.send_update(context, old_ref, inst_ref)
+        metadata_cache.invalidate(self.uuid)
         self.obj_reset_changes()
 
     @base.remotable
@@ -552,6 +614,45 @@ class Instance(base.NovaPersistentObject, base.NovaObject):
                 action='obj_load_attr',
                 reason='loading %s requires recursion' % attrname)
 
+    def _load_batched(self, attrname):
+        """Lazy-load an attribute for every instance of our list at once.
+
+        Instances that came from the same InstanceList share one query
+        (or one conductor call) per attribute instead of one each.
+        """
+        batch = [inst for inst in self._batch
+                 if inst is not self and inst._context and
+                 not inst.obj_attr_is_set(attrname)]
+        batch.append(self)
+        uuids = [inst.uuid for inst in batch]
+        if attrname == 'fault':
+            loaded = {}
+            for fault in objects.InstanceFaultList.get_by_instance_uuids(
+                    self._context, uuids):
+                loaded.setdefault(fault.instance_uuid, fault)
+        else:
+            loaded = dict((inst.uuid, inst[attrname])
+                          for inst in InstanceList.get_by_filters(
+                              self._context, {'uuid': uuids},
+                              expected_attrs=[attrname]))
+
+        cache = object_cache.get_cache(self._context)
+        for inst in batch:
+            if attrname == 'fault':
+                inst.fault = loaded.get(inst.uuid)
+            elif inst.uuid in loaded:
+                inst[attrname] = loaded[inst.uuid]
+            else:
+                continue
+            if inst is not self:
+                inst.obj_reset_changes([attrname])
+                if cache is not None:
+                    cache.put(inst.obj_name(), inst.uuid, attrname,
+                              inst[attrname])
+
+        if not self.obj_attr_is_set(attrname):
+            self._load_generic(attrname)
+
     def _load_fault(self):
         self.fault = objects.InstanceFault.get_latest_for_instance(
             self._context, self.uuid)
@@ -564,7 +665,49 @@ class Instance(base.NovaPersistentObject, base.NovaObject):
         except exception.NumaTopologyNotFound:
             self.numa_topology = None
 
+    def _load_projected_columns(self):
+        # NOTE: Instances projected together are completed together, so
+        # walking a projected list costs one extra query rather than one
+        # per instance.
+        batch = [inst for inst in getattr(self, '_batch', [self])
+                 if getattr(inst, '_projected', False)]
+        if self not in batch:
+            batch.append(self)
+        db_insts = db.instance_get_all_by_filters(
+            self._context, {'uuid': [inst.uuid for inst in batch]},
+            'created_at', 'desc', columns_to_join=[])
+        db_insts = dict((db_inst['uuid'], db_inst) for db_inst in db_insts)
+        for inst in batch:
+            db_inst = db_insts.get(inst.uuid)
+            if db_inst is None:
+                continue
+            loaded = []
+            for field in inst.fields:
+                if (field in INSTANCE_OPTIONAL_ATTRS or
+                        inst.obj_attr_is_set(field)):
+                    continue
+                elif field == 'deleted':
+                    inst.deleted = db_inst['deleted'] == db_inst['id']
+                elif field == 'cleaned':
+                    inst.cleaned = db_inst['cleaned'] == 1
+                else:
+                    inst[field] = db_inst[field]
+                loaded.append(field)
+            inst._projected = False
+            inst.obj_reset_changes(loaded)
+        if self._projected:
+            raise exception.InstanceNotFound(instance_id=self.uuid)
+
     def obj_load_attr(self, attrname):
+        if (attrname not in INSTANCE_OPTIONAL_ATTRS and
+                getattr(self, '_projected', False) and self._context):
+            # NOTE: The instance came from a column projection, so fetch
+            # every column we skipped rather than one query per field.
+            LOG.debug("Loading unprojected columns on %(name)s uuid "
+                      "%(uuid)s", {'name': self.obj_name(),
+                                   'uuid': self.uuid})
+            self._load_projected_columns()
+            return
         if attrname not in INSTANCE_OPTIONAL_ATTRS:
             raise exception.ObjectActionError(
                 action='obj_load_attr',
@@ -578,8 +721,19 @@ class Instance(base.NovaPersistentObject, base.NovaObject):
                    'name': self.obj_name(),
                    'uuid': self.uuid,
                    })
+        cache = object_cache.get_cache(self._context)
+        if cache is not None:
+            hit, value = cache.get(self.obj_name(), self.uuid, attrname)
+            if hit:
+                self[attrname] = value
+                self.obj_reset_changes([attrname])
+                return
+
         # FIXME(comstud): This should be optimized to only load the attr.
-        if attrname == 'fault':
+        if (attrname in _INSTANCE_BATCHED_LOAD_FIELDS and
+                len(getattr(self, '_batch', [])) > 1):
+            self._load_batched(attrname)
+        elif attrname == 'fault':
             # NOTE(danms): We handle fault differently here so that we
             # can be more efficient
             self._load_fault()
@@ -588,6 +742,8 @@ class Instance(base.NovaPersistentObject, base.NovaObject):
         else:
             self._load_generic(attrname)
         self.obj_reset_changes([attrname])
+        if cache is not None:
+            cache.put(self.obj_name(), self.uuid, attrname, self[attrname])
 
     def get_flavor(self, namespace=None):
         prefix = ('%s_' % namespace) if namespace is not None else ''
@@ -620,6 +776,8 @@ class Instance(base.NovaPersistentObject, base.NovaObject):
         after completion.
         """
         db.instance_metadata_delete(context, self.uuid, key)
+        object_cache.invalidate(context, self.obj_name(), self.uuid,
+                                ['metadata'])
         md_was_changed = 'metadata' in self.obj_what_changed()
         del self.metadata[key]
         self._orig_metadata.pop(key, None)
@@ -649,6 +807,34 @@ def _make_instance_list(context, inst_list, db_inst_list, expected_attrs):
                 expected_attrs=expected_attrs)
         if get_fault:
             inst_obj.fault = inst_faults.get(inst_obj.uuid, None)
+        inst_obj._batch = inst_list.objects
+        inst_list.objects.append(inst_obj)
+    inst_list.obj_reset_changes()
+    return inst_list
+
+
+def _make_projected_instance_list(context, inst_list, db_inst_list,
+                                  expected_attrs):
+    get_fault = expected_attrs and 'fault' in expected_attrs
+    inst_faults = {}
+    if get_fault:
+        expected_attrs.remove('fault')
+        instance_uuids = [inst['uuid'] for inst in db_inst_list]
+        faults = objects.InstanceFaultList.get_by_instance_uuids(
+            context, instance_uuids)
+        for fault in faults:
+            if fault.instance_uuid not in inst_faults:
+                inst_faults[fault.instance_uuid] = fault
+
+    inst_list.objects = []
+    for db_inst in db_inst_list:
+        inst_obj = objects.Instance._from_db_projection(
+                context, objects.Instance(context), db_inst,
+                expected_attrs=expected_attrs)
+        if get_fault:
+            inst_obj.fault = inst_faults.get(inst_obj.uuid, None)
+            inst_obj.obj_reset_changes(['fault'])
+        inst_obj._batch = inst_list.objects
         inst_list.objects.append(inst_obj)
     inst_list.obj_reset_changes()
     return inst_list
@@ -666,7 +852,12 @@ class InstanceList(base.ObjectListBase, base.NovaObject):
     # Version 1.7: Added use_slave to get_active_by_window_joined
     # Version 1.8: Instance <= version 1.14
     # Version 1.9: Instance <= version 1.15
-    VERSION = '1.9'
+    # Version 1.10: Added get_projected_by_filters
+    # Version 1.11: Added get_image_boot_counts
+    # Version 1.12: Added get_by_uuids and save_many
+    # Version 1.13: Instance <= version 1.16
+    #               Added expected_values to save_many
+    VERSION = '1.13'
 
     fields = {
         'objects': fields.ListOfObjectsField('Instance'),
@@ -682,6 +873,10 @@ class InstanceList(base.ObjectListBase, base.NovaObject):
         '1.7': '1.13',
         '1.8': '1.14',
         '1.9': '1.15',
+        '1.10': '1.15',
+        '1.11': '1.15',
+        '1.12': '1.15',
+        '1.13': '1.16',
         }
 
     @base.remotable_classmethod
@@ -695,6 +890,54 @@ class InstanceList(base.ObjectListBase, base.NovaObject):
         return _make_instance_list(context, cls(), db_inst_list,
                                    expected_attrs)
 
+    @base.remotable_classmethod
+    def get_projected_by_filters(cls, context, filters, fields,
+                                 sort_key='created_at', sort_dir='desc',
+                                 limit=None, marker=None, use_slave=False):
+        """Get instances that match all filters, loading only some fields.
+
+        :param fields: list of Instance field names to load. Column fields
+                       are selected directly; 'metadata', 'system_metadata',
+                       'info_cache' and 'fault' are fetched with one batched
+                       query each. Other fields are not supported.
+        """
+        columns = set(['id', 'uuid'])
+        expected_attrs = []
+        for field in fields:
+            if field in ('metadata', 'system_metadata', 'info_cache',
+                         'fault'):
+                expected_attrs.append(field)
+            elif field in INSTANCE_OPTIONAL_ATTRS:
+                raise exception.ObjectActionError(
+                    action='get_projected_by_filters',
+                    reason='field %s cannot be projected' % field)
+            else:
+                columns.add(field)
+        db_inst_list = db.instance_get_all_by_filters_projected(
+            context, filters, list(columns), sort_key=sort_key,
+            sort_dir=sort_dir, limit=limit, marker=marker,
+            columns_to_join=_expected_cols(expected_attrs),
+            use_slave=use_slave)
+        return _make_projected_instance_list(context, cls(), db_inst_list,
+                                             expected_attrs)
+
+    @base.remotable_classmethod
+    def get_by_uuids(cls, context, uuids, expected_attrs=None,
+                     use_slave=False):
+        """Get several instances by uuid with one call, in no order.
+
+        Like get_by_uuid(), deleted instances are not returned.
+        """
+        if not uuids:
+            return cls(context)
+        filters = {'uuid': uuids, 'deleted': False, 'soft_deleted': True}
+        db_inst_list = db.instance_get_all_by_filters(
+            context, filters, 'created_at', 'desc',
+            columns_to_join=_expected_cols(expected_attrs),
+            use_slave=use_slave)
+        return _make_instance_list(context, cls(), db_inst_list,
+                                   expected_attrs)
+
     @base.remotable_classmethod
     def get_by_host(cls, context, host, expected_attrs=None, use_slave=False):
         db_inst_list = db.instance_get_all_by_host(
@@ -743,6 +986,87 @@ class InstanceList(base.ObjectListBase, base.NovaObject):
         return _make_instance_list(context, cls(), db_inst_list,
                                    expected_attrs)
 
+    @classmethod
+    def get_image_boot_counts(cls, context, since, limit=None):
+        """Count the instances booted from each image since a time.
+
+        :param:since: datetime from which to count boots
+        :param:limit: only return this many of the most booted images
+        :returns: list of (image_ref, count), most booted image first
+        """
+        counts = cls._get_image_boot_counts(context,
+                                            timeutils.isotime(since),
+                                            limit=limit)
+        return [tuple(count) for count in counts]
+
+    @base.remotable_classmethod
+    def _get_image_boot_counts(cls, context, since, limit=None):
+        since = timeutils.parse_isotime(since)
+        return [list(count) for count in
+                db.instance_image_boot_counts(context, since, limit=limit)]
+
+    @classmethod
+    def save_many(cls, context, instances, expected_task_state=None,
+                  expected_values=None):
+        """Save the changes of several instances with one call.
+
+        Instances without changes are skipped. Instances that were deleted,
+        whose task_state does not match expected_task_state, or whose
+        fields no longer have their expected values, are not saved and
+        keep their changes.
+
+        :param expected_values: dict of instance uuid to the expected_values
+                                of its save()
+        :returns: list of the instances that were saved
+        """
+        changed = [inst for inst in instances if inst.obj_what_changed()]
+        if not changed:
+            return []
+        primitives = {}
+        for uuid, values in (expected_values or {}).items():
+            primitives[uuid] = dict(
+                (field, Instance.fields[field].to_primitive(None, field,
+                                                            value))
+                for field, value in values.items())
+        saved = cls._save_many(context, cls(objects=changed),
+                               expected_task_state=expected_task_state,
+                               expected_values=primitives)
+        saved_by_uuid = dict((inst.uuid, inst) for inst in saved)
+        result = []
+        for inst in changed:
+            current = saved_by_uuid.get(inst.uuid)
+            if current is None:
+                continue
+            if current is not inst:
+                for field in inst.fields:
+                    if current.obj_attr_is_set(field):
+                        inst[field] = current[field]
+                inst.obj_reset_changes()
+            result.append(inst)
+        return result
+
+    @base.remotable_classmethod
+    def _save_many(cls, context, instances, expected_task_state=None,
+                   expected_values=None):
+        expected_values = expected_values or {}
+        saved = []
+        for instance in instances:
+            try:
+                instance.save(context,
+                              expected_task_state=expected_task_state,
+                              expected_values=expected_values.get(
+                                  instance.uuid))
+            except (exception.InstanceNotFound,
+                    exception.UnexpectedTaskStateError,
+                    exception.InstanceUpdateConflict) as e:
+                LOG.debug('Instance changes not saved: %s', e,
+                          instance=instance)
+                continue
+            saved.append(instance)
+        inst_list = cls(objects=saved)
+        inst_list.obj_reset_changes()
+        return inst_list
+
     @classmethod
     def get_active_by_window_joined(cls, context, begin, end=None,
                                     project_id=None, host=None,
@@ -806,3 +1130,52 @@ class InstanceList(base.ObjectListBase, base.NovaObject):
             instance.obj_reset_changes(['fault'])
 
         return faults_by_uuid.keys()
+
+
+class InstanceSaveBatch(object):
+    """Collect instance changes and save them in as few calls as possible.
+
+    Periodic tasks walking the instances of a host add the instances they
+    change here rather than calling save() on each of them. The changes
+    are saved with InstanceList.save_many() on flush(), or as soon as
+    max_size instances are pending.
+    """
+
+    def __init__(self, context, expected_task_state=None, max_size=None):
+        self._context = context
+        self._expected_task_state = expected_task_state
+        self._max_size = max_size
+        self._instances = []
+        self._expected_values = {}
+
+    def __len__(self):
+        return len(self._instances)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.flush()
+
+    def add(self, instance, expected_values=None):
+        """Queue the changes of an instance.
+
+        :param expected_values: dict of the field values the instance was
+                                read with, such as power_state and
+                                updated_at. The changes are dropped if the
+                                instance was updated in the meantime.
+        """
+        self._instances.append(instance)
+        if expected_values:
+            self._expected_values[instance.uuid] = expected_values
+        if self._max_size and len(self._instances) >= self._max_size:
+            self.flush()
+
+    def flush(self):
+        """Save the pending instances, returning those that were saved."""
+        instances, self._instances = self._instances, []
+        expected_values, self._expected_values = self._expected_values, {}
+        return InstanceList.save_many(
+            self._context, instances,
+            expected_task_state=self._expected_task_state,
+            expected_values=expected_values)
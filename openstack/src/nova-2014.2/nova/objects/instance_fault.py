@@ -21,6 +21,7 @@ from nova import exception
 from nova.i18n import _LE
 from nova import objects
 from nova.objects import base
+from nova.objects import cache as object_cache
 from nova.objects import fields
 from nova.openstack.common import log as logging
 
@@ -75,6 +76,8 @@ class InstanceFault(base.NovaPersistentObject, base.NovaObject):
         db_fault = db.instance_fault_create(context, values)
         self._from_db_object(context, self, db_fault)
         self.obj_reset_changes()
+        object_cache.invalidate(context, 'Instance', self.instance_uuid,
+                                ['fault'])
         # Cells should only try sending a message over to nova-cells
         # if cells is enabled and we're not the API cell. Otherwise,
         # if the API cell is calling this, we could end up with
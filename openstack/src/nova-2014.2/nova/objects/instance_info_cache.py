@@ -12,12 +12,14 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+from nova.api.metadata import cache as metadata_cache
 from nova.cells import opts as cells_opts
 from nova.cells import rpcapi as cells_rpcapi
 from nova import db
 from nova import exception
 from nova.i18n import _LE
 from nova.objects import base
+from nova.objects import cache as object_cache
 from nova.objects import fields
 from nova.openstack.common import log as logging
 
@@ -32,7 +34,8 @@ class InstanceInfoCache(base.NovaPersistentObject, base.NovaObject):
     # Version 1.4: String attributes updated to support unicode
     # Version 1.5: Actually set the deleted, created_at, updated_at, and
     #              deleted_at attributes
-    VERSION = '1.5'
+    # Version 1.6: Added save_many()
+    VERSION = '1.6'
 
     fields = {
         'instance_uuid': fields.UUIDField(),
@@ -91,8 +94,30 @@ class InstanceInfoCache(base.NovaPersistentObject, base.NovaObject):
                                                {'network_info': nw_info_json})
             if update_cells and rv:
                 self._info_cache_cells_update(context, rv)
+            metadata_cache.invalidate(self.instance_uuid)
+            object_cache.invalidate(context, 'Instance', self.instance_uuid,
+                                    ['info_cache'])
         self.obj_reset_changes()
 
+    @base.remotable_classmethod
+    def save_many(cls, context, info_caches, update_cells=True):
+        """Save the network_info of several info caches in one DB
+        transaction.
+        """
+        values = {}
+        for info_cache in info_caches:
+            nw_info_json = info_cache.fields['network_info'].to_primitive(
+                info_cache, 'network_info', info_cache.network_info)
+            values[info_cache.instance_uuid] = {'network_info': nw_info_json}
+        rvs = db.instance_info_cache_update_many(context, values)
+        for instance_uuid in values:
+            metadata_cache.invalidate(instance_uuid)
+            object_cache.invalidate(context, 'Instance', instance_uuid,
+                                    ['info_cache'])
+        if update_cells:
+            for rv in rvs:
+                cls._info_cache_cells_update(context, rv)
+
     @base.remotable
     def delete(self, context):
         db.instance_info_cache_delete(context, self.instance_uuid)
@@ -0,0 +1,75 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from nova import db
+from nova import objects
+from nova.objects import base
+from nova.objects import fields
+
+
+class PeriodicTaskStats(base.NovaPersistentObject, base.NovaObject):
+    """Run statistics of a periodic task since its service last started."""
+    VERSION = '1.0'
+
+    fields = {
+        'id': fields.IntegerField(),
+        'host': fields.StringField(),
+        'binary': fields.StringField(),
+        'task_name': fields.StringField(),
+        'spacing': fields.FloatField(nullable=True),
+        'runs': fields.IntegerField(),
+        'failures': fields.IntegerField(),
+        'overruns': fields.IntegerField(),
+        'last_run_at': fields.DateTimeField(nullable=True),
+        'last_duration': fields.FloatField(nullable=True),
+        'max_duration': fields.FloatField(nullable=True),
+        'total_duration': fields.FloatField(),
+        'db_calls': fields.IntegerField(),
+        'rpc_calls': fields.IntegerField(),
+        }
+
+    @staticmethod
+    def _from_db_object(context, stats, db_stats):
+        for name in stats.fields:
+            stats[name] = db_stats[name]
+        stats._context = context
+        stats.obj_reset_changes()
+        return stats
+
+    @base.remotable
+    def save(self, context):
+        """Create or update the statistics of this host, binary and task."""
+        updates = self.obj_get_changes()
+        for key in ('id', 'host', 'binary', 'task_name'):
+            updates.pop(key, None)
+        db_stats = db.periodic_task_stats_update(context, self.host,
+                                                 self.binary, self.task_name,
+                                                 updates)
+        self._from_db_object(context, self, db_stats)
+
+
+class PeriodicTaskStatsList(base.ObjectListBase, base.NovaObject):
+    VERSION = '1.0'
+
+    fields = {
+        'objects': fields.ListOfObjectsField('PeriodicTaskStats'),
+        }
+    child_versions = {
+        '1.0': '1.0',
+        }
+
+    @base.remotable_classmethod
+    def get_all(cls, context, host=None, binary=None):
+        db_stats = db.periodic_task_stats_get_all(context, host=host,
+                                                  binary=binary)
+        return base.obj_make_list(context, cls(), objects.PeriodicTaskStats,
+                                  db_stats)
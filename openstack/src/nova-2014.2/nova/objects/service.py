@@ -19,6 +19,7 @@ from nova import objects
 from nova.objects import base
 from nova.objects import fields
 from nova.openstack.common import log as logging
+from nova.openstack.common import timeutils
 from nova import utils
 
 
@@ -140,7 +141,8 @@ class ServiceList(base.ObjectListBase, base.NovaObject):
     #              Service <= version 1.2
     # Version 1.1  Service version 1.3
     # Version 1.2: Service version 1.4
-    VERSION = '1.2'
+    # Version 1.3: Added update_heartbeats
+    VERSION = '1.3'
 
     fields = {
         'objects': fields.ListOfObjectsField('Service'),
@@ -150,6 +152,7 @@ class ServiceList(base.ObjectListBase, base.NovaObject):
         # NOTE(danms): Service was at 1.2 before we added this
         '1.1': '1.3',
         '1.2': '1.4',
+        '1.3': '1.4',
         }
 
     @base.remotable_classmethod
@@ -172,3 +175,23 @@ class ServiceList(base.ObjectListBase, base.NovaObject):
                 context, db_services)
         return base.obj_make_list(context, cls(context), objects.Service,
                                   db_services)
+
+    @classmethod
+    def update_heartbeats(cls, context, heartbeats):
+        """Record the last heartbeat of several services with one call.
+
+        :param heartbeats: dict of service id to heartbeat datetime
+        """
+        # NOTE: Primitives only, as the keys of a dict sent over RPC become
+        # strings and datetimes must be sent as isotime strings.
+        cls._update_heartbeats(context,
+                               [[service_id, timeutils.isotime(updated_at)]
+                                for service_id, updated_at
+                                in heartbeats.iteritems()])
+
+    @base.remotable_classmethod
+    def _update_heartbeats(cls, context, heartbeats):
+        db.service_heartbeat_update_many(
+            context, dict((service_id, timeutils.normalize_time(
+                timeutils.parse_isotime(updated_at)))
+                for service_id, updated_at in heartbeats))
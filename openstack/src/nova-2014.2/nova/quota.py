@@ -24,6 +24,7 @@ import six
 from nova import db
 from nova import exception
 from nova.i18n import _
+from nova.i18n import _LE
 from nova import objects
 from nova.openstack.common import importutils
 from nova.openstack.common import log as logging
@@ -90,6 +91,11 @@ quota_opts = [
     cfg.StrOpt('quota_driver',
                default='nova.quota.DbQuotaDriver',
                help='Default driver to use for quota checks'),
+    cfg.IntOpt('quota_usage_refresh_batch',
+               default=20,
+               help='Number of project and user usage sets resynced by each '
+                    'reservation expiry run when using the '
+                    'OptimisticQuotaDriver'),
     ]
 
 CONF = cfg.CONF
@@ -541,6 +547,11 @@ class DbQuotaDriver(object):
         #            which means access to the session.  Since the
         #            session isn't available outside the DBAPI, we
         #            have to do the work there.
+        return self._reserve(context, resources, quotas, user_quotas,
+                             deltas, expire, project_id, user_id)
+
+    def _reserve(self, context, resources, quotas, user_quotas, deltas,
+                 expire, project_id, user_id):
         return db.quota_reserve(context, resources, quotas, user_quotas,
                                 deltas, expire,
                                 CONF.until_refresh, CONF.max_age,
@@ -654,6 +665,72 @@ class DbQuotaDriver(object):
         db.reservation_expire(context)
 
 
+class OptimisticQuotaDriver(DbQuotaDriver):
+    """Database quota driver which does not lock the usage rows.
+
+    Reservations are made with compare-and-swap updates of the usage
+    counters, so concurrent boots for a project retry a cheap update
+    instead of queueing on SELECT ... FOR UPDATE. The deltas of a
+    multi-instance request are applied with a single update per usage
+    row. Instead of resyncing usages inline every until_refresh
+    reservations or max_age seconds, usages are resynced in the
+    background by expire(), a few projects at a time. Usages which are
+    missing or were reset still take the locking path once.
+    """
+
+    def _reserve(self, context, resources, quotas, user_quotas, deltas,
+                 expire, project_id, user_id):
+        return db.quota_reserve_optimistic(context, resources, quotas,
+                                           user_quotas, deltas, expire,
+                                           CONF.until_refresh, CONF.max_age,
+                                           project_id=project_id,
+                                           user_id=user_id)
+
+    def commit(self, context, reservations, project_id=None, user_id=None):
+        """Commit reservations.
+
+        :param context: The request context, for access checks.
+        :param reservations: A list of the reservation UUIDs, as
+                             returned by the reserve() method.
+        :param project_id: Unused, reservations are looked up by UUID.
+        :param user_id: Unused, reservations are looked up by UUID.
+        """
+        db.reservation_commit_optimistic(context, reservations,
+                                         project_id=project_id,
+                                         user_id=user_id)
+
+    def rollback(self, context, reservations, project_id=None, user_id=None):
+        """Roll back reservations.
+
+        :param context: The request context, for access checks.
+        :param reservations: A list of the reservation UUIDs, as
+                             returned by the reserve() method.
+        :param project_id: Unused, reservations are looked up by UUID.
+        :param user_id: Unused, reservations are looked up by UUID.
+        """
+        db.reservation_rollback_optimistic(context, reservations,
+                                           project_id=project_id,
+                                           user_id=user_id)
+
+    def expire(self, context):
+        """Expire reservations and resync the stalest usages.
+
+        :param context: The request context, for access checks.
+        """
+        db.reservation_expire_optimistic(context)
+
+        resources = QUOTAS._resources
+        for project_id, user_id in db.quota_usage_get_stale(
+                context, CONF.quota_usage_refresh_batch):
+            try:
+                db.quota_usage_refresh(context, resources, project_id,
+                                       user_id)
+            except Exception:
+                LOG.exception(_LE('Failed to refresh quota usages of project '
+                                '%(project_id)s, user %(user_id)s'),
+                              {'project_id': project_id, 'user_id': user_id})
+
+
 class NoopQuotaDriver(object):
     """Driver that turns quotas calls into no-ops and pretends that quotas
     for all resources are unlimited.  This can be used if you do not
@@ -32,6 +32,7 @@ from oslo import messaging
 import nova.context
 import nova.exception
 from nova.openstack.common import jsonutils
+from nova import utils
 
 CONF = cfg.CONF
 TRANSPORT = None
@@ -111,6 +112,7 @@ class RequestContextSerializer(messaging.Serializer):
         return self._base.deserialize_entity(context, entity)
 
     def serialize_context(self, context):
+        utils.note_call('rpc')
         return context.to_dict()
 
     def deserialize_context(self, context):
@@ -0,0 +1,217 @@
+# Service heartbeat driver with batched DB writes
+#
+# This is derived from nova/servicegroup/drivers/mc.py.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Heartbeats in memcached, flushed to the database in batches.
+
+Services report their heartbeats to memcached only. One service at a time,
+elected through a memcached lease, periodically writes the heartbeats of
+all services to the database in one transaction and publishes an up/down
+view of every service group. Other processes keep a local copy of that
+view, so is_up() and get_all() are dictionary lookups whatever the number
+of services.
+"""
+
+import datetime
+
+from oslo.config import cfg
+
+from nova import context
+from nova.i18n import _, _LE
+from nova import objects
+from nova.openstack.common import log as logging
+from nova.openstack.common import memorycache
+from nova.openstack.common import timeutils
+from nova.servicegroup import api
+
+
+heartbeat_opts = [
+    cfg.IntOpt('heartbeat_flush_interval',
+               default=30,
+               help='Interval in seconds between writes of the heartbeats '
+                    'of all services to the database by the heartbeat '
+                    'servicegroup driver'),
+    cfg.IntOpt('heartbeat_view_refresh_interval',
+               default=5,
+               help='Number of seconds a process uses its copy of the '
+                    'service up/down view before fetching it again'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(heartbeat_opts)
+CONF.import_opt('service_down_time', 'nova.service')
+CONF.import_opt('memcached_servers', 'nova.openstack.common.memorycache')
+
+LOG = logging.getLogger(__name__)
+
+FLUSHER_KEY = 'servicegroup-heartbeat-flusher'
+VIEW_KEY = 'servicegroup-heartbeat-view'
+
+
+def _member_key(topic, host):
+    return str('servicegroup-heartbeat-%s:%s' % (topic, host))
+
+
+class HeartbeatDriver(api.ServiceGroupDriver):
+
+    def __init__(self, *args, **kwargs):
+        test = kwargs.get('test')
+        if not CONF.memcached_servers and not test:
+            raise RuntimeError(_('memcached_servers not defined'))
+        self.mc = memorycache.get_client()
+        self._view = None
+        self._view_fetched_at = None
+
+    def join(self, member_id, group_id, service=None):
+        """Join the given service with its group."""
+
+        msg = _('Heartbeat_Driver: join new ServiceGroup member '
+                '%(member_id)s to the %(group_id)s group, '
+                'service = %(service)s')
+        LOG.debug(msg, {'member_id': member_id, 'group_id': group_id,
+                        'service': service})
+        if service is None:
+            raise RuntimeError(_('service is a mandatory argument for '
+                                 'Heartbeat based ServiceGroup driver'))
+        report_interval = service.report_interval
+        if report_interval:
+            service.tg.add_timer(report_interval, self._report_state,
+                                 api.INITIAL_REPORTING_DELAY, service)
+            service.tg.add_timer(CONF.heartbeat_flush_interval, self._flush,
+                                 api.INITIAL_REPORTING_DELAY, service)
+
+    def _get_view(self):
+        """Return the last published up/down view, or None.
+
+        The view maps topics to hosts to their last heartbeat. A view
+        older than service_down_time means that no service is flushing
+        heartbeats any more, so it is not used.
+        """
+        now = timeutils.utcnow_ts()
+        if (self._view_fetched_at is None or
+                now - self._view_fetched_at >=
+                CONF.heartbeat_view_refresh_interval):
+            self._view = self.mc.get(VIEW_KEY)
+            self._view_fetched_at = now
+        if (self._view is None or
+                now - self._view['built_at'] > CONF.service_down_time):
+            return None
+        return self._view['members']
+
+    def _is_recent(self, last_heartbeat):
+        return (abs(timeutils.utcnow_ts() - last_heartbeat) <=
+                CONF.service_down_time)
+
+    def _check_heartbeat(self, topic, host):
+        last_heartbeat = self.mc.get(_member_key(topic, host))
+        return last_heartbeat is not None and self._is_recent(last_heartbeat)
+
+    def is_up(self, service_ref):
+        """Check whether a service is up based on last heartbeat."""
+        view = self._get_view()
+        if view is not None:
+            last_heartbeat = view.get(service_ref['topic'], {}).get(
+                service_ref['host'])
+            if (last_heartbeat is not None and
+                    self._is_recent(last_heartbeat)):
+                return True
+        # NOTE: Services that joined after the view was built, or that look
+        # down in it, are checked one by one.
+        return self._check_heartbeat(service_ref['topic'],
+                                     service_ref['host'])
+
+    def get_all(self, group_id):
+        """Returns ALL members of the given group
+        """
+        LOG.debug('Heartbeat_Driver: get_all members of the %s group',
+                  group_id)
+        view = self._get_view()
+        if view is not None:
+            return [host for host, last_heartbeat
+                    in view.get(group_id, {}).iteritems()
+                    if (self._is_recent(last_heartbeat) or
+                        self._check_heartbeat(group_id, host))]
+        ctxt = context.get_admin_context()
+        services = objects.ServiceList.get_by_topic(ctxt, group_id)
+        return [service.host for service in services if self.is_up(service)]
+
+    def _report_state(self, service):
+        """Record the heartbeat of this service in memcached."""
+        try:
+            key = _member_key(service.service_ref['topic'],
+                              service.service_ref['host'])
+            self.mc.set(key, timeutils.utcnow_ts(),
+                        time=CONF.service_down_time)
+
+            # TODO(termie): make this pattern be more elegant.
+            if getattr(service, 'model_disconnected', False):
+                service.model_disconnected = False
+                LOG.error(_('Recovered model server connection!'))
+
+        # TODO(vish): this should probably only catch connection errors
+        except Exception:  # pylint: disable=W0702
+            if not getattr(service, 'model_disconnected', False):
+                service.model_disconnected = True
+                LOG.exception(_LE('model server went away'))
+
+    def _is_flusher(self, member_id):
+        """Elect one flushing service through a memcached lease."""
+        lease = CONF.heartbeat_flush_interval * 2
+        holder = self.mc.get(FLUSHER_KEY)
+        if holder is None:
+            return bool(self.mc.add(FLUSHER_KEY, member_id, time=lease))
+        if holder == member_id:
+            self.mc.set(FLUSHER_KEY, member_id, time=lease)
+            return True
+        return False
+
+    def _flush(self, service):
+        """Write all heartbeats to the database and publish the view."""
+        member_id = _member_key(service.service_ref['topic'],
+                                service.service_ref['host'])
+        try:
+            if not self._is_flusher(member_id):
+                return
+            ctxt = context.get_admin_context()
+            members = {}
+            heartbeats = {}
+            for service_obj in objects.ServiceList.get_all(ctxt):
+                last_heartbeat = self.mc.get(_member_key(service_obj.topic,
+                                                         service_obj.host))
+                if last_heartbeat is None:
+                    continue
+                members.setdefault(service_obj.topic, {})[
+                    service_obj.host] = last_heartbeat
+                updated_at = datetime.datetime.utcfromtimestamp(
+                    last_heartbeat)
+                db_updated_at = (service_obj.updated_at or
+                                 service_obj.created_at)
+                if (db_updated_at is None or
+                        timeutils.normalize_time(db_updated_at) <
+                        updated_at):
+                    heartbeats[service_obj.id] = updated_at
+            if heartbeats:
+                objects.ServiceList.update_heartbeats(ctxt, heartbeats)
+            self.mc.set(VIEW_KEY, {'built_at': timeutils.utcnow_ts(),
+                                   'members': members},
+                        time=CONF.service_down_time)
+            LOG.debug('Heartbeat_Driver: flushed %(count)d heartbeats of '
+                      '%(members)d services',
+                      {'count': len(heartbeats),
+                       'members': sum(len(hosts)
+                                      for hosts in members.values())})
+        except Exception:
+            LOG.exception(_LE('Failed to flush service heartbeats'))
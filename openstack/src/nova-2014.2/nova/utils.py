@@ -32,6 +32,7 @@ import socket
 import struct
 import sys
 import tempfile
+import threading
 from xml.sax import saxutils
 
 import eventlet
@@ -95,6 +96,8 @@ TIME_UNITS = {
 
 _IS_NEUTRON = None
 
+_CALL_COUNTS = threading.local()
+
 synchronized = lockutils.synchronized_with_prefix('nova-')
 
 SM_IMAGE_PROP_PREFIX = "image_"
@@ -714,6 +717,33 @@ def temporary_mutation(obj, **kwargs):
                 set_value(obj, attr, old_value)
 
 
+@contextlib.contextmanager
+def count_calls():
+    """Count the DB and RPC calls made by the current thread.
+
+    Yields a dict whose 'db' and 'rpc' counts are updated until the
+    block exits:
+
+        with count_calls() as calls:
+            do_something()
+        LOG.debug('%(db)d DB calls, %(rpc)d RPC calls', calls)
+    """
+    calls = {'db': 0, 'rpc': 0}
+    outer = getattr(_CALL_COUNTS, 'calls', None)
+    _CALL_COUNTS.calls = calls
+    try:
+        yield calls
+    finally:
+        _CALL_COUNTS.calls = outer
+
+
+def note_call(kind):
+    """Account a 'db' or 'rpc' call to the enclosing count_calls()."""
+    calls = getattr(_CALL_COUNTS, 'calls', None)
+    if calls is not None:
+        calls[kind] += 1
+
+
 def generate_mac_address():
     """Generate an Ethernet MAC address."""
     # NOTE(vish): We would prefer to use 0xfe here to ensure that linux
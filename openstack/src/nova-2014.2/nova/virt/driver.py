@@ -1196,6 +1196,29 @@ class ComputeDriver(object):
         """
         pass
 
+    def prefetch_images(self, context, image_ids):
+        """Download images into the driver's local image cache.
+
+        Called in the background so that later boots from these images do
+        not have to wait for the download. Images already cached are
+        skipped. The context is the one of the operator who asked for the
+        prefetch and is used to download the images.
+
+        :param image_ids: list of image IDs
+        """
+        pass
+
+    def refresh_cached_images(self, image_ids):
+        """Keep images already in the local image cache from aging out.
+
+        Called periodically for the images the node is configured to keep
+        cached. Unlike prefetch_images(), nothing is downloaded, so no
+        token is needed.
+
+        :param image_ids: list of image IDs
+        """
+        pass
+
     def add_to_aggregate(self, context, aggregate, host, **kwargs):
         """Add a compute host to an aggregate."""
         # NOTE(jogo) Currently only used for XenAPI-Pool
@@ -38,6 +38,31 @@ imagecache_opts = [
                default=(24 * 3600),
                help='Unused unresized base images younger than this will not '
                     'be removed'),
+    cfg.IntOpt('image_prefetch_interval',
+               default=0,
+               help='Number of seconds between runs of the task keeping the '
+                    'images listed in prefetch_images and the most booted '
+                    'recent images from aging out of the image cache of this '
+                    'node. The images are downloaded ahead of the first boot '
+                    'from them by the os-image-prefetch admin API, which '
+                    'carries the token glance needs. 0 disables the task'),
+    cfg.ListOpt('prefetch_images',
+                default=[],
+                help='IDs of images to keep in the image cache of every '
+                     'compute node'),
+    cfg.IntOpt('image_prefetch_popular_count',
+               default=0,
+               help='Also prefetch this many of the images most booted '
+                    'across the cloud in the last '
+                    'image_prefetch_popular_window seconds'),
+    cfg.IntOpt('image_prefetch_popular_window',
+               default=3600,
+               help='Number of seconds of recent boots considered when '
+                    'choosing popular images to prefetch'),
+    cfg.IntOpt('image_prefetch_max_rate',
+               default=0,
+               help='Limit image prefetch downloads to this many KiB per '
+                    'second. 0 means no limit'),
     ]
 
 CONF = cfg.CONF
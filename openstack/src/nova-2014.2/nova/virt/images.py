@@ -68,15 +68,23 @@ def convert_image(source, dest, out_format, run_as_root=False):
     utils.execute(*cmd, run_as_root=run_as_root)
 
 
-def fetch(context, image_href, path, _user_id, _project_id, max_size=0):
+def fetch(context, image_href, path, _user_id, _project_id, max_size=0,
+          max_rate=0):
+    """Download an image to path.
+
+    :param max_rate: limit the download to this many bytes per second,
+                     0 for no limit
+    """
     with fileutils.remove_path_on_error(path):
-        IMAGE_API.download(context, image_href, dest_path=path)
+        IMAGE_API.download(context, image_href, dest_path=path,
+                           max_rate=max_rate)
 
 
-def fetch_to_raw(context, image_href, path, user_id, project_id, max_size=0):
+def fetch_to_raw(context, image_href, path, user_id, project_id, max_size=0,
+                 max_rate=0):
     path_tmp = "%s.part" % path
     fetch(context, image_href, path_tmp, user_id, project_id,
-          max_size=max_size)
+          max_size=max_size, max_rate=max_rate)
 
     with fileutils.remove_path_on_error(path_tmp):
         data = qemu_img_info(path_tmp)
@@ -1170,6 +1170,7 @@ class LibvirtDriver(driver.ComputeDriver):
                 self._cleanup_lvm(instance)
             if CONF.libvirt.images_type == 'rbd':
                 self._cleanup_rbd(instance)
+            self.image_cache_manager.remove_instance_refs(instance)
 
         if destroy_disks or (
                 migrate_data and migrate_data.get('is_shared_block_storage',
@@ -2958,8 +2959,10 @@ class LibvirtDriver(driver.ComputeDriver):
                            'kernel_id': instance['kernel_id'],
                            'ramdisk_id': instance['ramdisk_id']}
 
+        base_files = []
         if disk_images['kernel_id']:
             fname = imagecache.get_cache_fname(disk_images, 'kernel_id')
+            base_files.append(fname)
             raw('kernel').cache(fetch_func=libvirt_utils.fetch_image,
                                 context=context,
                                 filename=fname,
@@ -2968,6 +2971,7 @@ class LibvirtDriver(driver.ComputeDriver):
                                 project_id=instance['project_id'])
             if disk_images['ramdisk_id']:
                 fname = imagecache.get_cache_fname(disk_images, 'ramdisk_id')
+                base_files.append(fname)
                 raw('ramdisk').cache(fetch_func=libvirt_utils.fetch_image,
                                      context=context,
                                      filename=fname,
@@ -2982,6 +2986,7 @@ class LibvirtDriver(driver.ComputeDriver):
         # create a base image.
         if not booted_from_volume:
             root_fname = imagecache.get_cache_fname(disk_images, 'image_id')
+            base_files.append(root_fname)
             size = instance['root_gb'] * units.Gi
 
             if size == 0 or suffix == '.rescue':
@@ -3005,6 +3010,8 @@ class LibvirtDriver(driver.ComputeDriver):
                           user_id=instance['user_id'],
                           project_id=instance['project_id'])
 
+        self.image_cache_manager.add_instance_refs(instance, base_files)
+
         # Lookup the filesystem type if required
         os_type_with_default = disk.get_fs_type_for_os_type(
                                                           instance['os_type'])
@@ -5822,6 +5829,14 @@ class LibvirtDriver(driver.ComputeDriver):
         """Manage the local cache of images."""
         self.image_cache_manager.update(context, all_instances)
 
+    def prefetch_images(self, context, image_ids):
+        """Download images into the local image cache."""
+        self.image_cache_manager.prefetch(context, image_ids)
+
+    def refresh_cached_images(self, image_ids):
+        """Keep images in the local image cache from aging out."""
+        self.image_cache_manager.refresh(image_ids)
+
     def _cleanup_remote_migration(self, dest, inst_base, inst_base_resize,
                                   shared_storage=False):
         """Used only for cleanup in case migrate_disk_and_power_off fails."""
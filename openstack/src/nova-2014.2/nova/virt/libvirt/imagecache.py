@@ -20,6 +20,7 @@ http://wiki.openstack.org/nova-image-cache-management.
 
 """
 
+import contextlib
 import hashlib
 import os
 import re
@@ -32,6 +33,7 @@ from nova.i18n import _LI
 from nova.i18n import _LW
 from nova.openstack.common import fileutils
 from nova.openstack.common import jsonutils
+from nova.openstack.common import lockutils
 from nova.openstack.common import log as logging
 from nova.openstack.common import processutils
 from nova import utils
@@ -62,12 +64,32 @@ imagecache_opts = [
     cfg.IntOpt('checksum_interval_seconds',
                default=3600,
                help='How frequently to checksum base images'),
+    cfg.BoolOpt('image_cache_index',
+                default=False,
+                help='Keep an index of the base files in the image cache, '
+                     'the instances using them and the size and mtime they '
+                     'had when last checksummed. Cache manager passes then '
+                     'only inspect new instances and changed base files, and '
+                     'only one of the compute nodes sharing the cache '
+                     'removes unused base files'),
+    cfg.IntOpt('image_cache_cleaner_lease',
+               default=0,
+               help='Number of seconds a compute node remains the only node '
+                    'removing unused base files from a shared image cache '
+                    'once elected. 0 means twice the '
+                    'image_cache_manager_interval'),
     ]
 
 CONF = cfg.CONF
 CONF.register_opts(imagecache_opts, 'libvirt')
 CONF.import_opt('instances_path', 'nova.compute.manager')
 CONF.import_opt('image_cache_subdirectory_name', 'nova.virt.imagecache')
+CONF.import_opt('image_cache_manager_interval', 'nova.virt.imagecache')
+CONF.import_opt('image_prefetch_max_rate', 'nova.virt.imagecache')
+CONF.import_opt('remove_unused_original_minimum_age_seconds',
+                'nova.virt.imagecache')
+
+INDEX_FILENAME = '.image_cache_index.json'
 
 
 def get_cache_fname(images, key):
@@ -232,10 +254,149 @@ def write_stored_checksum(target):
     write_stored_info(target, field='sha1', value=_hash_file(target))
 
 
+class ImageCacheIndex(object):
+    """Manifest of the base files in an image cache directory.
+
+    The manifest lives in the cache directory, so it is shared by all the
+    compute nodes sharing instance storage. It records the base files each
+    instance was spawned from, the size and mtime of every base file when
+    its checksum was last verified, and which node currently removes unused
+    base files.
+    """
+
+    def __init__(self, base_dir, lock_path):
+        self.path = os.path.join(base_dir, INDEX_FILENAME)
+        self.lock_path = lock_path
+        self._data = None
+
+    def _read(self):
+        data = {}
+        if os.path.exists(self.path):
+            with open(self.path, 'r') as f:
+                data = _read_possible_json(f.read(), self.path)
+        if not isinstance(data, dict):
+            data = {}
+        data.setdefault('refs', {})
+        data.setdefault('files', {})
+        return data
+
+    @contextlib.contextmanager
+    def _update(self):
+        with lockutils.lock('image-cache-index', lock_file_prefix='nova-',
+                            external=True, lock_path=self.lock_path):
+            data = self._read()
+            yield data
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                f.write(jsonutils.dumps(data))
+            os.rename(tmp_path, self.path)
+        self._data = data
+
+    @property
+    def data(self):
+        if self._data is None:
+            self.load()
+        return self._data
+
+    def load(self):
+        """Re-read the manifest, at the start of a cache manager pass."""
+        self._data = self._read()
+
+    def add_refs(self, refs):
+        """Record the base files used by instances.
+
+        :param refs: dict of instance uuid to a list of base file paths
+        """
+        with self._update() as data:
+            for instance_uuid, base_files in refs.iteritems():
+                names = set(data['refs'].get(instance_uuid, []))
+                names.update(os.path.basename(f) for f in base_files if f)
+                data['refs'][instance_uuid] = sorted(names)
+
+    def remove_refs(self, instance_uuids):
+        with self._update() as data:
+            for instance_uuid in instance_uuids:
+                data['refs'].pop(instance_uuid, None)
+
+    def instances(self):
+        return set(self.data['refs'])
+
+    def ref_counts(self):
+        """Return a dict of base file name to the number of its users."""
+        counts = {}
+        for names in self.data['refs'].itervalues():
+            for name in names:
+                counts[name] = counts.get(name, 0) + 1
+        return counts
+
+    def is_unchanged(self, base_file):
+        """Whether a base file is as it was when its checksum was verified."""
+        entry = self.data['files'].get(os.path.basename(base_file))
+        if not entry:
+            return False
+        try:
+            st = os.stat(base_file)
+        except OSError:
+            return False
+        return (entry.get('size') == st.st_size and
+                entry.get('mtime') == st.st_mtime)
+
+    def record_files(self, base_dir, verified):
+        """Remember the current size and mtime of verified base files.
+
+        Entries of base files which no longer exist are dropped.
+        """
+        with self._update() as data:
+            files = data['files']
+            for name in list(files):
+                if not os.path.exists(os.path.join(base_dir, name)):
+                    del files[name]
+            for base_file in verified:
+                try:
+                    st = os.stat(base_file)
+                except OSError:
+                    continue
+                files[os.path.basename(base_file)] = {'size': st.st_size,
+                                                      'mtime': st.st_mtime}
+
+    def touch(self, base_file):
+        """Bump the mtime of a base file to keep it from aging out.
+
+        A verified base file keeps its index entry, so the touch does not
+        cost a checksum of the whole file on the next pass.
+        """
+        name = os.path.basename(base_file)
+        with self._update() as data:
+            entry = data['files'].get(name)
+            try:
+                st = os.stat(base_file)
+                os.utime(base_file, None)
+            except OSError:
+                return
+            if (entry and entry.get('size') == st.st_size and
+                    entry.get('mtime') == st.st_mtime):
+                entry['mtime'] = os.stat(base_file).st_mtime
+
+    def elect_cleaner(self, host, lease):
+        """Try to become, or remain, the node removing unused base files.
+
+        Returns True if host holds the cleaner lease.
+        """
+        now = time.time()
+        with self._update() as data:
+            cleaner = data.get('cleaner') or {}
+            if (cleaner.get('host') not in (None, host) and
+                    cleaner.get('expires', 0) > now):
+                return False
+            data['cleaner'] = {'host': host, 'expires': now + lease}
+        return True
+
+
 class ImageCacheManager(imagecache.ImageCacheManager):
     def __init__(self):
         super(ImageCacheManager, self).__init__()
         self.lock_path = os.path.join(CONF.instances_path, 'locks')
+        self.index = None
         self._reset_state()
 
     def _reset_state(self):
@@ -250,6 +411,29 @@ class ImageCacheManager(imagecache.ImageCacheManager):
         self.originals = []
         self.removable_base_files = []
         self.unexplained_images = []
+        self.verified_base_files = []
+
+    def _get_index(self):
+        if not CONF.libvirt.image_cache_index:
+            return None
+        if self.index is None:
+            base_dir = os.path.join(CONF.instances_path,
+                                    CONF.image_cache_subdirectory_name)
+            fileutils.ensure_tree(base_dir)
+            self.index = ImageCacheIndex(base_dir, self.lock_path)
+        return self.index
+
+    def add_instance_refs(self, instance, base_files):
+        """Record the base files an instance was just spawned from."""
+        index = self._get_index()
+        if index:
+            index.add_refs({instance['uuid']: base_files})
+
+    def remove_instance_refs(self, instance):
+        """Forget the base files used by a deleted instance."""
+        index = self._get_index()
+        if index:
+            index.remove_refs([instance['uuid']])
 
     def _store_image(self, base_dir, ent, original=False):
         """Store a base image for later examination."""
@@ -280,47 +464,88 @@ class ImageCacheManager(imagecache.ImageCacheManager):
         return {'unexplained_images': self.unexplained_images,
                 'originals': self.originals}
 
+    def _get_backing_path(self, ent):
+        """Return the base file backing an instance directory, if any."""
+        disk_path = os.path.join(CONF.instances_path, ent, 'disk')
+        if not os.path.exists(disk_path):
+            return None
+        LOG.debug('%s has a disk file', ent)
+        try:
+            backing_file = libvirt_utils.get_disk_backing_file(disk_path)
+        except processutils.ProcessExecutionError:
+            # (for bug 1261442)
+            if not os.path.exists(disk_path):
+                LOG.debug('Failed to get disk backing file: %s', disk_path)
+                return None
+            else:
+                raise
+        LOG.debug('Instance %(instance)s is backed by %(backing)s',
+                  {'instance': ent,
+                   'backing': backing_file})
+        if not backing_file:
+            return None
+        return os.path.join(CONF.instances_path,
+                            CONF.image_cache_subdirectory_name,
+                            backing_file)
+
     def _list_backing_images(self):
         """List the backing images currently in use."""
         inuse_images = []
         for ent in os.listdir(CONF.instances_path):
             if ent in self.instance_names:
                 LOG.debug('%s is a valid instance name', ent)
-                disk_path = os.path.join(CONF.instances_path, ent, 'disk')
-                if os.path.exists(disk_path):
-                    LOG.debug('%s has a disk file', ent)
-                    try:
-                        backing_file = libvirt_utils.get_disk_backing_file(
-                            disk_path)
-                    except processutils.ProcessExecutionError:
-                        # (for bug 1261442)
-                        if not os.path.exists(disk_path):
-                            LOG.debug('Failed to get disk backing file: %s',
-                                      disk_path)
-                            continue
-                        else:
-                            raise
-                    LOG.debug('Instance %(instance)s is backed by '
-                              '%(backing)s',
-                              {'instance': ent,
-                               'backing': backing_file})
-
-                    if backing_file:
-                        backing_path = os.path.join(
-                            CONF.instances_path,
-                            CONF.image_cache_subdirectory_name,
-                            backing_file)
-                        if backing_path not in inuse_images:
-                            inuse_images.append(backing_path)
-
-                        if backing_path in self.unexplained_images:
-                            LOG.warn(_LW('Instance %(instance)s is using a '
-                                         'backing file %(backing)s which '
-                                         'does not appear in the image '
-                                         'service'),
-                                        {'instance': ent,
-                                         'backing': backing_file})
-                            self.unexplained_images.remove(backing_path)
+                backing_path = self._get_backing_path(ent)
+                if backing_path:
+                    if backing_path not in inuse_images:
+                        inuse_images.append(backing_path)
+
+                    if backing_path in self.unexplained_images:
+                        LOG.warn(_LW('Instance %(instance)s is using a '
+                                     'backing file %(backing)s which '
+                                     'does not appear in the image '
+                                     'service'),
+                                    {'instance': ent,
+                                     'backing': os.path.basename(
+                                         backing_path)})
+                        self.unexplained_images.remove(backing_path)
+        return inuse_images
+
+    def _list_indexed_backing_images(self, all_instances, base_dir):
+        """List the backing images in use according to the index.
+
+        Only the disks of instances the index does not know about yet, for
+        example instances spawned before the index was enabled, are
+        inspected. Instances which are gone are dropped from the index.
+        """
+        known = self.index.instances()
+        current = set()
+        new_refs = {}
+        for instance in all_instances:
+            current.add(instance.uuid)
+            if instance.uuid in known:
+                continue
+            backing_paths = []
+            for ent in (instance.uuid, instance.name,
+                        instance.uuid + '_resize', instance.name + '_resize'):
+                backing_path = self._get_backing_path(ent)
+                if backing_path:
+                    backing_paths.append(backing_path)
+            new_refs[instance.uuid] = backing_paths
+
+        if new_refs:
+            self.index.add_refs(new_refs)
+        gone = known - current
+        if gone:
+            LOG.debug('Dropping %d deleted instances from the image cache '
+                      'index', len(gone))
+            self.index.remove_refs(gone)
+
+        inuse_images = []
+        for name in self.index.ref_counts():
+            backing_path = os.path.join(base_dir, name)
+            inuse_images.append(backing_path)
+            if backing_path in self.unexplained_images:
+                self.unexplained_images.remove(backing_path)
         return inuse_images
 
     def _find_base_file(self, base_dir, fingerprint):
@@ -361,6 +586,19 @@ class ImageCacheManager(imagecache.ImageCacheManager):
         if not CONF.libvirt.checksum_base_images:
             return None
 
+        # NOTE: With the index, a base file which has kept the size and
+        # mtime it had when last verified is not hashed again, and one which
+        # has changed is hashed regardless of checksum_interval_seconds.
+        changed = False
+        if self.index:
+            if self.index.is_unchanged(base_file):
+                LOG.debug('image %(id)s at (%(base_file)s): unchanged since '
+                          'last verified',
+                          {'id': img_id,
+                           'base_file': base_file})
+                return True
+            changed = True
+
         lock_name = 'hash-%s' % os.path.split(base_file)[-1]
 
         # Protect against other nova-computes performing checksums at the same
@@ -373,7 +611,7 @@ class ImageCacheManager(imagecache.ImageCacheManager):
                 # NOTE(mikal): Checksums are timestamped. If we have recently
                 # checksummed (possibly on another compute node if we are using
                 # shared storage), then we don't need to checksum again.
-                if (stored_timestamp and
+                if (not changed and stored_timestamp and
                     time.time() - stored_timestamp <
                         CONF.libvirt.checksum_interval_seconds):
                     return True
@@ -469,6 +707,8 @@ class ImageCacheManager(imagecache.ImageCacheManager):
             checksum_result = self._verify_checksum(img_id, base_file)
             if checksum_result is not None:
                 image_bad = not checksum_result
+            if self.index and checksum_result is not False:
+                self.verified_base_files.append(base_file)
 
             # Give other threads a chance to run
             time.sleep(0)
@@ -534,7 +774,11 @@ class ImageCacheManager(imagecache.ImageCacheManager):
                     self.originals.append(base_file)
 
         # Elements remaining in unexplained_images might be in use
-        inuse_backing_images = self._list_backing_images()
+        if self.index:
+            inuse_backing_images = self._list_indexed_backing_images(
+                all_instances, base_dir)
+        else:
+            inuse_backing_images = self._list_backing_images()
         for backing_path in inuse_backing_images:
             if backing_path not in self.active_base_files:
                 self.active_base_files.append(backing_path)
@@ -556,13 +800,31 @@ class ImageCacheManager(imagecache.ImageCacheManager):
             LOG.info(_LI('Removable base files: %s'),
                      ' '.join(self.removable_base_files))
 
-            if self.remove_unused_base_images:
+            if self.remove_unused_base_images and self._is_cleaner():
                 for base_file in self.removable_base_files:
                     self._remove_base_file(base_file)
 
+        if self.index and CONF.libvirt.checksum_base_images:
+            self.index.record_files(base_dir, self.verified_base_files)
+
         # That's it
         LOG.debug('Verification complete')
 
+    def _is_cleaner(self):
+        """Whether this node may remove unused base files.
+
+        Without the index every node sharing the cache removes them.
+        """
+        if not self.index:
+            return True
+        lease = (CONF.libvirt.image_cache_cleaner_lease or
+                 2 * CONF.image_cache_manager_interval)
+        if self.index.elect_cleaner(CONF.host, lease):
+            return True
+        LOG.debug('Leaving removal of unused base files to another node '
+                  'sharing the image cache')
+        return False
+
     def _get_base(self):
 
         # NOTE(mikal): The new scheme for base images is as follows -- an
@@ -583,12 +845,75 @@ class ImageCacheManager(imagecache.ImageCacheManager):
             return
         return base_dir
 
+    def refresh(self, image_ids):
+        """Keep the cached images among image_ids from aging out of _base.
+
+        Images which are not cached are left alone; downloading them is
+        up to prefetch().
+        """
+        index = self._get_index()
+        base_dir = os.path.join(CONF.instances_path,
+                                CONF.image_cache_subdirectory_name)
+        min_age = CONF.remove_unused_original_minimum_age_seconds / 2
+
+        for image_id in image_ids:
+            fname = get_cache_fname({'image_id': image_id}, 'image_id')
+            target = os.path.join(base_dir, fname)
+            if not os.path.exists(target):
+                continue
+            if time.time() - os.path.getmtime(target) > min_age:
+                if index:
+                    index.touch(target)
+                else:
+                    os.utime(target, None)
+
+    def prefetch(self, context, image_ids):
+        """Download images into _base ahead of the first boot from them.
+
+        Downloads take the same lock as Image.cache, so a boot racing with
+        the prefetch waits for it rather than fetching the image again.
+        Images which are already cached are refreshed instead.
+        """
+        base_dir = os.path.join(CONF.instances_path,
+                                CONF.image_cache_subdirectory_name)
+        fileutils.ensure_tree(base_dir)
+        max_rate = CONF.image_prefetch_max_rate * 1024
+        self.refresh(image_ids)
+
+        for image_id in image_ids:
+            fname = get_cache_fname({'image_id': image_id}, 'image_id')
+            target = os.path.join(base_dir, fname)
+            if os.path.exists(target):
+                continue
+
+            @utils.synchronized(fname, external=True, lock_path=self.lock_path)
+            def fetch_image_sync():
+                if os.path.exists(target):
+                    return
+                LOG.info(_LI('image %(id)s at (%(base_file)s): prefetching'),
+                         {'id': image_id,
+                          'base_file': target})
+                libvirt_utils.fetch_image(context, target, image_id,
+                                          context.user_id,
+                                          context.project_id,
+                                          max_rate=max_rate)
+
+            try:
+                fetch_image_sync()
+            except Exception as e:
+                LOG.warn(_LW('image %(id)s: prefetch failed: %(error)s'),
+                         {'id': image_id,
+                          'error': e})
+
     def update(self, context, all_instances):
         base_dir = self._get_base()
         if not base_dir:
             return
         # reset the local statistics
         self._reset_state()
+        # read the index of the cache, if any
+        if self._get_index():
+            self.index.load()
         # read the cached images
         self._list_base_images(base_dir)
         # read running instances data
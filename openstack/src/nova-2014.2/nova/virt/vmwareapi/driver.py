@@ -20,6 +20,7 @@ A connection to the VMware vCenter platform.
 """
 
 import re
+import time
 
 from oslo.config import cfg
 from oslo.vmware import api
@@ -34,6 +35,7 @@ from nova.openstack.common import uuidutils
 from nova.virt import driver
 from nova.virt.vmwareapi import error_util
 from nova.virt.vmwareapi import host
+from nova.virt.vmwareapi import inventory
 from nova.virt.vmwareapi import vm_util
 from nova.virt.vmwareapi import vmops
 from nova.virt.vmwareapi import volumeops
@@ -84,6 +86,9 @@ CONF.register_opts(vmwareapi_opts, 'vmware')
 
 TIME_BETWEEN_API_CALL_RETRIES = 1.0
 
+# vSphere methods other than tasks that change the inventory of a cluster
+_CHANGING_METHODS = ('RebootGuest', 'ShutdownGuest', 'UnregisterVM')
+
 
 # The following class was removed in the transition from Icehouse to
 # Juno, but may still be referenced in configuration files.  The
@@ -305,16 +310,20 @@ class VMwareVCDriver(driver.ComputeDriver):
         """
         added_nodes = set(self.dict_mors.keys()) - set(self._resource_keys)
         for node in added_nodes:
+            _inventory = inventory.ClusterInventory(self._session,
+                                        self.dict_mors[node]['cluster_mor'])
             _volumeops = volumeops.VMwareVolumeOps(self._session,
                                         self.dict_mors[node]['cluster_mor'])
             _vmops = vmops.VMwareVMOps(self._session, self._virtapi,
                                        _volumeops,
                                        self.dict_mors[node]['cluster_mor'],
-                                       datastore_regex=self._datastore_regex)
+                                       datastore_regex=self._datastore_regex,
+                                       inventory=_inventory)
             name = self.dict_mors.get(node)['name']
             nodename = self._create_nodename(node, name)
             _vc_state = host.VCState(self._session, nodename,
-                                     self.dict_mors.get(node)['cluster_mor'])
+                                     self.dict_mors.get(node)['cluster_mor'],
+                                     inventory=_inventory)
             self._resources[nodename] = {'vmops': _vmops,
                                          'volumeops': _volumeops,
                                          'vcstate': _vc_state,
@@ -676,6 +685,8 @@ class VMwareAPISession(api.VMwareAPISession):
                 create_session=True,
                 wsdl_loc=CONF.vmware.wsdl_location
                 )
+        # Time of the last call that may have changed the inventory
+        self.changed_at = 0
 
     def _is_vim_object(self, module):
         """Check if the module is a VIM Object instance."""
@@ -688,6 +699,8 @@ class VMwareAPISession(api.VMwareAPISession):
         if not self._is_vim_object(module):
             return self.invoke_api(module, method, self.vim, *args, **kwargs)
         else:
+            if method.endswith('_Task') or method in _CHANGING_METHODS:
+                self.changed_at = time.time()
             return self.invoke_api(module, method, *args, **kwargs)
 
     def _get_vim(self):
@@ -698,4 +711,7 @@ class VMwareAPISession(api.VMwareAPISession):
         """Return a Deferred that will give the result of the given task.
         The task is polled until it completes.
         """
-        return self.wait_for_task(task_ref)
+        try:
+            return self.wait_for_task(task_ref)
+        finally:
+            self.changed_at = time.time()
@@ -199,15 +199,27 @@ def _select_datastore(data_stores, best_match, datastore_regex=None):
     """
 
     # data_stores is actually a RetrieveResult object from vSphere API call
-    for obj_content in data_stores.objects:
-        # the propset attribute "need not be set" by returning API
-        if not hasattr(obj_content, 'propSet'):
-            continue
+    # the propset attribute "need not be set" by returning API
+    return _select_datastore_from_properties(
+        [(obj_content.obj, vm_util.propset_dict(obj_content.propSet))
+         for obj_content in data_stores.objects
+         if hasattr(obj_content, 'propSet')],
+        best_match, datastore_regex)
 
-        propdict = vm_util.propset_dict(obj_content.propSet)
+
+def _select_datastore_from_properties(data_stores, best_match,
+                                      datastore_regex=None):
+    """Find the most preferable datastore in (ref, property dict) pairs.
+
+    :param data_stores: (datastore ref, summary property dict) pairs
+    :param best_match: the current best match for datastore
+    :param datastore_regex: an optional regular expression to match names
+    :return: datastore_ref, datastore_name, capacity, freespace
+    """
+    for ds_ref, propdict in data_stores:
         if _is_datastore_valid(propdict, datastore_regex):
             new_ds = Datastore(
-                    ref=obj_content.obj,
+                    ref=ds_ref,
                     name=propdict['summary.name'],
                     capacity=propdict['summary.capacity'],
                     freespace=propdict['summary.freeSpace'])
@@ -242,8 +254,18 @@ def _is_datastore_valid(propdict, datastore_regex):
              datastore_regex.match(propdict['summary.name'])))
 
 
-def get_datastore(session, cluster, datastore_regex=None):
-    """Get the datastore list and choose the most preferable one."""
+def get_datastore(session, cluster, datastore_regex=None, inventory=None):
+    """Get the datastore list and choose the most preferable one.
+
+    The datastores of the cluster are read from the inventory snapshot
+    when one is given and enabled.
+    """
+    snapshot = inventory.get() if inventory else None
+    if snapshot is not None:
+        best_match = _select_datastore_from_properties(snapshot.datastores,
+                                                       None, datastore_regex)
+        return _check_datastore_found(best_match, datastore_regex)
+
     datastore_ret = session._call_method(
                                 vim_util,
                                 "get_dynamic_property", cluster,
@@ -272,6 +294,10 @@ def get_datastore(session, cluster, datastore_regex=None):
         data_stores = session._call_method(vim_util,
                                            "continue_to_get_objects",
                                            token)
+    return _check_datastore_found(best_match, datastore_regex)
+
+
+def _check_datastore_found(best_match, datastore_regex):
     if best_match:
         return best_match
     if datastore_regex:
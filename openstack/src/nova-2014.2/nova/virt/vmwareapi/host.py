@@ -31,9 +31,9 @@ from nova.virt.vmwareapi import vm_util
 LOG = logging.getLogger(__name__)
 
 
-def _get_ds_capacity_and_freespace(session, cluster=None):
+def _get_ds_capacity_and_freespace(session, cluster=None, inventory=None):
     try:
-        ds = ds_util.get_datastore(session, cluster)
+        ds = ds_util.get_datastore(session, cluster, inventory=inventory)
         return ds.capacity, ds.freespace
     except exception.DatastoreNotFound:
         return 0, 0
@@ -104,11 +104,12 @@ class VCState(object):
     """Manages information about the VC host this compute
     node is running on.
     """
-    def __init__(self, session, host_name, cluster):
+    def __init__(self, session, host_name, cluster, inventory=None):
         super(VCState, self).__init__()
         self._session = session
         self._host_name = host_name
         self._cluster = cluster
+        self._inventory = inventory
         self._stats = {}
         self.update_status()
 
@@ -123,10 +124,17 @@ class VCState(object):
     def update_status(self):
         """Update the current state of the cluster."""
         capacity, freespace = _get_ds_capacity_and_freespace(self._session,
-                                                             self._cluster)
+                                                             self._cluster,
+                                                             self._inventory)
 
         # Get cpu, memory stats from the cluster
-        stats = vm_util.get_stats_from_cluster(self._session, self._cluster)
+        snapshot = self._inventory.get() if self._inventory else None
+        if snapshot is not None:
+            stats = vm_util.get_stats_from_properties(
+                snapshot.hosts, snapshot.res_pool_memory)
+        else:
+            stats = vm_util.get_stats_from_cluster(self._session,
+                                                   self._cluster)
         about_info = self._session._call_method(vim_util, "get_about_info")
         data = {}
         data["vcpus"] = stats['cpu']['vcpus']
@@ -0,0 +1,143 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Snapshot of the inventory of a vCenter cluster.
+
+The hosts, datastores, root resource pool and virtual machines of a cluster
+are read by a single property collector traversal and kept for
+``[vmware] inventory_snapshot_ttl`` seconds, so that the periodic tasks of a
+compute node list instances, report resources and choose datastores
+without one vCenter round trip per object. A snapshot taken before the
+last change made through the session is not used.
+"""
+
+import threading
+import time
+
+from oslo.config import cfg
+
+from nova.openstack.common import log as logging
+from nova.virt.vmwareapi import vim_util
+from nova.virt.vmwareapi import vm_util
+
+inventory_opts = [
+    cfg.IntOpt('inventory_snapshot_ttl',
+               default=0,
+               help='Number of seconds the inventory of a cluster, read '
+                    'with a single property collector traversal, is used '
+                    'to list instances, report resources and select '
+                    'datastores. 0 disables the snapshot'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(inventory_opts, 'vmware')
+
+LOG = logging.getLogger(__name__)
+
+
+class InventorySnapshot(object):
+    """The properties of the objects of a cluster at a point in time."""
+
+    def __init__(self, taken_at):
+        self.taken_at = taken_at
+        # Property dicts of the hosts of the cluster
+        self.hosts = []
+        # (reference, property dict) of the datastores of the cluster
+        self.datastores = []
+        # summary.runtime.memory of the root resource pool of the cluster
+        self.res_pool_memory = None
+        # Property dicts of the VMs of the root resource pool, by moref value
+        self.vms = {}
+
+    def add(self, obj_content):
+        propdict = vm_util.propset_dict(getattr(obj_content, 'propSet',
+                                                None))
+        obj_type = obj_content.obj._type
+        if obj_type == 'HostSystem':
+            self.hosts.append(propdict)
+        elif obj_type == 'Datastore':
+            self.datastores.append((obj_content.obj, propdict))
+        elif obj_type == 'ResourcePool':
+            self.res_pool_memory = propdict.get('summary.runtime.memory')
+        elif obj_type == 'VirtualMachine':
+            self.vms[obj_content.obj.value] = propdict
+
+
+class ClusterInventory(object):
+    """TTL bounded inventory snapshot of a cluster, shared by its users."""
+
+    def __init__(self, session, cluster):
+        self._session = session
+        self._cluster = cluster
+        self._snapshot = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return (CONF.vmware.inventory_snapshot_ttl > 0 and
+                self._cluster is not None and
+                self._cluster._type == 'ClusterComputeResource')
+
+    def _is_valid(self, snapshot):
+        if snapshot is None:
+            return False
+        changed_at = getattr(self._session, 'changed_at', 0)
+        return (snapshot.taken_at > changed_at and
+                time.time() - snapshot.taken_at <
+                CONF.vmware.inventory_snapshot_ttl)
+
+    def _take_snapshot(self):
+        snapshot = InventorySnapshot(time.time())
+        result = self._session._call_method(vim_util,
+                                            "get_cluster_inventory",
+                                            self._cluster)
+        while result:
+            for obj_content in result.objects:
+                snapshot.add(obj_content)
+            token = vm_util._get_token(result)
+            if not token:
+                break
+            result = self._session._call_method(vim_util,
+                                                "continue_to_get_objects",
+                                                token)
+        LOG.debug("Took inventory snapshot of cluster %(cluster)s: "
+                  "%(hosts)d hosts, %(datastores)d datastores, %(vms)d VMs",
+                  {'cluster': self._cluster.value,
+                   'hosts': len(snapshot.hosts),
+                   'datastores': len(snapshot.datastores),
+                   'vms': len(snapshot.vms)})
+        return snapshot
+
+    def get(self):
+        """Return a valid snapshot, taking a new one if needed.
+
+        Returns None when the snapshot is disabled for this cluster.
+        """
+        if not self.enabled:
+            return None
+        snapshot = self._snapshot
+        if self._is_valid(snapshot):
+            return snapshot
+        with self._lock:
+            # NOTE: Another thread may have refreshed it in the meantime.
+            if not self._is_valid(self._snapshot):
+                self._snapshot = self._take_snapshot()
+            return self._snapshot
+
+    def peek(self):
+        """Return the current snapshot if it is still valid, else None."""
+        if not self.enabled:
+            return None
+        snapshot = self._snapshot
+        if self._is_valid(snapshot):
+            return snapshot
+        return None
@@ -151,6 +151,51 @@ def get_inner_objects(vim, base_obj, path, inner_type,
             specSet=[property_filter_spec], options=options)
 
 
+def get_cluster_inventory(vim, cluster):
+    """Gets the hosts, datastores, root resource pool and VMs of a cluster.
+
+    All of them are collected by a single paginated RetrievePropertiesEx
+    traversal from the cluster.
+    """
+    client_factory = vim.client.factory
+    rp_to_vm = vutil.build_traversal_spec(client_factory, 'rp_to_vm',
+                                          'ResourcePool', 'vm', False, [])
+    select_set = [
+        vutil.build_traversal_spec(client_factory, 'cluster_to_host',
+                                   'ClusterComputeResource', 'host',
+                                   False, []),
+        vutil.build_traversal_spec(client_factory, 'cluster_to_ds',
+                                   'ClusterComputeResource', 'datastore',
+                                   False, []),
+        vutil.build_traversal_spec(client_factory, 'cluster_to_rp',
+                                   'ClusterComputeResource', 'resourcePool',
+                                   False, [rp_to_vm])]
+    object_spec = vutil.build_object_spec(client_factory, cluster,
+                                          select_set)
+    property_specs = [
+        vutil.build_property_spec(client_factory, type_='HostSystem',
+            properties_to_collect=['summary.hardware', 'summary.runtime']),
+        vutil.build_property_spec(client_factory, type_='Datastore',
+            properties_to_collect=['summary.type', 'summary.name',
+                                   'summary.capacity', 'summary.freeSpace',
+                                   'summary.accessible',
+                                   'summary.maintenanceMode']),
+        vutil.build_property_spec(client_factory, type_='ResourcePool',
+            properties_to_collect=['summary.runtime.memory']),
+        vutil.build_property_spec(client_factory, type_='VirtualMachine',
+            properties_to_collect=['name', 'runtime.connectionState',
+                                   'runtime.powerState',
+                                   'summary.config.numCpu',
+                                   'summary.config.memorySizeMB'])]
+    property_filter_spec = vutil.build_property_filter_spec(client_factory,
+                                property_specs, [object_spec])
+    options = client_factory.create('ns0:RetrieveOptions')
+    options.maxObjects = CONF.vmware.maximum_objects
+    return vim.RetrievePropertiesEx(
+            vim.service_content.propertyCollector,
+            specSet=[property_filter_spec], options=options)
+
+
 def cancel_retrieve(vim, token):
     """Cancels the retrieve operation."""
     return vim.CancelRetrievePropertiesEx(
@@ -1000,8 +1000,8 @@ def get_vm_state_from_name(session, vm_name):
 
 def get_stats_from_cluster(session, cluster):
     """Get the aggregate resource stats of a cluster."""
-    cpu_info = {'vcpus': 0, 'cores': 0, 'vendor': [], 'model': []}
-    mem_info = {'total': 0, 'free': 0}
+    hosts = []
+    res_usage = None
     # Get the Host and Resource Pool Managed Object Refs
     prop_dict = session._call_method(vim_util, "get_dynamic_properties",
                                      cluster, "ClusterComputeResource",
@@ -1014,28 +1014,43 @@ def get_stats_from_cluster(session, cluster):
                          "get_properties_for_a_collection_of_objects",
                          "HostSystem", host_mors,
                          ["summary.hardware", "summary.runtime"])
-            for obj in result.objects:
-                hardware_summary = obj.propSet[0].val
-                runtime_summary = obj.propSet[1].val
-                if (runtime_summary.inMaintenanceMode is False and
-                    runtime_summary.connectionState == "connected"):
-                    # Total vcpus is the sum of all pCPUs of individual hosts
-                    # The overcommitment ratio is factored in by the scheduler
-                    cpu_info['vcpus'] += hardware_summary.numCpuThreads
-                    cpu_info['cores'] += hardware_summary.numCpuCores
-                    cpu_info['vendor'].append(hardware_summary.vendor)
-                    cpu_info['model'].append(hardware_summary.cpuModel)
+            hosts = [propset_dict(obj.propSet) for obj in result.objects]
 
         res_mor = prop_dict.get('resourcePool')
         if res_mor:
             res_usage = session._call_method(vim_util, "get_dynamic_property",
                             res_mor, "ResourcePool", "summary.runtime.memory")
-            if res_usage:
-                # maxUsage is the memory limit of the cluster available to VM's
-                mem_info['total'] = int(res_usage.maxUsage / units.Mi)
-                # overallUsage is the hypervisor's view of memory usage by VM's
-                consumed = int(res_usage.overallUsage / units.Mi)
-                mem_info['free'] = mem_info['total'] - consumed
+    return get_stats_from_properties(hosts, res_usage)
+
+
+def get_stats_from_properties(hosts, res_usage):
+    """Get the aggregate resource stats of a cluster from its properties.
+
+    :param hosts: summary.hardware and summary.runtime property dicts of the
+                  hosts of the cluster
+    :param res_usage: summary.runtime.memory of the root resource pool
+    """
+    cpu_info = {'vcpus': 0, 'cores': 0, 'vendor': [], 'model': []}
+    mem_info = {'total': 0, 'free': 0}
+    for host_props in hosts:
+        hardware_summary = host_props.get('summary.hardware')
+        runtime_summary = host_props.get('summary.runtime')
+        if (hardware_summary and runtime_summary and
+            runtime_summary.inMaintenanceMode is False and
+            runtime_summary.connectionState == "connected"):
+            # Total vcpus is the sum of all pCPUs of individual hosts
+            # The overcommitment ratio is factored in by the scheduler
+            cpu_info['vcpus'] += hardware_summary.numCpuThreads
+            cpu_info['cores'] += hardware_summary.numCpuCores
+            cpu_info['vendor'].append(hardware_summary.vendor)
+            cpu_info['model'].append(hardware_summary.cpuModel)
+
+    if res_usage:
+        # maxUsage is the memory limit of the cluster available to VM's
+        mem_info['total'] = int(res_usage.maxUsage / units.Mi)
+        # overallUsage is the hypervisor's view of memory usage by VM's
+        consumed = int(res_usage.overallUsage / units.Mi)
+        mem_info['free'] = mem_info['total'] - consumed
     stats = {'cpu': cpu_info, 'mem': mem_info}
     return stats
 
@@ -140,7 +140,7 @@ class VMwareVMOps(object):
     """Management class for VM-related tasks."""
 
     def __init__(self, session, virtapi, volumeops, cluster=None,
-                 datastore_regex=None):
+                 datastore_regex=None, inventory=None):
         """Initializer."""
         self.compute_api = compute.API()
         self._session = session
@@ -148,6 +148,7 @@ class VMwareVMOps(object):
         self._volumeops = volumeops
         self._cluster = cluster
         self._datastore_regex = datastore_regex
+        self._inventory = inventory
         # Ensure that the base folder is unique per compute node
         if CONF.remove_unused_base_images:
             self._base_folder = '%s%s' % (CONF.my_ip,
@@ -377,7 +378,8 @@ class VMwareVMOps(object):
             raise exception.InstanceUnacceptable(instance_id=instance.uuid,
                                                  reason=reason)
         datastore = ds_util.get_datastore(
-                self._session, self._cluster, self._datastore_regex)
+                self._session, self._cluster, self._datastore_regex,
+                inventory=self._inventory)
         dc_info = self.get_datacenter_ref_and_name(datastore.ref)
 
         return VirtualMachineInstanceConfigInfo(instance,
@@ -1029,7 +1031,8 @@ class VMwareVMOps(object):
 
         ds_ref = ds_util.get_datastore(
                             self._session, self._cluster,
-                            datastore_regex=self._datastore_regex).ref
+                            datastore_regex=self._datastore_regex,
+                            inventory=self._inventory).ref
         dc_info = self.get_datacenter_ref_and_name(ds_ref)
         # 3. Clone the VM for instance
         vm_util.clone_vmref_for_instance(self._session, instance, vm_ref,
@@ -1088,7 +1091,8 @@ class VMwareVMOps(object):
                 vmdk_path = vm_util.get_vmdk_path(self._session, vm_ref,
                                                   instance)
                 data_store_ref = ds_util.get_datastore(self._session,
-                    self._cluster, datastore_regex=self._datastore_regex).ref
+                    self._cluster, datastore_regex=self._datastore_regex,
+                    inventory=self._inventory).ref
                 dc_info = self.get_datacenter_ref_and_name(data_store_ref)
                 self._extend_virtual_disk(instance, root_disk_in_kb, vmdk_path,
                                           dc_info.ref)
@@ -1145,14 +1149,20 @@ class VMwareVMOps(object):
         """Return data about the VM instance."""
         vm_ref = vm_util.get_vm_ref(self._session, instance)
 
-        lst_properties = ["summary.config.numCpu",
-                    "summary.config.memorySizeMB",
-                    "runtime.powerState"]
-        vm_props = self._session._call_method(vim_util,
-                    "get_object_properties", None, vm_ref, "VirtualMachine",
-                    lst_properties)
-        query = vm_util.get_values_from_object_properties(
-                self._session, vm_props)
+        # NOTE: get_info is called per instance, so it uses the inventory
+        # snapshot when a bulk caller has recently taken one, but does not
+        # take one itself.
+        snapshot = self._inventory.peek() if self._inventory else None
+        query = snapshot.vms.get(vm_ref.value) if snapshot else None
+        if not query or 'runtime.powerState' not in query:
+            lst_properties = ["summary.config.numCpu",
+                        "summary.config.memorySizeMB",
+                        "runtime.powerState"]
+            vm_props = self._session._call_method(vim_util,
+                        "get_object_properties", None, vm_ref,
+                        "VirtualMachine", lst_properties)
+            query = vm_util.get_values_from_object_properties(
+                    self._session, vm_props)
         max_mem = int(query['summary.config.memorySizeMB']) * 1024
         return {'state': VMWARE_POWER_STATES[query['runtime.powerState']],
                 'max_mem': max_mem,
@@ -1638,6 +1648,16 @@ class VMwareVMOps(object):
         properties = ['name', 'runtime.connectionState']
         LOG.debug("Getting list of instances from cluster %s",
                   self._cluster)
+        snapshot = self._inventory.get() if self._inventory else None
+        if snapshot is not None:
+            # Ignoring the orphaned or inaccessible VMs
+            lst_vm_names = [props.get('name')
+                            for props in snapshot.vms.itervalues()
+                            if props.get('runtime.connectionState') not in
+                            ["orphaned", "inaccessible"]]
+            LOG.debug("Got total of %s instances", str(len(lst_vm_names)))
+            return lst_vm_names
+
         vms = []
         root_res_pool = self._session._call_method(
             vim_util, "get_dynamic_property", self._cluster,